@@ -16,14 +16,19 @@
 # ==============================================================================
 
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from typing import Optional
-
-import anthropic
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
 
+import telemetry_queue
 from database import SessionLocal, AgentRunLog
 
+if TYPE_CHECKING:  # the SDK costs ~1s to import; load it on the first agent call
+    import anthropic
+
 _MODEL = "claude-sonnet-4-6"
 _SPEC_DIR = Path(__file__).parent / "agents"
 
@@ -34,12 +39,13 @@ _RATES = {
     "cache_write": 3.75 / 1_000_000,
 }
 
-_client: Optional[anthropic.Anthropic] = None
+_client: Optional["anthropic.Anthropic"] = None
 
 
-def _get_client() -> anthropic.Anthropic:
+def _get_client() -> "anthropic.Anthropic":
     global _client
     if _client is None:
+        import anthropic
         _client = anthropic.Anthropic()
     return _client
 
@@ -58,6 +64,188 @@ def _calculate_cost(
     )
 
 
+# ==============================================================================
+# ROLLING SPEND LEDGER
+# In-process mirror of agent_run_log spend, bucketed per minute per agent.
+# Seeded from the DB (main.lifespan() calls seed_spend_ledger(); the first
+# budget check seeds lazily if startup didn't), then kept current by
+# _log_run(). The budget gate and the cost dashboards read it instead of
+# re-scanning agent_run_log, so the pre-call check is O(1) amortized with no
+# DB round trip. Other processes spend too (worker.py runs the schedulers,
+# several web workers each have a ledger), so the ledger is reseeded from
+# agent_run_log every SPEND_LEDGER_RESYNC_SEC (default 60s), and on every
+# check once local spend is within 10% of the cap -- the combined total, not
+# this process's share, decides refusals. Buckets older than the 24h budget window drop out of the
+# running totals but are retained for 7 days for the dashboard series.
+# ==============================================================================
+_BUDGET_WINDOW_MIN = 24 * 60
+_RETAIN_MIN = 7 * 24 * 60
+SPEND_LEDGER_RESYNC_SEC = float(os.getenv("SPEND_LEDGER_RESYNC_SEC", "60"))
+_NEAR_CAP = 0.9
+
+
+class _SpendLedger:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (minute, {agent: {"usd", "success_usd", "statuses"}}) oldest first
+        self._window: Deque[Tuple[int, Dict[str, dict]]] = deque()
+        self._retained: Deque[Tuple[int, Dict[str, dict]]] = deque()
+        self._window_usd = 0.0
+        self.seeded = False
+        self._seeded_at = 0.0
+
+    @staticmethod
+    def _minute(ts: Optional[float] = None) -> int:
+        return int((time.time() if ts is None else ts) // 60)
+
+    def _advance(self, now_min: int) -> None:
+        cutoff = now_min - _BUDGET_WINDOW_MIN
+        while self._window and self._window[0][0] <= cutoff:
+            bucket = self._window.popleft()
+            for entry in bucket[1].values():
+                self._window_usd -= entry["usd"]
+            self._retained.append(bucket)
+        retain_cutoff = now_min - _RETAIN_MIN
+        while self._retained and self._retained[0][0] <= retain_cutoff:
+            self._retained.popleft()
+
+    @staticmethod
+    def _bucket(buckets: Deque[Tuple[int, Dict[str, dict]]], minute: int) -> Dict[str, dict]:
+        # Same minute (or an out-of-order record from clock skew between
+        # writers) folds into the newest bucket; only the window edge matters.
+        if buckets and buckets[-1][0] >= minute:
+            return buckets[-1][1]
+        bucket: Dict[str, dict] = {}
+        buckets.append((minute, bucket))
+        return bucket
+
+    @staticmethod
+    def _count(bucket: Dict[str, dict], agent_name: str, usd: float, status: str) -> float:
+        """Tally one run into `bucket`; returns the spend it adds to the budget."""
+        entry = bucket.setdefault(agent_name, {"usd": 0.0, "success_usd": 0.0, "statuses": {}})
+        entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+        if status == "BUDGET_BLOCKED":
+            return 0.0
+        entry["usd"] += usd
+        if status == "SUCCESS":
+            entry["success_usd"] += usd
+        return usd
+
+    def _add(self, minute: int, agent_name: str, usd: float, status: str) -> None:
+        self._window_usd += self._count(self._bucket(self._window, minute), agent_name, usd, status)
+
+    def record(self, agent_name: str, usd: float, status: str, at: Optional[float] = None) -> None:
+        minute = self._minute(at)
+        now_min = self._minute()
+        if minute <= now_min - _BUDGET_WINDOW_MIN:
+            return  # already outside the budget window; seed() handles history
+        with self._lock:
+            self._add(minute, agent_name, usd or 0.0, status)
+            self._advance(now_min)
+
+    def seed(self, rows: List[Tuple[str, float, str, datetime]]) -> None:
+        """Rebuild from (agent_name, usd, status, created_at) rows, oldest first."""
+        now_min = self._minute()
+        window_cutoff = now_min - _BUDGET_WINDOW_MIN
+        with self._lock:
+            self._window.clear()
+            self._retained.clear()
+            self._window_usd = 0.0
+            for agent_name, usd, status, created_at in rows:
+                if created_at is None:
+                    continue
+                minute = self._minute(created_at.replace(tzinfo=timezone.utc).timestamp())
+                if minute <= window_cutoff:
+                    self._count(self._bucket(self._retained, minute), agent_name, usd or 0.0, status)
+                else:
+                    self._add(minute, agent_name, usd or 0.0, status)
+            self._advance(now_min)
+            self.seeded = True
+            self._seeded_at = time.monotonic()
+
+    def age(self) -> float:
+        """Seconds since the last seed (inf if never seeded)."""
+        return time.monotonic() - self._seeded_at if self.seeded else float("inf")
+
+    def spent_24h(self) -> float:
+        with self._lock:
+            self._advance(self._minute())
+            return max(self._window_usd, 0.0)
+
+    def _buckets_since(self, minutes: int) -> List[Tuple[int, Dict[str, dict]]]:
+        cutoff = self._minute() - minutes
+        return [b for b in list(self._retained) + list(self._window) if b[0] > cutoff]
+
+    def summarize(self, minutes: int) -> dict:
+        """{total_usd, by_agent: {agent: {calls, usd, statuses}}} over the last `minutes`."""
+        with self._lock:
+            self._advance(self._minute())
+            buckets = self._buckets_since(minutes)
+        by_agent: dict = {}
+        total = 0.0
+        for _, bucket in buckets:
+            for agent, entry in bucket.items():
+                ag = by_agent.setdefault(agent, {"calls": 0, "usd": 0.0, "statuses": {}})
+                ag["calls"] += sum(entry["statuses"].values())
+                ag["usd"] = round(ag["usd"] + entry["usd"], 6)
+                for st, n in entry["statuses"].items():
+                    ag["statuses"][st] = ag["statuses"].get(st, 0) + n
+                total += entry["usd"]
+        return {"total_usd": round(total, 6), "by_agent": by_agent}
+
+    def daily_success_usd(self, days: int = 7) -> Dict[str, Dict[str, float]]:
+        """{"MM/DD": {agent: success_usd}} (UTC days) for the cost dashboard."""
+        with self._lock:
+            self._advance(self._minute())
+            buckets = self._buckets_since(days * 24 * 60)
+        daily: Dict[str, Dict[str, float]] = {}
+        for minute, bucket in buckets:
+            day = datetime.fromtimestamp(minute * 60, tz=timezone.utc).strftime("%m/%d")
+            for agent, entry in bucket.items():
+                if entry["statuses"].get("SUCCESS"):
+                    per_day = daily.setdefault(day, {})
+                    per_day[agent] = per_day.get(agent, 0.0) + entry["success_usd"]
+        return daily
+
+
+_SPEND_LEDGER = _SpendLedger()
+
+
+def seed_spend_ledger() -> None:
+    """Load the last 7 days of agent_run_log spend into the in-process ledger.
+    Column-projected, one query; safe to call again to resync. Rows still in
+    the telemetry queue are flushed first so this process's own recent spend
+    is part of the rebuild."""
+    telemetry_queue.flush()
+    db = SessionLocal()
+    try:
+        since = (datetime.now(timezone.utc) - timedelta(minutes=_RETAIN_MIN)).replace(tzinfo=None)
+        rows = db.query(
+            AgentRunLog.agent_name,
+            AgentRunLog.estimated_cost_usd,
+            AgentRunLog.status,
+            AgentRunLog.created_at,
+        ).filter(
+            AgentRunLog.created_at >= since,
+        ).order_by(AgentRunLog.created_at.asc()).all()
+        _SPEND_LEDGER.seed([tuple(r) for r in rows])
+    finally:
+        db.close()
+
+
+def refresh_spend_ledger(max_age: Optional[float] = None) -> None:
+    """Reseed when never seeded or older than `max_age` seconds (default
+    SPEND_LEDGER_RESYNC_SEC), picking up other processes' spend."""
+    if _SPEND_LEDGER.age() >= (SPEND_LEDGER_RESYNC_SEC if max_age is None else max_age):
+        seed_spend_ledger()
+
+
+def record_agent_run(agent_name: str, estimated_cost_usd: float, status: str) -> None:
+    """Mirror one agent_run_log row into the spend ledger. For modules that
+    write agent_run_log rows themselves (jewel_specialist)."""
+    _SPEND_LEDGER.record(agent_name, estimated_cost_usd, status)
+
+
 def _log_run(
     agent_name: str,
     model: str,
@@ -70,9 +258,11 @@ def _log_run(
     status: str,
     error_message: Optional[str] = None,
 ) -> None:
-    db = SessionLocal()
+    # Row is written behind by telemetry_queue; the ledger is updated inline so
+    # the budget gate sees this spend immediately.
     try:
-        row = AgentRunLog(
+        telemetry_queue.enqueue(
+            AgentRunLog,
             agent_name=agent_name,
             model=model,
             triggered_by=triggered_by,
@@ -84,30 +274,29 @@ def _log_run(
             status=status,
             error_message=error_message,
         )
-        db.add(row)
-        db.commit()
     except Exception as e:
-        print(f"[AGENT_CORE] Log write failed: {e}")
-    finally:
-        db.close()
+        print(f"[AGENT_CORE] Log enqueue failed: {e}")
+    _SPEND_LEDGER.record(agent_name, estimated_cost_usd, status)
 
 
 def _check_budget_before_run(agent_name: str) -> bool:
     """
     Returns True if the daily budget allows this call.
     Returns False and logs a BUDGET_BLOCKED row if the cap is exceeded.
-    Fails open (returns True) if the DB is unavailable — agents are
-    more important than the accounting when infra is down.
+    Reads the in-process spend ledger, resynced from agent_run_log when stale
+    and re-read from the DB on every check near the cap. Fails open
+    (returns True) if the ledger can't be seeded because the DB is
+    unavailable — agents are more important than the accounting when infra
+    is down.
     """
     daily_cap = float(os.getenv("AGENT_DAILY_BUDGET_USD", "10.00"))
-    db = SessionLocal()
     try:
-        since = datetime.now(timezone.utc) - timedelta(hours=24)
-        rows = db.query(AgentRunLog).filter(
-            AgentRunLog.created_at >= since,
-            AgentRunLog.status != "BUDGET_BLOCKED",
-        ).all()
-        spent = sum(r.estimated_cost_usd for r in rows)
+        refresh_spend_ledger()
+        spent = _SPEND_LEDGER.spent_24h()
+        if spent >= daily_cap * _NEAR_CAP and _SPEND_LEDGER.age() > 0.5:
+            # Close to the cap, spend from other processes decides it.
+            seed_spend_ledger()
+            spent = _SPEND_LEDGER.spent_24h()
 
         if spent >= daily_cap:
             _log_run(
@@ -136,8 +325,6 @@ def _check_budget_before_run(agent_name: str) -> bool:
     except Exception as e:
         print(f"[AGENT_CORE] Budget check DB error (failing open): {e}")
         return True
-    finally:
-        db.close()
 
 
 def _call_agent(
@@ -305,36 +492,17 @@ def get_cost_summary() -> dict:
     Used by GET /api/agents/cost.
     """
     daily_cap = float(os.getenv("AGENT_DAILY_BUDGET_USD", "10.00"))
-    now = datetime.now(timezone.utc)
-    today_cutoff = now - timedelta(hours=24)
-    week_cutoff = now - timedelta(days=7)
+    week_cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).replace(tzinfo=None)
 
     db = SessionLocal()
     try:
-        all_rows = db.query(AgentRunLog).filter(
+        refresh_spend_ledger()
+        today_summary = _SPEND_LEDGER.summarize(_BUDGET_WINDOW_MIN)
+        week_summary = _SPEND_LEDGER.summarize(_RETAIN_MIN)
+
+        last_10 = db.query(AgentRunLog).filter(
             AgentRunLog.created_at >= week_cutoff
-        ).order_by(AgentRunLog.id.desc()).all()
-
-        today_rows = [r for r in all_rows if r.created_at.replace(tzinfo=timezone.utc) >= today_cutoff]
-
-        def _summarize(rows: list) -> dict:
-            by_agent: dict = {}
-            total = 0.0
-            for r in rows:
-                ag = r.agent_name
-                if ag not in by_agent:
-                    by_agent[ag] = {"calls": 0, "usd": 0.0, "statuses": {}}
-                by_agent[ag]["calls"] += 1
-                by_agent[ag]["usd"] = round(by_agent[ag]["usd"] + r.estimated_cost_usd, 6)
-                s = r.status
-                by_agent[ag]["statuses"][s] = by_agent[ag]["statuses"].get(s, 0) + 1
-                total += r.estimated_cost_usd
-            return {"total_usd": round(total, 6), "by_agent": by_agent}
-
-        today_summary = _summarize(today_rows)
-        week_summary = _summarize(all_rows)
-
-        last_10 = all_rows[:10]
+        ).order_by(AgentRunLog.id.desc()).limit(10).all()
 
         return {
             "ok": True,
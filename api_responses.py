@@ -0,0 +1,40 @@
+# api_responses.py
+# ==============================================================================
+# KABRODA API RESPONSE CLASSES
+# Purpose: orjson-backed JSON responses for main.py.
+#
+# The heavy endpoints (/api/gravity/scan's KDE curve + 15m chart_data, the
+# /api/dmr/live battlebox payload, /api/v1/system/trades, the audit export)
+# were serialized through Starlette's stdlib JSONResponse. FastJSONResponse is
+# a drop-in replacement: same constructor, orjson encoder, and native handling
+# of NumPy arrays/scalars, datetimes and non-string dict keys. Anything orjson
+# still can't encode falls back to str(), matching the json.dumps(default=str)
+# convention used everywhere else in the codebase.
+# ==============================================================================
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "item") and callable(obj.item):  # NumPy scalars orjson skips (e.g. np.bool_ in old builds)
+        return obj.item()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -13,8 +13,10 @@ import traceback
 import asyncio
 import os
 import json
+import weakref
 
 import ccxt.async_support as ccxt
+from sqlalchemy.exc import IntegrityError
 
 import session_manager
 import sse_engine
@@ -23,12 +25,65 @@ import gravity_engine
 import gravity_math
 import kabroda_mas_flow
 import market_context_oracle  # <-- NEW: Import the Macro Oracle
+import db_locks
+import cache_backend
+import packet_codec
+import rolling_stats
+import replay_clock
+import request_spans
 from database import SessionLocal, SessionLock, GravityMemory 
 
 SESSION_CONFIGS = session_manager.SESSION_CONFIGS
 
-_LOCKED_PACKETS: Dict[str, Dict[str, Any]] = {}
-_CACHE_LOCK = asyncio.Lock()
+# Locked packets are write-once per session, so they go through the shared
+# cache: a worker that restarts or never saw the session reads the packet
+# another process already decoded instead of hitting session_locks.
+# Bounded by count and age: today's and yesterday's sessions for every symbol
+# stay hot, anything older is evicted and falls back to the session_locks
+# lookup below on its next request.
+LOCKED_PACKETS_MAX = int(os.getenv("LOCKED_PACKETS_MAX", "64"))
+LOCKED_PACKETS_MAX_AGE_H = float(os.getenv("LOCKED_PACKETS_MAX_AGE_H", "36"))
+_LOCKED_PACKETS = cache_backend.get_cache(
+    "locked_packets", max_entries=LOCKED_PACKETS_MAX, ttl=LOCKED_PACKETS_MAX_AGE_H * 3600.0
+)
+_packet_stats = {"hits": 0, "misses": 0, "db_loads": 0, "computed": 0}
+
+
+def get_locked_packet_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the locked-packet cache (misses = DB load or compute)."""
+    lookups = _packet_stats["hits"] + _packet_stats["misses"]
+    return {
+        **_packet_stats,
+        "hit_rate": round(_packet_stats["hits"] / lookups, 4) if lookups else None,
+        "max_entries": LOCKED_PACKETS_MAX,
+        "max_age_h": LOCKED_PACKETS_MAX_AGE_H,
+        "cache": _LOCKED_PACKETS.stats(),
+    }
+
+
+SESSION_LOCK_WAIT_SEC = float(os.getenv("SESSION_LOCK_WAIT_SEC", "30"))
+# One asyncio.Lock per session key serializes this process; the db_locks
+# "session_lock:<key>" lock serializes workers, so only one of them inserts the
+# SessionLock and fires MAS. Per key, not process-wide: a request waiting up to
+# SESSION_LOCK_WAIT_SEC on another worker's vault lock must not hold up every
+# other symbol and session in this process.
+_SESSION_LOCKS: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _session_lock(session_key: str) -> asyncio.Lock:
+    lock = _SESSION_LOCKS.get(session_key)
+    if lock is None:
+        lock = _SESSION_LOCKS[session_key] = asyncio.Lock()
+    return lock
+
+
+def _find_session_lock(db, norm_sym: str, session_id: str, date_key: str) -> Optional[SessionLock]:
+    return db.query(SessionLock).filter(
+        SessionLock.symbol == norm_sym,
+        SessionLock.session_id == session_id,
+        SessionLock.date_key == date_key
+    ).first()
+
 
 # ── Shared data layer ─────────────────────────────────────────────────────
 # _exchange_live, _normalize_symbol, fetch_live_5m/15m/1h/4h/daily,
@@ -210,11 +265,11 @@ def _calc_sma(prices: List[float], period: int) -> float:
 def _calc_stochastic(candles: List[Dict], k_period: int = 14, d_period: int = 3) -> Dict:
     """Stochastic Oscillator %K and %D."""
     if len(candles) < k_period: return {"k": 50.0, "d": 50.0}
+    highs = rolling_stats.sliding_max([float(c["high"]) for c in candles], k_period)
+    lows  = rolling_stats.sliding_min([float(c["low"]) for c in candles], k_period)
     k_vals = []
     for i in range(k_period - 1, len(candles)):
-        window = candles[i - k_period + 1 : i + 1]
-        hh = max(float(c["high"]) for c in window)
-        ll = min(float(c["low"])  for c in window)
+        hh, ll = highs[i], lows[i]
         cl = float(candles[i]["close"])
         k_vals.append(100 * (cl - ll) / (hh - ll) if hh != ll else 50.0)
     d = sum(k_vals[-d_period:]) / min(d_period, len(k_vals))
@@ -230,13 +285,8 @@ def _calc_stochastic(candles: List[Dict], k_period: int = 14, d_period: int = 3)
 # Trading Knowledge/knowledge/01_INDICATORS/{bbwp,pmarp}/README.md
 # (2026-08-16 provenance notes) by CC, not just cited secondhand.
 
-def _calc_bbwp(closes: List[float], bb_period: int = 13, bb_std: float = 2.0, lookback: int = 252) -> float:
-    """BB Width Percentile: percentile rank of current BB width over `lookback` bars.
-    bb_period=13 is Krown's directly-quoted, instructor-emphasized value
-    ("very specific there") -- not the generic public 20. lookback=252 and
-    bb_std=2.0 (public BB default) are unchanged. Returns 50.0 if insufficient data."""
-    if len(closes) < bb_period + 1:
-        return 50.0
+def _bbw_values(closes: List[float], bb_period: int, bb_std: float) -> List[Optional[float]]:
+    """Bollinger Band width / SMA for every bar, None until the band fills."""
     bbw: List[Optional[float]] = [None] * len(closes)
     for i in range(bb_period - 1, len(closes)):
         window = closes[i - bb_period + 1 : i + 1]
@@ -246,27 +296,39 @@ def _calc_bbwp(closes: List[float], bb_period: int = 13, bb_std: float = 2.0, lo
         variance = sum((x - sma) ** 2 for x in window) / bb_period
         std = variance ** 0.5
         bbw[i] = (sma + bb_std * std - (sma - bb_std * std)) / sma
-    cur = bbw[-1]
-    if cur is None:
-        return 50.0
-    start = max(0, len(closes) - lookback)
-    hist = [v for v in bbw[start:] if v is not None]
-    if not hist:
+    return bbw
+
+
+def _calc_bbwp_series(closes: List[float], bb_period: int = 13, bb_std: float = 2.0, lookback: int = 252) -> List[Optional[float]]:
+    """BBWP for every bar (None where undefined), aligned 1:1 with `closes`.
+    Ranks come from rolling_stats.rolling_percentile_rank, so a full sweep is
+    O(n log n) rather than O(n * lookback)."""
+    if len(closes) < bb_period + 1:
+        return [None] * len(closes)
+    return rolling_stats.rolling_percentile_rank(
+        _bbw_values(closes, bb_period, bb_std), lookback, inclusive=False, include_current=True, ndigits=2
+    )
+
+
+def _calc_bbwp(closes: List[float], bb_period: int = 13, bb_std: float = 2.0, lookback: int = 252) -> float:
+    """BB Width Percentile: percentile rank of current BB width over `lookback` bars.
+    bb_period=13 is Krown's directly-quoted, instructor-emphasized value
+    ("very specific there") -- not the generic public 20. lookback=252 and
+    bb_std=2.0 (public BB default) are unchanged. Returns 50.0 if insufficient data.
+    Only the last bar is ranked, so only its window's widths are computed."""
+    if len(closes) < bb_period + 1:
         return 50.0
-    return round(sum(1 for v in hist if v < cur) / len(hist) * 100.0, 2)
+    tail = closes[-(lookback + bb_period - 1):]
+    rank = rolling_stats.percentile_rank_last(
+        _bbw_values(tail, bb_period, bb_std), lookback, inclusive=False, include_current=True, ndigits=2
+    )
+    return 50.0 if rank is None else rank
 
 
-def _calc_pmarp(candles: List[Dict], ma_period: int = 20, lookback: int = 350) -> float:
-    """Price MA Ratio Percentile: percentile rank of (close/VWMA) over `lookback` bars.
-    ma_period=20 (VWMA, not SMA) is QPAI's directly-quoted config; lookback=350 is
-    the most corroborated single number in the library -- confirmed independently
-    by two separate courses ("I do find myself actually using a lookback of 350
-    most often"). Falls back to a plain SMA if volume data is unavailable/zero for
-    a window, rather than dividing by zero. Returns 50.0 if insufficient data."""
+def _pmar_values(candles: List[Dict], ma_period: int) -> List[Optional[float]]:
+    """close / VWMA(ma_period) for every bar, None until the average fills."""
     closes = [float(c["close"]) for c in candles]
     volumes = [float(c.get("volume") or 0.0) for c in candles]
-    if len(closes) < ma_period + 1:
-        return 50.0
     pmar: List[Optional[float]] = [None] * len(closes)
     for i in range(ma_period - 1, len(closes)):
         price_window = closes[i - ma_period + 1 : i + 1]
@@ -278,14 +340,32 @@ def _calc_pmarp(candles: List[Dict], ma_period: int = 20, lookback: int = 350) -
         )
         if vwma > 0:
             pmar[i] = closes[i] / vwma
-    cur = pmar[-1]
-    if cur is None:
-        return 50.0
-    start = max(0, len(closes) - lookback)
-    hist = [v for v in pmar[start:] if v is not None]
-    if not hist:
+    return pmar
+
+
+def _calc_pmarp_series(candles: List[Dict], ma_period: int = 20, lookback: int = 350) -> List[Optional[float]]:
+    """PMARP for every bar (None where undefined), aligned 1:1 with `candles`."""
+    if len(candles) < ma_period + 1:
+        return [None] * len(candles)
+    return rolling_stats.rolling_percentile_rank(
+        _pmar_values(candles, ma_period), lookback, inclusive=False, include_current=True, ndigits=2
+    )
+
+
+def _calc_pmarp(candles: List[Dict], ma_period: int = 20, lookback: int = 350) -> float:
+    """Price MA Ratio Percentile: percentile rank of (close/VWMA) over `lookback` bars.
+    ma_period=20 (VWMA, not SMA) is QPAI's directly-quoted config; lookback=350 is
+    the most corroborated single number in the library -- confirmed independently
+    by two separate courses ("I do find myself actually using a lookback of 350
+    most often"). Falls back to a plain SMA if volume data is unavailable/zero for
+    a window, rather than dividing by zero. Returns 50.0 if insufficient data."""
+    if len(candles) < ma_period + 1:
         return 50.0
-    return round(sum(1 for v in hist if v < cur) / len(hist) * 100.0, 2)
+    tail = candles[-(lookback + ma_period - 1):]
+    rank = rolling_stats.percentile_rank_last(
+        _pmar_values(tail, ma_period), lookback, inclusive=False, include_current=True, ndigits=2
+    )
+    return 50.0 if rank is None else rank
 
 
 def _bbwp_state_label(val: float) -> str:
@@ -629,17 +709,25 @@ def _compute_sse_packet(
     }
 
 async def get_live_battlebox(symbol: str, session_mode: str = "AUTO", manual_id: Optional[str] = None, operator_flex: bool = False, tuning: Optional[Dict] = None) -> Dict[str, Any]:
+    # Per-stage spans for every run (request_spans: ring buffer + slow log).
+    with request_spans.trace("battlebox", symbol=symbol) as tr:
+        out = await _live_battlebox(symbol, session_mode, manual_id, operator_flex, tuning)
+        tr.attrs["status"] = out.get("status")
+        return out
+
+async def _live_battlebox(symbol: str, session_mode: str, manual_id: Optional[str], operator_flex: bool, tuning: Optional[Dict]) -> Dict[str, Any]:
     # Concurrent fetching of required data arrays to prevent blocking
     fetch_tasks = [
-        fetch_live_5m(symbol),
-        fetch_live_15m(symbol),
-        fetch_live_1h(symbol),
-        fetch_live_4h(symbol),
-        fetch_live_daily(symbol),
-        market_context_oracle.get_global_macro_context() # <-- NEW: Fetch the Oracle data
+        request_spans.timed("fetch_5m", fetch_live_5m(symbol), count="candles"),
+        request_spans.timed("fetch_15m", fetch_live_15m(symbol), count="candles"),
+        request_spans.timed("fetch_1h", fetch_live_1h(symbol), count="candles"),
+        request_spans.timed("fetch_4h", fetch_live_4h(symbol), count="candles"),
+        request_spans.timed("fetch_1d", fetch_live_daily(symbol), count="candles"),
+        request_spans.timed("macro_context", market_context_oracle.get_global_macro_context(), count="keys") # <-- NEW: Fetch the Oracle data
     ]
     
-    results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
+    with request_spans.span("fetch"):
+        results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
     
     raw_5m = results[0] if not isinstance(results[0], Exception) else []
     raw_15m = results[1] if not isinstance(results[1], Exception) else []
@@ -650,20 +738,27 @@ async def get_live_battlebox(symbol: str, session_mode: str = "AUTO", manual_id:
 
     if not raw_5m: return {"status": "ERROR", "message": "No Data"}
 
-    now_utc = datetime.now(timezone.utc)
+    now_utc = replay_clock.now_utc()
     session = session_manager.resolve_current_session(now_utc, session_mode, manual_id)
     anchor_ts = int(session["anchor_time"])
     lock_end_ts = anchor_ts + 1800
 
-    macro_bias = _calculate_weekly_force(raw_daily)
-    micro_bias = _calculate_168h_micro_bias(raw_1h)
-    
-    fuel_gauge = _build_fuel_gauge(raw_1h, raw_4h, raw_15m)
-    harmonic_data = _calculate_harmonic_matrix(raw_1h, raw_4h)
-    macro_structure = _fetch_macro_structure(symbol) 
-
-    kde_data = gravity_math.calculate_gravity_kde(symbol)
-    macro_fibs = gravity_math.calculate_macro_fibs(raw_daily, [])
+    with request_spans.span("indicators"):
+        macro_bias = _calculate_weekly_force(raw_daily)
+        micro_bias = _calculate_168h_micro_bias(raw_1h)
+        
+        fuel_gauge = _build_fuel_gauge(raw_1h, raw_4h, raw_15m)
+        harmonic_data = _calculate_harmonic_matrix(raw_1h, raw_4h)
+    with request_spans.span("macro_structure") as sp:
+        macro_structure = _fetch_macro_structure(symbol) 
+        sp["levels"] = len(macro_structure)
+
+    with request_spans.span("gravity_kde") as sp:
+        kde_data = gravity_math.calculate_gravity_kde(symbol)
+        sp["peaks"] = len(kde_data.get("peaks", []))
+        sp["curve"] = len(kde_data.get("curve", []))
+    with request_spans.span("macro_fibs"):
+        macro_fibs = gravity_math.calculate_macro_fibs(raw_daily, [])
 
     if int(now_utc.timestamp()) < lock_end_ts:
         wm = _war_map_from_1h(raw_1h)
@@ -690,77 +785,116 @@ async def get_live_battlebox(symbol: str, session_mode: str = "AUTO", manual_id:
     norm_sym = _normalize_symbol(symbol)
     session_key = f"{norm_sym}::{session['id']}::{date_key}"
 
-    async with _CACHE_LOCK:
-        if session_key not in _LOCKED_PACKETS:
+    async with _session_lock(session_key):
+        pkt = _LOCKED_PACKETS.get(session_key)
+        if pkt is not None:
+            _packet_stats["hits"] += 1
+            request_spans.annotate(packet="cache")
+        else:
+            _packet_stats["misses"] += 1
+            stored = None  # the packet this request put in the cache, if any
+            # Another worker may be computing this same lock -- wait for it, then
+            # the existing_lock query below picks up the row it committed.
+            vault_lock = db_locks.DbLock(f"session_lock:{session_key}")
+            with request_spans.span("vault_wait"):
+                if not await vault_lock.acquire_async(timeout=SESSION_LOCK_WAIT_SEC):
+                    # Safe to go on: session_locks is unique per session key, so if the
+                    # other worker commits first our insert fails and we adopt its row.
+                    print(f"[BATTLEBOX] Session lock wait timed out for {session_key}; proceeding")
             db = SessionLocal()
             try:
-                existing_lock = db.query(SessionLock).filter(
-                    SessionLock.symbol == norm_sym,
-                    SessionLock.session_id == session['id'],
-                    SessionLock.date_key == date_key
-                ).first()
+                with request_spans.span("lock_lookup"):
+                    existing_lock = _find_session_lock(db, norm_sym, session['id'], date_key)
 
                 if existing_lock:
-                    _LOCKED_PACKETS[session_key] = json.loads(existing_lock.packet_data)
+                    stored = packet_codec.load_lock_packet(existing_lock)
+                    _LOCKED_PACKETS.set(session_key, stored)
+                    _packet_stats["db_loads"] += 1
+                    request_spans.annotate(packet="db_load")
                 else:
-                    pkt = _compute_sse_packet(raw_5m, anchor_ts, macro_bias, micro_bias, fuel_gauge, kde_data, macro_fibs, harmonic_data, macro_structure, macro_context, tuning=tuning, raw_daily=raw_daily)
+                    request_spans.annotate(packet="computed")
+                    with request_spans.span("sse_packet") as sp:
+                        pkt = _compute_sse_packet(raw_5m, anchor_ts, macro_bias, micro_bias, fuel_gauge, kde_data, macro_fibs, harmonic_data, macro_structure, macro_context, tuning=tuning, raw_daily=raw_daily)
+                        sp["candles"] = len(raw_5m)
+                        sp["levels"] = len(pkt.get("levels") or {})
                     if "error" in pkt:
                         return {"status": "ERROR", "message": pkt["error"], "battlebox": {"raw_15m": raw_15m, "war_map_context": _war_map_from_1h(raw_1h), "session_battle": _safe_placeholder_state(pkt["error"]), "session": session, "levels": {}, "bias_model": {}, "context": {}}}
 
                     # ── MTF STRUCTURAL SNAPSHOT (Phase 1 capture — frozen with the lock) ──
                     try:
-                        _w200sma = _fetch_weekly_200sma(symbol)
-                        _mtf_snap = _compute_mtf_structural_snapshot(
-                            raw_1h, raw_4h, raw_daily,
-                            float(raw_5m[-1]["close"]),
-                            _w200sma,
-                        )
+                        with request_spans.span("mtf_snapshot"):
+                            _w200sma = _fetch_weekly_200sma(symbol)
+                            _mtf_snap = _compute_mtf_structural_snapshot(
+                                raw_1h, raw_4h, raw_daily,
+                                float(raw_5m[-1]["close"]),
+                                _w200sma,
+                            )
                         pkt.setdefault("context", {})["mtf_structural_snapshot"] = _mtf_snap
                     except Exception as _mtf_err:
                         print(f"[MTF SNAPSHOT] Capture failed (non-blocking): {_mtf_err}")
 
-                    _LOCKED_PACKETS[session_key] = pkt
-
                     # Persist lock to DB in its own try/except so a write failure
                     # never silently blocks gravity logging or the Senior Analyst fire.
+                    winner = None
                     try:
-                        new_lock = SessionLock(
-                            symbol=norm_sym,
-                            session_id=session['id'],
-                            date_key=date_key,
-                            lock_time=int(pkt["lock_time"]),
-                            packet_data=json.dumps(pkt, default=str)
-                        )
-                        db.add(new_lock)
-                        db.commit()
+                        with request_spans.span("lock_write"):
+                            new_lock = SessionLock(
+                                symbol=norm_sym,
+                                session_id=session['id'],
+                                date_key=date_key,
+                                lock_time=int(pkt["lock_time"]),
+                                **packet_codec.lock_fields(pkt),
+                            )
+                            db.add(new_lock)
+                            db.commit()
                         print(f"[BATTLEBOX] Session lock persisted to DB: {session_key}")
+                    except IntegrityError:
+                        # Another worker committed this session's lock after our lookup
+                        # (only possible once the vault wait timed out). Its row is the lock.
+                        db.rollback()
+                        winner = _find_session_lock(db, norm_sym, session['id'], date_key)
                     except Exception as lock_err:
                         print(f"[BATTLEBOX] Lock DB write failed (in-memory only): {lock_err}")
                         db.rollback()
 
-                    gravity_engine.log_kabroda_bedrock(norm_sym, pkt["levels"], pkt["lock_time"])
-
-                    asyncio.create_task(
-                        asyncio.to_thread(
-                            kabroda_mas_flow.run_mas_analysis,
-                            symbol=norm_sym,
-                            session_id=session['id'],
-                            date_key=date_key,
-                            battlebox_payload=pkt
+                    if winner is not None:
+                        print(f"[BATTLEBOX] {session_key} was locked by another worker; using its packet")
+                        stored = packet_codec.load_lock_packet(winner)
+                        _LOCKED_PACKETS.set(session_key, stored)
+                        _packet_stats["db_loads"] += 1
+                        request_spans.annotate(packet="db_load")
+                    else:
+                        stored = pkt
+                        _LOCKED_PACKETS.set(session_key, stored)
+                        _packet_stats["computed"] += 1
+
+                        with request_spans.span("bedrock_log"):
+                            gravity_engine.log_kabroda_bedrock(norm_sym, pkt["levels"], pkt["lock_time"])
+
+                        asyncio.create_task(
+                            asyncio.to_thread(
+                                kabroda_mas_flow.run_mas_analysis,
+                                symbol=norm_sym,
+                                session_id=session['id'],
+                                date_key=date_key,
+                                battlebox_payload=pkt
+                            )
                         )
-                    )
 
             except Exception as e:
                 print(f"DATABASE VAULT ERROR: {e}")
                 traceback.print_exc()
-                if session_key not in _LOCKED_PACKETS:
+                if stored is None:
                     pkt = _compute_sse_packet(raw_5m, anchor_ts, macro_bias, micro_bias, fuel_gauge, kde_data, macro_fibs, harmonic_data, macro_structure, macro_context, tuning=tuning, raw_daily=raw_daily)
                     if "error" not in pkt:
-                        _LOCKED_PACKETS[session_key] = pkt
+                        # Not persisted: keep it short-lived so the vault is retried.
+                        stored = pkt
+                        _LOCKED_PACKETS.set(session_key, stored, ttl=300)
             finally:
                 db.close()
-            
-        pkt = _LOCKED_PACKETS.get(session_key)
+                await vault_lock.release_async()
+            pkt = stored
+
         if not pkt:
             return {"status": "ERROR", "message": "Failed to initialize and lock session data."}
 
@@ -768,7 +902,8 @@ async def get_live_battlebox(symbol: str, session_mode: str = "AUTO", manual_id:
     lock_time = int(pkt["lock_time"])
     post_lock = [c for c in raw_5m if int(c["time"]) >= lock_time]
     
-    state = structure_state_engine.compute_structure_state(levels=levels, candles_5m_post_lock=post_lock, tuning=tuning or {})
+    with request_spans.span("structure_state", candles=len(post_lock)):
+        state = structure_state_engine.compute_structure_state(levels=levels, candles_5m_post_lock=post_lock, tuning=tuning or {})
 
     return {
         "status": "OK", "timestamp": now_utc.strftime("%H:%M UTC"), "price": float(raw_5m[-1]["close"]), "energy": session.get("energy", "ACTIVE"), 
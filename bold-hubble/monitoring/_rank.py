@@ -0,0 +1,32 @@
+"""
+Percentile rank of the latest value against its trailing window.
+
+Kept inside the package (rather than importing the app's rolling_stats) so
+bold-hubble installs and imports on its own. Same contract as the app's
+rolling_stats.percentile_rank_last.
+"""
+
+from typing import Optional, Sequence
+
+
+def percentile_rank_last(
+    values: Sequence[Optional[float]],
+    lookback: int,
+    inclusive: bool = True,
+    include_current: bool = False,
+) -> Optional[float]:
+    """Share (0-100) of the `lookback` values before the last one that sit at
+    or below it (strictly below with inclusive=False). None values are skipped;
+    None when there is nothing to rank against."""
+    if not values or lookback < 1 or values[-1] is None:
+        return None
+    cur = values[-1]
+    end = len(values) if include_current else len(values) - 1
+    window = [v for v in values[max(0, end - lookback) : end] if v is not None]
+    if not window:
+        return None
+    if inclusive:
+        count = sum(1 for v in window if v <= cur)
+    else:
+        count = sum(1 for v in window if v < cur)
+    return count / len(window) * 100.0
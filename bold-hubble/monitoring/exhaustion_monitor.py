@@ -15,6 +15,8 @@ Integration:
 
 from typing import Dict, List, Optional, Tuple
 
+from ._rank import percentile_rank_last
+
 
 # ---------------------------------------------------------------------------
 # Internal calculation helpers (lightweight, no external deps)
@@ -88,11 +90,8 @@ def _calc_bbwp(candles: List[Dict], period: int = 20) -> float:
         widths.append(width)
     if len(widths) < 2:
         return 50.0
-    current_width = widths[-1]
     # Percentile rank of current width in its history
-    count_below = sum(1 for w in widths[:-1] if w <= current_width)
-    percentile = (count_below / (len(widths) - 1)) * 100.0
-    return percentile
+    return percentile_rank_last(widths, lookback=len(widths) - 1)
 
 
 def _calc_pmarp(candles: List[Dict], period: int = 21) -> Tuple[float, bool]:
@@ -0,0 +1,341 @@
+# cache_backend.py
+# ==============================================================================
+# KABRODA CACHE BACKENDS
+# Purpose: One cache interface for warm state that used to live in module
+# globals (locked battlebox packets, the lifecycle monitor's 5m exhaustion
+# candles), with a backend that outlives the process.
+#
+# Every uvicorn worker and every restart used to start cold and re-derive that
+# state from the DB or the exchange. Backends:
+#   LRUCache     -- in-process OrderedDict, size-bounded, per-entry TTL.
+#   SQLiteCache  -- a local SQLite file (WAL) shared by every process on the
+#                   host. Survives restarts. Size-bounded by least recent
+#                   access, per-entry TTL. Values are stored as JSON, the same
+#                   json.dumps(default=str) round trip packet_codec uses.
+#   TieredCache  -- LRU in front of SQLite: hot reads never leave the process,
+#                   misses are filled from the shared file. The LRU holds the
+#                   JSON-decoded value too, so a get returns the same types
+#                   (lists, str keys, str datetimes) whichever tier served it.
+#
+# get_cache(namespace, ...) is the entry point; CACHE_BACKEND picks the kind
+# (tiered | sqlite | memory, default tiered) and CACHE_PATH the shared file.
+# A shared-backend error is logged and treated as a miss -- a cache must never
+# be the reason a request fails. Expiry reads replay_clock.time(), so TTLs
+# follow the simulated clock during a replay.
+# ==============================================================================
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+
+import replay_clock
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "tiered").strip().lower()
+CACHE_PATH = os.getenv("CACHE_PATH", "./kabroda_cache.db")
+
+_MISSING = object()
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)  # NaN / Infinity tokens
+
+
+class Cache(abc.ABC):
+    """Interface every backend implements. ttl is seconds; None means no expiry."""
+
+    name = "cache"
+
+    @abc.abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+
+class LRUCache(Cache):
+    def __init__(self, max_entries: int = 256, default_ttl: Optional[float] = None, name: str = "lru"):
+        self.name = name
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at | None, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and replay_clock.time() >= expires_at:
+                del self._data[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = replay_clock.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "lru", **self._stats, "size": len(self._data), "max": self.max_entries}
+
+
+class SQLiteCache(Cache):
+    _PRUNE_EVERY = 32  # writes between size/expiry sweeps
+
+    def __init__(
+        self,
+        namespace: str,
+        path: str = CACHE_PATH,
+        max_entries: int = 1024,
+        default_ttl: Optional[float] = None,
+    ):
+        self.name = namespace
+        self.namespace = namespace
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        # Reconnect after fork: an inherited sqlite3 handle must not be shared.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+                " expires_at REAL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (namespace, accessed_at)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _error(self, op: str, e: Exception) -> None:
+        self._stats["errors"] += 1
+        print(f"[CACHE] {self.namespace} {op} failed (treated as miss): {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, key: str) -> Optional[tuple]:
+        """(value, expires_at) for a live entry, else None."""
+        now = replay_clock.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is None or (row[1] is not None and now >= row[1]):
+                    self._stats["misses"] += 1
+                    return None
+                conn.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+                self._stats["hits"] += 1
+                return _loads(row[0]), row[1]
+            except Exception as e:
+                self._error("get", e)
+                return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set_raw(key, _dumps(value), ttl)
+
+    def set_raw(self, key: str, raw: bytes, ttl: Optional[float] = None) -> None:
+        """set() for a value already encoded with _dumps."""
+        ttl = self.default_ttl if ttl is None else ttl
+        now = replay_clock.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, raw, expires_at, now),
+                )
+                self._writes += 1
+                if self._writes % self._PRUNE_EVERY == 0:
+                    self._prune(conn, now)
+            except Exception as e:
+                self._error("set", e)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        cur = conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache_entries WHERE namespace = ?"
+            " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        )
+        self._stats["evictions"] += max(cur.rowcount, 0)
+
+    def prune(self) -> None:
+        with self._lock:
+            try:
+                self._prune(self._connection(), replay_clock.time())
+            except Exception as e:
+                self._error("prune", e)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            try:
+                self._connection().execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+                )
+            except Exception as e:
+                self._error("delete", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            except Exception as e:
+                self._error("clear", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "sqlite", "path": self.path, **self._stats, "max": self.max_entries}
+
+
+class TieredCache(Cache):
+    def __init__(self, local: LRUCache, shared: SQLiteCache):
+        self.name = shared.name
+        self.local = local
+        self.shared = shared
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        entry = self.shared.get_entry(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        # The hot copy expires with the shared entry, never later.
+        ttl = None if expires_at is None else max(expires_at - replay_clock.time(), 0.0)
+        self.local.set(key, value, ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        # Encode once; keep the decoded form locally so a hot hit and a
+        # shared-file fill return the same types.
+        raw = _dumps(value)
+        self.local.set(key, _loads(raw), ttl)
+        self.shared.set_raw(key, raw, ttl)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "tiered", "local": self.local.stats(), "shared": self.shared.stats()}
+
+
+_registry: Dict[str, Cache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(
+    namespace: str,
+    max_entries: int = 256,
+    ttl: Optional[float] = None,
+    backend: Optional[str] = None,
+    shared_max_entries: Optional[int] = None,
+) -> Cache:
+    """The process-wide cache for `namespace` (created on first call)."""
+    with _registry_lock:
+        cache = _registry.get(namespace)
+        if cache is not None:
+            return cache
+        kind = (backend or CACHE_BACKEND)
+        shared_max = shared_max_entries or max_entries * 4
+        if kind == "memory":
+            cache = LRUCache(max_entries, ttl, name=namespace)
+        elif kind == "sqlite":
+            cache = SQLiteCache(namespace, max_entries=shared_max, default_ttl=ttl)
+        else:
+            cache = TieredCache(
+                LRUCache(max_entries, ttl, name=namespace),
+                SQLiteCache(namespace, max_entries=shared_max, default_ttl=ttl),
+            )
+        _registry[namespace] = cache
+        return cache
+
+
+def get_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        caches = dict(_registry)
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -1,8 +1,9 @@
 # database.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, text, UniqueConstraint
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, LargeBinary, text, UniqueConstraint, inspect
+from sqlalchemy.orm import declarative_base, defer, sessionmaker
 import datetime
 import os
+import time
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./kabroda.db")
 
@@ -24,9 +25,50 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
-    
+# ---------------------------------------------------------
+# HEAVY COLUMNS -- JSON / long-text blobs that list views never render.
+# Hot list queries either project the columns they return
+# (db.query(*columns_of(Model, NAMES))) or keep full ORM rows but skip the
+# blobs with .options(*defer_heavy(Model)). A deferred column still loads on
+# first attribute access while the session is open, so a caller that does
+# need it costs one extra SELECT instead of every row paying for it.
+# ---------------------------------------------------------
+HEAVY_COLUMNS = {
+    "campaign_logs": ("diagnostic_data", "mas_executive_brief", "formatted_newsletter", "structure_reasoning"),
+    "session_locks": ("packet_data", "packet_blob"),
+}
+
+SESSION_LOCK_LIST_COLUMNS = ("id", "symbol", "session_id", "date_key", "lock_time")
+
+CAMPAIGN_LOG_LIST_COLUMNS = (
+    "id", "symbol", "date_key", "session_id", "bias", "grade",
+    "entry_price", "stop_loss", "t1", "t2", "t3",
+    "status", "realized_pnl", "mas_approval_status", "created_at",
+)
+
+
+def defer_heavy(model):
+    """Loader options that defer `model`'s HEAVY_COLUMNS."""
+    return tuple(defer(getattr(model, name)) for name in HEAVY_COLUMNS.get(model.__tablename__, ()))
+
+
+def columns_of(model, names):
+    """Column attributes for a projected query; result rows expose them by name."""
+    return tuple(getattr(model, name) for name in names)
+
+# ---------------------------------------------------------
+# SCHEMA MIGRATIONS
+# init_db() used to replay every ALTER TABLE below (one transaction each,
+# errors swallowed) on every boot. Migrations are now numbered, recorded in
+# schema_migrations, and each runs exactly once per database. To change the
+# schema: append a (version, name, fn) entry to _MIGRATIONS -- never edit or
+# renumber an entry that has shipped. Every migration must be idempotent
+# (IF NOT EXISTS / try-except ALTER) because two processes can boot at once.
+# ---------------------------------------------------------
+def _m001_legacy_column_patches():
+    """Pre-versioning ALTER TABLE patches, kept verbatim. Runs once on
+    databases that predate schema_migrations; skipped on fresh installs where
+    create_all() already built every column."""
     # --- MIGRATION PATCHES (POSTGRESQL SAFE) ---
     try:
         with engine.begin() as conn:
@@ -383,6 +425,190 @@ def init_db():
         except Exception:
             pass
 
+
+def _m002_hot_path_indexes():
+    """Composite / partial indexes matching the lifecycle loop and dashboard
+    filters on campaign_logs, plus the (symbol, session_id, date_key) lookups
+    on the audit tables. Partial predicates are written with the dialect's
+    boolean literal so they match what SQLAlchemy renders for `col == True`
+    (SQLite only uses a partial index when the WHERE terms match exactly)."""
+    true_ = "1" if engine.dialect.name == "sqlite" else "TRUE"
+    statements = [
+        # ledger_closing_engine pending/active/4H-1H candidate sweeps (every 60s):
+        # mas_approval_status + closed_at IS NULL + entry_filled_at [+ is_canonical]
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_open_lifecycle "
+        "ON campaign_logs (mas_approval_status, is_canonical, entry_filled_at) "
+        "WHERE closed_at IS NULL",
+        # "open canonical trades" per symbol
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_open_canonical "
+        "ON campaign_logs (symbol, mas_approval_status) "
+        f"WHERE closed_at IS NULL AND is_canonical = {true_}",
+        # post-exit runner scan: APPROVED + closed + target_hit
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_closed_target "
+        "ON campaign_logs (mas_approval_status, target_hit, is_canonical) "
+        "WHERE closed_at IS NOT NULL",
+        # shadow runner sweeps (15M canonical and 4H/1H candidates)
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_shadow_open "
+        "ON campaign_logs (session_timeframe, mas_approval_status, is_canonical) "
+        f"WHERE shadow_runner_active = {true_} AND shadow_runner_closed_at IS NULL",
+        # dashboards / trades / memory bank
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_dashboard "
+        "ON campaign_logs (symbol, is_canonical, session_timeframe, status)",
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_canonical_created "
+        "ON campaign_logs (is_canonical, created_at)",
+        # get-or-create by session key (gravity_engine, kabroda_mas_flow)
+        "CREATE INDEX IF NOT EXISTS ix_campaign_logs_session_key "
+        "ON campaign_logs (symbol, session_id, date_key)",
+        "CREATE INDEX IF NOT EXISTS ix_session_audit_log_session_key "
+        "ON session_audit_log (symbol, session_id, date_key)",
+        "CREATE INDEX IF NOT EXISTS ix_session_locks_session_key "
+        "ON session_locks (symbol, session_id, date_key)",
+        # spend ledger seed + cost dashboard window scans
+        "CREATE INDEX IF NOT EXISTS ix_agent_run_log_created "
+        "ON agent_run_log (created_at)",
+    ]
+    with engine.begin() as conn:
+        for stmt in statements:
+            conn.execute(text(stmt))
+
+
+def _m003_session_lock_packet_blob():
+    """Binary column for packet_codec-encoded SessionLock packets."""
+    blob_type = "BLOB" if engine.dialect.name == "sqlite" else "BYTEA"
+    if "packet_blob" in {c["name"] for c in inspect(engine).get_columns("session_locks")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE session_locks ADD COLUMN packet_blob {blob_type}"))
+
+
+def _m004_session_locks_unique_key():
+    """One SessionLock per (symbol, session_id, date_key). The cross-worker
+    vault lock can time out and let two workers insert; the unique index makes
+    the second insert fail so it adopts the first row. Duplicates written
+    before this existed are dropped first, keeping the earliest (the lock the
+    session actually traded on)."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM session_locks WHERE id NOT IN ("
+            " SELECT MIN(id) FROM session_locks GROUP BY symbol, session_id, date_key)"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_session_locks_session_key "
+            "ON session_locks (symbol, session_id, date_key)"
+        ))
+
+
+_MIGRATIONS = [
+    (1, "legacy_column_patches", _m001_legacy_column_patches),
+    (2, "hot_path_indexes", _m002_hot_path_indexes),
+    (3, "session_lock_packet_blob", _m003_session_lock_packet_blob),
+    (4, "session_locks_unique_key", _m004_session_locks_unique_key),
+]
+
+
+def run_migrations(fresh_install: bool = False) -> list:
+    """Apply pending migrations in version order; returns the versions applied.
+
+    On a fresh install the legacy column patches are stamped as applied
+    without running (create_all() already produced the final columns).
+    A failing migration is logged and stops the run so later migrations
+    never apply on top of it; it is retried on the next boot.
+    """
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    done = []
+    for version, name, fn in _MIGRATIONS:
+        if version in applied:
+            continue
+        if not (fresh_install and version == 1):
+            try:
+                fn()
+            except Exception as e:
+                print(f">>> [DB] Migration {version:03d}_{name} failed (will retry next boot): {e}")
+                break
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.datetime.utcnow()},
+                )
+        except Exception:
+            pass  # another process recorded it first
+        done.append(version)
+
+    if done:
+        ms = (time.perf_counter() - started) * 1000.0
+        print(f">>> [DB] Applied migrations {done} in {ms:.0f}ms (schema v{_MIGRATIONS[-1][0]})")
+    return done
+
+
+def init_db():
+    fresh_install = not inspect(engine).has_table("campaign_logs")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(fresh_install=fresh_install)
+
+# ---------------------------------------------------------
+# SCHEMA MIGRATION LEDGER -- one row per applied _MIGRATIONS entry
+# ---------------------------------------------------------
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+# ---------------------------------------------------------
+# SCHEDULER LEADER LEASE -- one row per lease name (scheduler_leader.py).
+# Whoever holds an unexpired row runs the background schedulers; the holder
+# renews expires_at every ttl/3, so a crashed leader is replaced within ttl.
+# ---------------------------------------------------------
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class AdvisoryLock(Base):
+    """Lock rows for db_locks' SQLite fallback (Postgres uses pg_advisory_lock)."""
+    __tablename__ = "advisory_locks"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+# ---------------------------------------------------------
+# MACRO ENGINE HISTORY -- kabroda_macro_engine's persisted MEXC spot daily
+# series (closed bars only) and its resumable ZigZag / anchor state, so a
+# refresh only fetches and processes the bars since the last run. Separate
+# from candle_history: that table is the Kraken audit trail, this one is the
+# macro engine's own SPOT source of truth.
+# ---------------------------------------------------------
+class MacroDailyCandle(Base):
+    __tablename__ = "macro_daily_candles"
+
+    symbol = Column(String, primary_key=True)   # "BTCUSDT"
+    time = Column(Integer, primary_key=True)    # candle open, unix seconds UTC
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+
+
+class MacroEngineState(Base):
+    __tablename__ = "macro_engine_state"
+
+    symbol = Column(String, primary_key=True)
+    zigzag_state = Column(Text, nullable=False)   # JSON: trend, extreme, confirmed pivots
+    anchors = Column(Text, nullable=True)         # JSON: last validated anchor set
+    anchor_signature = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 # ---------------------------------------------------------
 # EXISTING USER MODEL
 # ---------------------------------------------------------
@@ -443,7 +669,11 @@ class SessionLock(Base):
     date_key = Column(String, index=True, nullable=False)
     lock_time = Column(Integer, nullable=False)
     
+    # Legacy rows: full packet as a JSON string. New rows write "" here and the
+    # packet to packet_blob (packet_codec: version byte + zlib'd JSON). Read
+    # through packet_codec.load_lock_packet(), never json.loads() directly.
     packet_data = Column(String, nullable=False) 
+    packet_blob = Column(LargeBinary, nullable=True)
 
 # ---------------------------------------------------------
 # MISSION LEDGER (AUTOMATED TRADE TRACKER + MAS ORCHESTRATION)
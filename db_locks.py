@@ -0,0 +1,215 @@
+# db_locks.py
+# ==============================================================================
+# KABRODA DISTRIBUTED LOCKS
+# Purpose: Mutual exclusion across processes for work that must happen once
+# per cluster, not once per worker.
+#
+# battlebox_pipeline._session_lock and _LOCKED_PACKETS only serialize callers
+# inside one process. With several web workers, two of them could both miss
+# the session_locks row, compute the packet, insert a SessionLock and fire
+# run_mas_analysis for the same session. The gravity ingestion tick and the
+# trade-lifecycle tick have the same shape: two copies means duplicate pivots,
+# double-closed campaigns and double notifications.
+#
+# Backends:
+#   postgresql -- pg_try_advisory_lock on a dedicated pooled connection, keyed
+#                 by a stable 64-bit hash of the lock name. Held until
+#                 release(); the server drops it if the process dies.
+#   sqlite     -- a row in advisory_locks (INSERT to take, DELETE to give
+#                 back). Rows carry expires_at so a crashed holder is taken
+#                 over after `ttl` seconds.
+#
+# Whole-process leadership for the scheduler set lives in scheduler_leader;
+# these locks cover the individual critical sections inside it and inside the
+# request path.
+#
+# Fail-open: if the lock backend itself errors, acquire() logs and returns
+# True (degraded) so a DB hiccup never stalls the session lock or the loops --
+# the same trade-off the rest of the pipeline makes on non-critical writes.
+# ==============================================================================
+
+import asyncio
+import datetime
+import hashlib
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import database
+
+LOCK_TTL_SEC = float(os.getenv("DB_LOCK_TTL", "300"))
+_POLL_SEC = 0.1
+
+_stats_lock = threading.Lock()
+_stats = {"acquired": 0, "contended": 0, "timeouts": 0, "degraded": 0}
+
+
+def _bump(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def lock_key(name: str) -> int:
+    """Signed 64-bit advisory lock key for `name` (stable across processes)."""
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class DbLock:
+    """One named cross-process lock. Not re-entrant; one acquire per instance."""
+
+    def __init__(self, name: str, ttl: float = LOCK_TTL_SEC):
+        self.name = name
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.held = False
+        self.degraded = False
+        self._conn = None  # Postgres session holding the advisory lock
+
+    # -- backend attempts ----------------------------------------------------
+
+    def _try_pg(self) -> bool:
+        if self._conn is None:
+            self._conn = database.engine.connect()
+        got = self._conn.execute(
+            text("SELECT pg_try_advisory_lock(:k)"), {"k": lock_key(self.name)}
+        ).scalar()
+        self._conn.commit()  # session-level lock survives; don't sit idle in a transaction
+        if not got:
+            self._conn.close()
+            self._conn = None
+        return bool(got)
+
+    def _try_row(self) -> bool:
+        now = datetime.datetime.utcnow()
+        params = {
+            "n": self.name, "me": self.token, "now": now,
+            "exp": now + datetime.timedelta(seconds=self.ttl),
+        }
+        with database.engine.begin() as conn:
+            res = conn.execute(text(
+                "UPDATE advisory_locks SET holder = :me, acquired_at = :now, expires_at = :exp "
+                "WHERE name = :n AND expires_at < :now"
+            ), params)
+            if res.rowcount == 1:
+                print(f"[DB LOCK] Took over expired lock '{self.name}'")
+                return True
+        try:
+            with database.engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO advisory_locks (name, holder, acquired_at, expires_at) "
+                    "VALUES (:n, :me, :now, :exp)"
+                ), params)
+        except IntegrityError:
+            return False  # held by someone else
+        return True
+
+    def _try_once(self) -> bool:
+        if database.engine.dialect.name == "postgresql":
+            return self._try_pg()
+        return self._try_row()
+
+    # -- public API ----------------------------------------------------------
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        if self.held:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        contended = False
+        while True:
+            try:
+                got = self._try_once()
+            except Exception as e:
+                print(f"[DB LOCK] Backend error on '{self.name}' (proceeding unlocked): {e}")
+                self._close_conn(invalidate=True)  # lock state on that session is unknown
+                _bump("degraded")
+                self.degraded = True
+                self.held = True
+                return True
+            if got:
+                _bump("acquired")
+                self.held = True
+                return True
+            if not contended:
+                _bump("contended")
+                contended = True
+            if not blocking:
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                _bump("timeouts")
+                return False
+            time.sleep(_POLL_SEC)
+
+    def release(self) -> None:
+        if not self.held:
+            return
+        self.held = False
+        if self.degraded:
+            self.degraded = False
+            return
+        try:
+            if self._conn is not None:
+                self._conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": lock_key(self.name)})
+                self._conn.commit()
+            else:
+                with database.engine.begin() as conn:
+                    conn.execute(
+                        text("DELETE FROM advisory_locks WHERE name = :n AND holder = :me"),
+                        {"n": self.name, "me": self.token},
+                    )
+        except Exception as e:
+            print(f"[DB LOCK] Release failed for '{self.name}' (expires with session/ttl): {e}")
+            self._close_conn(invalidate=True)
+        finally:
+            self._close_conn()
+
+    def _close_conn(self, invalidate: bool = False) -> None:
+        """Give the advisory-lock connection back. With invalidate=True the
+        connection is discarded instead of pooled: the server session may
+        still hold the lock, and closing it is what releases it."""
+        if self._conn is not None:
+            try:
+                if invalidate:
+                    self._conn.invalidate()
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    async def acquire_async(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        return await asyncio.to_thread(self.acquire, blocking, timeout)
+
+    async def release_async(self) -> None:
+        await asyncio.to_thread(self.release)
+
+
+@contextmanager
+def db_lock(name: str, blocking: bool = True, timeout: Optional[float] = None, ttl: float = LOCK_TTL_SEC):
+    """Yields True if the lock is held for the body, False if it was not acquired."""
+    lock = DbLock(name, ttl=ttl)
+    acquired = lock.acquire(blocking=blocking, timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        lock.release()
+
+
+@asynccontextmanager
+async def async_db_lock(name: str, blocking: bool = True, timeout: Optional[float] = None, ttl: float = LOCK_TTL_SEC):
+    lock = DbLock(name, ttl=ttl)
+    acquired = await lock.acquire_async(blocking=blocking, timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        await lock.release_async()
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {**_stats, "backend": "advisory" if database.engine.dialect.name == "postgresql" else "row"}
@@ -0,0 +1,190 @@
+# execution_kernel.py
+# ==============================================================================
+# KABRODA TRADE EXECUTION KERNEL
+# Purpose: One resolver for "given the bars after a fill, which comes first --
+# the stop or the targets?", shared by the market simulator (5m backtests)
+# and the trade-lifecycle monitor (1m live resolution), so a backtest and a
+# live close are decided by the same rules by construction.
+#
+# Both callers used to walk candles one at a time in their own Python loops.
+# resolve_trades() takes flat high/low/close arrays plus a batch of trades,
+# each a [start, end) window into those arrays, and answers every trade at
+# once: the windows are gathered into a padded (trades x bars) matrix and the
+# first touch of the stop and of every target is an argmax over a boolean
+# mask. Batches are processed in row chunks so memory stays bounded.
+#
+# Rules (identical for every caller):
+#   - LONG touches a stop at low <= stop and a target at high >= target;
+#     SHORT mirrors it. A NaN target is never touched.
+#   - The trade exits at the first stop touch or the first touch of
+#     targets[exit_target], whichever bar comes first.
+#   - Same-bar ambiguity is settled by tie_break: STOP_FIRST (default, the
+#     conservative rule both engines already used) assumes the stop traded
+#     first, so the trade is a loss and no target on that bar counts;
+#     TARGET_FIRST assumes the favorable side traded first.
+#   - max_bars caps how many bars after start are scanned (time cap).
+#   - Realized R: -1.0 on a stop (R is defined by the trade's own stop),
+#     fractional R at the exit target, and fractional R at the last scanned
+#     close when neither was hit. Fractional R uses the lifecycle monitor's
+#     0.01 risk floor and 4-decimal rounding.
+# Pure numpy, no DB / exchange imports, safe to import from anywhere.
+# ==============================================================================
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+STOP_FIRST = "stop_first"
+TARGET_FIRST = "target_first"
+
+EXIT_OPEN = 0    # neither stop nor exit target inside the window
+EXIT_STOP = 1
+EXIT_TARGET = 2
+EXIT_NAMES = {EXIT_OPEN: "OPEN", EXIT_STOP: "STOP", EXIT_TARGET: "TARGET"}
+
+_CHUNK_CELLS = 4_000_000  # trades x bars x targets per gathered block
+
+
+def frac_r(entry, stop, exit_price, is_long):
+    """(move) / (risk), direction-aware; scalar or array. Risk floored at 0.01."""
+    entry = np.asarray(entry, dtype=float)
+    risk = np.maximum(np.abs(entry - np.asarray(stop, dtype=float)), 0.01)
+    move = np.where(is_long, exit_price - entry, entry - exit_price)
+    return np.round(move / risk, 4)
+
+
+def _first(mask: np.ndarray) -> np.ndarray:
+    """Offset of the first True along axis 1, -1 where there is none."""
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+
+def resolve_trades(
+    high: Sequence[float],
+    low: Sequence[float],
+    close: Sequence[float],
+    start: Sequence[int],
+    end: Sequence[int],
+    is_long: Sequence[bool],
+    entry: Sequence[float],
+    stop: Sequence[float],
+    targets,
+    exit_target: int = -1,
+    tie_break: str = STOP_FIRST,
+    max_bars: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """Resolve a batch of n trades against shared OHLC arrays.
+
+    start/end: per-trade [start, end) bar window (start = first bar after the
+    fill). targets: (n, k) prices, NaN for a missing target. exit_target:
+    which target column closes the trade (default the last).
+
+    Returns arrays, all indices absolute into the OHLC arrays (-1 = never):
+      stop_idx (n,)      first stop touch
+      target_idx (n, k)  first touch of each target
+      exit_idx (n,)      bar the trade closed on (-1 when still open)
+      exit_reason (n,)   EXIT_OPEN / EXIT_STOP / EXIT_TARGET
+      reached (n, k)     target touched at or before the exit (tie rule applied)
+      realized_r (n,)    R at exit, or at the last scanned close when open
+                         (NaN for an empty window)
+    """
+    if tie_break not in (STOP_FIRST, TARGET_FIRST):
+        raise ValueError(f"tie_break must be {STOP_FIRST!r} or {TARGET_FIRST!r}")
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    start = np.asarray(start, dtype=np.int64).reshape(-1)
+    n = len(start)
+    end = np.minimum(np.asarray(end, dtype=np.int64).reshape(-1), len(high))
+    if max_bars is not None:
+        end = np.minimum(end, start + max_bars)
+    is_long = np.asarray(is_long, dtype=bool).reshape(-1)
+    entry = np.asarray(entry, dtype=float).reshape(-1)
+    stop = np.asarray(stop, dtype=float).reshape(-1)
+    targets = np.asarray(targets, dtype=float)
+    targets = targets.reshape(n, -1) if n else targets.reshape(0, targets.shape[-1] if targets.ndim == 2 else 0)
+    k = targets.shape[1]
+    exit_col = exit_target % k if k else None
+
+    stop_off = np.full(n, -1, dtype=np.int64)
+    target_off = np.full((n, k), -1, dtype=np.int64)
+    lengths = np.maximum(end - start, 0)
+    width = int(lengths.max()) if n else 0
+    rows = max(1, _CHUNK_CELLS // max(width * max(k, 1), 1))
+
+    for lo in range(0, n, rows):
+        sl = slice(lo, lo + rows)
+        w = int(lengths[sl].max()) if width else 0
+        if w == 0:
+            continue
+        offs = np.arange(w)
+        valid = offs < lengths[sl, None]
+        idx = np.where(valid, start[sl, None] + offs, 0)
+        h, l = high[idx], low[idx]
+        longs = is_long[sl, None]
+
+        stop_hit = np.where(longs, l <= stop[sl, None], h >= stop[sl, None]) & valid
+        stop_off[sl] = _first(stop_hit)
+        if k:
+            t = targets[sl, None, :]
+            tgt_hit = np.where(longs[..., None], h[..., None] >= t, l[..., None] <= t) & valid[..., None]
+            target_off[sl] = _first(tgt_hit)
+
+    # Exit bar: first of stop / exit target, ties by rule.
+    big = np.iinfo(np.int64).max
+    s = np.where(stop_off >= 0, stop_off, big)
+    x = np.where(target_off[:, exit_col] >= 0, target_off[:, exit_col], big) if k else np.full(n, big)
+    stop_wins = (s <= x) if tie_break == STOP_FIRST else (s < x)
+    exit_off = np.minimum(s, x)
+    reason = np.where(exit_off == big, EXIT_OPEN, np.where(stop_wins, EXIT_STOP, EXIT_TARGET))
+
+    t_off = np.where(target_off >= 0, target_off, big)
+    reached = t_off < exit_off[:, None]
+    on_exit_bar = (t_off == exit_off[:, None]) & (exit_off[:, None] != big)
+    if tie_break == STOP_FIRST:
+        on_exit_bar &= (reason == EXIT_TARGET)[:, None]
+    reached |= on_exit_bar
+    reached |= (target_off >= 0) & (reason == EXIT_OPEN)[:, None]
+
+    last_close = np.where(lengths > 0, close[np.maximum(end - 1, 0)] if len(close) else np.nan, np.nan)
+    target_px = targets[:, exit_col] if k else np.full(n, np.nan)
+    exit_px = np.where(reason == EXIT_TARGET, target_px, last_close)
+    realized = np.where(reason == EXIT_STOP, -1.0, frac_r(entry, stop, exit_px, is_long))
+
+    def _abs(off):
+        return np.where(off >= 0, off + (start if off.ndim == 1 else start[:, None]), -1)
+
+    return {
+        "stop_idx": _abs(stop_off),
+        "target_idx": _abs(target_off),
+        "exit_idx": _abs(np.where(reason == EXIT_OPEN, -1, exit_off)),
+        "exit_reason": reason,
+        "reached": reached,
+        "realized_r": realized,
+    }
+
+
+def resolve_candles(
+    candles: Sequence[dict],
+    is_long: bool,
+    entry: float,
+    stop: float,
+    targets: Sequence[Optional[float]],
+    keys: Sequence[str] = ("high", "low", "close"),
+    **kwargs,
+) -> Dict:
+    """One trade over a list of candle dicts; `keys` names the high/low/close
+    fields. Same rules as resolve_trades, results unwrapped to scalars."""
+    hk, lk, ck = keys
+    high = [c[hk] for c in candles]
+    low = [c[lk] for c in candles]
+    close = [c[ck] for c in candles]
+    tgt = [[np.nan if t is None else t for t in targets]]
+    out = resolve_trades(high, low, close, [0], [len(candles)], [is_long], [entry], [stop], tgt, **kwargs)
+    return {
+        "stop_idx": int(out["stop_idx"][0]),
+        "target_idx": [int(i) for i in out["target_idx"][0]],
+        "exit_idx": int(out["exit_idx"][0]),
+        "exit_reason": EXIT_NAMES[int(out["exit_reason"][0])],
+        "reached": [bool(r) for r in out["reached"][0]],
+        "realized_r": float(out["realized_r"][0]),
+    }
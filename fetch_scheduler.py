@@ -0,0 +1,417 @@
+# fetch_scheduler.py
+# ==============================================================================
+# KABRODA FETCH SCHEDULER — one client + one request budget per exchange
+# Purpose: Every ccxt call in the app (market_data's Kraken candles, the
+# lifecycle engine's MEXC ticker / Kraken 1m OHLC, the macro engine's MEXC
+# daily pagination) goes through call() below instead of a private module-level
+# client. That gives us:
+#   - ONE ccxt client per exchange id, shared by every module.
+#   - ONE token bucket per exchange (rate + burst), so N modules firing at
+#     once share the exchange's real budget instead of each assuming it owns it.
+#   - Priority classes: live lifecycle checks are granted before interactive
+#     API requests, which are granted before background scans.
+#   - Fair queuing inside a priority class: waiters are granted round-robin by
+#     symbol, so a 30-symbol scan can't starve BTC behind 29 other symbols.
+# ccxt's own per-instance throttle is disabled on these clients — the bucket
+# here is the only throttle, and a 429 from the exchange drains the bucket so
+# every caller backs off together.
+#
+#   - ONE pooled aiohttp session (keep-alive, DNS cache, connection limits)
+#     behind every async client, released by close_all() at shutdown.
+#   - ONE switch for offline runs: set_source(obj) answers every call() from
+#     obj.<method>() instead of the exchange (harness/replay.py serves
+#     candle_history this way). No budget, no network while it is set.
+#
+# Like market_data.py, this module depends only on ccxt (+ its aiohttp /
+# certifi dependencies) and the stdlib.
+# ==============================================================================
+
+from __future__ import annotations
+
+import asyncio
+import os
+import ssl
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import aiohttp
+import certifi
+import ccxt.async_support as ccxt
+
+# ---------------------------------------------------------------------------
+# PRIORITY CLASSES — lower value is granted first
+# ---------------------------------------------------------------------------
+PRIORITY_LIVE = 0          # trade-lifecycle checks (entry/stop/target detection)
+PRIORITY_INTERACTIVE = 1   # user-facing API requests (battlebox, radar, confluence)
+PRIORITY_BACKGROUND = 2    # periodic scans (gravity ingestion, MTF, macro, monitor)
+
+_PRIORITY_NAMES = {
+    PRIORITY_LIVE: "LIVE",
+    PRIORITY_INTERACTIVE: "INTERACTIVE",
+    PRIORITY_BACKGROUND: "BACKGROUND",
+}
+
+# Callers don't thread a priority argument through every fetch_live_* layer —
+# a scheduler loop sets its class once (set_priority) and every fetch made from
+# that task, including asyncio.gather children, inherits it via contextvars.
+_priority_var: ContextVar[int] = ContextVar("fetch_priority", default=PRIORITY_INTERACTIVE)
+
+# ---------------------------------------------------------------------------
+# PER-EXCHANGE BUDGETS — (tokens per second, burst size)
+# Kraken public REST tolerates ~1 call/s sustained with short bursts; MEXC spot
+# market data is far more generous. Override per exchange with
+# FETCH_BUDGET_<EXCHANGE>="rate,burst", e.g. FETCH_BUDGET_KRAKEN="0.8,4".
+# ---------------------------------------------------------------------------
+_DEFAULT_BUDGETS: Dict[str, Tuple[float, int]] = {
+    "kraken": (1.0, 5),
+    "mexc": (10.0, 20),
+}
+_FALLBACK_BUDGET: Tuple[float, int] = (1.0, 3)
+
+_CLIENT_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "kraken": {"timeout": 10000},
+    "mexc": {},
+}
+
+# Seconds every caller on an exchange backs off after a 429 / DDoS response.
+_RATE_LIMIT_PENALTY_SEC = 10.0
+
+
+def _budget_for(exchange_id: str) -> Tuple[float, int]:
+    raw = os.getenv(f"FETCH_BUDGET_{exchange_id.upper()}")
+    if raw:
+        try:
+            rate_s, burst_s = raw.split(",", 1)
+            return max(float(rate_s), 0.01), max(int(burst_s), 1)
+        except ValueError:
+            print(f"[FETCH SCHEDULER] Ignoring malformed FETCH_BUDGET_{exchange_id.upper()}={raw!r}")
+    return _DEFAULT_BUDGETS.get(exchange_id, _FALLBACK_BUDGET)
+
+
+# ---------------------------------------------------------------------------
+# PRIORITY CONTEXT
+# ---------------------------------------------------------------------------
+def set_priority(level: int) -> None:
+    """Set the fetch priority for the current task (and tasks it spawns).
+    Call once at the top of a long-running scheduler loop."""
+    _priority_var.set(level)
+
+
+@contextmanager
+def priority_scope(level: int):
+    """Scoped priority override: `with fetch_scheduler.priority_scope(PRIORITY_LIVE): ...`"""
+    token = _priority_var.set(level)
+    try:
+        yield
+    finally:
+        _priority_var.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# TOKEN BUCKET + FAIR PRIORITY QUEUE
+# ---------------------------------------------------------------------------
+class _ExchangeBudget:
+    """Token bucket shared by every caller on one exchange.
+
+    acquire() returns immediately while tokens are available and nobody is
+    queued; otherwise the caller parks a future in queues[priority][symbol]
+    and a single dispatcher task grants tokens as they refill — lowest
+    priority value first, round-robin across symbols within a class.
+    """
+
+    def __init__(self, exchange_id: str, rate: float, burst: int):
+        self.exchange_id = exchange_id
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.granted = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.rate_limit_hits = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues.values())
+
+    def _pop_next(self) -> Optional[asyncio.Future]:
+        for level in sorted(self._queues):
+            by_symbol = self._queues[level]
+            while by_symbol:
+                symbol, waiters = next(iter(by_symbol.items()))
+                fut = None
+                while waiters:
+                    candidate = waiters.popleft()
+                    if not candidate.done():  # skip callers that were cancelled
+                        fut = candidate
+                        break
+                if waiters:
+                    by_symbol.move_to_end(symbol)
+                else:
+                    del by_symbol[symbol]
+                if fut is not None:
+                    return fut
+        return None
+
+    def _bind_loop(self) -> None:
+        # Futures and the dispatcher task belong to one event loop. If we're
+        # called from a new loop (test clients, a restarted worker), anything
+        # parked on the old loop can never be granted — start clean.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queues = {}
+            self._dispatcher = None
+
+    async def acquire(self, symbol: str, level: int) -> None:
+        self._bind_loop()
+        self._refill()
+        if self.tokens >= 1.0 and not self._has_waiters():
+            self.tokens -= 1.0
+            self.granted += 1
+            return
+
+        fut = self._loop.create_future()
+        self._queues.setdefault(level, OrderedDict()).setdefault(symbol, deque()).append(fut)
+        self.queued += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = self._loop.create_task(self._dispatch())
+        started = time.monotonic()
+        await fut
+        self.wait_seconds += time.monotonic() - started
+
+    async def _dispatch(self) -> None:
+        while self._has_waiters():
+            self._refill()
+            if self.tokens < 1.0:
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                continue
+            fut = self._pop_next()
+            if fut is None:
+                break
+            self.tokens -= 1.0
+            self.granted += 1
+            fut.set_result(None)
+
+    def penalize(self, seconds: float = _RATE_LIMIT_PENALTY_SEC) -> None:
+        """Exchange said slow down — push the bucket negative so nobody on
+        this exchange is granted again for `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+        self.rate_limit_hits += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "rate_per_sec": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "queue_depth": {
+                _PRIORITY_NAMES.get(level, str(level)): sum(len(q) for q in by_symbol.values())
+                for level, by_symbol in sorted(self._queues.items())
+            },
+            "granted": self.granted,
+            "queued": self.queued,
+            "avg_wait_sec": round(self.wait_seconds / self.queued, 3) if self.queued else 0.0,
+            "rate_limit_hits": self.rate_limit_hits,
+        }
+
+
+# ---------------------------------------------------------------------------
+# CONNECTION POOL — one aiohttp session shared by every async client
+# ccxt would otherwise open a private ClientSession (own connector, own DNS
+# cache, own TLS handshakes) per exchange instance and never release it. The
+# clients below are built without a session and have the shared one attached
+# on first call, so keep-alive connections are reused across exchanges and
+# bursts, and close_all() can release every socket on shutdown.
+# A session is bound to the loop that created it; when a new loop (harness,
+# bench, replay) asks for the pool, the old one is closed before it is replaced.
+# Pool sizing: FETCH_POOL_LIMIT (total sockets), FETCH_POOL_PER_HOST.
+# ---------------------------------------------------------------------------
+_POOL_LIMIT = int(os.getenv("FETCH_POOL_LIMIT", "32"))
+_POOL_LIMIT_PER_HOST = int(os.getenv("FETCH_POOL_PER_HOST", "8"))
+_KEEPALIVE_SEC = 60.0
+_DNS_CACHE_TTL_SEC = 300
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+_closing: set = set()  # release tasks in flight (keeps them from being GC'd)
+
+
+async def _close_connector(connector: aiohttp.BaseConnector) -> None:
+    try:
+        await connector.close(abort_ssl=True)
+    except Exception as e:
+        print(f"[FETCH POOL] Stale session release failed: {e}")
+
+
+def _release_session(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a pool left behind by another event loop (harness/bench runs
+    each get a fresh loop). Closed on its own loop while that still runs,
+    otherwise from the current one."""
+    connector = session.connector
+    session.detach()
+    if connector is None or connector.closed:
+        return
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(_close_connector(connector), loop)
+        return
+    task = asyncio.get_running_loop().create_task(_close_connector(connector))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def _shared_session() -> aiohttp.ClientSession:
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        if _session is not None and not _session.closed:
+            _release_session(_session, _session_loop)
+        connector = aiohttp.TCPConnector(
+            limit=_POOL_LIMIT,
+            limit_per_host=_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=_KEEPALIVE_SEC,
+            ttl_dns_cache=_DNS_CACHE_TTL_SEC,
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+# ---------------------------------------------------------------------------
+# REGISTRY — one client and one budget per exchange id
+# ---------------------------------------------------------------------------
+_clients: Dict[str, Any] = {}
+_sync_clients: Dict[str, Any] = {}
+_budgets: Dict[str, _ExchangeBudget] = {}
+_source: Any = None
+
+
+def set_source(source: Any) -> None:
+    """Route every call() to `source.<method>(*args, **kwargs)` (an async
+    stand-in for the ccxt client) instead of the exchange; None restores
+    live fetching."""
+    global _source
+    _source = source
+
+
+def get_source() -> Any:
+    return _source
+
+
+def get_client(exchange_id: str):
+    """Shared ccxt async client for `exchange_id` (created on first use).
+    The pooled HTTP session is attached by call(), inside the running loop."""
+    client = _clients.get(exchange_id)
+    if client is None:
+        options = {
+            "enableRateLimit": False,
+            # Presence of the key marks the session as caller-owned, so
+            # client.close() never closes the shared pool out from under others.
+            "session": None,
+            **_CLIENT_OPTIONS.get(exchange_id, {}),
+        }
+        client = getattr(ccxt, exchange_id)(options)
+        _clients[exchange_id] = client
+    return client
+
+
+def get_sync_client(exchange_id: str):
+    """Shared blocking ccxt client for code that runs inside asyncio.to_thread()
+    (lti_engine). Can't draw on the async bucket, so it keeps ccxt's own
+    throttle; its requests.Session is keep-alive pooled and closed by close_all()."""
+    client = _sync_clients.get(exchange_id)
+    if client is None:
+        import ccxt as ccxt_sync
+        options = {"enableRateLimit": True, **_CLIENT_OPTIONS.get(exchange_id, {})}
+        client = getattr(ccxt_sync, exchange_id)(options)
+        _sync_clients[exchange_id] = client
+    return client
+
+
+async def close_all() -> None:
+    """Release every exchange client and the shared connection pool.
+    Called from main.lifespan() shutdown and at the end of standalone scripts."""
+    global _session, _session_loop
+    for exchange_id, client in list(_clients.items()):
+        try:
+            await client.close()
+        except Exception as e:
+            print(f"[FETCH SCHEDULER] close failed for {exchange_id}: {e}")
+    for exchange_id, client in list(_sync_clients.items()):
+        try:
+            if getattr(client, "session", None) is not None:
+                client.session.close()
+        except Exception as e:
+            print(f"[FETCH SCHEDULER] close failed for sync {exchange_id}: {e}")
+    if _session is not None and not _session.closed:
+        try:
+            await _session.close()
+        except RuntimeError:
+            pass  # session belonged to a loop that's already gone
+    _session = None
+    _session_loop = None
+
+
+def _get_budget(exchange_id: str) -> _ExchangeBudget:
+    budget = _budgets.get(exchange_id)
+    if budget is None:
+        rate, burst = _budget_for(exchange_id)
+        budget = _ExchangeBudget(exchange_id, rate, burst)
+        _budgets[exchange_id] = budget
+    return budget
+
+
+async def call(
+    exchange_id: str,
+    method: str,
+    *args: Any,
+    symbol: str = "",
+    priority: Optional[int] = None,
+    **kwargs: Any,
+) -> Any:
+    """Run `client.<method>(*args, **kwargs)` once the exchange budget grants
+    a token. `symbol` is the fairness key; `priority` defaults to the current
+    task's class (see set_priority). Exceptions propagate unchanged — callers
+    keep their existing try/except fallbacks."""
+    if _source is not None:
+        return await getattr(_source, method)(*args, **kwargs)
+    level = _priority_var.get() if priority is None else priority
+    budget = _get_budget(exchange_id)
+    await budget.acquire(symbol, level)
+    client = get_client(exchange_id)
+    session = _shared_session()
+    if client.session is not session:
+        client.session = session
+    try:
+        return await getattr(client, method)(*args, **kwargs)
+    except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
+        budget.penalize()
+        print(f"[FETCH SCHEDULER] {exchange_id} rate-limited on {method} {symbol} — backing off {_RATE_LIMIT_PENALTY_SEC:.0f}s")
+        raise
+
+
+def get_stats() -> Dict[str, Any]:
+    """Per-exchange budget and queue telemetry for the system-state endpoint."""
+    stats: Dict[str, Any] = {exchange_id: budget.snapshot() for exchange_id, budget in _budgets.items()}
+    connector = _session.connector if _session is not None and not _session.closed else None
+    stats["connection_pool"] = {
+        "open": connector is not None,
+        "limit": _POOL_LIMIT,
+        "limit_per_host": _POOL_LIMIT_PER_HOST,
+    }
+    return stats
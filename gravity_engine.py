@@ -31,8 +31,10 @@ from position_sizing import calc_position_size
 # into market_data.py. mtf_confluence_scanner now imports from market_data
 # instead of battlebox_pipeline, so there is no cycle.
 import mtf_confluence_scanner
-
-TARGETS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+import fetch_scheduler
+import db_locks
+import rolling_stats
+from market_data import TARGETS
 
 # ---------------------------------------------------------------------------
 # HELPER: ATR
@@ -107,7 +109,7 @@ def _compute_energy_grade(candles: List[Dict], bias: str) -> str:
     # Crown PMARP cap (Cut 5): overextended/depressed price → cap grade on trend-following entries.
     # Only runs with ≥252 bars (enough history for meaningful percentile). No cap below threshold.
     if len(closes) >= 252:
-        pmarp = battlebox_pipeline._calc_pmarp(closes)
+        pmarp = battlebox_pipeline._calc_pmarp(candles)
         if bias == "LONG":
             if pmarp >= 95.0:
                 grade = "WEAK"                              # parabolic extension — chasing
@@ -141,7 +143,7 @@ def _compute_kinematic_grade(candles: List[Dict]) -> str:
     ema55 = battlebox_pipeline._calc_ema_series(closes, 55)[-1]
     ribbon_spread = abs(ema9 - ema55) / ema55 * 100
     bbwp_val = battlebox_pipeline._calc_bbwp(closes)
-    pmarp_val = battlebox_pipeline._calc_pmarp(closes)
+    pmarp_val = battlebox_pipeline._calc_pmarp(candles)
     if pmarp_val >= 85.0:
         return "OVEREXTENDED"
     elif bbwp_val <= 30.0 and ribbon_spread > 0.05:
@@ -341,16 +343,17 @@ def _scan_for_pivots(candles: List[Dict[str, Any]], timeframe: str, left=3, righ
         p_class = 2
         source = "1H_PIVOT"
 
-    for i in range(left, len(closed_candles) - right):
+    supply_idx = set(rolling_stats.pivot_highs([float(c["high"]) for c in closed_candles], left, right))
+    demand_idx = set(rolling_stats.pivot_lows([float(c["low"]) for c in closed_candles], left, right))
+
+    for i in sorted(supply_idx | demand_idx):
         ch = float(closed_candles[i]["high"])
         cl = float(closed_candles[i]["low"])
         ts = int(closed_candles[i]["time"])
         vol = float(closed_candles[i]["volume"])
 
-        is_supply = all(float(closed_candles[i - j]["high"]) <= ch for j in range(1, left + 1)) and \
-                    all(float(closed_candles[i + j]["high"]) < ch for j in range(1, right + 1))
-        is_demand = all(float(closed_candles[i - j]["low"]) >= cl for j in range(1, left + 1)) and \
-                    all(float(closed_candles[i + j]["low"]) > cl for j in range(1, right + 1))
+        is_supply = i in supply_idx
+        is_demand = i in demand_idx
 
         if is_supply or is_demand:
             avg_vol = _calculate_average_volume(closed_candles, i)
@@ -384,6 +387,54 @@ def _scan_for_pivots(candles: List[Dict[str, Any]], timeframe: str, left=3, righ
     return pivots_found
 
 
+# ---------------------------------------------------------------------------
+# PIVOT RECORDING -- stores pivots from _scan_for_pivots as GravityMemory zones,
+# skipping any (timestamp, source) already on file. Shared by the ingestion
+# loop and harness/walk_forward.py's replay.
+# ---------------------------------------------------------------------------
+def _record_pivots(db, db_sym: str, pivots: List[Dict[str, Any]]) -> int:
+    if not pivots:
+        return 0
+    stamps = [datetime.fromtimestamp(p["ts"], tz=timezone.utc) for p in pivots]
+    existing = {
+        (_as_naive_utc(ts), src)
+        for ts, src in db.query(GravityMemory.timestamp, GravityMemory.source).filter(
+            GravityMemory.symbol == db_sym,
+            GravityMemory.timestamp >= min(stamps),
+            GravityMemory.timestamp <= max(stamps),
+        ).all()
+    }
+    added = 0
+    for p, dt in zip(pivots, stamps):
+        key = (_as_naive_utc(dt), p["source"])
+        if key in existing:
+            continue
+        existing.add(key)
+        db.add(GravityMemory(
+            symbol=db_sym,
+            timestamp=dt,
+            source=p["source"],
+            level_type=p["type"],
+            price=p["price"],
+            permanence_class=p["class"],
+            heat_multiplier=p["heat"],
+            departure_move_pct=p.get("departure_pct"),
+        ))
+        added += 1
+        print(
+            f"|| GRAVITY BEDROCK || {db_sym} | {p['source']} {p['type']} @ ${p['price']:.2f} "
+            f"| Heat: {p['heat']} | Depart: {p.get('departure_pct', 'N/A')}"
+        )
+    if added:
+        db.commit()
+    return added
+
+
+def _as_naive_utc(dt: datetime) -> datetime:
+    """Postgres/SQLite hand timestamps back naive (UTC); compare on that form."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo is not None else dt
+
+
 # ---------------------------------------------------------------------------
 # ZONE TOUCH TRACKER  (runs every gravity loop iteration)
 # For each active intraday zone (4H / 1H / DAILY), checks whether the most
@@ -392,6 +443,7 @@ def _scan_for_pivots(candles: List[Dict[str, Any]], timeframe: str, left=3, righ
 #   - Closed through the zone → mark active=False (zone invalidated)
 # touch_count is re-derived from the available candle window each run (idempotent).
 # "Touch" = approach within 0.3% band without a close-through.
+# `now` defaults to the wall clock; the walk-forward replay passes its own.
 # ---------------------------------------------------------------------------
 def _update_zone_touches(
     db_sym: str,
@@ -399,11 +451,12 @@ def _update_zone_touches(
     candles_1h: List[Dict],
     candles_1d: List[Dict],
     db,
+    now: Optional[datetime] = None,
 ) -> None:
     TOUCH_BAND = 0.003        # within 0.3% of zone price = "touched"
     INVALIDATION_BUF = 0.001  # close through by >0.1% = zone dead
 
-    now = datetime.now(timezone.utc)
+    now = now or datetime.now(timezone.utc)
     cutoff = now - timedelta(days=60)
 
     try:
@@ -439,14 +492,14 @@ def _update_zone_touches(
                 continue
 
             zone_ts = zone.timestamp.replace(tzinfo=timezone.utc) if zone.timestamp.tzinfo is None else zone.timestamp
+            zone_epoch = zone_ts.timestamp()
             z = zone.price
 
             touches = 0
             invalidated = False
 
             for c in relevant:
-                c_ts = datetime.fromtimestamp(int(c["time"]), tz=timezone.utc)
-                if c_ts <= zone_ts:
+                if int(c["time"]) <= zone_epoch:
                     continue  # only evaluate candles that closed AFTER zone was formed
 
                 h = float(c["high"])
@@ -555,7 +608,7 @@ async def fill_decision_outcomes():
 STOP_WINDOW_4H = timedelta(days=5)
 
 
-def _detect_4h_bos(symbol: str, db_sym: str, candles_4h: List[Dict[str, Any]], candles_1d: List[Dict[str, Any]], db, confluence: Optional[Dict[str, Any]] = None) -> None:
+def _detect_4h_bos(symbol: str, db_sym: str, candles_4h: List[Dict[str, Any]], candles_1d: List[Dict[str, Any]], db, confluence: Optional[Dict[str, Any]] = None, now: Optional[datetime] = None) -> None:
     from harness.unified_audit_writer import write_decision_log as _wdl, gauge as _dg
 
     try:
@@ -563,7 +616,7 @@ def _detect_4h_bos(symbol: str, db_sym: str, candles_4h: List[Dict[str, Any]], c
             return
 
         current_close = float(candles_4h[-1]["close"])
-        now = datetime.now(timezone.utc)
+        now = now or datetime.now(timezone.utc)  # replay passes the simulated clock
         date_key = now.strftime("%Y-%m-%d")
 
         # Dedup: one candidate per date_key per symbol
@@ -855,7 +908,7 @@ def _detect_4h_bos(symbol: str, db_sym: str, candles_4h: List[Dict[str, Any]], c
 STOP_WINDOW_1H = timedelta(days=2)
 
 
-def _detect_1h_bos(symbol: str, db_sym: str, candles_1h: List[Dict[str, Any]], candles_4h: List[Dict[str, Any]], candles_1d: List[Dict[str, Any]], db, confluence: Optional[Dict[str, Any]] = None) -> None:
+def _detect_1h_bos(symbol: str, db_sym: str, candles_1h: List[Dict[str, Any]], candles_4h: List[Dict[str, Any]], candles_1d: List[Dict[str, Any]], db, confluence: Optional[Dict[str, Any]] = None, now: Optional[datetime] = None) -> None:
     from harness.unified_audit_writer import write_decision_log as _wdl, gauge as _dg
 
     try:
@@ -863,7 +916,7 @@ def _detect_1h_bos(symbol: str, db_sym: str, candles_1h: List[Dict[str, Any]], c
             return
 
         current_close = float(candles_1h[-1]["close"])
-        now = datetime.now(timezone.utc)
+        now = now or datetime.now(timezone.utc)  # replay passes the simulated clock
         date_key = now.strftime("%Y-%m-%d")
 
         # Dedup
@@ -1175,6 +1228,7 @@ def _detect_1h_bos(symbol: str, db_sym: str, candles_1h: List[Dict[str, Any]], c
 # ---------------------------------------------------------------------------
 async def run_gravity_ingestion_loop():
     print(">>> GRAVITY ENGINE: Initializing background loop (v4 target logic, STRICT SSOT MODE)...")
+    fetch_scheduler.set_priority(fetch_scheduler.PRIORITY_BACKGROUND)
 
     try:
         subprocess.Popen(["python", "kabroda_macro_engine.py"])
@@ -1191,6 +1245,12 @@ async def run_gravity_ingestion_loop():
             _ghr["gravity_engine"]["status"] = "EXECUTING"
         except Exception:
             pass
+        # One ingestion tick cluster-wide: a second process skips this round.
+        tick_lock = db_locks.DbLock("gravity_ingestion", ttl=1800)
+        if not await tick_lock.acquire_async(blocking=False):
+            print("[GRAVITY] Ingestion tick held by another process -- skipping")
+            await asyncio.sleep(900)
+            continue
         db = SessionLocal()
         try:
             for symbol in TARGETS:
@@ -1209,31 +1269,7 @@ async def run_gravity_ingestion_loop():
                 new_pivots.extend(_scan_for_pivots(candles_1h, "1h"))
                 new_pivots.extend(_scan_for_pivots(candles_1d, "1d"))
 
-                for p in new_pivots:
-                    dt = datetime.fromtimestamp(p["ts"], tz=timezone.utc)
-                    src = p["source"]
-                    exists = db.query(GravityMemory).filter(
-                        GravityMemory.symbol == db_sym,
-                        GravityMemory.timestamp == dt,
-                        GravityMemory.source == src,
-                    ).first()
-                    if not exists:
-                        mem = GravityMemory(
-                            symbol=db_sym,
-                            timestamp=dt,
-                            source=src,
-                            level_type=p["type"],
-                            price=p["price"],
-                            permanence_class=p["class"],
-                            heat_multiplier=p["heat"],
-                            departure_move_pct=p.get("departure_pct"),
-                        )
-                        db.add(mem)
-                        db.commit()
-                        print(
-                            f"|| GRAVITY BEDROCK || {db_sym} | {src} {p['type']} @ ${p['price']:.2f} "
-                            f"| Heat: {p['heat']} | Depart: {p.get('departure_pct', 'N/A')}"
-                        )
+                _record_pivots(db, db_sym, new_pivots)
 
                 # Update zone touch counts and invalidate broken zones
                 _update_zone_touches(db_sym, candles_4h, candles_1h, candles_1d, db)
@@ -1254,6 +1290,7 @@ async def run_gravity_ingestion_loop():
             print(f"Gravity Engine Iteration Error: {e}")
         finally:
             db.close()
+            await tick_lock.release_async()
 
         loop_count += 1
         if loop_count >= 96:
@@ -0,0 +1,442 @@
+# harness/bench.py
+# =============================================================================
+# KABRODA BENCHMARKS — timings for the indicator / SSE / KDE / scanner paths.
+#
+# Times the hot paths the live loops run on every tick against a FIXED candle
+# fixture, offline:
+#   sse.compute_sse_levels                 the session packet's level engine
+#   kde[100|1000|10000]                    gravity_math.calculate_gravity_kde
+#                                          over that many active levels
+#   mtf._analyze_timeframe[15M|1D]         one timeframe of the confluence vote
+#   battlebox._build_synthetic_jewel       the 15M jewel read
+#   gravity._scan_for_pivots[1H]           pivot scan over the 720-bar 1H window
+#   gravity._update_zone_touches           zone touch / invalidation pass
+#   mtf.run_mtf_confluence_scan            the full 5-TF scan, fetches stubbed
+#                                          through market_data.set_candle_source
+#
+# Fixtures: the default is synthetic (seeded random walk, identical on every
+# machine). `record` captures a recorded fixture -- the fetch windows as they
+# stood at one instant -- from candle_history, so a benchmark can run on real
+# market shape. Gravity levels live in a private in-memory SQLite DB that
+# gravity_math / gravity_engine are pointed at for the run.
+#
+# Every case also records a digest of its output: a speed-up that changes a
+# result is flagged by `compare` alongside timing regressions.
+#
+#   python harness/bench.py run --save main            # -> bench_baselines/main.json
+#   python harness/bench.py compare main               # re-run, flag regressions
+#   python harness/bench.py compare main after.json    # compare two saved runs
+#   python harness/bench.py record --end 2026-06-01T14:35 --out fixture.json
+# =============================================================================
+
+import argparse
+import asyncio
+import contextlib
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import battlebox_pipeline
+import gravity_engine
+import gravity_math
+import market_data
+import mtf_confluence_scanner
+import sse_engine
+from database import Base, GravityMemory
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines")
+THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.15"))   # best-call slowdown flagged as a regression
+MIN_DELTA_MS = 0.01                                         # below this, differences are timer noise
+
+# Widest window any benchmarked caller fetches (run_mtf_confluence_scan's 4H
+# 280 / daily 500, the packet's 5M 1500 / 1H 720).
+FIXTURE_LIMITS = {"5M": 1500, "15M": 300, "1H": 720, "4H": 280, "1D": 500}
+_SPANS = {"5M": 300, "15M": 900, "1H": 3600, "4H": 14400, "1D": 86400}
+_CCXT_TF = {"5m": "5M", "15m": "15M", "1h": "1H", "4h": "4H", "1d": "1D"}
+KDE_SIZES = (100, 1000, 10000)
+
+
+# ---------------------------------------------------------------------------
+# FIXTURES — {"symbol", "now", "source", "windows": {tf: [candle dicts]}}
+# ---------------------------------------------------------------------------
+def synthetic_fixture(seed: int = 7) -> Dict[str, Any]:
+    """A 5M random walk with two-day trend legs, resampled upward; older daily
+    bars continue the walk backwards. Same bars on every machine."""
+    rng = random.Random(seed)
+    now = int(datetime(2026, 6, 1, 14, 35, tzinfo=timezone.utc).timestamp())
+    n5 = 60 * 288
+    t0 = now - now % 300 - (n5 - 1) * 300
+    m5, price, drift = [], 60000.0, 0.0
+    for i in range(n5):
+        if i % 576 == 0:
+            drift = rng.choice([-1, 1]) * rng.uniform(0.0001, 0.0004)
+        o = price
+        price *= 1 + drift + rng.gauss(0, 0.0015)
+        m5.append({"time": t0 + 300 * i, "open": o, "close": price, "volume": rng.uniform(5, 80),
+                   "high": max(o, price) * (1 + abs(rng.gauss(0, 0.0007))),
+                   "low": min(o, price) * (1 - abs(rng.gauss(0, 0.0007)))})
+    windows = {"5M": m5}
+    for tf in ("15M", "1H", "4H", "1D"):
+        windows[tf] = _resample(m5, _SPANS[tf])
+    older, px = [], windows["1D"][0]["open"]
+    for d in range(1, FIXTURE_LIMITS["1D"] - len(windows["1D"]) + 1):
+        c = px
+        px = c / (1 + rng.gauss(0.0005, 0.025))
+        older.append({"time": windows["1D"][0]["time"] - d * 86400, "open": px, "close": c,
+                      "high": max(px, c) * (1 + abs(rng.gauss(0, 0.01))),
+                      "low": min(px, c) * (1 - abs(rng.gauss(0, 0.01))), "volume": rng.uniform(500, 5000)})
+    windows["1D"] = older[::-1] + windows["1D"]
+    return {"symbol": "BTC/USDT", "now": now, "source": f"synthetic:{seed}",
+            "windows": {tf: rows[-FIXTURE_LIMITS[tf]:] for tf, rows in windows.items()}}
+
+
+def _resample(m5: List[Dict[str, Any]], span: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for c in m5:
+        bucket = c["time"] - c["time"] % span
+        if out and out[-1]["time"] == bucket:
+            b = out[-1]
+            b["high"], b["low"] = max(b["high"], c["high"]), min(b["low"], c["low"])
+            b["close"], b["volume"] = c["close"], b["volume"] + c["volume"]
+        else:
+            out.append({**c, "time": bucket})
+    return out
+
+
+def record_fixture(symbol: str, end: datetime, source_url: Optional[str] = None) -> Dict[str, Any]:
+    """The fetch windows as they stood at `end`, rebuilt from candle_history."""
+    from harness.walk_forward import load_history
+    end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    hist = load_history(symbol, end - timedelta(days=FIXTURE_LIMITS["1D"] - 300), end, source_url)
+    now = int(end.timestamp())
+    windows = {tf: hist.window(tf, now, limit) for tf, limit in FIXTURE_LIMITS.items()}
+    short = [tf for tf, rows in windows.items() if len(rows) < FIXTURE_LIMITS[tf]]
+    if short:
+        print(f"[BENCH] warning: candle_history is short on {', '.join(short)} before {end.isoformat()}")
+    return {"symbol": symbol, "now": now, "source": f"candle_history:{end.isoformat()}", "windows": windows}
+
+
+def load_fixture(path: Optional[str]) -> Dict[str, Any]:
+    if not path:
+        return synthetic_fixture()
+    with open(path) as f:
+        return json.load(f)
+
+
+class _FixtureSource:
+    """fetch_scheduler source serving the fixture windows (newest `limit`)."""
+
+    def __init__(self, windows: Dict[str, List[Dict[str, Any]]]):
+        self.windows = windows
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        rows = self.windows[_CCXT_TF[timeframe]]
+        rows = rows[-limit:] if limit else rows
+        return [[c["time"] * 1000, c["open"], c["high"], c["low"], c["close"], c["volume"]] for c in rows]
+
+
+# ---------------------------------------------------------------------------
+# CASES
+# ---------------------------------------------------------------------------
+class Case:
+    """run() is timed; reset() (untimed) runs before every call; output()
+    (default: run's last return value) is digested."""
+
+    def __init__(self, name: str, run: Callable[[], Any], reset: Optional[Callable[[], None]] = None,
+                 output: Optional[Callable[[], Any]] = None):
+        self.name, self.run, self.reset, self.output = name, run, reset, output
+
+
+def _kde_levels(db, db_sym: str, n: int, price: float, rng: random.Random) -> None:
+    sources = [("4H_PIVOT", 1), ("1H_PIVOT", 2), ("7_DAY_KABRODA", 2), ("MACRO_ENGINE_CLASS_0", 0)]
+    rows = []
+    for _ in range(n):
+        source, klass = rng.choices(sources, weights=[4, 8, 2, 1])[0]
+        rows.append(GravityMemory(symbol=db_sym, source=source, permanence_class=klass, active=True,
+                                  level_type=rng.choice(["SUPPLY", "DEMAND"]),
+                                  price=price * (1 + rng.uniform(-0.15, 0.15)),
+                                  heat_multiplier=rng.uniform(1.0, 3.0)))
+    db.add_all(rows)
+    db.commit()
+
+
+def _sse_inputs(m5: List[Dict[str, Any]], daily: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """_compute_sse_packet's compute_sse_levels input, locked at the fixture's last 5M bar."""
+    context_24h = m5[-288:]
+    calibration = context_24h[-6:]
+    return {
+        "locked_history_5m": context_24h,
+        "slice_24h_5m": context_24h,
+        "slice_4h_5m": context_24h[-48:],
+        "raw_daily_candles": daily,
+        "session_open_price": float(calibration[0]["open"]),
+        "r30_high": max(float(c["high"]) for c in calibration),
+        "r30_low": min(float(c["low"]) for c in calibration),
+        "last_price": float(context_24h[-1]["close"]),
+        "tuning": {},
+    }
+
+
+def build_cases(fixture: Dict[str, Any], db, loop: asyncio.AbstractEventLoop) -> List[Case]:
+    w = fixture["windows"]
+    symbol = fixture["symbol"]
+    now = datetime.fromtimestamp(fixture["now"], tz=timezone.utc)
+    price = float(w["5M"][-1]["close"])
+    rng = random.Random(11)
+
+    for n in KDE_SIZES:
+        _kde_levels(db, f"KDE{n}USDT", n, price, rng)
+    # The scan's KDE lookup and the zone pass read real pivots off the fixture.
+    g4, g1, gd = w["4H"][-50:], w["1H"][-200:], w["1D"][-30:]
+    pivots = (gravity_engine._scan_for_pivots(g4, "4h") + gravity_engine._scan_for_pivots(g1, "1h")
+              + gravity_engine._scan_for_pivots(gd, "1d"))
+    gravity_engine._record_pivots(db, symbol.replace("/", ""), pivots)
+    gravity_engine._record_pivots(db, "ZONEUSDT", pivots)
+
+    def _reset_zones():
+        db.query(GravityMemory).filter(GravityMemory.symbol == "ZONEUSDT").update(
+            {"active": True, "touch_count": 0}, synchronize_session=False)
+        db.commit()
+
+    def _zone_state():
+        return [(z.price, z.active, z.touch_count) for z in
+                db.query(GravityMemory).filter(GravityMemory.symbol == "ZONEUSDT").order_by(GravityMemory.id)]
+
+    sse_in = _sse_inputs(w["5M"], w["1D"][-300:])
+    adx_4h = market_data._calc_adx(w["4H"][-200:])
+    cases = [Case("sse.compute_sse_levels", lambda: sse_engine.compute_sse_levels(sse_in))]
+    cases += [Case(f"kde[{n}]", lambda n=n: gravity_math.calculate_gravity_kde(f"KDE{n}/USDT")) for n in KDE_SIZES]
+    cases += [
+        Case("mtf._analyze_timeframe[15M]", lambda: mtf_confluence_scanner._analyze_timeframe(w["15M"], "15M")),
+        Case("mtf._analyze_timeframe[1D]", lambda: mtf_confluence_scanner._analyze_timeframe(w["1D"], "1D")),
+        Case("battlebox._build_synthetic_jewel",
+             lambda: battlebox_pipeline._build_synthetic_jewel(w["15M"], adx_4h=adx_4h)),
+        Case("gravity._scan_for_pivots[1H]", lambda: gravity_engine._scan_for_pivots(w["1H"], "1h")),
+        Case("gravity._update_zone_touches",
+             lambda: gravity_engine._update_zone_touches("ZONEUSDT", g4, g1, gd, db, now=now),
+             reset=_reset_zones, output=_zone_state),
+        Case("mtf.run_mtf_confluence_scan",
+             lambda: loop.run_until_complete(mtf_confluence_scanner.run_mtf_confluence_scan(symbol))),
+    ]
+    return cases
+
+
+def _digest(value: Any) -> str:
+    if isinstance(value, dict):
+        value = {k: v for k, v in value.items() if k != "scanned_at"}  # wall-clock stamp
+    blob = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+def _time_case(case: Case, repeat: int, min_time: float, max_time: float) -> Dict[str, Any]:
+    """Individually timed calls: at least `repeat` of them and `min_time` s,
+    stopping early once `max_time` s is spent. The warm-up call counts as a
+    sample when it is already slow (a multi-second call has no warm-up to
+    speak of), so kde[10000] costs one or two calls, not repeat + 1."""
+    if case.reset:
+        case.reset()
+    t0 = time.perf_counter()
+    out = case.run()
+    first = time.perf_counter() - t0
+    samples: List[float] = [first] if first > max_time / repeat else []
+    while (len(samples) < repeat or sum(samples) < min_time) and sum(samples) < max_time:
+        if case.reset:
+            case.reset()
+        t0 = time.perf_counter()
+        out = case.run()
+        samples.append(time.perf_counter() - t0)
+    if case.output:
+        out = case.output()
+    ms = [s * 1000.0 for s in samples]
+    return {
+        "median_ms": round(statistics.median(ms), 4),
+        "min_ms": round(min(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "stdev_ms": round(statistics.stdev(ms), 4) if len(ms) > 1 else 0.0,
+        "calls": len(ms),
+        "digest": _digest(out),
+    }
+
+
+def run_benchmarks(fixture: Optional[Dict[str, Any]] = None, only: Optional[List[str]] = None,
+                   repeat: int = 5, min_time: float = 0.2, max_time: float = 5.0,
+                   quiet: bool = True) -> Dict[str, Any]:
+    """Run every case (or those matching the `only` glob patterns); returns the
+    result document `compare` reads."""
+    fixture = fixture or synthetic_fixture()
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[GravityMemory.__table__])
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    loop = asyncio.new_event_loop()
+    saved = (gravity_math.SessionLocal, gravity_engine.SessionLocal)
+    results: Dict[str, Any] = {}
+    out = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    try:
+        gravity_math.SessionLocal = gravity_engine.SessionLocal = factory
+        market_data.set_candle_source(_FixtureSource(fixture["windows"]))
+        with out:
+            for case in build_cases(fixture, db, loop):
+                if only and not any(case.name == p or fnmatch.fnmatchcase(case.name, p) for p in only):
+                    continue
+                results[case.name] = _time_case(case, repeat, min_time, max_time)
+    finally:
+        market_data.set_candle_source(None)
+        gravity_math.SessionLocal, gravity_engine.SessionLocal = saved
+        loop.close()
+        db.close()
+        engine.dispose()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "fixture": fixture.get("source"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+# ---------------------------------------------------------------------------
+# BASELINES
+# ---------------------------------------------------------------------------
+def baseline_path(name: str) -> str:
+    """A bare name lives in bench_baselines/; anything path-like is used as-is."""
+    if os.sep in name or name.endswith(".json"):
+        return name
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_results(doc: Dict[str, Any], name: str) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(name: str) -> Dict[str, Any]:
+    with open(baseline_path(name)) as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = THRESHOLD) -> Dict[str, Any]:
+    """Per-case ratio of best-call times, current/baseline (the minimum is the
+    estimate least disturbed by other load on the box). REGRESSION above
+    1 + threshold, FASTER below 1 - threshold, CHANGED when the output digest
+    differs. Cases only one side ran are listed as NEW / NOT RUN."""
+    rows, regressions, changed = [], [], []
+    base, cur = baseline.get("results", {}), current.get("results", {})
+    for name in sorted(set(base) | set(cur)):
+        b, c = base.get(name), cur.get(name)
+        if b is None or c is None:
+            rows.append({"case": name, "status": "NEW" if b is None else "NOT RUN"})
+            continue
+        ratio = c["min_ms"] / b["min_ms"] if b["min_ms"] > 0 else float("inf")
+        delta = c["min_ms"] - b["min_ms"]
+        status = "OK"
+        if ratio > 1 + threshold and delta > MIN_DELTA_MS:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold and -delta > MIN_DELTA_MS:
+            status = "FASTER"
+        if b.get("digest") != c.get("digest"):
+            changed.append(name)
+        rows.append({"case": name, "status": status, "baseline_ms": b["min_ms"], "current_ms": c["min_ms"],
+                     "ratio": round(ratio, 3), "output_changed": b.get("digest") != c.get("digest")})
+    return {"rows": rows, "regressions": regressions, "output_changed": changed, "threshold": threshold}
+
+
+def _print_results(doc: Dict[str, Any]) -> None:
+    print(f"[BENCH] fixture={doc['meta']['fixture']} python={doc['meta']['python']} {doc['meta']['machine']}")
+    for name, r in doc["results"].items():
+        print(f"  {name:<36} median {r['median_ms']:>10.3f} ms   min {r['min_ms']:>10.3f} ms   "
+              f"n={r['calls']:<5} {r['digest']}")
+
+
+def _print_comparison(cmp: Dict[str, Any]) -> None:
+    for r in cmp["rows"]:
+        if "ratio" not in r:
+            print(f"  {r['case']:<36} {r['status']}")
+            continue
+        flag = " OUTPUT CHANGED" if r["output_changed"] else ""
+        print(f"  {r['case']:<36} {r['baseline_ms']:>10.3f} -> {r['current_ms']:>10.3f} ms  "
+              f"x{r['ratio']:<6} {r['status']}{flag}")
+    print(f"[BENCH] {len(cmp['regressions'])} regression(s) beyond {cmp['threshold']:.0%}, "
+          f"{len(cmp['output_changed'])} output change(s)")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Benchmarks for the indicator, SSE, KDE and scanner hot paths.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def _run_args(p):
+        p.add_argument("--fixture", default=None, help="recorded fixture JSON (default: synthetic)")
+        p.add_argument("--only", action="append", help="glob on case names, repeatable")
+        p.add_argument("--repeat", type=int, default=5, help="minimum timed calls per case")
+        p.add_argument("--min-time", type=float, default=0.2, help="minimum timed seconds per case")
+        p.add_argument("--max-time", type=float, default=5.0, help="stop timing a case after this many seconds")
+
+    p_run = sub.add_parser("run", help="time every case")
+    _run_args(p_run)
+    p_run.add_argument("--save", default=None, help="baseline name (bench_baselines/<name>.json) or path")
+
+    p_cmp = sub.add_parser("compare", help="flag regressions against a saved baseline")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current", nargs="?", help="saved run to compare (default: run now)")
+    p_cmp.add_argument("--threshold", type=float, default=THRESHOLD)
+    p_cmp.add_argument("--allow-output-change", action="store_true")
+    _run_args(p_cmp)
+
+    p_rec = sub.add_parser("record", help="capture a fixture from candle_history")
+    p_rec.add_argument("--symbol", default="BTC/USDT")
+    p_rec.add_argument("--end", required=True, help="UTC instant, YYYY-MM-DDTHH:MM")
+    p_rec.add_argument("--source", default=None, help="candle_history DB URL (default DATABASE_URL)")
+    p_rec.add_argument("--out", required=True)
+
+    a = ap.parse_args(argv)
+    if a.cmd == "record":
+        fixture = record_fixture(a.symbol, datetime.fromisoformat(a.end), a.source)
+        with open(a.out, "w") as f:
+            json.dump(fixture, f)
+        print(f"[BENCH] fixture written to {a.out} ({fixture['source']})")
+        return
+
+    if a.cmd == "run":
+        doc = run_benchmarks(load_fixture(a.fixture), a.only, a.repeat, a.min_time, a.max_time)
+        _print_results(doc)
+        if a.save:
+            print(f"[BENCH] saved {save_results(doc, a.save)}")
+        return
+
+    baseline = load_results(a.baseline)
+    if a.current:
+        current = load_results(a.current)
+    else:
+        current = run_benchmarks(load_fixture(a.fixture), a.only or list(baseline["results"]), a.repeat,
+                                 a.min_time, a.max_time)
+        _print_results(current)
+    cmp = compare(baseline, current, a.threshold)
+    _print_comparison(cmp)
+    if cmp["regressions"] or (cmp["output_changed"] and not a.allow_output_change):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
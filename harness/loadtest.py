@@ -0,0 +1,416 @@
+# harness/loadtest.py
+# =============================================================================
+# KABRODA LOAD TEST — latency and throughput of the public data endpoints
+# under increasing concurrency, with the exchange stubbed out.
+#
+#   dmr         POST /api/dmr/live        get_live_battlebox (logged-in user)
+#   radar       POST /api/radar/scan      battlebox + MTF scan for every target
+#   confluence  GET  /api/confluence      run_mtf_confluence_scan + 200 SMA read
+#   gravity     GET  /api/gravity/scan    daily/15m fetch + KDE + macro fibs
+#
+# `run` starts the real app under uvicorn in a subprocess (`serve`), then
+# drives each endpoint with N closed-loop clients (each sends its next request
+# as soon as the last one returns) for --duration seconds per step, N walking
+# up the --concurrency ladder. Reported per endpoint and step: requests,
+# errors, throughput, p50/p95/p99/max latency. An endpoint's capacity is the
+# highest step that held p95 under --slo-ms with under 1% errors.
+#
+# The server process is the production app with:
+#   - a stand-in exchange (StubExchange) serving fixture candles
+#     (harness/bench.py's synthetic fixture, or a recorded one) after
+#     --latency-ms +/- --jitter-ms of simulated network wait. --budget off
+#     (default) bypasses fetch_scheduler's per-exchange token buckets so the app
+#     itself is measured; --budget live keeps them, which measures the
+#     exchange budget instead (Kraken: 1 req/s).
+#   - the macro oracle answered after --macro-latency-ms (yfinance stand-in),
+#     the MAS call at lock skipped, admin email muted.
+#   - replay_clock frozen at the fixture's instant, so the session packet sees
+#     the same market every request (the locked packet is cached after the
+#     first call, as in production).
+#   - a seeded database: --db (default a scratch SQLite file; a Postgres URL
+#     works too -- use a scratch database) gets a load-test user and
+#     --levels gravity levels per target symbol.
+#   - no lifespan schedulers: the load is the requests, nothing else.
+# One uvicorn worker: the question is what one event loop can serve.
+#
+#   python harness/loadtest.py run --concurrency 1,4,16,64 --duration 15 --latency-ms 120
+# =============================================================================
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = {
+    "dmr": ("POST", "/api/dmr/live", {"symbol": "BTCUSDT"}),
+    "radar": ("POST", "/api/radar/scan", None),
+    "confluence": ("GET", "/api/confluence?symbol=BTC/USDT", None),
+    "gravity": ("GET", "/api/gravity/scan?symbol=BTC/USDT", None),
+}
+LOADTEST_EMAIL = "loadtest@kabroda.local"
+LOADTEST_PASSWORD = "loadtest-password"
+MAX_ERROR_RATE = 0.01
+_CCXT_TF = {"1m": "5M", "5m": "5M", "15m": "15M", "1h": "1H", "4h": "4H", "1d": "1D"}
+
+
+# ---------------------------------------------------------------------------
+# SERVER SIDE
+# ---------------------------------------------------------------------------
+class StubExchange:
+    """Stand-in ccxt client: fixture candles for any symbol after a simulated
+    network wait. Used as a fetch_scheduler source (--budget off) or as the
+    registered kraken/mexc client (--budget live)."""
+
+    def __init__(self, windows: Dict[str, List[Dict[str, Any]]], latency_ms: float, jitter_ms: float, seed: int = 5):
+        self.windows = windows
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.session = None  # fetch_scheduler.call() attaches its pool here
+        self.calls: Counter = Counter()
+        self._rng = random.Random(seed)
+
+    async def _wait(self) -> None:
+        delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        self.calls[f"fetch_ohlcv:{timeframe}"] += 1
+        await self._wait()
+        rows = self.windows[_CCXT_TF[timeframe]]
+        rows = rows[-limit:] if limit else rows
+        return [[c["time"] * 1000, c["open"], c["high"], c["low"], c["close"], c["volume"]] for c in rows]
+
+    async def fetch_ticker(self, symbol, params=None):
+        self.calls["fetch_ticker"] += 1
+        await self._wait()
+        last = self.windows["5M"][-1]
+        return {"symbol": symbol, "last": last["close"], "timestamp": last["time"] * 1000}
+
+    async def close(self) -> None:
+        pass
+
+
+def _seed(levels: int, price: float) -> None:
+    """Load-test user + `levels` active gravity levels per target (idempotent)."""
+    import auth
+    import market_data
+    from database import GravityMemory, SessionLocal, UserModel, init_db
+    from harness.bench import _kde_levels
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if not db.query(UserModel).filter(UserModel.email == LOADTEST_EMAIL).first():
+            db.add(UserModel(email=LOADTEST_EMAIL, password_hash=auth.hash_password(LOADTEST_PASSWORD),
+                             username="loadtest", tier="basic", is_admin=False, subscription_status="active"))
+            db.commit()
+        rng = random.Random(17)
+        for symbol in market_data.TARGETS:
+            db_sym = symbol.replace("/", "")
+            have = db.query(GravityMemory).filter(GravityMemory.symbol == db_sym, GravityMemory.active == True).count()
+            if have < levels:
+                _kde_levels(db, db_sym, levels - have, price, rng)
+    finally:
+        db.close()
+
+
+def serve(port: int, fixture_path: Optional[str], latency_ms: float, jitter_ms: float,
+          macro_latency_ms: float, levels: int, budget: str) -> None:
+    """Run the app on 127.0.0.1:`port` against the stand-in exchange.
+    DATABASE_URL must already point at the load-test database."""
+    from datetime import datetime, timezone
+
+    import uvicorn
+
+    import fetch_scheduler
+    import kabroda_mas_flow
+    import market_context_oracle
+    import market_data
+    import notify
+    import replay_clock
+    from harness.bench import load_fixture
+    from main import app
+
+    fixture = load_fixture(fixture_path)
+    _seed(levels, float(fixture["windows"]["5M"][-1]["close"]))
+
+    stub = StubExchange(fixture["windows"], latency_ms, jitter_ms)
+    if budget == "live":
+        for exchange_id in ("kraken", "mexc"):
+            fetch_scheduler._clients[exchange_id] = stub
+    else:
+        market_data.set_candle_source(stub)
+
+    async def _macro():
+        await asyncio.sleep(macro_latency_ms / 1000.0)
+        return {}
+
+    market_context_oracle.get_global_macro_context = _macro
+    kabroda_mas_flow.run_mas_analysis = lambda **kwargs: None
+    notify.send_admin_email = lambda *a, **k: None
+    replay_clock.install(replay_clock.ReplayClock(datetime.fromtimestamp(fixture["now"], tz=timezone.utc)))
+
+    @asynccontextmanager
+    async def _no_schedulers(app_instance):
+        yield
+
+    app.router.lifespan_context = _no_schedulers
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+# ---------------------------------------------------------------------------
+# CLIENT SIDE
+# ---------------------------------------------------------------------------
+def _percentile(sorted_ms: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_ms:
+        return None
+    return sorted_ms[min(len(sorted_ms) - 1, max(0, math.ceil(q / 100.0 * len(sorted_ms)) - 1))]
+
+
+def summarize(latencies_ms: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ms = sorted(latencies_ms)
+    total = len(ms) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "rps": round(len(ms) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": _round(_percentile(ms, 50)),
+        "p95_ms": _round(_percentile(ms, 95)),
+        "p99_ms": _round(_percentile(ms, 99)),
+        "max_ms": _round(ms[-1] if ms else None),
+    }
+
+
+def _round(v: Optional[float]) -> Optional[float]:
+    return None if v is None else round(v, 2)
+
+
+async def _step(base_url: str, endpoint: str, concurrency: int, duration: float,
+                requests: Optional[int] = None) -> Dict[str, Any]:
+    """`concurrency` logged-in closed-loop clients on one endpoint for `duration`
+    s, or for exactly `requests` requests each when that is given."""
+    import aiohttp
+
+    method, path, body = ENDPOINTS[endpoint]
+    latencies: List[float] = []
+    errors = Counter()
+    timeout = aiohttp.ClientTimeout(total=max(60.0, duration * 4))
+
+    async with aiohttp.ClientSession(base_url, cookie_jar=aiohttp.CookieJar(unsafe=True), timeout=timeout,
+                                     connector=aiohttp.TCPConnector(limit=0)) as http:
+        async with http.post("/login", data={"email": LOADTEST_EMAIL, "password": LOADTEST_PASSWORD},
+                             allow_redirects=False) as resp:
+            await resp.read()
+        deadline = time.perf_counter() + duration
+
+        async def _client():
+            sent = 0
+            while (sent < requests) if requests is not None else (time.perf_counter() < deadline):
+                sent += 1
+                t0 = time.perf_counter()
+                try:
+                    async with http.request(method, path, json=body) as resp:
+                        await resp.read()
+                        ok = resp.status == 200
+                        if not ok:
+                            errors[str(resp.status)] += 1
+                except Exception as e:
+                    ok = False
+                    errors[type(e).__name__] += 1
+                if ok:
+                    latencies.append((time.perf_counter() - t0) * 1000.0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[_client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    out = {"endpoint": endpoint, "concurrency": concurrency, **summarize(latencies, sum(errors.values()), elapsed)}
+    if errors:
+        out["error_kinds"] = dict(errors)
+    return out
+
+
+def capacity(rows: List[Dict[str, Any]], slo_ms: float) -> Dict[str, Any]:
+    """Per endpoint: the highest concurrency that held p95 <= slo_ms with
+    under MAX_ERROR_RATE errors, and the best throughput seen."""
+    out: Dict[str, Any] = {}
+    for endpoint in dict.fromkeys(r["endpoint"] for r in rows):
+        steps = [r for r in rows if r["endpoint"] == endpoint]
+        held = [r for r in steps if r["error_rate"] < MAX_ERROR_RATE and r["p95_ms"] is not None
+                and r["p95_ms"] <= slo_ms]
+        out[endpoint] = {
+            "max_concurrency_within_slo": max((r["concurrency"] for r in held), default=None),
+            "peak_rps": max((r["rps"] for r in steps), default=0.0),
+        }
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 90.0) -> None:
+    import aiohttp
+
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"load-test server exited with code {proc.returncode}")
+            try:
+                async with http.get(f"{base_url}/health") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError("load-test server did not become ready")
+
+
+def run_load_test(
+    endpoints: List[str],
+    concurrency: List[int],
+    duration: float = 10.0,
+    latency_ms: float = 80.0,
+    jitter_ms: float = 20.0,
+    macro_latency_ms: float = 250.0,
+    levels: int = 500,
+    db_url: Optional[str] = None,
+    fixture_path: Optional[str] = None,
+    budget: str = "off",
+    slo_ms: float = 1000.0,
+    warmup: int = 1,
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    """Start a stubbed server, walk every endpoint up the concurrency ladder,
+    stop the server. Returns {"config", "warmup", "steps", "capacity"}."""
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        raise ValueError(f"unknown endpoint(s) {unknown}; choose from {sorted(ENDPOINTS)}")
+    scratch = None
+    if not db_url:
+        scratch = tempfile.mkdtemp(prefix="kabroda_loadtest_")
+        db_url = f"sqlite:///{os.path.join(scratch, 'loadtest.db')}"
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, os.path.abspath(__file__), "serve", "--port", str(port),
+           "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms),
+           "--macro-latency-ms", str(macro_latency_ms), "--levels", str(levels), "--budget", budget]
+    if fixture_path:
+        cmd += ["--fixture", fixture_path]
+    env = {**os.environ, "DATABASE_URL": db_url, "SESSION_HTTPS_ONLY": "0", "CACHE_BACKEND": "memory"}
+    sink = None if verbose else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, env=env, stdout=sink, stderr=sink)
+
+    async def _drive():
+        await _wait_ready(base_url, proc)
+        steps, warmups = [], []
+        for endpoint in endpoints:
+            if warmup > 0:  # the first call computes and caches the session lock
+                row = await _step(base_url, endpoint, 1, 0.0, requests=warmup)
+                warmups.append(row)
+                print(f"[LOAD TEST] warmup {endpoint}: {row['requests']} requests, {row['errors']} errors")
+            for n in concurrency:
+                row = await _step(base_url, endpoint, n, duration)
+                steps.append(row)
+                print(f"[LOAD TEST] {_fmt(row)}")
+        return steps, warmups
+
+    try:
+        steps, warmups = asyncio.run(_drive())
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        "config": {"endpoints": endpoints, "concurrency": concurrency, "duration": duration,
+                   "latency_ms": latency_ms, "jitter_ms": jitter_ms, "macro_latency_ms": macro_latency_ms,
+                   "levels": levels, "budget": budget, "slo_ms": slo_ms, "warmup": warmup,
+                   "db": "scratch sqlite" if scratch else db_url.split("@")[-1],
+                   "fixture": fixture_path or "synthetic"},
+        "warmup": warmups,
+        "steps": steps,
+        "capacity": capacity(steps, slo_ms),
+    }
+
+
+def _fmt(r: Dict[str, Any]) -> str:
+    def ms(v):
+        return "-" if v is None else f"{v:.1f}"
+    return (f"{r['endpoint']:<11} c={r['concurrency']:<4} n={r['requests']:<6} err={r['errors']:<4} "
+            f"rps={r['rps']:<8} p50={ms(r['p50_ms'])} p95={ms(r['p95_ms'])} p99={ms(r['p99_ms'])} "
+            f"max={ms(r['max_ms'])} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Load test the dashboard/radar endpoints against a stubbed exchange.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def _server_args(p):
+        p.add_argument("--fixture", default=None, help="recorded bench fixture JSON (default: synthetic)")
+        p.add_argument("--latency-ms", type=float, default=80.0, help="stand-in exchange latency per call")
+        p.add_argument("--jitter-ms", type=float, default=20.0)
+        p.add_argument("--macro-latency-ms", type=float, default=250.0, help="stand-in macro oracle latency")
+        p.add_argument("--levels", type=int, default=500, help="seeded gravity levels per symbol")
+        p.add_argument("--budget", choices=("off", "live"), default="off",
+                       help="bypass (off) or keep (live) the fetch scheduler's exchange budgets")
+
+    p_run = sub.add_parser("run", help="start a stubbed server and walk the concurrency ladder")
+    _server_args(p_run)
+    p_run.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated: " + ", ".join(ENDPOINTS))
+    p_run.add_argument("--concurrency", default="1,4,16,64", help="comma-separated client counts")
+    p_run.add_argument("--duration", type=float, default=10.0, help="seconds per step")
+    p_run.add_argument("--slo-ms", type=float, default=1000.0, help="p95 target used for capacity")
+    p_run.add_argument("--warmup", type=int, default=1, help="untimed requests per endpoint before its ladder")
+    p_run.add_argument("--db", default=None, help="database URL to seed and serve (default: scratch SQLite)")
+    p_run.add_argument("--out", default=None, help="write the JSON report here")
+    p_run.add_argument("--verbose", action="store_true", help="show the server's output")
+
+    p_serve = sub.add_parser("serve", help="run the stubbed server only (DATABASE_URL picks the DB)")
+    _server_args(p_serve)
+    p_serve.add_argument("--port", type=int, default=8765)
+
+    a = ap.parse_args(argv)
+    if a.cmd == "serve":
+        serve(a.port, a.fixture, a.latency_ms, a.jitter_ms, a.macro_latency_ms, a.levels, a.budget)
+        return
+
+    report = run_load_test(
+        a.endpoints.split(","), [int(n) for n in a.concurrency.split(",")], duration=a.duration,
+        latency_ms=a.latency_ms, jitter_ms=a.jitter_ms, macro_latency_ms=a.macro_latency_ms, levels=a.levels,
+        db_url=a.db, fixture_path=a.fixture, budget=a.budget, slo_ms=a.slo_ms, warmup=a.warmup,
+        verbose=a.verbose,
+    )
+    for endpoint, cap in report["capacity"].items():
+        print(f"[LOAD TEST] capacity {endpoint:<11} max concurrency with p95 <= {a.slo_ms:.0f} ms: "
+              f"{cap['max_concurrency_within_slo']}  peak {cap['peak_rps']} req/s")
+    if a.out:
+        with open(a.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[LOAD TEST] report written to {a.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# harness/replay.py
+# =============================================================================
+# KABRODA REPLAY RUNNER — a recorded day through the live loops, offline.
+#
+# Runs the production loops unmodified on a simulated clock:
+#   - battlebox_pipeline.get_live_battlebox, polled every `battlebox_every`
+#     simulated seconds (what the dashboard does),
+#   - session_monitor.run_session_monitor_loop (15-min polls),
+#   - ledger_closing_engine.run_ledger_audit_loop (60s lifecycle ticks),
+# against:
+#   - replay_clock.ReplayClock: every datetime.now() those loops read and every
+#     asyncio.sleep() they wait on is simulated. The event loop jumps straight
+#     to the next timer, so a day runs as fast as the work allows (--speed N
+#     paces it at N x real time instead). Timer order is the only scheduler,
+#     so two replays of the same range write the same rows.
+#   - CandleHistorySource: every fetch_scheduler.call() (market_data's Kraken
+#     candles, the lifecycle MEXC ticker and Kraken 1m OHLC) is answered from
+#     candle_history as the exchange would have returned it at the simulated
+#     instant -- closed bars plus the forming bar (harness/walk_forward.py's
+#     CandleReplay). candle_history has no 1m bars, so 1m requests get 5M.
+#
+# Not replayed: the Senior Analyst MAS call fired at lock (an LLM request --
+# recorded, not made) and the macro oracle (yfinance -- returns {}). Admin
+# emails are muted. The lifecycle loop works whatever campaigns the app DB
+# holds; point --db at a copy of a production DB to replay its trades.
+#
+# The loops write to the app database exactly as in production (session
+# locks, monitor events, campaign updates), so --db must be a scratch SQLite
+# file. App modules are imported inside run_replay() so the CLI can point
+# DATABASE_URL at it first.
+#
+#   python harness/replay.py --db sqlite:///./replay.db --source sqlite:///./kabroda.db \
+#       --start 2026-06-01T12:00 --hours 10
+# =============================================================================
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import replay_clock
+
+# ccxt timeframe -> candle_history timeframe. No 1m is stored; 5M stands in.
+_TIMEFRAMES = {"1m": "5M", "5m": "5M", "15m": "15M", "1h": "1H", "4h": "4H", "1d": "1D"}
+_DEFAULT_LIMIT = 720  # Kraken's fetch_ohlcv page when no limit is passed
+
+
+class CandleHistorySource:
+    """Async stand-in for a ccxt client (see fetch_scheduler.set_source):
+    fetch_ohlcv / fetch_ticker answered from CandleReplay histories as of
+    `clock`. `calls` counts requests by method and timeframe."""
+
+    def __init__(self, histories: Dict[str, Any], clock: replay_clock.ReplayClock):
+        self.histories = histories
+        self.clock = clock
+        self.calls: Counter = Counter()
+
+    def _history(self, symbol: str):
+        hist = self.histories.get(symbol)
+        if hist is None:
+            raise LookupError(f"no replay history for {symbol}")
+        return hist
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                          limit: Optional[int] = None, params: Optional[Dict] = None) -> List[List[float]]:
+        if timeframe not in _TIMEFRAMES:
+            raise ValueError(f"replay has no {timeframe} candles")
+        self.calls[f"fetch_ohlcv:{timeframe}"] += 1
+        rows = self._history(symbol).window(
+            _TIMEFRAMES[timeframe], int(self.clock.time()), limit or _DEFAULT_LIMIT,
+            since_ts=None if since is None else int(since) // 1000,
+        )
+        return [[r["time"] * 1000, r["open"], r["high"], r["low"], r["close"], r["volume"]] for r in rows]
+
+    async def fetch_ticker(self, symbol: str, params: Optional[Dict] = None) -> Dict[str, Any]:
+        self.calls["fetch_ticker"] += 1
+        now_ts = int(self.clock.time())
+        last = self._history(symbol).window("5M", now_ts, 1)
+        if not last:
+            raise LookupError(f"no replay candles for {symbol} before {now_ts}")
+        return {"symbol": symbol, "last": last[-1]["close"], "timestamp": now_ts * 1000}
+
+
+def _parse_utc(value) -> datetime:
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def run_replay(
+    start,
+    hours: float = 24.0,
+    symbols: Iterable[str] = ("BTC/USDT",),
+    source_url: Optional[str] = None,
+    speed: Optional[float] = None,
+    battlebox_every: int = 60,
+    quiet: bool = True,
+) -> Dict[str, Any]:
+    """Drive the live loops from `start` for `hours` simulated hours against
+    candle_history (source_url, default the app DB). Writes to the app DB;
+    refuses anything but SQLite. Returns a summary of the run."""
+    import database
+    if database.engine.dialect.name != "sqlite":
+        raise RuntimeError("replay writes to the app database -- point DATABASE_URL at a scratch SQLite file")
+
+    import battlebox_pipeline
+    import cache_backend
+    import kabroda_mas_flow
+    import ledger_closing_engine
+    import market_context_oracle
+    import market_data
+    import notify
+    import session_monitor
+    from harness.walk_forward import load_history
+
+    start = _parse_utc(start)
+    end = start + timedelta(hours=hours)
+    symbols = list(symbols)
+    database.init_db()
+    histories = {s: load_history(s, start, end, source_url) for s in symbols}
+
+    clock = replay_clock.ReplayClock(start, speed)
+    source = CandleHistorySource(histories, clock)
+    statuses: Counter = Counter()
+    mas_calls: List[Dict[str, Any]] = []
+
+    async def _no_macro():
+        return {}
+
+    def _record_mas(**kwargs):
+        mas_calls.append({k: kwargs.get(k) for k in ("symbol", "session_id", "date_key")})
+
+    patches = [
+        (kabroda_mas_flow, "run_mas_analysis", _record_mas),
+        (market_context_oracle, "get_global_macro_context", _no_macro),
+        (notify, "send_admin_email", lambda *a, **k: None),
+        # Private caches, so nothing simulated leaks into the shared cache file.
+        (battlebox_pipeline, "_LOCKED_PACKETS", cache_backend.LRUCache(
+            battlebox_pipeline.LOCKED_PACKETS_MAX, battlebox_pipeline.LOCKED_PACKETS_MAX_AGE_H * 3600.0,
+            name="locked_packets")),
+        (ledger_closing_engine, "_exhaustion_5m_cache", cache_backend.LRUCache(
+            32, ledger_closing_engine._EXHAUSTION_CACHE_TTL, name="exhaustion_5m")),
+    ]
+    saved = [(mod, name, getattr(mod, name)) for mod, name, _ in patches]
+
+    async def _battlebox_poller():
+        while True:
+            for symbol in symbols:
+                out = await battlebox_pipeline.get_live_battlebox(symbol)
+                statuses[out.get("status")] += 1
+            await asyncio.sleep(battlebox_every)
+
+    async def _drive():
+        tasks = [
+            asyncio.create_task(_battlebox_poller()),
+            asyncio.create_task(session_monitor.run_session_monitor_loop()),
+            asyncio.create_task(ledger_closing_engine.run_ledger_audit_loop()),
+        ]
+        await clock.sleep_until(end)
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+
+    loop = asyncio.new_event_loop()
+    clock.bind(loop)
+    out = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    wall = time.perf_counter()
+    try:
+        for mod, name, value in patches:
+            setattr(mod, name, value)
+        replay_clock.install(clock)
+        market_data.set_candle_source(source)
+        with out:
+            loop.run_until_complete(_drive())
+            loop.run_until_complete(loop.shutdown_default_executor())
+    finally:
+        market_data.set_candle_source(None)
+        replay_clock.uninstall()
+        for mod, name, value in saved:
+            setattr(mod, name, value)
+        loop.close()
+    wall = time.perf_counter() - wall
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "simulated_seconds": clock.elapsed(),
+        "wall_seconds": round(wall, 3),
+        "speedup": round(clock.elapsed() / wall, 1) if wall > 0 else None,
+        "fetches": dict(source.calls),
+        "battlebox": dict(statuses),
+        "mas_calls": mas_calls,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Replay stored candles through the live loops on a simulated clock.")
+    ap.add_argument("--db", required=True, help="scratch SQLite app DB URL the loops write to")
+    ap.add_argument("--source", default=None, help="candle_history DB URL (default --db)")
+    ap.add_argument("--start", required=True, help="UTC start, YYYY-MM-DD[THH:MM]")
+    ap.add_argument("--hours", type=float, default=24.0)
+    ap.add_argument("--symbols", default="BTC/USDT", help="comma-separated")
+    ap.add_argument("--speed", type=float, default=None, help="pace at N x real time (default: unpaced)")
+    ap.add_argument("--battlebox-every", type=int, default=60, help="simulated seconds between battlebox polls")
+    ap.add_argument("--verbose", action="store_true", help="keep the replayed modules' console output")
+    a = ap.parse_args(argv)
+    if "database" in sys.modules:
+        raise SystemExit("--db must be set before the app modules are imported; run replay.py as a script")
+    os.environ["DATABASE_URL"] = a.db
+    summary = run_replay(
+        a.start, hours=a.hours, symbols=a.symbols.split(","), source_url=a.source, speed=a.speed,
+        battlebox_every=a.battlebox_every, quiet=not a.verbose,
+    )
+    print(f"[REPLAY] {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main()
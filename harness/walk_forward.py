@@ -0,0 +1,593 @@
+# harness/walk_forward.py
+# =============================================================================
+# KABRODA WALK-FORWARD HARNESS — replay stored candles through the live rules.
+#
+# Replays candle_history day by day through the same code paths the live
+# system runs, and writes decision_log-shaped rows (plus their
+# decision_gauge_reading rows) to a SEPARATE results database:
+#
+#   4H / 1H  gravity_engine's ingestion tick every `tick_minutes`: pivot scan
+#            -> _record_pivots -> _update_zone_touches -> _detect_4h_bos /
+#            _detect_1h_bos, with the simulated clock passed as `now`.
+#            Candidates are then closed by ledger_closing_engine's Phase 4 rule
+#            (_resolve_stop_t1 over the bars from fill to the 5d/2d time cap).
+#   15M      the get_live_battlebox packet (battlebox_pipeline._compute_sse_packet
+#            over the same fetch windows, at lock time) for each session. The
+#            MAS verdict is an LLM call and is NOT replayed: the decision is the
+#            market simulator's radar rule (radar_verdict + one-and-done on the
+#            first trigger breach before the session close), and the trade is
+#            closed by the Phase 2 rule (stop/T1 until the next session open).
+#
+# Candle windows are rebuilt as the exchange would have returned them at the
+# simulated instant: closed bars plus a forming bar aggregated from the 5M
+# bars so far. Higher timeframes are resampled from 5M wherever 5M covers the
+# bucket; stored 1H/4H/1D rows fill the older history. Live fetches persist
+# the forming bar as-is, so a stored native bar can be a partial snapshot --
+# another reason 5M wins where it exists. Resolution is 5M, not the live 1m.
+#
+# Not replayed (no stored history to rebuild them from): the MTF confluence
+# read (confluence=None, record-only), weekly 200 SMA / macro engine levels,
+# KDE peaks and the macro oracle (context-only inputs to the MAS prompt).
+#
+# Chunks: the range is split into `chunk_days` UTC-day chunks run in parallel
+# (spawned worker processes, each with a private in-memory SQLite). Zone state
+# is rebuilt per chunk from a WARMUP_DAYS replay before the chunk -- enough to
+# cover the 15-day BOS zone cutoff -- so chunked and sequential runs produce the
+# same rows. Each finished chunk is written together with its
+# walk_forward_progress row in one transaction; re-running the same command
+# skips finished chunks, so an interrupted multi-year run resumes where it
+# stopped. Extending --end continues the same run.
+#
+# Hard wall (see README): reads candle_history only, writes only the results
+# database. Every live-module SessionLocal the replay touches is pointed at the
+# worker's in-memory DB for the duration of a chunk, and admin emails are
+# muted.
+#
+#   python harness/walk_forward.py --start 2025-01-01 --end 2026-01-01 --workers 8
+# =============================================================================
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import battlebox_pipeline
+import database
+import gravity_engine
+import kabroda_mas_flow
+import ledger_closing_engine
+import market_simulator
+import notify
+import session_manager
+from database import Base, CampaignLog, CandleHistory, DecisionGaugeReading, DecisionLog, GravityMemory
+from harness import unified_audit_writer
+
+RESULTS_URL = os.getenv("WALK_FORWARD_RESULTS_URL", "sqlite:///./walk_forward_results.db")
+WORKERS = int(os.getenv("WALK_FORWARD_WORKERS", "0")) or (os.cpu_count() or 1)
+
+TF_SECONDS = {"5M": 300, "15M": 900, "1H": 3600, "4H": 14400, "1D": 86400}
+# market_data.fetch_live_* default limits -- what get_live_battlebox sees.
+PACKET_LIMITS = {"5M": 1500, "15M": 300, "1H": 720, "4H": 200, "1D": 300}
+# run_gravity_ingestion_loop's fetch limits.
+GRAVITY_LIMITS = {"4H": 50, "1H": 200, "1D": 30}
+TICK_OFFSET = 300                # ticks land 5 min past the quarter hour
+WARMUP_DAYS = 16                 # > the 15-day 4H BOS zone cutoff
+WARMUP_TICK = 3600               # zone state only changes on closed 1H/4H/1D bars
+TAIL_DAYS = 7                    # 4H candidate cap (5d) + the next session open
+
+_META = MetaData()
+walk_forward_runs = Table(
+    "walk_forward_runs", _META,
+    Column("run_key", String, primary_key=True),
+    Column("config", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+walk_forward_progress = Table(
+    "walk_forward_progress", _META,
+    Column("run_key", String, primary_key=True),
+    Column("chunk_start", String, primary_key=True),   # "YYYY-MM-DD"
+    Column("decisions", Integer, nullable=False),
+    Column("completed_at", DateTime, nullable=False),
+)
+
+_DECISION_FIELDS = [
+    c.name for c in DecisionLog.__table__.columns if c.name not in ("id", "created_at")
+]
+_REPLAY_TABLES = [t.__table__ for t in (GravityMemory, CampaignLog, DecisionLog, DecisionGaugeReading)]
+
+
+# ---------------------------------------------------------------------------
+# CANDLE WINDOWS
+# ---------------------------------------------------------------------------
+class _Bars:
+    """One timeframe as parallel arrays, sorted by open time (epoch seconds)."""
+
+    def __init__(self, t, o, h, l, c, v):
+        self.t = np.asarray(t, dtype=np.int64)
+        self.o, self.h, self.l, self.c, self.v = (np.asarray(x, dtype=float) for x in (o, h, l, c, v))
+        self._rows = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_rows"] = None  # rebuilt lazily in the worker, not pickled
+        return state
+
+    def __len__(self):
+        return len(self.t)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        if self._rows is None:
+            self._rows = [
+                {"time": int(t), "open": o, "high": h, "low": l, "close": c, "volume": v}
+                for t, o, h, l, c, v in zip(self.t, self.o.tolist(), self.h.tolist(),
+                                            self.l.tolist(), self.c.tolist(), self.v.tolist())
+            ]
+        return self._rows
+
+
+def _resample(m5: _Bars, span: int):
+    """5M -> `span` buckets. Returns (bars, complete) where complete marks the
+    buckets that had every 5M bar."""
+    if not len(m5):
+        return _Bars([], [], [], [], [], []), np.zeros(0, dtype=bool)
+    bucket = m5.t - m5.t % span
+    keys, first = np.unique(bucket, return_index=True)
+    last = np.r_[first[1:], len(bucket)] - 1
+    bars = _Bars(
+        keys, m5.o[first], np.maximum.reduceat(m5.h, first), np.minimum.reduceat(m5.l, first),
+        m5.c[last], np.add.reduceat(m5.v, first),
+    )
+    return bars, (last - first + 1) == span // TF_SECONDS["5M"]
+
+
+def _merge(native: _Bars, resampled: _Bars, complete: np.ndarray) -> _Bars:
+    """Resampled buckets win when complete or when no stored bar exists."""
+    keep = ~np.isin(native.t, resampled.t[complete])
+    use = complete | ~np.isin(resampled.t, native.t)
+    cols = [np.r_[getattr(native, k)[keep], getattr(resampled, k)[use]] for k in ("t", "o", "h", "l", "c", "v")]
+    order = np.argsort(cols[0], kind="stable")
+    return _Bars(*(c[order] for c in cols))
+
+
+class CandleReplay:
+    """Every timeframe the live fetchers serve, answerable "as of" any instant."""
+
+    def __init__(self, bars: Dict[str, _Bars]):
+        m5 = bars.get("5M") or _Bars([], [], [], [], [], [])
+        self.bars = {"5M": m5}
+        for tf in ("15M", "1H", "4H", "1D"):
+            native = bars.get(tf) or _Bars([], [], [], [], [], [])
+            self.bars[tf] = _merge(native, *_resample(m5, TF_SECONDS[tf]))
+
+    def window(self, tf: str, now_ts: int, limit: int, since_ts: Optional[int] = None) -> List[Dict[str, Any]]:
+        """What fetch_live_<tf>(limit=limit) returns at now_ts: the newest
+        closed bars plus the forming bar built from the 5M bars so far.
+        With since_ts, the first `limit` bars opening at or after it instead
+        (ccxt's fetch_ohlcv(since=...))."""
+        span = TF_SECONDS[tf]
+        bucket = now_ts - now_ts % span
+        closed = int(np.searchsorted(self.bars[tf].t, bucket, side="left"))
+        forming = self._forming(bucket, now_ts) if tf != "5M" else None
+        if since_ts is not None:
+            lo = int(np.searchsorted(self.bars[tf].t, since_ts, side="left"))
+            out = self.bars[tf].rows()[lo:max(lo, min(closed, lo + limit))]
+            return out + [forming] if forming and len(out) < limit and forming["time"] >= since_ts else out
+        n = limit - (1 if forming else 0)
+        out = self.bars[tf].rows()[max(0, closed - n):closed]
+        return out + [forming] if forming else out
+
+    def _forming(self, bucket: int, now_ts: int) -> Optional[Dict[str, Any]]:
+        m5 = self.bars["5M"]
+        lo = int(np.searchsorted(m5.t, bucket, side="left"))
+        hi = int(np.searchsorted(m5.t, now_ts - TF_SECONDS["5M"], side="right"))
+        if hi <= lo:
+            return None
+        return {"time": bucket, "open": float(m5.o[lo]), "high": float(m5.h[lo:hi].max()),
+                "low": float(m5.l[lo:hi].min()), "close": float(m5.c[hi - 1]),
+                "volume": float(m5.v[lo:hi].sum())}
+
+    def span(self, start_ts: int, end_ts: int):
+        """[lo, hi) indices of the 5M bars opening in [start_ts, end_ts)."""
+        t = self.bars["5M"].t
+        return int(np.searchsorted(t, start_ts, side="left")), int(np.searchsorted(t, end_ts, side="left"))
+
+    def lifecycle_candles(self, start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+        """5M bars in the ledger's 1m candle shape (ts in ms, h/l/c)."""
+        lo, hi = self.span(start_ts, end_ts)
+        m5 = self.bars["5M"]
+        return [{"ts": int(t) * 1000, "h": h, "l": l, "c": c}
+                for t, h, l, c in zip(m5.t[lo:hi], m5.h[lo:hi].tolist(), m5.l[lo:hi].tolist(), m5.c[lo:hi].tolist())]
+
+    def covers(self, end_ts: int) -> bool:
+        t = self.bars["5M"].t
+        return bool(len(t)) and int(t[-1]) + TF_SECONDS["5M"] >= end_ts
+
+
+def load_history(symbol: str, start: datetime, end: datetime, source_url: Optional[str] = None) -> CandleReplay:
+    """Read candle_history (read-only) for the replay range plus its lookback
+    (the 300-bar daily window) and tail (the longest trade lifetime)."""
+    engine = create_engine(source_url) if source_url else database.engine
+    lo = (start - timedelta(days=PACKET_LIMITS["1D"] + WARMUP_DAYS + 2)).replace(tzinfo=None)
+    hi = (end + timedelta(days=TAIL_DAYS)).replace(tzinfo=None)
+    cols = {tf: ([], [], [], [], [], []) for tf in TF_SECONDS}
+    q = (
+        select(CandleHistory.timeframe, CandleHistory.timestamp, CandleHistory.open, CandleHistory.high,
+               CandleHistory.low, CandleHistory.close, CandleHistory.volume)
+        .where(CandleHistory.symbol == symbol, CandleHistory.timestamp >= lo, CandleHistory.timestamp < hi)
+        .order_by(CandleHistory.timestamp)
+    )
+    with engine.connect() as conn:
+        for tf, ts, o, h, l, c, v in conn.execute(q):
+            if tf not in cols or None in (o, h, l, c):
+                continue
+            for arr, val in zip(cols[tf], (_epoch(ts), o, h, l, c, v or 0.0)):
+                arr.append(val)
+    if source_url:
+        engine.dispose()
+    return CandleReplay({tf: _Bars(*arrs) for tf, arrs in cols.items()})
+
+
+def _epoch(dt: datetime) -> int:
+    return int((dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def _utc(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# ONE CHUNK (runs in a worker process)
+# ---------------------------------------------------------------------------
+_HISTORY: Optional[CandleReplay] = None
+_QUIET = True
+
+
+def _init_worker(history: CandleReplay, quiet: bool) -> None:
+    global _HISTORY, _QUIET
+    _HISTORY, _QUIET = history, quiet
+
+
+@contextlib.contextmanager
+def _replay_env(session_factory, quiet: bool):
+    """Point the live modules' DB sessions at the replay DB and mute email."""
+    patches = [
+        (unified_audit_writer, "SessionLocal", session_factory),
+        (battlebox_pipeline, "SessionLocal", session_factory),
+        (notify, "send_admin_email", lambda *a, **k: None),
+    ]
+    saved = [(mod, name, getattr(mod, name)) for mod, name, _ in patches]
+    out = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    try:
+        for mod, name, value in patches:
+            setattr(mod, name, value)
+        with out:
+            yield
+    finally:
+        for mod, name, value in saved:
+            setattr(mod, name, value)
+
+
+def _gravity_tick(hist: CandleReplay, db, symbol: str, now_ts: int, detect: bool) -> None:
+    """One run_gravity_ingestion_loop iteration at now_ts."""
+    db_sym = symbol.replace("/", "")
+    c4 = hist.window("4H", now_ts, GRAVITY_LIMITS["4H"])
+    c1 = hist.window("1H", now_ts, GRAVITY_LIMITS["1H"])
+    cd = hist.window("1D", now_ts, GRAVITY_LIMITS["1D"])
+    if not c4 or not c1 or not cd:
+        return
+    pivots = (gravity_engine._scan_for_pivots(c4, "4h") + gravity_engine._scan_for_pivots(c1, "1h")
+              + gravity_engine._scan_for_pivots(cd, "1d"))
+    gravity_engine._record_pivots(db, db_sym, pivots)
+    now = _utc(now_ts)
+    gravity_engine._update_zone_touches(db_sym, c4, c1, cd, db, now=now)
+    if detect:
+        gravity_engine._detect_4h_bos(symbol, db_sym, c4, cd, db, None, now=now)
+        gravity_engine._detect_1h_bos(symbol, db_sym, c1, c4, cd, db, None, now=now)
+
+
+def _close_candidates(hist: CandleReplay, db) -> None:
+    """ledger_closing_engine Phase 4 over the replayed candidates."""
+    for c in db.query(CampaignLog).filter(
+        CampaignLog.mas_approval_status.in_(["4H_CANDIDATE", "1H_CANDIDATE"]),
+        CampaignLog.closed_at.is_(None),
+    ).all():
+        fill_ts, expiry_ts = _epoch(c.entry_filled_at), _epoch(c.session_expires_at)
+        candles = hist.lifecycle_candles(fill_ts, expiry_ts)
+        status, r = _resolve(c, candles, hist.covers(expiry_ts))
+        if status:
+            c.status, c.realized_pnl, c.closed_at = status, r, _utc(expiry_ts)
+            db.commit()
+            unified_audit_writer.backfill_decision_outcome(campaign_log_id=c.id, outcome_status=status, realized_r=r)
+
+
+def _resolve(c, candles: List[Dict[str, Any]], expired: bool):
+    """(outcome_status, realized_r) under the lifecycle rules; (None, None)
+    while the stored history ends before the trade does."""
+    if candles:
+        outcome, _, r, _ = ledger_closing_engine._resolve_stop_t1(c, candles)
+        if outcome:
+            return ("CLOSED_LOSS" if outcome == "STOP" else "CLOSED_WIN"), r
+    if not expired:
+        return None, None
+    if not candles:
+        return "NO_TRIGGER", None
+    return "CLOSED_AT_EXPIRY", ledger_closing_engine._frac_r(c.entry_price, c.stop_loss, candles[-1]["c"], c.bias == "LONG")
+
+
+def _session_locks(session_ids: Iterable[str], day_ts: int):
+    """(session_id, anchor_ts) for every session locking on this UTC day."""
+    for sid in session_ids:
+        cfg = session_manager.get_session_config(sid)
+        for probe in (day_ts - 1, day_ts + 86400 - 1):
+            anchor = session_manager.anchor_ts_for_utc_date(cfg, _utc(probe))
+            if day_ts <= anchor + 1800 < day_ts + 86400:
+                yield sid, anchor
+
+
+def _session_decision(hist: CandleReplay, db, symbol: str, session_id: str, anchor_ts: int) -> None:
+    """The 15M decision for one session, written like kabroda_mas_flow's."""
+    lock_ts = anchor_ts + 1800
+    raw = {tf: hist.window(tf, lock_ts, PACKET_LIMITS[tf]) for tf in TF_SECONDS}
+    if not raw["5M"]:
+        return
+    fuel = battlebox_pipeline._build_fuel_gauge(raw["1H"], raw["4H"], raw["15M"])
+    harmonic = battlebox_pipeline._calculate_harmonic_matrix(raw["1H"], raw["4H"])
+    pkt = battlebox_pipeline._compute_sse_packet(
+        raw["5M"], anchor_ts,
+        battlebox_pipeline._calculate_weekly_force(raw["1D"]),
+        battlebox_pipeline._calculate_168h_micro_bias(raw["1H"]),
+        fuel, {}, {}, harmonic, [], {}, raw_daily=raw["1D"],
+    )
+    if "error" in pkt:
+        return
+    levels = pkt["levels"]
+    mtf = battlebox_pipeline._compute_mtf_structural_snapshot(raw["1H"], raw["4H"], raw["1D"], float(raw["5M"][-1]["close"]), None)
+
+    date_key = _utc(anchor_ts).strftime("%Y-%m-%d")
+    expires = kabroda_mas_flow._compute_session_expires_at(session_id, date_key)
+    next_open = ledger_closing_engine._next_session_open_utc(expires)
+    anchor_price = next(c["open"] for c in raw["5M"] if c["time"] >= anchor_ts)
+    radar = market_simulator.radar_verdict(symbol, anchor_price, levels)
+
+    # One and done: the first breach of either trigger before the close decides.
+    bo, bd = float(levels.get("breakout_trigger", 0)), float(levels.get("breakdown_trigger", 0))
+    lo, hi = hist.span(lock_ts, _epoch(expires))
+    m5 = hist.bars["5M"]
+    breach = (m5.h[lo:hi] >= bo) | (m5.l[lo:hi] <= bd)
+    side = None
+    if breach.any():
+        trig = lo + int(breach.argmax())
+        side = "LONG" if m5.h[trig] >= bo else "SHORT"
+
+    g = unified_audit_writer.gauge
+    jewel, tf1h, tf4h = fuel.get("15M_JEWEL", {}), fuel.get("1H", {}), fuel.get("4H", {})
+    gauges = [x for x in [
+        g("15M", "energy_status", harmonic.get("1h_fuel_status")),
+        g("15M", "kinematic_grade", jewel.get("kinematic_grade")),
+        g("15M", "bbwp", jewel.get("bbwp")),
+        g("15M", "bbwp_state", jewel.get("bbwp_state")),
+        g("15M", "pmarp", jewel.get("pmarp")),
+        g("15M", "pmarp_state", jewel.get("pmarp_state")),
+        g("1H", "trend", tf1h.get("trend")),
+        g("1H", "rsi", tf1h.get("rsi")),
+        g("4H", "trend", tf4h.get("trend")),
+        g("4H", "rsi", tf4h.get("rsi")),
+        g("4H", "macd_hist", tf4h.get("macd_hist")),
+        g("Daily", "daily_21ema_direction", mtf.get("daily_21ema_direction")),
+        g("15M", "radar_tier", radar[side]["tier"] if side else None),
+    ] if x]
+    decided_at = _utc(lock_ts)
+    common = dict(symbol=symbol, decision_timeframe="15M", date_key=date_key, decided_at=decided_at,
+                  session_id=session_id, candle_window_start=_utc(anchor_ts), candle_window_end=decided_at,
+                  gauge_readings=gauges)
+    atr = levels.get("atr")
+
+    plan = radar[side]["plan"] if side else None
+    if not plan or not plan["valid"]:
+        unified_audit_writer.write_decision_log(
+            decision_type="STAND_DOWN", stand_down_reason="RADAR_STAND_DOWN" if side else "NO_TRIGGER", **common)
+        return
+
+    t1, t2, t3 = (round(t, 2) for t in plan["targets"])
+    trade = SimpleNamespace(bias=side, entry_price=round(plan["entry"], 2), stop_loss=round(plan["stop"], 2), t1=t1)
+    unified_audit_writer.write_decision_log(
+        decision_type="TRADE", bias=side, entry_price=trade.entry_price, stop_loss=trade.stop_loss,
+        t1=t1, t2=t2, t3=t3,
+        atr_pct_at_decision=round(float(atr) / trade.entry_price * 100.0, 4) if atr and trade.entry_price else None,
+        **common)
+    # Phase 2: filled on the trigger bar, resolved from the next bar until the next session open.
+    next_open_ts = _epoch(next_open)
+    status, r = _resolve(trade, hist.lifecycle_candles(int(m5.t[trig]) + TF_SECONDS["5M"], next_open_ts),
+                         hist.covers(next_open_ts))
+    if status:
+        # write_decision_log returns no id; this worker is the DB's only writer.
+        row = db.query(DecisionLog).order_by(DecisionLog.id.desc()).first()
+        row.outcome_status, row.realized_r = status, r
+        db.commit()
+
+
+def _run_chunk(symbol: str, session_ids: List[str], tick_minutes: int, chunk_start: str, chunk_days: int) -> Dict[str, Any]:
+    """Replay one chunk against a private in-memory DB; return its decision rows."""
+    hist = _HISTORY
+    start_ts = _epoch(datetime.strptime(chunk_start, "%Y-%m-%d"))
+    end_ts = start_ts + chunk_days * 86400
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=_REPLAY_TABLES)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    try:
+        with _replay_env(factory, _QUIET):
+            for ts in range(start_ts - WARMUP_DAYS * 86400 + TICK_OFFSET, start_ts, WARMUP_TICK):
+                _gravity_tick(hist, db, symbol, ts, detect=False)
+            for ts in range(start_ts + TICK_OFFSET, end_ts, tick_minutes * 60):
+                _gravity_tick(hist, db, symbol, ts, detect=True)
+            _close_candidates(hist, db)
+            for day_ts in range(start_ts, end_ts, 86400):
+                for sid, anchor_ts in _session_locks(session_ids, day_ts):
+                    _session_decision(hist, db, symbol, sid, anchor_ts)
+
+        lo, hi = _utc(start_ts).replace(tzinfo=None), _utc(end_ts).replace(tzinfo=None)
+        rows = (db.query(DecisionLog)
+                .filter(DecisionLog.decided_at >= lo, DecisionLog.decided_at < hi)
+                .order_by(DecisionLog.decided_at, DecisionLog.decision_timeframe, DecisionLog.id).all())
+        gauges: Dict[int, list] = {}
+        for gr in db.query(DecisionGaugeReading).order_by(DecisionGaugeReading.id).all():
+            gauges.setdefault(gr.decision_id, []).append(
+                (gr.timeframe, gr.gauge_name, gr.value_numeric, gr.value_label))
+        decisions = [
+            {**{f: getattr(r, f) for f in _DECISION_FIELDS}, "campaign_log_id": None, "gauges": gauges.get(r.id, [])}
+            for r in rows
+        ]
+    finally:
+        db.close()
+        engine.dispose()
+    return {"chunk_start": chunk_start, "decisions": decisions}
+
+
+# ---------------------------------------------------------------------------
+# DRIVER
+# ---------------------------------------------------------------------------
+def _run_key(config: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _save_chunk(factory, run_key: str, result: Dict[str, Any]) -> None:
+    """Decision rows + the progress row in one transaction: the checkpoint."""
+    db = factory()
+    try:
+        for d in result["decisions"]:
+            row = DecisionLog(**{f: d[f] for f in _DECISION_FIELDS})
+            db.add(row)
+            db.flush()
+            for tf, name, num, label in d["gauges"]:
+                db.add(DecisionGaugeReading(decision_id=row.id, timeframe=tf, gauge_name=name,
+                                            value_numeric=num, value_label=label))
+        db.execute(walk_forward_progress.insert().values(
+            run_key=run_key, chunk_start=result["chunk_start"], decisions=len(result["decisions"]),
+            completed_at=datetime.utcnow()))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def run_walk_forward(
+    symbol: str,
+    start: str,
+    end: str,
+    session_ids: Iterable[str] = ("us_ny_futures",),
+    results_url: Optional[str] = None,
+    source_url: Optional[str] = None,
+    chunk_days: int = 7,
+    tick_minutes: int = 15,
+    workers: Optional[int] = None,
+    quiet: bool = True,
+) -> Dict[str, Any]:
+    """Replay [start, end) (UTC dates) and write decisions to results_url.
+    Resumable: finished chunks of the same run are skipped."""
+    session_ids = sorted(set(session_ids))
+    known = {s["id"] for s in session_manager.SESSION_CONFIGS}
+    if not session_ids or set(session_ids) - known:
+        raise ValueError(f"session_ids must be from {sorted(known)}")
+    if chunk_days < 1 or tick_minutes < 5 or tick_minutes % 5:
+        raise ValueError("chunk_days must be >= 1 and tick_minutes a multiple of 5")
+    start_dt = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    end_dt = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    if end_dt <= start_dt:
+        raise ValueError("end must be after start")
+
+    config = {"symbol": symbol, "start": start, "sessions": session_ids, "chunk_days": chunk_days,
+              "tick_minutes": tick_minutes}
+    run_key = _run_key(config)
+    engine = create_engine(results_url or RESULTS_URL)
+    Base.metadata.create_all(engine, tables=[DecisionLog.__table__, DecisionGaugeReading.__table__])
+    _META.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    with engine.begin() as conn:
+        other = conn.execute(select(walk_forward_runs.c.run_key).where(walk_forward_runs.c.run_key != run_key)).first()
+        if other:
+            raise ValueError(f"results DB already holds run {other[0]}; use a separate --results database per run")
+        if not conn.execute(select(walk_forward_runs.c.run_key)).first():
+            conn.execute(walk_forward_runs.insert().values(
+                run_key=run_key, config=json.dumps(config, sort_keys=True), created_at=datetime.utcnow()))
+        done = {r[0] for r in conn.execute(
+            select(walk_forward_progress.c.chunk_start).where(walk_forward_progress.c.run_key == run_key))}
+
+    chunks = []
+    day = start_dt
+    while day < end_dt:
+        chunks.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=chunk_days)
+    todo = [c for c in chunks if c not in done]
+    summary = {"run_key": run_key, "chunks": len(chunks), "skipped": len(chunks) - len(todo), "decisions": 0}
+    if not todo:
+        engine.dispose()
+        return summary
+
+    history = load_history(symbol, start_dt, day, source_url)
+    args = [(symbol, session_ids, tick_minutes, c, chunk_days) for c in todo]
+    n_workers = max(1, min(workers or WORKERS, len(todo)))
+    print(f"[WALK FORWARD] run {run_key}: {len(todo)}/{len(chunks)} chunks on {n_workers} worker(s)")
+
+    def _record(result):
+        _save_chunk(factory, run_key, result)
+        summary["decisions"] += len(result["decisions"])
+        print(f"[WALK FORWARD] chunk {result['chunk_start']} done ({len(result['decisions'])} decisions)")
+
+    try:
+        if n_workers == 1:
+            _init_worker(history, quiet)
+            for a in args:
+                _record(_run_chunk(*a))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(history, quiet),
+            ) as pool:
+                for fut in as_completed([pool.submit(_run_chunk, *a) for a in args]):
+                    _record(fut.result())
+    finally:
+        engine.dispose()
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Walk-forward replay of stored candles through the live decision rules.")
+    ap.add_argument("--symbol", default="BTC/USDT")
+    ap.add_argument("--start", required=True, help="first UTC date, YYYY-MM-DD")
+    ap.add_argument("--end", required=True, help="UTC date to stop before, YYYY-MM-DD")
+    ap.add_argument("--sessions", default="us_ny_futures", help="comma-separated session ids")
+    ap.add_argument("--results", default=None, help=f"results DB URL (default {RESULTS_URL})")
+    ap.add_argument("--source", default=None, help="candle_history DB URL (default DATABASE_URL)")
+    ap.add_argument("--chunk-days", type=int, default=7)
+    ap.add_argument("--tick-minutes", type=int, default=15)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--verbose", action="store_true", help="keep the replayed modules' console output")
+    a = ap.parse_args(argv)
+    summary = run_walk_forward(
+        a.symbol, a.start, a.end, a.sessions.split(","), results_url=a.results, source_url=a.source,
+        chunk_days=a.chunk_days, tick_minutes=a.tick_minutes, workers=a.workers, quiet=not a.verbose,
+    )
+    print(f"[WALK FORWARD] {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ import logging
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
+import agent_core
+import telemetry_queue
 from database import SessionLocal, JewelSnapshotLog, AgentRunLog
 from mtf_confluence_scanner import run_mtf_confluence_scan
 
@@ -57,9 +59,9 @@ def _log_run(
     status: str,
     error_message: Optional[str] = None,
 ) -> None:
-    db = SessionLocal()
     try:
-        db.add(AgentRunLog(
+        telemetry_queue.enqueue(
+            AgentRunLog,
             agent_name="jewel_specialist",
             model="n/a",
             triggered_by=session_label,
@@ -70,12 +72,10 @@ def _log_run(
             estimated_cost_usd=0.0,
             status=status,
             error_message=error_message,
-        ))
-        db.commit()
+        )
     except Exception as e:
-        logger.error(f"[JEWEL] agent_run_log write failed: {e}")
-    finally:
-        db.close()
+        logger.error(f"[JEWEL] agent_run_log enqueue failed: {e}")
+    agent_core.record_agent_run("jewel_specialist", 0.0, status)
 
 
 async def run_jewel_snapshot(
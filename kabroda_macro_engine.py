@@ -4,98 +4,126 @@
 # Purpose: Autonomous Macro Elliott Wave Scanner & State Latch
 # AUDIT FIX: Phase 1 (ZigZag Matrix) integrated with Phase 2 (Axiom Validator).
 # Enforces strict Elliott Wave rules on structural pivots to map pure sequences.
+# Incremental: the daily series and ZigZag state persist between runs (see
+# "Persisted daily history" below), so a refresh fetches only new bars.
 # ==============================================================================
 
 import asyncio
+import json
+import time
 from datetime import datetime, timezone
-from typing import List, Dict, Any
-import ccxt.async_support as ccxt
-from database import SessionLocal, GravityMemory
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import func
+import fetch_scheduler
+from database import SessionLocal, GravityMemory, MacroDailyCandle, MacroEngineState
+from market_data import TARGETS
 
-TARGETS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+WINDOW_DAYS = 1500
+DEVIATION_PCT = 0.20
+_DAY = 86400
+_HISTORY_MARGIN_DAYS = 30  # closed bars kept beyond the window before pruning
 
-# Single Source of Truth: SPOT Market
-_exchange = ccxt.mexc({
-    "enableRateLimit": True
-})
-
-async def fetch_historical_daily_macro(symbol: str, target_days: int = 1500) -> List[Dict[str, Any]]:
+async def fetch_historical_daily_macro(symbol: str, target_days: int = 1500, since_ms: Optional[int] = None) -> List[Dict[str, Any]]:
     limit_per_call = 1000  
     all_candles = []
     
-    now_ts = int(datetime.now(timezone.utc).timestamp() * 1000)
-    since_ts = now_ts - (target_days * 86400 * 1000)
+    if since_ms is None:
+        now_ts = int(datetime.now(timezone.utc).timestamp() * 1000)
+        since_ms = now_ts - (target_days * 86400 * 1000)
+    since_ts = since_ms
     
     while len(all_candles) < target_days:
         try:
-            rows = await _exchange.fetch_ohlcv(symbol, "1d", since=since_ts, limit=limit_per_call)
+            # Single Source of Truth: SPOT Market. Pagination is paced by the
+            # MEXC fetch budget rather than a fixed per-page sleep.
+            rows = await fetch_scheduler.call(
+                "mexc", "fetch_ohlcv", symbol, "1d", since=since_ts, limit=limit_per_call,
+                symbol=symbol, priority=fetch_scheduler.PRIORITY_BACKGROUND,
+            )
             if not rows: break 
                 
             formatted = [{"time": int(r[0] / 1000), "high": float(r[2]), "low": float(r[3]), "close": float(r[4])} for r in rows]
             all_candles.extend(formatted)
             since_ts = int(rows[-1][0]) + 1
-            await asyncio.sleep(0.5)
+            if len(rows) < limit_per_call: break  # caught up to the live bar
         except Exception as e:
             print(f"Macro Pagination Error for {symbol}: {e}")
             break
             
     return all_candles[-target_days:]
 
-def _calculate_zigzag_pivots(candles: List[Dict[str, Any]], deviation_pct: float = 0.20) -> List[Dict[str, Any]]:
-    """Phase 1: Strips daily noise. Returns pure 20% structural pivots."""
-    if not candles: return []
+# ── Phase 1: resumable ZigZag ──────────────────────────────────────────────
+# The state machine is a plain dict (JSON-persisted in macro_engine_state) so
+# a refresh feeds it only the bars after state["last_time"]. Pivots carry the
+# candle open time instead of a list index, so they stay valid as the window
+# slides forward.
 
-    pivots = []
-    current_trend = 1 
-    extreme_price = candles[0]["high"]
-    extreme_idx = 0
+def _new_zigzag(first: Dict[str, Any]) -> Dict[str, Any]:
+    return {"trend": 1, "extreme_price": first["high"], "extreme_time": first["time"], "last_time": None, "pivots": []}
 
-    for i, c in enumerate(candles):
+def _advance_zigzag(state: Dict[str, Any], candles: List[Dict[str, Any]], deviation_pct: float = DEVIATION_PCT) -> int:
+    """Feed bars newer than state["last_time"]; returns how many pivots confirmed."""
+    last = state["last_time"]
+    added = 0
+    for c in candles:
+        t = c["time"]
+        if last is not None and t <= last:
+            continue
         high = c["high"]
         low = c["low"]
 
-        if current_trend == 1: 
-            if high > extreme_price:
-                extreme_price = high
-                extreme_idx = i
-            elif low < extreme_price * (1 - deviation_pct):
-                pivots.append({"type": "PEAK", "price": extreme_price, "abs_idx": extreme_idx})
-                current_trend = -1
-                extreme_price = low
-                extreme_idx = i
-
-        elif current_trend == -1: 
-            if low < extreme_price:
-                extreme_price = low
-                extreme_idx = i
-            elif high > extreme_price * (1 + deviation_pct):
-                pivots.append({"type": "TROUGH", "price": extreme_price, "abs_idx": extreme_idx})
-                current_trend = 1
-                extreme_price = high
-                extreme_idx = i
-    
-    return pivots
+        if state["trend"] == 1: 
+            if high > state["extreme_price"]:
+                state["extreme_price"] = high
+                state["extreme_time"] = t
+            elif low < state["extreme_price"] * (1 - deviation_pct):
+                state["pivots"].append({"type": "PEAK", "price": state["extreme_price"], "time": state["extreme_time"]})
+                state["trend"] = -1
+                state["extreme_price"] = low
+                state["extreme_time"] = t
+                added += 1
+
+        elif state["trend"] == -1: 
+            if low < state["extreme_price"]:
+                state["extreme_price"] = low
+                state["extreme_time"] = t
+            elif high > state["extreme_price"] * (1 + deviation_pct):
+                state["pivots"].append({"type": "TROUGH", "price": state["extreme_price"], "time": state["extreme_time"]})
+                state["trend"] = 1
+                state["extreme_price"] = high
+                state["extreme_time"] = t
+                added += 1
+        last = t
+    state["last_time"] = last
+    return added
+
+def _calculate_zigzag_pivots(candles: List[Dict[str, Any]], deviation_pct: float = 0.20) -> List[Dict[str, Any]]:
+    """Phase 1: Strips daily noise. Returns pure 20% structural pivots."""
+    if not candles: return []
+    state = _new_zigzag(candles[0])
+    _advance_zigzag(state, candles, deviation_pct)
+    return state["pivots"]
 
-def _find_macro_anchors(candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _cycle_extremes(candles: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(origin, top): highest high of the window and the lowest low at or before it."""
+    top_i = max(range(len(candles)), key=lambda i: candles[i]["high"])
+    origin_i = min(range(top_i + 1), key=lambda i: candles[i]["low"])
+    return candles[origin_i], candles[top_i]
+
+def _find_macro_anchors(candles: List[Dict[str, Any]], pivots: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     if not candles: return []
-    
-    for i, c in enumerate(candles):
-        c["abs_idx"] = i
 
-    # Phase 1: Raw Pivots
-    raw_pivots = _calculate_zigzag_pivots(candles, deviation_pct=0.20)
+    # Phase 1: Raw Pivots (precomputed by the incremental scan when given)
+    raw_pivots = pivots if pivots is not None else _calculate_zigzag_pivots(candles, deviation_pct=DEVIATION_PCT)
     
     if len(raw_pivots) < 4: return [] # Need structure to map waves
 
     # Absolute Extremes (Wave 0 and Wave 5)
-    highest_candle = max(candles, key=lambda c: c["high"])
-    cycle_top_price = highest_candle["high"]
-    top_idx = highest_candle["abs_idx"]
-    
-    pre_top_candles = candles[:top_idx+1]
-    lowest_candle = min(pre_top_candles, key=lambda c: c["low"])
-    cycle_origin_price = lowest_candle["low"]
-    origin_idx = lowest_candle["abs_idx"]
+    origin_candle, top_candle = _cycle_extremes(candles)
+    cycle_top_price = top_candle["high"]
+    top_t = top_candle["time"]
+    cycle_origin_price = origin_candle["low"]
+    origin_t = origin_candle["time"]
 
     anchors = [
         {"type": "CYCLE_ORIGIN", "price": cycle_origin_price},
@@ -103,7 +131,7 @@ def _find_macro_anchors(candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     ]
 
     # --- Phase 2: Elliott Wave Axiom Validator (Bull Run) ---
-    bull_pivots = [p for p in raw_pivots if origin_idx < p["abs_idx"] < top_idx]
+    bull_pivots = [p for p in raw_pivots if origin_t < p["time"] < top_t]
     peaks = [p for p in bull_pivots if p["type"] == "PEAK"]
     troughs = [p for p in bull_pivots if p["type"] == "TROUGH"]
 
@@ -116,17 +144,17 @@ def _find_macro_anchors(candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             w4 = min(upper_troughs, key=lambda t: t["price"])
             
             # Axiom 2: Find W3 (Highest peak before W4)
-            valid_w3 = [p for p in peaks if p["abs_idx"] < w4["abs_idx"]]
+            valid_w3 = [p for p in peaks if p["time"] < w4["time"]]
             if valid_w3:
                 w3 = max(valid_w3, key=lambda p: p["price"])
                 
                 # Axiom 3: Find W2 (Lowest trough before W3)
-                valid_w2 = [t for t in troughs if t["abs_idx"] < w3["abs_idx"]]
+                valid_w2 = [t for t in troughs if t["time"] < w3["time"]]
                 if valid_w2:
                     w2 = min(valid_w2, key=lambda t: t["price"])
                     
                     # Axiom 4: Find W1 (Highest peak before W2)
-                    valid_w1 = [p for p in peaks if p["abs_idx"] < w2["abs_idx"]]
+                    valid_w1 = [p for p in peaks if p["time"] < w2["time"]]
                     if valid_w1:
                         w1 = max(valid_w1, key=lambda p: p["price"])
                         
@@ -142,7 +170,7 @@ def _find_macro_anchors(candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                             ])
 
     # --- Phase 2: Elliott Wave Axiom Validator (Bear Run) ---
-    bear_pivots = [p for p in raw_pivots if p["abs_idx"] > top_idx]
+    bear_pivots = [p for p in raw_pivots if p["time"] > top_t]
     bear_peaks = [p for p in bear_pivots if p["type"] == "PEAK"]
     bear_troughs = [p for p in bear_pivots if p["type"] == "TROUGH"]
 
@@ -152,17 +180,17 @@ def _find_macro_anchors(candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         anchors.append({"type": "BEAR_WAVE_3_LOW", "price": bear_w3["price"]})
 
         # Bear W4 is the highest bounce AFTER W3
-        valid_w4 = [p for p in bear_peaks if p["abs_idx"] > bear_w3["abs_idx"]]
+        valid_w4 = [p for p in bear_peaks if p["time"] > bear_w3["time"]]
         if valid_w4:
             bear_w4 = max(valid_w4, key=lambda p: p["price"])
             anchors.append({"type": "BEAR_WAVE_4_BOUNCE", "price": bear_w4["price"]})
 
         # Bear W1 & W2 (Before W3)
-        valid_w2 = [p for p in bear_peaks if p["abs_idx"] < bear_w3["abs_idx"]]
+        valid_w2 = [p for p in bear_peaks if p["time"] < bear_w3["time"]]
         if valid_w2:
             bear_w2 = max(valid_w2, key=lambda p: p["price"])
             
-            valid_w1 = [t for t in bear_troughs if t["abs_idx"] < bear_w2["abs_idx"]]
+            valid_w1 = [t for t in bear_troughs if t["time"] < bear_w2["time"]]
             if valid_w1:
                 bear_w1 = min(valid_w1, key=lambda t: t["price"])
                 
@@ -204,14 +232,100 @@ def _compute_weekly_200sma(daily_candles: List[Dict[str, Any]]) -> float:
     return sum(sorted_closes[-200:]) / 200.0
 
 
+# ── Persisted daily history ────────────────────────────────────────────────
+# Closed bars live in macro_daily_candles; a refresh fetches only the bars
+# after the newest stored one (normally a single MEXC call returning the
+# just-closed day plus today's forming bar). The forming bar is never stored
+# or fed to the persisted ZigZag -- it joins each scan transiently, exactly as
+# the full paginated fetch used to include it.
+
+async def _sync_daily_history(db, symbol: str, db_sym: str, target_days: int = WINDOW_DAYS) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """(closed bars oldest-first, forming bar or None) after pulling new bars."""
+    last_time = db.query(func.max(MacroDailyCandle.time)).filter(MacroDailyCandle.symbol == db_sym).scalar()
+    if last_time is None:
+        rows = await fetch_historical_daily_macro(symbol, target_days=target_days)
+    else:
+        rows = await fetch_historical_daily_macro(symbol, target_days=target_days, since_ms=(last_time + _DAY) * 1000)
+
+    now_s = int(time.time())
+    forming = rows[-1] if rows and rows[-1]["time"] + _DAY > now_s else None
+    new_closed = [r for r in rows if r["time"] + _DAY <= now_s and (last_time is None or r["time"] > last_time)]
+    for r in new_closed:
+        db.add(MacroDailyCandle(symbol=db_sym, time=r["time"], high=r["high"], low=r["low"], close=r["close"]))
+    if new_closed:
+        keep_from = new_closed[-1]["time"] - (target_days + _HISTORY_MARGIN_DAYS) * _DAY
+        db.query(MacroDailyCandle).filter(
+            MacroDailyCandle.symbol == db_sym, MacroDailyCandle.time < keep_from
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    stored = (
+        db.query(MacroDailyCandle.time, MacroDailyCandle.high, MacroDailyCandle.low, MacroDailyCandle.close)
+        .filter(MacroDailyCandle.symbol == db_sym)
+        .order_by(MacroDailyCandle.time.desc())
+        .limit(target_days)
+        .all()
+    )
+    history = [{"time": r.time, "high": r.high, "low": r.low, "close": r.close} for r in reversed(stored)]
+    print(f"|| MACRO HISTORY || {db_sym} | {len(new_closed)} new closed bars, {len(history)} stored")
+    return history, forming
+
+
+def _anchor_signature(window: List[Dict[str, Any]], pivots: List[Dict[str, Any]]) -> str:
+    """Everything the axiom validator reads: if it is unchanged, so are the anchors."""
+    origin, top = _cycle_extremes(window)
+    last_pivot = pivots[-1]["time"] if pivots else None
+    return f"{len(pivots)}:{last_pivot}:{origin['time']}:{origin['low']}:{top['time']}:{top['high']}"
+
+
+def _scan_symbol(db, db_sym: str, history: List[Dict[str, Any]], forming: Optional[Dict[str, Any]], target_days: int = WINDOW_DAYS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], bool]:
+    """(anchors, window, changed). Resumes the stored ZigZag over new closed bars
+    and re-runs the axiom validator only when its inputs moved."""
+    row = db.get(MacroEngineState, db_sym)
+    state = json.loads(row.zigzag_state) if row is not None else None
+    if state is None or state["last_time"] is None:
+        state = _new_zigzag(history[0])
+    confirmed = _advance_zigzag(state, history)
+    state["pivots"] = [p for p in state["pivots"] if p["time"] >= history[0]["time"]]
+
+    window = (history + [forming])[-target_days:] if forming else history[-target_days:]
+    probe = dict(state, pivots=list(state["pivots"]))  # forming bar only touches a copy
+    if forming:
+        _advance_zigzag(probe, [forming])
+    win_pivots = [p for p in probe["pivots"] if p["time"] >= window[0]["time"]]
+
+    signature = _anchor_signature(window, win_pivots)
+    changed = row is None or row.anchor_signature != signature or row.anchors is None
+    if changed:
+        anchors = _find_macro_anchors(window, pivots=win_pivots)
+    else:
+        anchors = json.loads(row.anchors)
+    if confirmed:
+        print(f"|| MACRO ZIGZAG || {db_sym} | {confirmed} new confirmed pivot(s)")
+
+    if row is None:
+        row = MacroEngineState(symbol=db_sym)
+        db.add(row)
+    row.zigzag_state = json.dumps(state)
+    row.anchors = json.dumps(anchors)
+    row.anchor_signature = signature
+    row.updated_at = datetime.utcnow()
+    db.commit()
+    return anchors, window, changed
+
+
 async def run_macro_scan():
     print(">>> MACRO ENGINE: Scanning multi-year SPOT structural anchors (AXIOM VALIDATOR)...")
     db = SessionLocal()
     try:
         for symbol in TARGETS:
             db_sym = symbol.replace("/", "")
-            daily_data = await fetch_historical_daily_macro(symbol, target_days=1500)
-            anchors = _find_macro_anchors(daily_data)
+            started = time.perf_counter()
+            history, forming = await _sync_daily_history(db, symbol, db_sym)
+            if not history:
+                print(f"|| MACRO ENGINE WARNING || {db_sym} | No daily history. Skipping.")
+                continue
+            anchors, daily_data, changed = _scan_symbol(db, db_sym, history, forming)
             
             if len(anchors) < 2:
                 print(f"|| MACRO ENGINE WARNING || {db_sym} | Insufficient data. Skipping.")
@@ -219,25 +333,28 @@ async def run_macro_scan():
 
             now_utc = datetime.now(timezone.utc)
             
-            db.query(GravityMemory).filter(
-                GravityMemory.symbol == db_sym,
-                GravityMemory.source == "MACRO_ENGINE_CLASS_0"
-            ).delete()
-            
-            for anchor in anchors:
-                mem = GravityMemory(
-                    symbol=db_sym, 
-                    timestamp=now_utc, 
-                    source="MACRO_ENGINE_CLASS_0",
-                    level_type=anchor["type"], 
-                    price=anchor["price"],
-                    permanence_class=0, 
-                    heat_multiplier=15.0 
-                )
-                db.add(mem)
-            
-            db.commit()
-            print(f"|| MACRO ANCHORS LOCKED (SPOT) || {db_sym} | Exact Waves Mapped: {len(anchors)}")
+            if changed:
+                db.query(GravityMemory).filter(
+                    GravityMemory.symbol == db_sym,
+                    GravityMemory.source == "MACRO_ENGINE_CLASS_0"
+                ).delete()
+                
+                for anchor in anchors:
+                    mem = GravityMemory(
+                        symbol=db_sym, 
+                        timestamp=now_utc, 
+                        source="MACRO_ENGINE_CLASS_0",
+                        level_type=anchor["type"], 
+                        price=anchor["price"],
+                        permanence_class=0, 
+                        heat_multiplier=15.0 
+                    )
+                    db.add(mem)
+                
+                db.commit()
+                print(f"|| MACRO ANCHORS LOCKED (SPOT) || {db_sym} | Exact Waves Mapped: {len(anchors)}")
+            else:
+                print(f"|| MACRO ANCHORS UNCHANGED || {db_sym} | {len(anchors)} anchors still valid")
 
             # ── WEEKLY 200 SMA (stored as active=False so KDE ignores it) ──
             # Queried by _fetch_weekly_200sma() in battlebox_pipeline at lock time.
@@ -263,11 +380,13 @@ async def run_macro_scan():
             except Exception as sma_err:
                 print(f"|| WEEKLY 200 SMA ERROR || {db_sym}: {sma_err}")
 
+            print(f"|| MACRO ENGINE || {db_sym} | refreshed in {(time.perf_counter() - started) * 1000:.0f}ms")
+
     except Exception as e:
         print(f"Macro Engine Error: {e}")
     finally:
         db.close()
-        await _exchange.close()
+        await fetch_scheduler.close_all()
 
 if __name__ == "__main__":
     asyncio.run(run_macro_scan())
\ No newline at end of file
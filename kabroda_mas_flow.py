@@ -20,11 +20,11 @@ import pytz
 from pydantic import BaseModel, Field
 
 import agent_core
-import gravity_interpreter
 import junior_analyst
-import mtf_interpreter
-import publisher_crew
+import startup_profile
+import telemetry_queue
 import trade_structure_analyst
+
 from database import (
     SessionLocal,
     CampaignLog,
@@ -35,6 +35,11 @@ from database import (
     InterpreterLog,
 )
 
+# Bucket B interpreters and the publisher only run once per session lock.
+gravity_interpreter = startup_profile.lazy_module("gravity_interpreter")
+mtf_interpreter = startup_profile.lazy_module("mtf_interpreter")
+publisher_crew = startup_profile.lazy_module("publisher_crew")
+
 
 # ==============================================================================
 # SECTION 1 — PYDANTIC SCHEMAS (UNCHANGED FROM ORIGINAL)
@@ -1157,6 +1162,8 @@ def _write_narrative_log(
     Wave fields remain NULL — filled by Elliott Wave Specialist in Phase 3B.
     narrative_text = Part 1 paragraph extracted from the agent response.
     tactical_text  = brief.tactical_brief (Part 2 execution directive).
+    Written synchronously, not via telemetry_queue: this row is the Senior
+    Analyst dedup key, so it must exist before the run returns.
     """
     db = SessionLocal()
     try:
@@ -1193,19 +1200,15 @@ def _log_interpreter(
     Writes a row even on fail-open (output_text=None, ran_successfully=False)
     so absences are auditable. Fail-safe: caller wraps in try/except.
     """
-    db = SessionLocal()
-    try:
-        db.add(InterpreterLog(
-            symbol=symbol,
-            session_date=session_date,
-            session_id=session_id,
-            interpreter_name=name,
-            output_text=output_text,
-            ran_successfully=output_text is not None,
-        ))
-        db.commit()
-    finally:
-        db.close()
+    telemetry_queue.enqueue(
+        InterpreterLog,
+        symbol=symbol,
+        session_date=session_date,
+        session_id=session_id,
+        interpreter_name=name,
+        output_text=output_text,
+        ran_successfully=output_text is not None,
+    )
 
 
 def run_mas_analysis(
@@ -5,6 +5,7 @@
 # Phase 4 candidate monitoring — 2026-06-30
 # Phase 3B shadow runner tracking (15M, EMA-based) — 2026-07-06
 # Phase 4B shadow runner tracking (4H/1H, zone-based) — 2026-07-07
+# Stop/T1 resolution moved to execution_kernel (shared with the simulator) — 2026-10-18
 #
 # Six-phase state machine (four real phases + two shadow/record-only phases).
 #
@@ -21,7 +22,9 @@
 #   the NEXT session open (next day 8:30 AM ET) without resolution. The 3 PM
 #   session_expires_at is the Phase 1 entry-window boundary only.
 #
-#   Stop-first rule on same-candle ambiguity (conservative). At 1m granularity
+#   Stop-first rule on same-candle ambiguity (conservative), applied by
+#   execution_kernel.resolve_candles -- the same resolver and tie rule the
+#   market simulator's backtests use. At 1m granularity
 #   this requires a ~$1,690 intrabar range for BTC at current levels — rare.
 #
 #   Genuinely-unresolved case (neither stop nor T1 hit by next session open):
@@ -71,9 +74,11 @@ from datetime import datetime, timedelta, timezone
 import traceback
 from typing import Optional
 
-import ccxt.async_support as ccxt
-
-from database import CampaignLog, GravityMemory, SessionLocal
+import fetch_scheduler
+import db_locks
+import execution_kernel
+import replay_clock
+from database import CampaignLog, GravityMemory, SessionLocal, defer_heavy
 from session_manager import anchor_ts_for_utc_date, get_session_config
 import notify
 
@@ -83,11 +88,9 @@ from monitoring.exhaustion_monitor import check_exhaustion
 # 5m candle cache for exhaustion monitor — refreshed every 5 min per symbol
 # to avoid redundant Kraken calls while giving PMARP/BBWP enough history.
 import market_data
-_exhaustion_5m_cache: dict = {}  # symbol -> {"candles": [...], "refreshed_at": float}
+import cache_backend
 _EXHAUSTION_CACHE_TTL = 300.0  # 5 minutes
-
-_ticker_exchange = ccxt.mexc({"enableRateLimit": True})
-_ohlc_exchange   = ccxt.kraken({"enableRateLimit": True})
+_exhaustion_5m_cache = cache_backend.get_cache("exhaustion_5m", max_entries=32, ttl=_EXHAUSTION_CACHE_TTL)  # symbol -> candles
 
 _TARGET_RANK = {"T1": 1, "T2": 2, "T3": 3}
 
@@ -96,7 +99,7 @@ async def _get_live_price(symbol: str) -> float:
     """MEXC snapshot — Phase 1 entry detection and Phase 3 T2/T3 observation only."""
     try:
         fmt = symbol if "/" in symbol else symbol.replace("USDT", "/USDT")
-        ticker = await _ticker_exchange.fetch_ticker(fmt)
+        ticker = await fetch_scheduler.call("mexc", "fetch_ticker", fmt, symbol=fmt)
         return float(ticker["last"])
     except Exception as e:
         print(f"|| LIFECYCLE || Price fetch error {symbol}: {e}")
@@ -111,7 +114,7 @@ async def _fetch_1m_since(symbol: str, since_ms: int, limit: int = 720) -> list:
     """
     try:
         fmt = symbol if "/" in symbol else symbol.replace("USDT", "/USDT")
-        rows = await _ohlc_exchange.fetch_ohlcv(fmt, "1m", since=since_ms, limit=limit)
+        rows = await fetch_scheduler.call("kraken", "fetch_ohlcv", fmt, "1m", since=since_ms, limit=limit, symbol=fmt)
         return [
             {"ts": int(r[0]), "o": float(r[1]), "h": float(r[2]),
              "l": float(r[3]), "c": float(r[4])}
@@ -163,11 +166,29 @@ def _frac_r(entry_price: float, stop_loss: float, exit_price: float, is_long: bo
     CLOSED_AT_EXPIRY branches (a zero-risk row is a data anomaly, not a
     real trading state -- this just prevents a crash, not a correct answer).
     """
-    risk = max(abs(entry_price - stop_loss), 0.01)
-    if risk <= 0.01:
+    if abs(entry_price - stop_loss) <= 0.01:
         print(f"|| LIFECYCLE || _frac_r: near-zero risk (entry={entry_price}, stop={stop_loss}) -- data anomaly, R floored.")
-    move = (exit_price - entry_price) if is_long else (entry_price - exit_price)
-    return round(move / risk, 4)
+    # Same formula the execution kernel applies to simulated exits.
+    return float(execution_kernel.frac_r(entry_price, stop_loss, exit_price, is_long))
+
+
+def _resolve_stop_t1(c: CampaignLog, candles: list):
+    """
+    Phase 2 / Phase 4 close check: first of stop or T1 across the scanned 1m
+    candles, resolved by execution_kernel (stop-first on the same candle).
+    Returns (outcome, candle_ts, realized_r, same_candle) with outcome
+    "STOP" / "T1", or (None, None, None, False) while the trade is still open.
+    """
+    res = execution_kernel.resolve_candles(
+        candles, c.bias == "LONG", c.entry_price, c.stop_loss, [c.t1], keys=("h", "l", "c"),
+    )
+    if res["exit_reason"] == "OPEN":
+        return None, None, None, False
+    candle_ts = datetime.fromtimestamp(candles[res["exit_idx"]]["ts"] / 1000, tz=timezone.utc)
+    if res["exit_reason"] == "STOP":
+        return "STOP", candle_ts, res["realized_r"], res["target_idx"][0] == res["stop_idx"]
+    # Same value as res["realized_r"]; _frac_r also logs a zero-risk anomaly.
+    return "T1", candle_ts, _frac_r(c.entry_price, c.stop_loss, c.t1, c.bias == "LONG"), False
 
 
 def _observe_targets(c: CampaignLog, live: float) -> bool:
@@ -279,16 +300,25 @@ def _notify_candidate_closed(c: CampaignLog) -> None:
 
 async def run_ledger_audit_loop():
     print(">>> TRADE-LIFECYCLE MONITOR: Initializing (W-9 engine, OHLC detection, Phase 4 candidates, Phase 3B shadow runner)...")
+    # Every fetch_scheduler call from this loop runs at PRIORITY_LIVE, so
+    # lifecycle checks jump background scan traffic.
+    fetch_scheduler.set_priority(fetch_scheduler.PRIORITY_LIVE)
 
     while True:
         # Health monitoring
         try:
             from main import scheduler_health_registry as _lhr
-            _lhr["ledger_closing"]["last_run"] = datetime.now(timezone.utc).isoformat()
+            _lhr["ledger_closing"]["last_run"] = replay_clock.now_utc().isoformat()
             _lhr["ledger_closing"]["status"] = "EXECUTING"
         except Exception:
             pass
-        now_utc = datetime.now(timezone.utc)
+        now_utc = replay_clock.now_utc()
+        # One lifecycle tick cluster-wide, so no campaign is filled/closed twice.
+        tick_lock = db_locks.DbLock("ledger_lifecycle", ttl=600)
+        if not await tick_lock.acquire_async(blocking=False):
+            print("|| LIFECYCLE MONITOR || Tick held by another process -- skipping")
+            await asyncio.sleep(60)
+            continue
         # Per-cycle price cache — avoids redundant API calls for same symbol (Phase 1/3)
         price_cache: dict = {}
         db = SessionLocal()
@@ -298,7 +328,7 @@ async def run_ledger_audit_loop():
             # Records that are APPROVED, open, and not yet filled.
             # session_expires_at IS NOT NULL guard: legacy rows (null expiry)
             # are skipped entirely until the Step 5 historical backfill.
-            pending = db.query(CampaignLog).filter(
+            pending = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.mas_approval_status == "APPROVED",
                 CampaignLog.closed_at.is_(None),
                 CampaignLog.entry_filled_at.is_(None),
@@ -358,7 +388,7 @@ async def run_ledger_audit_loop():
             # or until the next session open without resolution. The 3 PM ET
             # session_expires_at does NOT close filled trades — it is the Phase 1
             # entry-window boundary only. No more EXPIRED/null for filled rows.
-            active = db.query(CampaignLog).filter(
+            active = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.mas_approval_status == "APPROVED",
                 CampaignLog.closed_at.is_(None),
                 CampaignLog.entry_filled_at.isnot(None),
@@ -380,45 +410,33 @@ async def run_ledger_audit_loop():
                 if not candles:
                     continue
 
-                closed = False
-
-                # Scan chronologically. Stop-first on same-candle (conservative).
-                for candle in candles:
-                    if c.bias == "LONG":
-                        hit_stop = candle["l"] <= c.stop_loss
-                        hit_t1   = c.t1 is not None and candle["h"] >= c.t1
-                    else:
-                        hit_stop = candle["h"] >= c.stop_loss
-                        hit_t1   = c.t1 is not None and candle["l"] <= c.t1
-
-                    candle_ts = datetime.fromtimestamp(candle["ts"] / 1000, tz=timezone.utc)
-
-                    if hit_stop:
-                        c.status       = "CLOSED_LOSS"
-                        c.realized_pnl = -1.0
-                        c.target_hit   = "STOP"
-                        c.closed_at    = candle_ts
-                        closed = True
-                        tag = " (same-candle, stop wins)" if hit_t1 else ""
-                        print(f"|| LIFECYCLE P2 || {c.symbol} {c.bias} STOP{tag} {candle_ts}. -1R.")
-                        break
-
-                    if hit_t1:
-                        r = _frac_r(c.entry_price, c.stop_loss, c.t1, c.bias == "LONG")
-                        c.status       = "CLOSED_WIN"
-                        c.realized_pnl = r
-                        c.target_hit   = "T1"
-                        c.max_target_reached = _advance_target(c.max_target_reached, "T1")
-                        c.closed_at    = candle_ts
-                        # Shadow-mode runner tracking (2026-07-06, 15M only, record-only) —
-                        # seeds Phase 3B below. Real status/realized_pnl/closed_at above are
-                        # completely unaffected by this.
-                        c.shadow_runner_active = True
-                        c.shadow_runner_stop = c.entry_price
-                        c.shadow_runner_last_scan_ts = candle_ts
-                        closed = True
-                        print(f"|| LIFECYCLE P2 || {c.symbol} {c.bias} T1 {candle_ts}. {r:+.4f}R.")
-                        break
+                # Stop vs T1 over the 1m candles, via the shared execution
+                # kernel (the simulator's resolver). Stop-first on same-candle
+                # (conservative).
+                outcome, candle_ts, r, same_candle = _resolve_stop_t1(c, candles)
+                closed = outcome is not None
+
+                if outcome == "STOP":
+                    c.status       = "CLOSED_LOSS"
+                    c.realized_pnl = r
+                    c.target_hit   = "STOP"
+                    c.closed_at    = candle_ts
+                    tag = " (same-candle, stop wins)" if same_candle else ""
+                    print(f"|| LIFECYCLE P2 || {c.symbol} {c.bias} STOP{tag} {candle_ts}. -1R.")
+
+                elif outcome == "T1":
+                    c.status       = "CLOSED_WIN"
+                    c.realized_pnl = r
+                    c.target_hit   = "T1"
+                    c.max_target_reached = _advance_target(c.max_target_reached, "T1")
+                    c.closed_at    = candle_ts
+                    # Shadow-mode runner tracking (2026-07-06, 15M only, record-only) —
+                    # seeds Phase 3B below. Real status/realized_pnl/closed_at above are
+                    # completely unaffected by this.
+                    c.shadow_runner_active = True
+                    c.shadow_runner_stop = c.entry_price
+                    c.shadow_runner_last_scan_ts = candle_ts
+                    print(f"|| LIFECYCLE P2 || {c.symbol} {c.bias} T1 {candle_ts}. {r:+.4f}R.")
 
                 if closed:
                     db.commit()
@@ -487,7 +505,7 @@ async def run_ledger_audit_loop():
             # ── PHASE 3: Post-exit observation ────────────────────────────────
             # T1-closed records whose session is still running. Keep watching
             # T2/T3 to build target-optimisation data. No status/pnl changes.
-            post_exit = db.query(CampaignLog).filter(
+            post_exit = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.mas_approval_status == "APPROVED",
                 CampaignLog.closed_at.isnot(None),
                 CampaignLog.target_hit == "T1",
@@ -528,7 +546,7 @@ async def run_ledger_audit_loop():
             # only fills shadow_runner_* columns, modeling what "close 50% at T1,
             # run the rest" would have produced, for review before ever
             # considering flipping this live.
-            shadow_active = db.query(CampaignLog).filter(
+            shadow_active = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.session_timeframe == "15M",
                 CampaignLog.is_canonical == True,
                 CampaignLog.shadow_runner_active == True,
@@ -544,13 +562,10 @@ async def run_ledger_audit_loop():
                 # ── Exhaustion check (IMP-006) ─────────────────────────────
                 # Fetch 5m candles with a 5-minute TTL cache to give PMARP/BBWP
                 # enough history (272+ candles) without hammering Kraken.
-                now_ts = datetime.now(timezone.utc).timestamp()
-                cached = _exhaustion_5m_cache.get(c.symbol)
-                if cached and (now_ts - cached["refreshed_at"]) < _EXHAUSTION_CACHE_TTL:
-                    candles_5m = cached["candles"]
-                else:
+                candles_5m = _exhaustion_5m_cache.get(c.symbol)
+                if candles_5m is None:
                     candles_5m = await market_data.fetch_live_5m(c.symbol, limit=300)
-                    _exhaustion_5m_cache[c.symbol] = {"candles": candles_5m, "refreshed_at": now_ts}
+                    _exhaustion_5m_cache.set(c.symbol, candles_5m)
                 exhaustion = check_exhaustion(
                     candles_5m, candles_5m,
                     {"entry_price": c.entry_price, "current_stop": c.shadow_runner_stop, "direction": c.bias},
@@ -621,7 +636,7 @@ async def run_ledger_audit_loop():
             # They are never APPROVED so Phases 1-3 skip them. Phase 4 closes
             # them on stop/T1 hit (via OHLC) or time cap, recording outcomes so
             # the 4H/1H candidates are auditable in campaign_logs.
-            candidates = db.query(CampaignLog).filter(
+            candidates = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.mas_approval_status.in_(["4H_CANDIDATE", "1H_CANDIDATE"]),
                 CampaignLog.closed_at.is_(None),
                 CampaignLog.entry_filled_at.isnot(None),
@@ -649,43 +664,30 @@ async def run_ledger_audit_loop():
                         _notify_candidate_closed(c)
                     continue
 
-                closed = False
-                for candle in candles:
-                    if c.bias == "LONG":
-                        hit_stop = candle["l"] <= c.stop_loss
-                        hit_t1   = c.t1 is not None and candle["h"] >= c.t1
-                    else:
-                        hit_stop = candle["h"] >= c.stop_loss
-                        hit_t1   = c.t1 is not None and candle["l"] <= c.t1
-
-                    candle_ts = datetime.fromtimestamp(candle["ts"] / 1000, tz=timezone.utc)
-
-                    if hit_stop:
-                        c.status       = "CLOSED_LOSS"
-                        c.realized_pnl = -1.0
-                        c.target_hit   = "STOP"
-                        c.closed_at    = candle_ts
-                        closed = True
-                        tag = " (same-candle, stop wins)" if hit_t1 else ""
-                        print(f"|| LIFECYCLE P4 || {c.symbol} {c.mas_approval_status} STOP{tag} {candle_ts}. -1R.")
-                        break
-
-                    if hit_t1:
-                        r = _frac_r(c.entry_price, c.stop_loss, c.t1, c.bias == "LONG")
-                        c.status       = "CLOSED_WIN"
-                        c.realized_pnl = r
-                        c.target_hit   = "T1"
-                        c.max_target_reached = _advance_target(c.max_target_reached, "T1")
-                        c.closed_at    = candle_ts
-                        # Shadow-mode runner tracking (2026-07-07, 4H/1H, record-only) —
-                        # seeds Phase 4B below. Real status/realized_pnl/closed_at above
-                        # are completely unaffected by this.
-                        c.shadow_runner_active = True
-                        c.shadow_runner_stop = c.entry_price
-                        c.shadow_runner_last_scan_ts = candle_ts
-                        closed = True
-                        print(f"|| LIFECYCLE P4 || {c.symbol} {c.mas_approval_status} T1 {candle_ts}. {r:+.4f}R.")
-                        break
+                outcome, candle_ts, r, same_candle = _resolve_stop_t1(c, candles)
+                closed = outcome is not None
+
+                if outcome == "STOP":
+                    c.status       = "CLOSED_LOSS"
+                    c.realized_pnl = r
+                    c.target_hit   = "STOP"
+                    c.closed_at    = candle_ts
+                    tag = " (same-candle, stop wins)" if same_candle else ""
+                    print(f"|| LIFECYCLE P4 || {c.symbol} {c.mas_approval_status} STOP{tag} {candle_ts}. -1R.")
+
+                elif outcome == "T1":
+                    c.status       = "CLOSED_WIN"
+                    c.realized_pnl = r
+                    c.target_hit   = "T1"
+                    c.max_target_reached = _advance_target(c.max_target_reached, "T1")
+                    c.closed_at    = candle_ts
+                    # Shadow-mode runner tracking (2026-07-07, 4H/1H, record-only) —
+                    # seeds Phase 4B below. Real status/realized_pnl/closed_at above
+                    # are completely unaffected by this.
+                    c.shadow_runner_active = True
+                    c.shadow_runner_stop = c.entry_price
+                    c.shadow_runner_last_scan_ts = candle_ts
+                    print(f"|| LIFECYCLE P4 || {c.symbol} {c.mas_approval_status} T1 {candle_ts}. {r:+.4f}R.")
 
                 if closed:
                     db.commit()
@@ -738,7 +740,7 @@ async def run_ledger_audit_loop():
             # T3 stays the fixed v4 Fibonacci target -- only the stop trails,
             # same design choice as the 15M version. Real status/realized_pnl/
             # closed_at are never touched here.
-            shadow_active_tf = db.query(CampaignLog).filter(
+            shadow_active_tf = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.mas_approval_status.in_(["4H_CANDIDATE", "1H_CANDIDATE"]),
                 CampaignLog.shadow_runner_active == True,
                 CampaignLog.shadow_runner_closed_at.is_(None),
@@ -753,13 +755,10 @@ async def run_ledger_audit_loop():
                 # ── Exhaustion check (IMP-006) ─────────────────────────────
                 # Fetch 5m candles with a 5-minute TTL cache to give PMARP/BBWP
                 # enough history (272+ candles) without hammering Kraken.
-                now_ts = datetime.now(timezone.utc).timestamp()
-                cached = _exhaustion_5m_cache.get(c.symbol)
-                if cached and (now_ts - cached["refreshed_at"]) < _EXHAUSTION_CACHE_TTL:
-                    candles_5m = cached["candles"]
-                else:
+                candles_5m = _exhaustion_5m_cache.get(c.symbol)
+                if candles_5m is None:
                     candles_5m = await market_data.fetch_live_5m(c.symbol, limit=300)
-                    _exhaustion_5m_cache[c.symbol] = {"candles": candles_5m, "refreshed_at": now_ts}
+                    _exhaustion_5m_cache.set(c.symbol, candles_5m)
                 exhaustion = check_exhaustion(
                     candles_5m, candles_5m,
                     {"entry_price": c.entry_price, "current_stop": c.shadow_runner_stop, "direction": c.bias},
@@ -834,5 +833,6 @@ async def run_ledger_audit_loop():
             traceback.print_exc()
         finally:
             db.close()
+            await tick_lock.release_async()
 
         await asyncio.sleep(60)
@@ -22,14 +22,15 @@
 # Sync module by design -- invoked via asyncio.to_thread() from main.py's
 # monthly scheduler, matching elliott_wave_specialist.run_elliott_wave_
 # analysis()'s calling convention. Uses plain (non-async_support) ccxt for
-# the same reason: no event loop exists inside a to_thread() worker.
+# the same reason: no event loop exists inside a to_thread() worker -- the
+# client comes from fetch_scheduler's sync registry so it is reused across
+# runs and closed with the rest of the exchange clients at shutdown.
 # ==============================================================================
 
 import datetime as dt
 from typing import Any, Dict, List, Optional
 
-import ccxt
-
+import fetch_scheduler
 from battlebox_pipeline import (
     _calc_bbwp,
     _calc_pmarp,
@@ -46,8 +47,6 @@ from database import SessionLocal, GravityMemory, MacroNarrativeLog
 SYMBOL = "BTC/USDT"
 _WEEKLY_FETCH_LIMIT = 720  # ~13.8 years -- comfortably covers Kraken's full BTC/USD listing history
 
-_exchange = ccxt.kraken({"enableRateLimit": True})
-
 _SYNODIC_MONTH = 29.53058867
 _REFERENCE_NEW_MOON = dt.datetime(2000, 1, 6, 18, 14, tzinfo=dt.timezone.utc)
 
@@ -61,7 +60,7 @@ _CONVICTION_SCALE = [
 
 
 def _fetch_weekly_candles(symbol: str = SYMBOL, limit: int = _WEEKLY_FETCH_LIMIT) -> List[Dict[str, Any]]:
-    rows = _exchange.fetch_ohlcv(symbol, "1w", limit=limit)
+    rows = fetch_scheduler.get_sync_client("kraken").fetch_ohlcv(symbol, "1w", limit=limit)
     return [
         {"ts": int(r[0]), "open": float(r[1]), "high": float(r[2]),
          "low": float(r[3]), "close": float(r[4])}
@@ -189,7 +188,7 @@ def run_lti_audit(symbol: str = SYMBOL) -> Dict[str, Any]:
     bbwp = _calc_bbwp(closes, lookback=252)
     bbwp_state = _bbwp_state_label(bbwp)
 
-    pmarp = _calc_pmarp(closes, ma_period=200, lookback=252)  # Crown: "use 200 SMA for macro investing"
+    pmarp = _calc_pmarp(candles, ma_period=200, lookback=252)  # Crown: "use 200 SMA for macro investing"
     pmarp_state = _pmarp_state_label(pmarp)
 
     rsi_weekly = _calc_rsi(closes)
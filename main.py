@@ -2,7 +2,12 @@
 # ---------------------------------------------------------
 # KABRODA UNIFIED SERVER: PRIVATE TEAM TERMINAL
 # ---------------------------------------------------------
+import startup_profile
+startup_profile.install()  # before anything heavy, so every import is timed
+
 import os
+import csv
+import io
 import json 
 import traceback
 import re
@@ -12,10 +17,16 @@ import asyncio
 from contextlib import asynccontextmanager 
 
 from fastapi import FastAPI, Request, Form, HTTPException, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.templating import Jinja2Templates
+# orjson-backed drop-in for Starlette's JSONResponse (NumPy/datetime aware);
+# aliased so every existing JSONResponse(...) call site picks it up.
+import api_responses
+from api_responses import FastJSONResponse as JSONResponse
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
@@ -23,8 +34,6 @@ from pydantic import BaseModel
 import auth
 import battlebox_pipeline
 import market_radar
-import research_lab
-import market_simulator
 import gravity_engine
 import gravity_math
 import kabroda_mas_flow
@@ -33,13 +42,25 @@ import mtf_confluence_scanner
 import session_monitor
 import agent_core
 import session_manager
-import lti_engine
-import lti_interpreter
+import fetch_scheduler
+import packet_codec
+import scheduler_leader
+import db_locks
+import cache_backend
+import telemetry_queue
+import request_spans
 
 from datetime import datetime, timezone, timedelta
 from jewel_specialist import run_jewel_snapshot
 
 from database import init_db, get_db, UserModel, CampaignLog, SessionLock, AgentRunLog, SessionLocal, MacroNarrativeLog, JewelSnapshotLog, DecisionJournal, NewsletterLog, MtfReading, SystemAuditLog, InterpreterLog, LtiCheckpoint, LtiProtocol, DailyAuditLog, AuditSuggestionLog, TrialsLog, SystemAnalysisReport, SignalAccuracyLog, SystemAlertLog, SignalHealthLog, SignalWeight, AccuracyReport, SignalPerformanceLog
+from database import CAMPAIGN_LOG_LIST_COLUMNS, SESSION_LOCK_LIST_COLUMNS, columns_of, defer_heavy
+
+# Rarely used subsystems: imported on first request/tick, not at boot.
+research_lab = startup_profile.lazy_module("research_lab")
+market_simulator = startup_profile.lazy_module("market_simulator")
+lti_engine = startup_profile.lazy_module("lti_engine")
+lti_interpreter = startup_profile.lazy_module("lti_interpreter")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -218,7 +239,7 @@ async def _fire_senior_analyst(date_key: str) -> None:
         if not lock_record:
             print(f"[SCHEDULER] No session lock found for {date_key} — aborting")
             return
-        pkt = json.loads(lock_record.packet_data)
+        pkt = packet_codec.load_lock_packet(lock_record)
     finally:
         db.close()
 
@@ -519,7 +540,7 @@ def _do_outcome_tick(current_price: float) -> None:
             filled += 1
 
         # target_hit: current ledger always closes at T1 or SL — record what happened
-        closed_logs = db.query(CampaignLog).filter(
+        closed_logs = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
             CampaignLog.status.in_(["CLOSED_WIN", "CLOSED_LOSS"]),
             CampaignLog.target_hit.is_(None),
             CampaignLog.is_canonical == True,
@@ -574,7 +595,7 @@ def _run_analysis_loop_body(db: Session) -> str:
     """
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
 
-    recent_trades = db.query(CampaignLog).filter(
+    recent_trades = db.query(CampaignLog.status, CampaignLog.realized_pnl).filter(
         CampaignLog.is_canonical == True,
         CampaignLog.created_at >= thirty_days_ago
     ).all()
@@ -646,38 +667,69 @@ async def run_analysis_loop_scheduler() -> None:
             await asyncio.sleep(300)
 
 
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "inline").strip().lower()  # inline | off
+
+
+def start_scheduler_tasks() -> list:
+    """Create every background scheduler task. Called by the leader
+    supervisor once this process holds the scheduler lease."""
+    return [
+        asyncio.create_task(gravity_engine.run_gravity_ingestion_loop()),
+        asyncio.create_task(ledger_closing_engine.run_ledger_audit_loop()),
+        asyncio.create_task(run_senior_analyst_scheduler()),
+        asyncio.create_task(run_jewel_scheduler()),
+        asyncio.create_task(run_weekly_scheduler()),
+        # KULTI LTI scheduler pulled 2026-07-08 -- see WORK_LOG.md. The design mixed
+        # trading-system paradigms (confluence-count tiers, borrowed JEWEL vocabulary,
+        # N-based validation thinking) into what should be a from-first-principles
+        # long-term investing system. Off until it's rebuilt properly. Function body
+        # left in place below, not deleted, in case pieces (real indicator math,
+        # Hash Ribbons) are worth reusing in the rebuild.
+        # asyncio.create_task(run_monthly_lti_scheduler()),
+        asyncio.create_task(run_outcome_tracker()),
+        asyncio.create_task(run_analysis_loop_scheduler()),
+        asyncio.create_task(session_monitor.run_session_monitor_loop()),
+        # signal_accuracy/signal_flagging/accuracy_report schedulers archived
+        # 2026-08-17 per Kabroda Audit REBUILD_PLAN.md -- confirmed record-only,
+        # never fed a live decision. Modules moved to _archive/.
+    ]
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print(">>> BOOTING KABRODA SYSTEM: Initializing Database Schema...")
-    init_db()
-    app.state.gravity_task          = asyncio.create_task(gravity_engine.run_gravity_ingestion_loop())
-    app.state.ledger_task           = asyncio.create_task(ledger_closing_engine.run_ledger_audit_loop())
-    app.state.senior_analyst_task   = asyncio.create_task(run_senior_analyst_scheduler())
-    app.state.jewel_task            = asyncio.create_task(run_jewel_scheduler())
-    app.state.weekly_task           = asyncio.create_task(run_weekly_scheduler())
-    # KULTI LTI scheduler pulled 2026-07-08 -- see WORK_LOG.md. The design mixed
-    # trading-system paradigms (confluence-count tiers, borrowed JEWEL vocabulary,
-    # N-based validation thinking) into what should be a from-first-principles
-    # long-term investing system. Off until it's rebuilt properly. Function body
-    # left in place below, not deleted, in case pieces (real indicator math,
-    # Hash Ribbons) are worth reusing in the rebuild.
-    # app.state.lti_task            = asyncio.create_task(run_monthly_lti_scheduler())
-    app.state.outcome_tracker_task  = asyncio.create_task(run_outcome_tracker())
-    app.state.analysis_loop_task    = asyncio.create_task(run_analysis_loop_scheduler())
-    app.state.monitor_task          = asyncio.create_task(session_monitor.run_session_monitor_loop())
-    # signal_accuracy/signal_flagging/accuracy_report schedulers archived
-    # 2026-08-17 per Kabroda Audit REBUILD_PLAN.md -- confirmed record-only,
-    # never fed a live decision. Modules moved to _archive/.
+    with startup_profile.phase("init_db"):
+        init_db()
+    try:
+        with startup_profile.phase("seed_spend_ledger"):
+            agent_core.seed_spend_ledger()
+    except Exception as e:
+        print(f">>> Agent spend ledger seed failed (will seed on first budget check): {e}")
+    # Schedulers run under the DB leader lease (scheduler_leader.py): inline
+    # mode keeps the old single-process deploy working, and extra uvicorn
+    # workers just stand by. SCHEDULER_MODE=off makes this a stateless web
+    # tier -- run `python worker.py` as a separate process instead.
+    app.state.scheduler_supervisor = None
+    if SCHEDULER_MODE != "off":
+        app.state.scheduler_supervisor = asyncio.create_task(
+            scheduler_leader.run_as_leader(start_scheduler_tasks)
+        )
+    else:
+        print(">>> SCHEDULER_MODE=off -- web tier only, schedulers run in worker.py")
     yield
     print(">>> SHUTTING DOWN KABRODA SYSTEM...")
-    app.state.gravity_task.cancel()
-    app.state.ledger_task.cancel()
-    app.state.senior_analyst_task.cancel()
-    app.state.jewel_task.cancel()
-    app.state.weekly_task.cancel()
-    app.state.outcome_tracker_task.cancel()
-    app.state.analysis_loop_task.cancel()
-    app.state.monitor_task.cancel()
+    if app.state.scheduler_supervisor is not None:
+        app.state.scheduler_supervisor.cancel()
+        try:
+            await app.state.scheduler_supervisor
+        except asyncio.CancelledError:
+            pass
+    # Release pooled exchange connections (shared aiohttp session + every
+    # registered ccxt client) so reloads don't leak sockets.
+    await fetch_scheduler.close_all()
+    # Drain the telemetry write-behind queue so agent/interpreter/narrative
+    # rows logged in the last flush interval reach the DB before exit.
+    await asyncio.to_thread(telemetry_queue.shutdown)
 
 
 # signal_accuracy_tracker / signal_flagging_engine / accuracy_report_generator
@@ -687,7 +739,7 @@ async def lifespan(app: FastAPI):
 # only by an admin-only dashboard. See REBUILD_PLAN.md. Modules moved to
 # _archive/.
 
-app = FastAPI(title="Kabroda BattleBox", version="12.0", lifespan=lifespan)
+app = FastAPI(title="Kabroda BattleBox", version="12.0", lifespan=lifespan, default_response_class=JSONResponse)
 
 SECRET_KEY = os.getenv("SESSION_SECRET", "kabroda_prod_key_999")
 
@@ -708,6 +760,10 @@ app.add_middleware(
     max_age=86400 * 30  
 )
 
+# Compress JSON/HTML for clients that send Accept-Encoding: gzip. The big
+# payloads (gravity scan chart_data, battlebox, trade history) shrink ~5-10x.
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1024")), compresslevel=5)
+
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
@@ -850,7 +906,7 @@ async def macro_war_room_page(request: Request, symbol: str = "BTC/USDT", db: Se
             ).first()
 
             if lock_record:
-                pkt = json.loads(lock_record.packet_data)
+                pkt = packet_codec.load_lock_packet(lock_record)
                 asyncio.create_task(
                     asyncio.to_thread(
                         kabroda_mas_flow.run_mas_analysis,
@@ -1036,7 +1092,7 @@ async def api_radar_snapshot(db: Session = Depends(get_db)):
     price = 0.0
     if lock:
         try:
-            pkt = json.loads(lock.packet_data)
+            pkt = packet_codec.load_lock_packet(lock)
             levels = pkt.get("levels", {})
             price = float(levels.get("anchor_price") or 0)
         except Exception:
@@ -1197,7 +1253,7 @@ async def audit_foreign_intel(payload: ForeignIntelPayload, request: Request, db
         if not lock_record:
             return JSONResponse({"ok": False, "error": f"No active Kabroda session locked for {asset} in DB. Cannot perform audit."})
 
-        current_ssot = json.loads(lock_record.packet_data)
+        current_ssot = packet_codec.load_lock_packet(lock_record)
 
         # Third data source: live multi-timeframe confluence for the momentum audit.
         try:
@@ -1506,8 +1562,124 @@ async def admin_roster_page(request: Request, db: Session = Depends(get_db)):
     ctx["recent_suggestions"] = db.query(AuditSuggestionLog).order_by(AuditSuggestionLog.logged_at.desc()).limit(9).all()
     return _template_or_fallback(request, templates, "admin.html", ctx)
 
+def _audit_trade_record(l) -> Dict[str, Any]:
+    try:
+        diagnostics = json.loads(l.diagnostic_data) if l.diagnostic_data else {}
+    except Exception:
+        diagnostics = {}
+    return {
+        "trade_id": l.id,
+        "symbol": l.symbol,
+        "date": l.date_key,
+        "bias": l.bias,
+        "status": l.status,
+        "realized_pnl": l.realized_pnl,
+        "diagnostics": diagnostics
+    }
+
+
+def _audit_digest_record(d) -> Dict[str, Any]:
+    return {"date_key": d.date_key, "trades_covered_15m": d.trades_covered_15m,
+            "trades_covered_1h": d.trades_covered_1h, "trades_covered_4h": d.trades_covered_4h,
+            "digest": json.loads(d.digest_json)}
+
+
+def _audit_suggestion_record(s) -> Dict[str, Any]:
+    return {"hypothesis_id": s.hypothesis_id, "hypothesis_text": s.hypothesis_text,
+            "tier_label": s.tier_label, "n_supporting": s.n_supporting,
+            "actual_win_rate": s.actual_win_rate, "suggestion_text": s.suggestion_text,
+            "consecutive_runs_surfaced": s.consecutive_runs_surfaced, "status": s.status}
+
+
+def _audit_trial_record(t) -> Dict[str, Any]:
+    return {"test_type": t.test_type, "hypothesis": t.hypothesis, "result_summary": t.result_summary,
+            "result_accuracy_pct": t.result_accuracy_pct, "result_n": t.result_n,
+            "candidate_status": t.candidate_status}
+
+
+_AUDIT_TRADE_COLUMNS = ("id", "symbol", "date_key", "bias", "status", "realized_pnl", "diagnostic_data")
+_AUDIT_EXPORT_PAGE_SIZE = 500
+
+
+def _newest_first(time_col, model):
+    """Export ordering shared by the JSON and streamed formats: newest
+    `time_col` first (undated rows last), id breaking ties."""
+    return (time_col.desc().nulls_last(), model.id.desc())
+
+
+def _keyset_scan(db: Session, model, time_col, date_range, columns=None, page_size: Optional[int] = None):
+    """Yield rows in _newest_first order, one page at a time, keyed on
+    (time_col, id) of the last row sent. Only `page_size` rows are ever
+    resident, however large the table is."""
+    page_size = page_size or _AUDIT_EXPORT_PAGE_SIZE
+    if columns and time_col.key not in {c.key for c in columns}:
+        columns = (*columns, time_col)
+    last = None
+    while True:
+        q = db.query(*columns) if columns else db.query(model)
+        if date_range:
+            q = q.filter(time_col >= date_range[0], time_col < date_range[1])
+        if last is not None:
+            last_time, last_id = last
+            if last_time is None:
+                q = q.filter(time_col.is_(None), model.id < last_id)
+            else:
+                q = q.filter(or_(time_col < last_time, time_col.is_(None),
+                                 and_(time_col == last_time, model.id < last_id)))
+        page = q.order_by(*_newest_first(time_col, model)).limit(page_size).all()
+        if not page:
+            return
+        yield from page
+        last = (getattr(page[-1], time_col.key), page[-1].id)
+        if len(page) < page_size:
+            return
+        db.expunge_all()
+
+
+def _stream_audit_ndjson(date_range):
+    """One JSON object per line, each tagged with "record": trade rows first,
+    then (for dated exports) digests, suggestions and trials."""
+    db = SessionLocal()
+    try:
+        for l in _keyset_scan(db, CampaignLog, CampaignLog.created_at, date_range,
+                              columns=columns_of(CampaignLog, _AUDIT_TRADE_COLUMNS)):
+            yield api_responses.dumps({"record": "trade", **_audit_trade_record(l)}) + b"\n"
+        if date_range:
+            for record, model, time_col, fmt in (
+                ("daily_digest", DailyAuditLog, DailyAuditLog.created_at, _audit_digest_record),
+                ("audit_suggestion", AuditSuggestionLog, AuditSuggestionLog.logged_at, _audit_suggestion_record),
+                ("trial", TrialsLog, TrialsLog.logged_at_utc, _audit_trial_record),
+            ):
+                for row in _keyset_scan(db, model, time_col, date_range):
+                    yield api_responses.dumps({"record": record, **fmt(row)}) + b"\n"
+    finally:
+        db.close()
+
+
+def _stream_audit_csv(date_range):
+    """Trade ledger as CSV; diagnostics stay a JSON-encoded column."""
+    fields = ["trade_id", "symbol", "date", "bias", "status", "realized_pnl", "diagnostics"]
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    db = SessionLocal()
+    try:
+        for i, l in enumerate(_keyset_scan(db, CampaignLog, CampaignLog.created_at, date_range,
+                                           columns=columns_of(CampaignLog, _AUDIT_TRADE_COLUMNS))):
+            rec = _audit_trade_record(l)
+            rec["diagnostics"] = json.dumps(rec["diagnostics"], default=str)
+            writer.writerow(rec)
+            if i % 100 == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+        yield buf.getvalue()
+    finally:
+        db.close()
+
+
 @app.get("/admin/export-audit-ledger")
-async def export_audit_ledger(request: Request, start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
+async def export_audit_ledger(request: Request, start_date: str = None, end_date: str = None, format: str = None, db: Session = Depends(get_db)):
     """
     Unconditional full-dump when start_date/end_date are absent (preserves
     the original behavior + nav.html's existing link exactly). When present
@@ -1516,6 +1688,12 @@ async def export_audit_ledger(request: Request, start_date: str = None, end_date
     AuditSuggestionLog (H1-H6 15M + H7-H9 4H/1H), and TrialsLog (binomial
     checkpoints) rows for the same window -- "the whole json log" covering
     every audit data source in one pull, not just raw trades.
+
+    format=ndjson|csv streams the same records instead of building one JSON
+    document: rows are paged by (timestamp, id) keyset in the same newest-first
+    order as the JSON document, so memory stays flat
+    as the ledger grows and the first bytes go out immediately. CSV carries
+    the trade ledger only; NDJSON tags each line with its "record" type.
     """
     ctx = get_user_context(request, db)
     if not ctx.get("is_admin"):
@@ -1530,61 +1708,47 @@ async def export_audit_ledger(request: Request, start_date: str = None, end_date
         except ValueError:
             return JSONResponse({"ok": False, "error": "start_date/end_date must be YYYY-MM-DD"}, status_code=400)
 
-    campaign_q = db.query(CampaignLog).order_by(CampaignLog.created_at.desc())
+    if format:
+        suffix = f"_{start_date}_{end_date}" if date_range else ""
+        if format == "ndjson":
+            return StreamingResponse(
+                _stream_audit_ndjson(date_range),
+                media_type="application/x-ndjson",
+                headers={"Content-Disposition": f'attachment; filename="audit_ledger{suffix}.ndjson"'},
+            )
+        if format == "csv":
+            return StreamingResponse(
+                _stream_audit_csv(date_range),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="audit_ledger{suffix}.csv"'},
+            )
+        return JSONResponse({"ok": False, "error": "format must be ndjson or csv"}, status_code=400)
+
+    campaign_q = db.query(
+        *columns_of(CampaignLog, _AUDIT_TRADE_COLUMNS)
+    ).order_by(*_newest_first(CampaignLog.created_at, CampaignLog))
     if date_range:
         campaign_q = campaign_q.filter(CampaignLog.created_at >= date_range[0], CampaignLog.created_at < date_range[1])
-    logs = campaign_q.all()
 
-    audit_data = []
-    for l in logs:
-        try:
-            diagnostics = json.loads(l.diagnostic_data) if l.diagnostic_data else {}
-        except Exception:
-            diagnostics = {}
-
-        audit_data.append({
-            "trade_id": l.id,
-            "symbol": l.symbol,
-            "date": l.date_key,
-            "bias": l.bias,
-            "status": l.status,
-            "realized_pnl": l.realized_pnl,
-            "diagnostics": diagnostics
-        })
+    audit_data = [_audit_trade_record(l) for l in campaign_q.all()]
 
     response = {"ok": True, "total_records": len(audit_data), "ledger": audit_data}
 
     if date_range:
         digest_q = db.query(DailyAuditLog).filter(
             DailyAuditLog.created_at >= date_range[0], DailyAuditLog.created_at < date_range[1]
-        ).order_by(DailyAuditLog.created_at.desc())
-        response["daily_digests"] = [
-            {"date_key": d.date_key, "trades_covered_15m": d.trades_covered_15m,
-             "trades_covered_1h": d.trades_covered_1h, "trades_covered_4h": d.trades_covered_4h,
-             "digest": json.loads(d.digest_json)}
-            for d in digest_q.all()
-        ]
+        ).order_by(*_newest_first(DailyAuditLog.created_at, DailyAuditLog))
+        response["daily_digests"] = [_audit_digest_record(d) for d in digest_q.all()]
 
         suggestion_q = db.query(AuditSuggestionLog).filter(
             AuditSuggestionLog.logged_at >= date_range[0], AuditSuggestionLog.logged_at < date_range[1]
-        ).order_by(AuditSuggestionLog.logged_at.desc())
-        response["audit_suggestions"] = [
-            {"hypothesis_id": s.hypothesis_id, "hypothesis_text": s.hypothesis_text,
-             "tier_label": s.tier_label, "n_supporting": s.n_supporting,
-             "actual_win_rate": s.actual_win_rate, "suggestion_text": s.suggestion_text,
-             "consecutive_runs_surfaced": s.consecutive_runs_surfaced, "status": s.status}
-            for s in suggestion_q.all()
-        ]
+        ).order_by(*_newest_first(AuditSuggestionLog.logged_at, AuditSuggestionLog))
+        response["audit_suggestions"] = [_audit_suggestion_record(s) for s in suggestion_q.all()]
 
         trials_q = db.query(TrialsLog).filter(
             TrialsLog.logged_at_utc >= date_range[0], TrialsLog.logged_at_utc < date_range[1]
-        ).order_by(TrialsLog.logged_at_utc.desc())
-        response["trials"] = [
-            {"test_type": t.test_type, "hypothesis": t.hypothesis, "result_summary": t.result_summary,
-             "result_accuracy_pct": t.result_accuracy_pct, "result_n": t.result_n,
-             "candidate_status": t.candidate_status}
-            for t in trials_q.all()
-        ]
+        ).order_by(*_newest_first(TrialsLog.logged_at_utc, TrialsLog))
+        response["trials"] = [_audit_trial_record(t) for t in trials_q.all()]
 
     return JSONResponse(response)
 
@@ -1846,6 +2010,24 @@ async def simulator_run(request: Request, db: Session = Depends(get_db)):
         traceback.print_exc()
         return JSONResponse({"ok": False, "error": str(e)})
 
+@app.post("/api/simulator/sweep")
+async def simulator_sweep(request: Request, db: Session = Depends(get_db)):
+    uid = request.session.get(auth.SESSION_KEY)
+    if not uid: raise HTTPException(status_code=401)
+
+    user = db.query(UserModel).filter(UserModel.id == uid).first()
+
+    if not getattr(user, "is_admin", False):
+        return JSONResponse({"ok": False, "error": "Admin access required for heavy backtesting computations."}, status_code=403)
+
+    payload = await request.json()
+    try:
+        out = await market_simulator.run_parameter_sweep(payload)
+        return JSONResponse(out)
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"ok": False, "error": str(e)})
+
 # ==============================================================================
 # EXECUTIVE DASHBOARD API ROUTES (Phase 6 — read-only DB queries)
 # ==============================================================================
@@ -1968,21 +2150,15 @@ async def api_dashboard_costs(request: Request, db: Session = Depends(get_db)):
     if not ctx.get("is_admin"):
         return JSONResponse({"ok": False, "error": "Admin only."}, status_code=403)
     try:
-        from collections import defaultdict
-        since_7d = (datetime.now(timezone.utc) - timedelta(days=7)).replace(tzinfo=None)
-        rows = db.query(AgentRunLog).filter(
-            AgentRunLog.created_at >= since_7d, AgentRunLog.status == "SUCCESS").all()
-        daily = defaultdict(lambda: defaultdict(float))
-        all_agents = set()
-        for row in rows:
-            created_at = row.created_at or datetime.utcnow()
-            day = created_at.strftime("%m/%d")
-            daily[day][row.agent_name] += (row.estimated_cost_usd or 0.0)
-            all_agents.add(row.agent_name)
+        # Served from agent_core's spend ledger, resynced from agent_run_log
+        # when stale so spend from the worker process shows up too.
+        await asyncio.to_thread(agent_core.refresh_spend_ledger)
+        daily = agent_core._SPEND_LEDGER.daily_success_usd(days=7)
+        all_agents = {ag for per_day in daily.values() for ag in per_day}
         days_list = [(datetime.utcnow() - timedelta(days=i)).strftime("%m/%d") for i in range(6, -1, -1)]
         agents_sorted = sorted(all_agents)
         return JSONResponse({"ok": True, "days": days_list,
-            "agents": [{"name": ag, "values": [round(daily[d][ag], 5) for d in days_list]} for ag in agents_sorted]})
+            "agents": [{"name": ag, "values": [round(daily.get(d, {}).get(ag, 0.0), 5) for d in days_list]} for ag in agents_sorted]})
     except Exception as e:
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
@@ -2015,7 +2191,7 @@ async def api_dashboard_mas_history(request: Request, db: Session = Depends(get_
                 continue
             cumulative += row.realized_pnl
             pnl_series.append({"date": row.date_key, "cumulative": round(cumulative, 4)})
-        trades = db.query(CampaignLog).filter(CampaignLog.symbol == "BTC/USDT", CampaignLog.is_canonical == True, CampaignLog.session_timeframe == "15M").order_by(CampaignLog.id.desc()).limit(50).all()
+        trades = db.query(*columns_of(CampaignLog, CAMPAIGN_LOG_LIST_COLUMNS)).filter(CampaignLog.symbol == "BTC/USDT", CampaignLog.is_canonical == True, CampaignLog.session_timeframe == "15M").order_by(CampaignLog.id.desc()).limit(50).all()
         trades_data = []
         for t in trades:
             if t.status in ("CLOSED_WIN", "CLOSED_LOSS", "CLOSED_AT_EXPIRY") and t.realized_pnl is not None:
@@ -2045,7 +2221,7 @@ async def api_dashboard_jewel(request: Request, db: Session = Depends(get_db)):
         date_keys = {snap.timestamp.strftime("%Y-%m-%d") for snap in snapshots if snap.timestamp}
         trades_by_date = {}
         if date_keys:
-            campaigns = db.query(CampaignLog).filter(
+            campaigns = db.query(CampaignLog).options(*defer_heavy(CampaignLog)).filter(
                 CampaignLog.symbol == "BTC/USDT",
                 CampaignLog.date_key.in_(list(date_keys)),
                 CampaignLog.status.in_(["CLOSED_WIN", "CLOSED_LOSS"]),
@@ -2171,7 +2347,7 @@ async def get_system_state(request: Request, db: Session = Depends(get_db)):
     
     try:
         # 1. active_sessions: query active SessionLock
-        locks = db.query(SessionLock).all()
+        locks = db.query(*columns_of(SessionLock, SESSION_LOCK_LIST_COLUMNS)).all()
         active_sessions = [
             {
                 "symbol": lock.symbol,
@@ -2216,12 +2392,39 @@ async def get_system_state(request: Request, db: Session = Depends(get_db)):
             "active_runners": active_runners,
             "scheduler_health": scheduler_health_registry,
             "macro_engine": macro_engine_data,
-            "recent_errors": recent_errors_list
+            "recent_errors": recent_errors_list,
+            "fetch_scheduler": fetch_scheduler.get_stats(),
+            "telemetry_queue": telemetry_queue.get_stats(),
+            "packet_cache": packet_codec.get_stats(),
+            "locked_packets": battlebox_pipeline.get_locked_packet_stats(),
+            "startup": startup_profile.report(),
+            "db_locks": db_locks.get_stats(),
+            "caches": cache_backend.get_stats(),
+            "scheduler_leader": scheduler_leader.get_status(),
+            "request_spans": request_spans.get_stats(),
         })
     except Exception as e:
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
 
+@app.get("/api/v1/system/spans")
+async def get_request_spans(request: Request, name: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    """
+    Admin-only. Per-stage timings of recent battlebox / MTF confluence runs
+    (request_spans ring buffer): per-stage p50/p95/max plus the newest traces.
+    """
+    ctx = get_user_context(request, db)
+    if not ctx.get("is_logged_in"):
+        return JSONResponse({"ok": False, "error": "Unauthorized"}, status_code=401)
+    if not ctx.get("is_admin"):
+        return JSONResponse({"ok": False, "error": "Forbidden"}, status_code=403)
+    return JSONResponse({
+        "ok": True,
+        "stats": request_spans.get_stats(),
+        "recent": request_spans.recent(limit=max(0, min(limit, request_spans.BUFFER_SIZE)), name=name),
+    })
+
+
 @app.get("/api/v1/system/session-energy")
 async def get_session_energy(request: Request, db: Session = Depends(get_db)):
     """
@@ -2246,7 +2449,7 @@ async def get_session_energy(request: Request, db: Session = Depends(get_db)):
                 "message": "No session lock data found yet."
             })
 
-        pkt = json.loads(latest_lock.packet_data)
+        pkt = packet_codec.load_lock_packet(latest_lock)
 
         # Extract the key sections for the dashboard
         context = pkt.get("context", {})
@@ -2361,7 +2564,7 @@ async def get_system_trades(request: Request, db: Session = Depends(get_db)):
         return JSONResponse({"ok": False, "error": "Invalid window value"}, status_code=400)
         
     try:
-        query = db.query(CampaignLog).filter(CampaignLog.is_canonical == True)
+        query = db.query(*columns_of(CampaignLog, CAMPAIGN_LOG_LIST_COLUMNS)).filter(CampaignLog.is_canonical == True)
         
         if window == "7d":
             cutoff = datetime.utcnow() - timedelta(days=7)
@@ -2389,7 +2592,7 @@ async def get_system_trades(request: Request, db: Session = Depends(get_db)):
                 "status": t.status,
                 "realized_pnl": t.realized_pnl,
                 "mas_approval_status": t.mas_approval_status,
-                "created_at": t.created_at.isoformat() if hasattr(t, "created_at") and t.created_at else None
+                "created_at": t.created_at.isoformat() if t.created_at else None
             })
             
         total_canonical = len(trades)
@@ -2594,7 +2797,7 @@ async def post_system_analysis(request: Request, db: Session = Depends(get_db)):
     try:
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
         
-        recent_trades = db.query(CampaignLog).filter(
+        recent_trades = db.query(CampaignLog.status, CampaignLog.realized_pnl).filter(
             CampaignLog.is_canonical == True,
             CampaignLog.created_at >= thirty_days_ago
         ).all()
@@ -2840,4 +3043,9 @@ async def global_exception_handler(request: Request, exc: Exception):
         </div>
         """,
         status_code=500
-    )
\ No newline at end of file
+    )
+
+
+# Module fully imported and every route registered -- stop the import timer
+# and print the cold-start breakdown.
+startup_profile.finish_imports()
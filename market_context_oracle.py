@@ -7,13 +7,14 @@
 # and single-index DataFrames. Flat fallback no longer reuses same data for
 # all tickers (v1.1 bug). Each ticker fails independently to UNKNOWN.
 # ==============================================================================
-import yfinance as yf
 import asyncio
-import pandas as pd
 from typing import Dict, Any
 
 
 def _fetch_macro_sync() -> Dict[str, Any]:
+    # yfinance (+ pandas) add ~0.6s to process start; only the macro fetch needs them.
+    import pandas as pd
+    import yfinance as yf
     try:
         tickers_list = ["^GSPC", "DX-Y.NYB", "^VIX"]
         data = yf.download(tickers_list, period="5d", group_by='ticker', progress=False)
@@ -4,19 +4,35 @@
 # Extracted from battlebox_pipeline.py to break the circular import chain:
 #   battlebox_pipeline → gravity_engine → mtf_confluence_scanner → battlebox_pipeline
 # This module has ZERO dependencies on battlebox_pipeline, gravity_engine,
-# or any other root-level module — it only depends on ccxt and Python stdlib.
+# or any other root-level module — it only depends on fetch_scheduler (itself
+# ccxt + stdlib only) and Python stdlib.
 # ==============================================================================
 
 from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-import ccxt.async_support as ccxt
+import fetch_scheduler
 
 # ---------------------------------------------------------------------------
-# EXCHANGE CLIENT — single Kraken instance shared by all fetch functions
+# SCAN UNIVERSE — symbols the background scanners (gravity ingestion, MTF
+# confluence, macro engine) iterate. Single definition; add symbols here.
 # ---------------------------------------------------------------------------
-_exchange_live = ccxt.kraken({"enableRateLimit": True, "timeout": 10000})
+TARGETS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+
+# ---------------------------------------------------------------------------
+# EXCHANGE CLIENT — the scheduler's shared Kraken instance. All fetches below
+# go through fetch_scheduler.call() so they draw on Kraken's shared budget.
+# ---------------------------------------------------------------------------
+_exchange_live = fetch_scheduler.get_client("kraken")
+
+
+def set_candle_source(source: Any) -> None:
+    """Serve every fetch from `source` instead of the exchange (see
+    fetch_scheduler.set_source) -- e.g. harness/replay.py's candle_history
+    replay. Replayed candles are not written back to candle_history.
+    None restores live fetching."""
+    fetch_scheduler.set_source(source)
 
 
 # ---------------------------------------------------------------------------
@@ -42,7 +58,7 @@ def _normalize_symbol(symbol: str) -> str:
 # keeping it a runtime import avoids widening this module's blast radius.
 # ---------------------------------------------------------------------------
 def _persist_candles(symbol: str, timeframe: str, rows: List[Dict[str, Any]]) -> None:
-    if not rows:
+    if not rows or fetch_scheduler.get_source() is not None:
         return
     try:
         import datetime as _dt
@@ -86,12 +102,12 @@ def _persist_candles(symbol: str, timeframe: str, rows: List[Dict[str, Any]]) ->
 
 
 # ---------------------------------------------------------------------------
-# LIVE OHLCV FETCHERS — one per timeframe, all using _exchange_live
+# LIVE OHLCV FETCHERS — one per timeframe, all via the Kraken fetch budget
 # ---------------------------------------------------------------------------
 async def fetch_live_5m(symbol: str, limit: int = 1500) -> List[Dict[str, Any]]:
     s = _normalize_symbol(symbol)
     try:
-        rows = await _exchange_live.fetch_ohlcv(s, "5m", limit=limit)
+        rows = await fetch_scheduler.call("kraken", "fetch_ohlcv", s, "5m", limit=limit, symbol=s)
         result = [
             {
                 "time": int(r[0] / 1000),
@@ -112,7 +128,7 @@ async def fetch_live_5m(symbol: str, limit: int = 1500) -> List[Dict[str, Any]]:
 async def fetch_live_15m(symbol: str, limit: int = 300) -> List[Dict[str, Any]]:
     s = _normalize_symbol(symbol)
     try:
-        rows = await _exchange_live.fetch_ohlcv(s, "15m", limit=limit)
+        rows = await fetch_scheduler.call("kraken", "fetch_ohlcv", s, "15m", limit=limit, symbol=s)
         result = [
             {
                 "time": int(r[0] / 1000),
@@ -133,7 +149,7 @@ async def fetch_live_15m(symbol: str, limit: int = 300) -> List[Dict[str, Any]]:
 async def fetch_live_1h(symbol: str, limit: int = 720) -> List[Dict[str, Any]]:
     s = _normalize_symbol(symbol)
     try:
-        rows = await _exchange_live.fetch_ohlcv(s, "1h", limit=limit)
+        rows = await fetch_scheduler.call("kraken", "fetch_ohlcv", s, "1h", limit=limit, symbol=s)
         result = [
             {
                 "time": int(r[0] / 1000),
@@ -154,7 +170,7 @@ async def fetch_live_1h(symbol: str, limit: int = 720) -> List[Dict[str, Any]]:
 async def fetch_live_4h(symbol: str, limit: int = 200) -> List[Dict[str, Any]]:
     s = _normalize_symbol(symbol)
     try:
-        rows = await _exchange_live.fetch_ohlcv(s, "4h", limit=limit)
+        rows = await fetch_scheduler.call("kraken", "fetch_ohlcv", s, "4h", limit=limit, symbol=s)
         result = [
             {
                 "time": int(r[0] / 1000),
@@ -175,7 +191,7 @@ async def fetch_live_4h(symbol: str, limit: int = 200) -> List[Dict[str, Any]]:
 async def fetch_live_daily(symbol: str, limit: int = 300) -> List[Dict[str, Any]]:
     s = _normalize_symbol(symbol)
     try:
-        rows = await _exchange_live.fetch_ohlcv(s, "1d", limit=limit)
+        rows = await fetch_scheduler.call("kraken", "fetch_ohlcv", s, "1d", limit=limit, symbol=s)
         result = [
             {
                 "time": int(r[0] / 1000),
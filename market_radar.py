@@ -13,6 +13,7 @@ from datetime import timedelta
 import battlebox_pipeline
 import gravity_math
 import mtf_confluence_scanner
+import packet_codec
 from database import SessionLocal, SessionLock, MtfReading, DecisionJournal, CampaignLog
 
 TARGETS = ["BTCUSDT"]
@@ -209,7 +210,7 @@ async def _try_locked_shortcut(symbol: str):
             ).first()
         if not lock:
             return None
-        pkt = json.loads(lock.packet_data)
+        pkt = packet_codec.load_lock_packet(lock)
     except Exception:
         return None
 
@@ -3,14 +3,24 @@
 # KABRODA MARKET SIMULATOR v5.0 (TRUE RADAR CLONE)
 # JOB: Exact 1:1 duplication of Market Radar math wrapped in a historical 
 #      execution engine with "What-If" parameter overrides.
+#      run_parameter_sweep replays one set of session levels across a grid or
+#      random sample of overrides on a process pool and ranks the results.
 # ==============================================================================
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, timezone
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 
 import session_manager
 import sse_engine 
 import battlebox_pipeline
+import execution_kernel
 
 # ==============================================================================
 # 1. EXACT MARKET RADAR MATH (DUPLICATED)
@@ -103,6 +113,21 @@ def _get_plan(symbol, anchor, vector, tier, levels):
     plan.update({"valid": True, "entry": entry_price, "stop": stop_price, "targets": [t1, t2, t3]})
     return plan
 
+def radar_verdict(symbol, anchor, levels, overrides=None):
+    """Radar tier and trade plan for each side of one locked session.
+    Also used by harness/walk_forward.py so replayed 15M decisions follow
+    the same rules as the simulator."""
+    bo = float(levels.get("breakout_trigger", 0))
+    bd = float(levels.get("breakdown_trigger", 0))
+    dr = float(levels.get("daily_resistance", 0))
+    ds = float(levels.get("daily_support", 0))
+    l_gap, l_tier = _eval_side(symbol, anchor, bo, dr, (bo > dr and dr > 0), overrides)
+    s_gap, s_tier = _eval_side(symbol, anchor, bd, ds, (bd < ds and ds > 0), overrides)
+    return {
+        "LONG": {"gap": l_gap, "tier": l_tier, "plan": _get_plan(symbol, anchor, "LONG", l_tier, levels)},
+        "SHORT": {"gap": s_gap, "tier": s_tier, "plan": _get_plan(symbol, anchor, "SHORT", s_tier, levels)},
+    }
+
 # ==============================================================================
 # 2. HISTORICAL DATA RECONSTRUCTION HELPER
 # ==============================================================================
@@ -118,201 +143,384 @@ def _calc_momentum(df, current_ts, hours_back):
     except:
         return "NEUTRAL"
 
+def _prepare_sessions(raw_5m, start_dt, end_dt, active_cfgs):
+    """Levels + execution candles for every session in range. Nothing here
+    depends on the what-if overrides, so a sweep builds this list once."""
+    sessions = []
+    curr_day = start_dt
+    while curr_day <= end_dt:
+        query_time = curr_day + timedelta(hours=12)
+        for cfg in active_cfgs:
+            anchor_ts = session_manager.anchor_ts_for_utc_date(cfg, query_time)
+            actual_date = datetime.fromtimestamp(anchor_ts, tz=timezone.utc).strftime("%Y-%m-%d")
+            lock_end_ts = anchor_ts + 1800  
+            exec_end_ts = lock_end_ts + (12 * 3600) 
+
+            calibration = _slice_by_ts(raw_5m, anchor_ts, lock_end_ts)
+            if len(calibration) < 6: continue 
+            
+            context_24h = _slice_by_ts(raw_5m, lock_end_ts - 86400, lock_end_ts)
+            session_candles = _slice_by_ts(raw_5m, lock_end_ts, exec_end_ts)
+            anchor_price = calibration[0]["open"]
+
+            # A. Reconstruct Levels
+            sse_input = {
+                "locked_history_5m": context_24h,
+                "session_open_price": anchor_price,
+                "r30_high": max(c["high"] for c in calibration),
+                "r30_low": min(c["low"] for c in calibration),
+                "last_price": context_24h[-1]["close"],
+                "tuning": {}
+            }
+            computed = sse_engine.compute_sse_levels(sse_input)
+            lvls = computed.get("levels", {})
+            
+            bo = float(lvls.get("breakout_trigger", 0))
+            bd = float(lvls.get("breakdown_trigger", 0))
+            if not bo or not bd: continue
+
+            sessions.append({
+                "date": actual_date,
+                "anchor_price": anchor_price,
+                "levels": lvls,
+                "candles": session_candles,
+                "hlc": np.array([(c["high"], c["low"], c["close"]) for c in session_candles], dtype=float).reshape(-1, 3),
+            })
+        curr_day += timedelta(days=1)
+    return sessions
+
+def _stack_bars(sessions):
+    """(bars, offsets): the sessions' (high, low, close) rows stacked, and
+    where each session starts in them."""
+    if not sessions: return np.empty((0, 3)), []
+    lengths = [len(s["hlc"]) for s in sessions]
+    offsets = [0]
+    for n in lengths[:-1]: offsets.append(offsets[-1] + n)
+    return np.concatenate([s["hlc"] for s in sessions]), offsets
+
+def _scenario(payload: dict) -> dict:
+    """Entry/stop style and what-if overrides from a run_simulation payload."""
+    return {
+        # User Scenarios
+        "entry_style": payload.get("entry_style", "15m_close"), # instant, 15m_close, pullback
+        "stop_style": payload.get("stop_style", "radar_default"), # radar_default, 15m_candle
+        # What-If Overrides
+        "overrides": {
+            "use_custom": payload.get("use_custom_gaps", False),
+            "min_gap": float(payload.get("min_gap", 0.5)),
+            "primal_max": float(payload.get("primal_max", 1.5)),
+            "exhaust_max": float(payload.get("exhaust_max", 2.25)),
+            "allow_jb": payload.get("allow_jb", True)
+        },
+    }
+
 # ==============================================================================
 # 3. THE SIMULATION LOOP
 # ==============================================================================
-async def run_simulation(payload: dict):
+def _simulate(symbol, sessions, scenario):
+    entry_style = scenario["entry_style"]
+    stop_style = scenario["stop_style"]
+    overrides = scenario["overrides"]
+
+    stats = {"total_trades": 0, "skipped": 0, "wins_t1": 0, "wins_t2": 0, "wins_t3": 0, "stops": 0}
+    trade_log = []
+    pending = []
+
+    # Every session's bars in one flat array; trades index into it.
+    bars, offsets = _stack_bars(sessions)
+
+    for n_sess, sess in enumerate(sessions):
+        actual_date = sess["date"]
+        anchor_price = sess["anchor_price"]
+        lvls = sess["levels"]
+        session_candles = sess["candles"]
+
+        bo = float(lvls.get("breakout_trigger", 0))
+        bd = float(lvls.get("breakdown_trigger", 0))
+
+        # B. Query Market Radar Brain
+        radar = radar_verdict(symbol, anchor_price, lvls, overrides)
+        l_tier, l_plan = radar["LONG"]["tier"], radar["LONG"]["plan"]
+        s_tier, s_plan = radar["SHORT"]["tier"], radar["SHORT"]["plan"]
+
+        # C. Execution Engine (ONE AND DONE RULE)
+        trade_taken = False
+        triggered_dir = None
+        plan = None
+        tier = ""
+
+        for i, c in enumerate(session_candles):
+            # Find the absolute first trigger breach
+            if not trade_taken:
+                if c['high'] >= bo:
+                    triggered_dir = "LONG"
+                    plan = l_plan
+                    tier = l_tier
+                    trigger_idx = i
+                    trade_taken = True
+                elif c['low'] <= bd:
+                    triggered_dir = "SHORT"
+                    plan = s_plan
+                    tier = s_tier
+                    trigger_idx = i
+                    trade_taken = True
+            
+            if trade_taken:
+                break # Break loop to process the locked trade
+
+        if not trade_taken:
+            continue # Day ended with no triggers hit
+
+        if not plan['valid']:
+            stats["skipped"] += 1
+            trade_log.append({"date": actual_date, "status": "SKIPPED", "msg": f"Triggered {triggered_dir}, but Radar ruled: {tier}"})
+            continue
+
+        # Execute Entry Style
+        actual_entry = 0
+        actual_stop = plan['stop']
+        exec_idx = -1
+
+        if entry_style == "instant":
+            actual_entry = plan['entry']
+            exec_idx = trigger_idx
+
+        elif entry_style == "15m_close" or entry_style == "pullback":
+            # Wait for the current 15m block to close
+            for j in range(trigger_idx, len(session_candles)):
+                cc = session_candles[j]
+                minute = datetime.fromtimestamp(cc["time"], tz=timezone.utc).minute
+                if minute in [10, 25, 40, 55]:
+                    # This is the 15m close
+                    if entry_style == "15m_close":
+                        actual_entry = cc['close']
+                        exec_idx = j
+                        if stop_style == "15m_candle":
+                            actual_stop = cc['low'] if triggered_dir == "LONG" else cc['high']
+                    elif entry_style == "pullback":
+                        # We have the close. Now we set a limit order at the exact trigger line.
+                        limit_price = plan['entry']
+                        for k in range(j + 1, len(session_candles)):
+                            pc = session_candles[k]
+                            if (triggered_dir == "LONG" and pc['low'] <= limit_price) or \
+                               (triggered_dir == "SHORT" and pc['high'] >= limit_price):
+                                actual_entry = limit_price
+                                exec_idx = k
+                                if stop_style == "15m_candle":
+                                    actual_stop = cc['low'] if triggered_dir == "LONG" else cc['high']
+                                break
+                    break
+        
+        if exec_idx == -1 or actual_entry == 0:
+            trade_log.append({"date": actual_date, "status": "MISSED ENTRY", "msg": f"{triggered_dir} triggered but entry criteria ({entry_style}) never met."})
+            continue
+
+        # Run the Trade to Conclusion (batched below, one kernel call for every trade)
+        trade_log.append(None)
+        pending.append({
+            "log_idx": len(trade_log) - 1,
+            "date": actual_date, "dir": triggered_dir, "tier": tier,
+            "entry": actual_entry, "stop": actual_stop, "targets": plan['targets'],
+            "start": offsets[n_sess] + exec_idx + 1, "end": offsets[n_sess] + len(session_candles),
+        })
+
+    if pending:
+        res = execution_kernel.resolve_trades(
+            bars[:, 0], bars[:, 1], bars[:, 2],
+            [p["start"] for p in pending], [p["end"] for p in pending],
+            [p["dir"] == "LONG" for p in pending],
+            [p["entry"] for p in pending], [p["stop"] for p in pending],
+            [p["targets"] for p in pending],
+        )
+        for i, p in enumerate(pending):
+            stopped = bool(res["exit_reason"][i] == execution_kernel.EXIT_STOP)
+            hit_t1, hit_t2, hit_t3 = (bool(v) for v in res["reached"][i])
+
+            # Tally
+            stats["total_trades"] += 1
+            if stopped: stats["stops"] += 1
+            elif hit_t3: stats["wins_t3"] += 1
+            elif hit_t2: stats["wins_t2"] += 1
+            elif hit_t1: stats["wins_t1"] += 1
+
+            res_str = "STOPPED OUT" if stopped else ("HIT T3" if hit_t3 else ("HIT T2" if hit_t2 else ("HIT T1" if hit_t1 else "TIME EXPIRED")))
+
+            trade_log[p["log_idx"]] = {
+                "date": p["date"],
+                "status": res_str,
+                "msg": f"{p['dir']} | {p['tier']} | In @ {p['entry']:.1f} | Stop @ {p['stop']:.1f} | T1:{hit_t1} T2:{hit_t2} T3:{hit_t3}"
+            }
+
+    return {"stats": stats, "log": trade_log}
+
+async def _load_sessions(payload: dict):
+    """(symbol, sessions) for a payload's symbol / date range / session ids."""
     symbol = payload.get("symbol", "BTCUSDT").strip().upper()
     start_date = payload.get("start_date_utc")
     end_date = payload.get("end_date_utc")
     session_ids = payload.get("session_ids", ["us_ny_futures"])
+
+    start_dt = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    fetch_start_dt = start_dt - timedelta(days=10) # Enough for 168h momentum
+    end_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
     
-    # User Scenarios
-    entry_style = payload.get("entry_style", "15m_close") # instant, 15m_close, pullback
-    stop_style = payload.get("stop_style", "radar_default") # radar_default, 15m_candle
-    
-    # What-If Overrides
-    overrides = {
-        "use_custom": payload.get("use_custom_gaps", False),
-        "min_gap": float(payload.get("min_gap", 0.5)),
-        "primal_max": float(payload.get("primal_max", 1.5)),
-        "exhaust_max": float(payload.get("exhaust_max", 2.25)),
-        "allow_jb": payload.get("allow_jb", True)
-    }
+    raw_5m = await battlebox_pipeline.fetch_historical_pagination(
+        symbol, int(fetch_start_dt.timestamp()), int(end_dt.timestamp())
+    )
+    if not raw_5m: return symbol, None
+
+    active_cfgs = [s for s in session_manager.SESSION_CONFIGS if s["id"] in session_ids]
+    return symbol, _prepare_sessions(raw_5m, start_dt, end_dt, active_cfgs)
 
+async def run_simulation(payload: dict):
     try:
-        start_dt = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-        fetch_start_dt = start_dt - timedelta(days=10) # Enough for 168h momentum
-        end_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
-        
-        raw_5m = await battlebox_pipeline.fetch_historical_pagination(
-            symbol, int(fetch_start_dt.timestamp()), int(end_dt.timestamp())
-        )
-        if not raw_5m: return {"ok": False, "error": "No data found"}
+        symbol, sessions = await _load_sessions(payload)
+        if sessions is None: return {"ok": False, "error": "No data found"}
 
-        df = pd.DataFrame(raw_5m)
-        df['time'] = pd.to_datetime(df['time'], unit='s', utc=True)
-        df.set_index('time', inplace=True)
-        df.sort_index(inplace=True)
+        out = _simulate(symbol, sessions, _scenario(payload))
+        return {"ok": True, "stats": out["stats"], "log": out["log"]}
 
-        active_cfgs = [s for s in session_manager.SESSION_CONFIGS if s["id"] in session_ids]
-        
-        stats = {"total_trades": 0, "skipped": 0, "wins_t1": 0, "wins_t2": 0, "wins_t3": 0, "stops": 0}
-        trade_log = []
-        curr_day = start_dt
-        
-        while curr_day <= end_dt:
-            query_time = curr_day + timedelta(hours=12)
-            for cfg in active_cfgs:
-                anchor_ts = session_manager.anchor_ts_for_utc_date(cfg, query_time)
-                actual_date = datetime.fromtimestamp(anchor_ts, tz=timezone.utc).strftime("%Y-%m-%d")
-                lock_end_ts = anchor_ts + 1800  
-                exec_end_ts = lock_end_ts + (12 * 3600) 
-
-                calibration = _slice_by_ts(raw_5m, anchor_ts, lock_end_ts)
-                if len(calibration) < 6: continue 
-                
-                context_24h = _slice_by_ts(raw_5m, lock_end_ts - 86400, lock_end_ts)
-                session_candles = _slice_by_ts(raw_5m, lock_end_ts, exec_end_ts)
-                anchor_price = calibration[0]["open"]
-
-                # A. Reconstruct Levels
-                sse_input = {
-                    "locked_history_5m": context_24h,
-                    "session_open_price": anchor_price,
-                    "r30_high": max(c["high"] for c in calibration),
-                    "r30_low": min(c["low"] for c in calibration),
-                    "last_price": context_24h[-1]["close"],
-                    "tuning": {}
-                }
-                computed = sse_engine.compute_sse_levels(sse_input)
-                lvls = computed.get("levels", {})
-                
-                bo = float(lvls.get("breakout_trigger", 0))
-                bd = float(lvls.get("breakdown_trigger", 0))
-                dr = float(lvls.get("daily_resistance", 0))
-                ds = float(lvls.get("daily_support", 0))
-                if not bo or not bd: continue
-
-                # B. Query Market Radar Brain
-                l_gap, l_tier = _eval_side(symbol, anchor_price, bo, dr, (bo > dr and dr > 0), overrides)
-                s_gap, s_tier = _eval_side(symbol, anchor_price, bd, ds, (bd < ds and ds > 0), overrides)
-                
-                l_plan = _get_plan(symbol, anchor_price, "LONG", l_tier, lvls)
-                s_plan = _get_plan(symbol, anchor_price, "SHORT", s_tier, lvls)
-
-                # C. Execution Engine (ONE AND DONE RULE)
-                trade_taken = False
-                triggered_dir = None
-                plan = None
-                tier = ""
-
-                for i, c in enumerate(session_candles):
-                    # Find the absolute first trigger breach
-                    if not trade_taken:
-                        if c['high'] >= bo:
-                            triggered_dir = "LONG"
-                            plan = l_plan
-                            tier = l_tier
-                            trigger_idx = i
-                            trade_taken = True
-                        elif c['low'] <= bd:
-                            triggered_dir = "SHORT"
-                            plan = s_plan
-                            tier = s_tier
-                            trigger_idx = i
-                            trade_taken = True
-                    
-                    if trade_taken:
-                        break # Break loop to process the locked trade
-
-                if not trade_taken:
-                    continue # Day ended with no triggers hit
-
-                if not plan['valid']:
-                    stats["skipped"] += 1
-                    trade_log.append({"date": actual_date, "status": "SKIPPED", "msg": f"Triggered {triggered_dir}, but Radar ruled: {tier}"})
-                    continue
-
-                # Execute Entry Style
-                actual_entry = 0
-                actual_stop = plan['stop']
-                exec_idx = -1
-
-                if entry_style == "instant":
-                    actual_entry = plan['entry']
-                    exec_idx = trigger_idx
-
-                elif entry_style == "15m_close" or entry_style == "pullback":
-                    # Wait for the current 15m block to close
-                    for j in range(trigger_idx, len(session_candles)):
-                        cc = session_candles[j]
-                        minute = datetime.fromtimestamp(cc["time"], tz=timezone.utc).minute
-                        if minute in [10, 25, 40, 55]:
-                            # This is the 15m close
-                            if entry_style == "15m_close":
-                                actual_entry = cc['close']
-                                exec_idx = j
-                                if stop_style == "15m_candle":
-                                    actual_stop = cc['low'] if triggered_dir == "LONG" else cc['high']
-                            elif entry_style == "pullback":
-                                # We have the close. Now we set a limit order at the exact trigger line.
-                                limit_price = plan['entry']
-                                for k in range(j + 1, len(session_candles)):
-                                    pc = session_candles[k]
-                                    if (triggered_dir == "LONG" and pc['low'] <= limit_price) or \
-                                       (triggered_dir == "SHORT" and pc['high'] >= limit_price):
-                                        actual_entry = limit_price
-                                        exec_idx = k
-                                        if stop_style == "15m_candle":
-                                            actual_stop = cc['low'] if triggered_dir == "LONG" else cc['high']
-                                        break
-                            break
-                
-                if exec_idx == -1 or actual_entry == 0:
-                    trade_log.append({"date": actual_date, "status": "MISSED ENTRY", "msg": f"{triggered_dir} triggered but entry criteria ({entry_style}) never met."})
-                    continue
-
-                # Run the Trade to Conclusion
-                hit_t1, hit_t2, hit_t3, stopped = False, False, False, False
-                for j in range(exec_idx + 1, len(session_candles)):
-                    tc = session_candles[j]
-                    
-                    if (triggered_dir == 'LONG' and tc['low'] <= actual_stop) or \
-                       (triggered_dir == 'SHORT' and tc['high'] >= actual_stop):
-                        stopped = True
-                        break
-                    
-                    if triggered_dir == 'LONG':
-                        if tc['high'] >= plan['targets'][0]: hit_t1 = True
-                        if tc['high'] >= plan['targets'][1]: hit_t2 = True
-                        if tc['high'] >= plan['targets'][2]: hit_t3 = True
-                    else:
-                        if tc['low'] <= plan['targets'][0]: hit_t1 = True
-                        if tc['low'] <= plan['targets'][1]: hit_t2 = True
-                        if tc['low'] <= plan['targets'][2]: hit_t3 = True
-                    
-                    if hit_t3: break
-
-                # Tally
-                stats["total_trades"] += 1
-                if stopped: stats["stops"] += 1
-                elif hit_t3: stats["wins_t3"] += 1
-                elif hit_t2: stats["wins_t2"] += 1
-                elif hit_t1: stats["wins_t1"] += 1
-
-                res_str = "STOPPED OUT" if stopped else ("HIT T3" if hit_t3 else ("HIT T2" if hit_t2 else ("HIT T1" if hit_t1 else "TIME EXPIRED")))
-
-                trade_log.append({
-                    "date": actual_date,
-                    "status": res_str,
-                    "msg": f"{triggered_dir} | {tier} | In @ {actual_entry:.1f} | Stop @ {actual_stop:.1f} | T1:{hit_t1} T2:{hit_t2} T3:{hit_t3}"
-                })
-
-            curr_day += timedelta(days=1)
-
-        return {"ok": True, "stats": stats, "log": trade_log}
+    except Exception as e:
+        traceback.print_exc()
+        return {"ok": False, "error": str(e)}
+
+# ==============================================================================
+# 4. PARAMETER SWEEP
+# ==============================================================================
+# One history load and one pass of compute_sse_levels, then every override
+# combination replays the same sessions. The combinations fan out over a
+# process pool; each worker receives the sessions once through the pool
+# initializer instead of once per task.
+#
+# The sweep runs inside the web process, so the pool is capped at 2 workers
+# by default to leave cores for request handling. Set SIM_SWEEP_WORKERS to
+# override (e.g. on a dedicated worker box); a request's "workers" field can
+# only lower it.
+SWEEP_PARAMS = ("min_gap", "primal_max", "exhaust_max", "allow_jb", "entry_style", "stop_style")
+SWEEP_RANK_KEYS = ("win_rate", "total_trades", "wins_t3", "stops", "skipped")
+SIM_SWEEP_MAX_COMBOS = int(os.getenv("SIM_SWEEP_MAX_COMBOS", "500"))
+SIM_SWEEP_WORKERS = max(1, int(os.getenv("SIM_SWEEP_WORKERS", "2")))
+
+_GAP_PARAMS = ("min_gap", "primal_max", "exhaust_max", "allow_jb")
+_sweep_state = {}
+
+def _sweep_combos(payload: dict):
+    """Override dicts from either a `grid` ({param: [values]}, full product)
+    or a `random` block ({"samples", "space": {param: [values] | [lo, hi]}, "seed"})."""
+    grid = payload.get("grid")
+    rnd = payload.get("random")
+    if grid:
+        unknown = set(grid) - set(SWEEP_PARAMS)
+        if unknown: raise ValueError(f"Unknown sweep params: {sorted(unknown)}")
+        keys = list(grid)
+        total = 1
+        for k in keys: total *= len(grid[k])
+        if total > SIM_SWEEP_MAX_COMBOS:
+            raise ValueError(f"Grid has {total} combinations (max {SIM_SWEEP_MAX_COMBOS})")
+        return [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))]
+
+    if rnd:
+        space = rnd.get("space") or {}
+        unknown = set(space) - set(SWEEP_PARAMS)
+        if unknown: raise ValueError(f"Unknown sweep params: {sorted(unknown)}")
+        samples = min(int(rnd.get("samples", 50)), SIM_SWEEP_MAX_COMBOS)
+        rng = random.Random(rnd.get("seed"))
+        combos = []
+        for _ in range(samples):
+            combo = {}
+            for k, spec in space.items():
+                # Two numbers on a numeric param = a continuous range, anything else = choices.
+                if k in ("min_gap", "primal_max", "exhaust_max") and len(spec) == 2 \
+                        and all(isinstance(v, (int, float)) for v in spec):
+                    combo[k] = round(rng.uniform(spec[0], spec[1]), 3)
+                else:
+                    combo[k] = rng.choice(spec)
+            combos.append(combo)
+        return combos
+
+    raise ValueError("Sweep needs a 'grid' or 'random' block")
+
+def _combo_scenario(base: dict, combo: dict) -> dict:
+    scenario = _scenario({**base, **combo})
+    if any(k in combo for k in _GAP_PARAMS):
+        scenario["overrides"]["use_custom"] = True
+    return scenario
+
+def _combo_result(params, out, include_log):
+    s = out["stats"]
+    wins = s["wins_t1"] + s["wins_t2"] + s["wins_t3"]
+    row = {
+        "params": params,
+        "stats": s,
+        "win_rate": round(wins / s["total_trades"] * 100, 2) if s["total_trades"] else 0.0,
+    }
+    if include_log: row["log"] = out["log"]
+    return row
+
+def _sweep_init(symbol, sessions, base, include_log):
+    _sweep_state.update(symbol=symbol, sessions=sessions, base=base, include_log=include_log)
+
+def _sweep_eval(combo):
+    st = _sweep_state
+    out = _simulate(st["symbol"], st["sessions"], _combo_scenario(st["base"], combo))
+    return _combo_result(combo, out, st["include_log"])
+
+def _rank(rows, rank_by):
+    def key(r):
+        v = r["win_rate"] if rank_by == "win_rate" else r["stats"].get(rank_by, 0)
+        # Fewer is better for losses; more is better for everything else.
+        primary = -v if rank_by in ("stops", "skipped") else v
+        return (primary, r["stats"]["total_trades"])
+    rows.sort(key=key, reverse=True)
+    for i, r in enumerate(rows, 1): r["rank"] = i
+    return rows
+
+def _sweep_inline(symbol, sessions, combos, base, include_log):
+    # Local arguments, not _sweep_state: that global belongs to pool workers,
+    # and concurrent inline sweeps in this process would overwrite it.
+    return [_combo_result(c, _simulate(symbol, sessions, _combo_scenario(base, c)), include_log) for c in combos]
+
+def _run_sweep(symbol, sessions, combos, base, include_log, workers):
+    if workers <= 1 or len(combos) <= 1:
+        return _sweep_inline(symbol, sessions, combos, base, include_log)
+    try:
+        # spawn: forked children would inherit the event loop and DB pool.
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(combos)), mp_context=ctx,
+                                 initializer=_sweep_init,
+                                 initargs=(symbol, sessions, base, include_log)) as pool:
+            return list(pool.map(_sweep_eval, combos, chunksize=max(1, len(combos) // (workers * 4))))
+    except Exception as e:
+        print(f"[SIMULATOR] Sweep pool failed ({e}); running inline")
+        return _sweep_inline(symbol, sessions, combos, base, include_log)
+
+async def run_parameter_sweep(payload: dict):
+    """Same payload as run_simulation plus `grid` or `random`, `rank_by`
+    (one of SWEEP_RANK_KEYS), `top` and `include_log`. Returns the combos
+    ranked best first."""
+    try:
+        combos = _sweep_combos(payload)
+        rank_by = payload.get("rank_by", "win_rate")
+        if rank_by not in SWEEP_RANK_KEYS:
+            return {"ok": False, "error": f"rank_by must be one of {list(SWEEP_RANK_KEYS)}"}
+        include_log = bool(payload.get("include_log", False))
+        # A request may ask for fewer processes, never more than the host allows.
+        workers = max(1, min(int(payload.get("workers") or SIM_SWEEP_WORKERS), SIM_SWEEP_WORKERS))
+
+        symbol, sessions = await _load_sessions(payload)
+        if sessions is None: return {"ok": False, "error": "No data found"}
+
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(
+            None, _run_sweep, symbol, sessions, combos, payload, include_log, workers
+        )
+        rows = _rank(rows, rank_by)
+        top = payload.get("top")
+        if top: rows = rows[: int(top)]
+        return {"ok": True, "combos": len(combos), "sessions": len(sessions), "rank_by": rank_by, "results": rows}
 
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
     except Exception as e:
         traceback.print_exc()
-        return {"ok": False, "error": str(e)}
\ No newline at end of file
+        return {"ok": False, "error": str(e)}
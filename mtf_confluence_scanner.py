@@ -25,8 +25,11 @@ from market_data import (
     _normalize_symbol,
     _calc_ema_series,
     _calc_adx,
+    TARGETS,
 )
 import gravity_math
+import request_spans
+import rolling_stats
 
 # Three Drives / Revin Suite (revin_ribbons, rmo, rwp, revin_suite_engine)
 # removed 2026-08-17 -- Kabroda Audit AUDIT_FINDINGS.md #1-3/#5: all four
@@ -36,9 +39,6 @@ import gravity_math
 # neutral placeholder values its own error_result already used for
 # insufficient-data cases -- no downstream consumer needed a code change.
 
-TARGETS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
-
-
 # ------------------------------------------------------------------------------
 # WEEKLY RESAMPLER
 # ------------------------------------------------------------------------------
@@ -210,11 +210,10 @@ def _calc_bbwp(candles: List[Dict], period: int = 20, lookback: int = 252) -> Di
         return {"bbwp_value": round(current_bw, 4), "bbwp_compressed": current_bw < 25.0}
 
     # Percentile rank of current_bw vs up to `lookback` historical values
-    history = bw_series[-(min(lookback, len(bw_series)) + 1) : -1]
-    if not history:
+    rank = rolling_stats.percentile_rank_last(bw_series, lookback)
+    if rank is None:
         return {"bbwp_value": round(current_bw, 4), "bbwp_compressed": current_bw < 25.0}
 
-    rank = sum(1 for v in history if v <= current_bw) / len(history) * 100.0
     return {"bbwp_value": round(rank, 2), "bbwp_compressed": rank < 25.0}
 
 
@@ -258,15 +257,14 @@ def _calc_pmarp(
             "pmarp_direction": direction,
         }
 
-    history = ratio_series[-(min(lookback, len(ratio_series)) + 1) : -1]
-    if not history:
+    rank = rolling_stats.percentile_rank_last(ratio_series, lookback)
+    if rank is None:
         return {
             "pmarp_value": round(abs(current_ratio), 4),
             "pmarp_overextended": False,
             "pmarp_direction": direction,
         }
 
-    rank = sum(1 for v in history if v <= current_ratio) / len(history) * 100.0
     return {
         "pmarp_value": round(rank, 2),
         "pmarp_overextended": rank > 75.0,
@@ -283,24 +281,12 @@ def _calc_pmarp(
 
 def _find_pivot_highs(series: List[float], n: int = 3) -> List[Tuple[int, float]]:
     """Indices and values of bars higher than the n bars before AND after."""
-    pivots: List[Tuple[int, float]] = []
-    for i in range(n, len(series) - n):
-        val = series[i]
-        if all(val > series[i - j] for j in range(1, n + 1)) and \
-           all(val > series[i + j] for j in range(1, n + 1)):
-            pivots.append((i, val))
-    return pivots
+    return [(i, series[i]) for i in rolling_stats.pivot_highs(series, n, n, strict_left=True)]
 
 
 def _find_pivot_lows(series: List[float], n: int = 3) -> List[Tuple[int, float]]:
     """Indices and values of bars lower than the n bars before AND after."""
-    pivots: List[Tuple[int, float]] = []
-    for i in range(n, len(series) - n):
-        val = series[i]
-        if all(val < series[i - j] for j in range(1, n + 1)) and \
-           all(val < series[i + j] for j in range(1, n + 1)):
-            pivots.append((i, val))
-    return pivots
+    return [(i, series[i]) for i in rolling_stats.pivot_lows(series, n, n, strict_left=True)]
 
 
 def _find_divergence(
@@ -579,8 +565,10 @@ def _find_key_levels(
     support: Optional[float] = None
 
     try:
-        kde = gravity_math.calculate_gravity_kde(symbol)
-        peaks = kde.get("peaks", [])
+        with request_spans.span("gravity_kde") as sp:
+            kde = gravity_math.calculate_gravity_kde(symbol)
+            peaks = kde.get("peaks", [])
+            sp["peaks"] = len(peaks)
         if peaks:
             above = [p["price"] for p in peaks if p["price"] > current_price]
             below = [p["price"] for p in peaks if p["price"] < current_price]
@@ -694,27 +682,30 @@ def _build_summary(
 
 async def run_mtf_confluence_scan(symbol: str) -> Dict[str, Any]:
     """Run full 5-TF JEWEL scan for a single symbol. Live data only."""
+    with request_spans.trace("mtf_confluence", symbol=symbol):
+        return await _mtf_confluence_scan(symbol)
+
+
+async def _mtf_confluence_scan(symbol: str) -> Dict[str, Any]:
     norm_sym = _normalize_symbol(symbol)
 
     # 4H bumped to 280 so percentile rank covers full 252-period lookback
-    raw_15m, raw_1h, raw_4h, raw_daily = await asyncio.gather(
-        fetch_live_15m(norm_sym, limit=300),
-        fetch_live_1h(norm_sym, limit=300),
-        fetch_live_4h(norm_sym, limit=280),
-        fetch_live_daily(norm_sym, limit=500),
-    )
+    with request_spans.span("fetch"):
+        raw_15m, raw_1h, raw_4h, raw_daily = await asyncio.gather(
+            request_spans.timed("fetch_15m", fetch_live_15m(norm_sym, limit=300), count="candles"),
+            request_spans.timed("fetch_1h", fetch_live_1h(norm_sym, limit=300), count="candles"),
+            request_spans.timed("fetch_4h", fetch_live_4h(norm_sym, limit=280), count="candles"),
+            request_spans.timed("fetch_1d", fetch_live_daily(norm_sym, limit=500), count="candles"),
+        )
 
     raw_weekly = _resample_weekly(raw_daily)
 
     current_price = raw_15m[-1]["close"] if raw_15m else 0.0
 
-    tf_data = {
-        "15M": _analyze_timeframe(raw_15m, "15M"),
-        "1H": _analyze_timeframe(raw_1h, "1H"),
-        "4H": _analyze_timeframe(raw_4h, "4H"),
-        "1D": _analyze_timeframe(raw_daily, "1D"),
-        "1W": _analyze_timeframe(raw_weekly, "1W"),
-    }
+    tf_data = {}
+    for tf, candles in (("15M", raw_15m), ("1H", raw_1h), ("4H", raw_4h), ("1D", raw_daily), ("1W", raw_weekly)):
+        with request_spans.span(f"analyze_{tf}", candles=len(candles)):
+            tf_data[tf] = _analyze_timeframe(candles, tf)
 
     bull_count = sum(1 for v in tf_data.values() if v.get("direction_vote") == "BULLISH")
     bear_count = sum(1 for v in tf_data.values() if v.get("direction_vote") == "BEARISH")
@@ -742,7 +733,8 @@ async def run_mtf_confluence_scan(symbol: str) -> Dict[str, Any]:
 
     jewel_signal = _build_jewel_signal(tf_data, dominant_direction)
 
-    levels = _find_key_levels(norm_sym, raw_4h, current_price)
+    with request_spans.span("key_levels", candles=len(raw_4h)):
+        levels = _find_key_levels(norm_sym, raw_4h, current_price)
 
     summary = _build_summary(tf_data, score, conviction, dominant_direction, current_price, levels)
 
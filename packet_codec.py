@@ -0,0 +1,96 @@
+# packet_codec.py
+# ==============================================================================
+# KABRODA SESSION-LOCK PACKET CODEC
+# Purpose: Compact, versioned storage for SessionLock packets plus a
+# per-process decode cache.
+#
+# A locked battlebox packet (levels, htf_shelves, macro structure arrays,
+# MTF structural snapshot) used to be stored as a raw json.dumps() string and
+# re-parsed with json.loads() by every reader: get_live_battlebox, the radar
+# shortcut, session_monitor, the Senior Analyst recovery fire and the admin
+# dashboards. session_locks is keep-forever, so the text adds up.
+#
+# Wire format (SessionLock.packet_blob):
+#   byte 0    format version
+#   byte 1..  payload
+#   v1 = zlib-compressed UTF-8 JSON, produced with json.dumps(pkt, default=str)
+#        so decoded packets are identical to what the old String column held.
+# Legacy rows (packet_blob NULL) fall back to json.loads(packet_data).
+#
+# Locks are write-once, so the decoded packet is cached by lock id (bounded
+# LRU). Cached packets are shared across callers -- treat them as read-only,
+# the same contract battlebox_pipeline._LOCKED_PACKETS already has.
+# ==============================================================================
+
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict
+
+import orjson
+
+FORMAT_JSON_ZLIB = 1
+CURRENT_FORMAT = FORMAT_JSON_ZLIB
+
+_ZLIB_LEVEL = 6
+_CACHE_MAX = 64
+
+_cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def encode_packet(pkt: Dict[str, Any]) -> bytes:
+    raw = json.dumps(pkt, default=str).encode("utf-8")
+    return bytes([CURRENT_FORMAT]) + zlib.compress(raw, _ZLIB_LEVEL)
+
+
+def _loads(raw: bytes) -> Dict[str, Any]:
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # json.dumps emits NaN/Infinity tokens that orjson rejects.
+        return json.loads(raw)
+
+
+def decode_packet(blob: bytes) -> Dict[str, Any]:
+    if not blob:
+        raise ValueError("empty packet blob")
+    version = blob[0]
+    if version == FORMAT_JSON_ZLIB:
+        return _loads(zlib.decompress(blob[1:]))
+    raise ValueError(f"unknown packet format version {version}")
+
+
+def lock_fields(pkt: Dict[str, Any]) -> Dict[str, Any]:
+    """Column values for a new SessionLock row holding `pkt`."""
+    return {"packet_data": "", "packet_blob": encode_packet(pkt)}
+
+
+def load_lock_packet(lock) -> Dict[str, Any]:
+    """Decoded packet for a SessionLock row, parsed at most once per process."""
+    lock_id = lock.id
+    if lock_id is not None:
+        with _cache_lock:
+            pkt = _cache.get(lock_id)
+            if pkt is not None:
+                _cache.move_to_end(lock_id)
+                _stats["hits"] += 1
+                return pkt
+
+    blob = lock.packet_blob
+    pkt = decode_packet(blob) if blob else _loads(lock.packet_data.encode("utf-8"))
+
+    if lock_id is not None:
+        with _cache_lock:
+            _stats["misses"] += 1
+            _cache[lock_id] = pkt
+            while len(_cache) > _CACHE_MAX:
+                _cache.popitem(last=False)
+    return pkt
+
+
+def get_stats() -> Dict[str, Any]:
+    with _cache_lock:
+        return {**_stats, "cached": len(_cache), "max": _CACHE_MAX}
@@ -0,0 +1,118 @@
+# replay_clock.py
+# ==============================================================================
+# KABRODA REPLAY CLOCK
+# Purpose: One place the live loops ask "what time is it?", so a recorded day
+# can be driven through them faster than real time (harness/replay.py).
+#
+# now_utc() / time() return the wall clock until a ReplayClock is installed,
+# then the replay's simulated time. Callers that matter for replay:
+# battlebox_pipeline.get_live_battlebox, session_monitor.run_session_monitor_loop,
+# ledger_closing_engine.run_ledger_audit_loop and cache_backend's TTLs.
+#
+# ReplayClock.bind(loop) makes that loop run on virtual time: asyncio.sleep()
+# and every other timer fire in order, but instead of blocking until a timer
+# is due the loop jumps straight to it (optionally pacing at `speed`x real
+# time). The order of wake-ups depends only on the timers, so a replay is
+# deterministic. Virtual time is held while executor work (asyncio.to_thread
+# -- DB locks, the macro oracle) is in flight, so a thread that takes real
+# time never lets the simulated day run ahead of it.
+# Stdlib only -- importable from any module, including cache_backend.
+# ==============================================================================
+
+import asyncio
+import time as _time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+_active: Optional["ReplayClock"] = None
+
+
+def now_utc() -> datetime:
+    """Timezone-aware UTC now -- simulated while a replay is installed."""
+    return _active.now() if _active is not None else datetime.now(timezone.utc)
+
+
+def time() -> float:
+    """Epoch seconds -- simulated while a replay is installed."""
+    return _active.time() if _active is not None else _time.time()
+
+
+def install(clock: "ReplayClock") -> None:
+    global _active
+    _active = clock
+
+
+def uninstall() -> None:
+    global _active
+    _active = None
+
+
+def active() -> Optional["ReplayClock"]:
+    return _active
+
+
+class ReplayClock:
+    """Simulated wall clock starting at `start`, driven by a bound event loop.
+    speed=None runs as fast as the work allows; speed=100 paces timers at
+    100x real time (useful when profiling under a realistic request rate)."""
+
+    def __init__(self, start: datetime, speed: Optional[float] = None):
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive (or None for unpaced)")
+        self.start = start
+        self.speed = speed
+        self._vtime = 0.0  # the bound loop's time(): simulated seconds since start
+        self._inflight = 0
+        self._loop = None
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.elapsed())
+
+    def time(self) -> float:
+        return self.start.timestamp() + self.elapsed()
+
+    def elapsed(self) -> float:
+        """Simulated seconds since start."""
+        return self._vtime
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Put `loop` on virtual time. Call before running anything on it."""
+        if self._loop is not None:
+            raise RuntimeError("ReplayClock is already bound to a loop")
+        self._loop = loop
+        real_select = loop._selector.select
+        real_executor = loop.run_in_executor
+
+        def _select(timeout=None):
+            if timeout == 0:
+                return real_select(0)
+            if self._inflight:
+                # Executor work outstanding: wait for it in real time, clock held.
+                return real_select(None if timeout is None else 0.05)
+            events = real_select(0)
+            if events or timeout is None:
+                return events or real_select(None)
+            if self.speed:
+                _time.sleep(timeout / self.speed)
+            self._vtime += timeout
+            return events
+
+        def _run_in_executor(executor, func, *args):
+            fut = real_executor(executor, func, *args)
+            self._inflight += 1
+            fut.add_done_callback(self._executor_done)
+            return fut
+
+        loop._selector.select = _select
+        loop.time = lambda: self._vtime
+        loop.run_in_executor = _run_in_executor
+
+    def _executor_done(self, _fut) -> None:
+        self._inflight -= 1
+
+    async def sleep_until(self, when: datetime) -> None:
+        delay = (when - self.now()).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
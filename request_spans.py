@@ -0,0 +1,187 @@
+# request_spans.py
+# ==============================================================================
+# KABRODA REQUEST SPANS
+# Purpose: Per-stage timings for the request-path pipelines, so a slow
+# battlebox or confluence scan can be pinned to a stage in production without
+# attaching a profiler.
+#
+# trace(name, **attrs) -- context manager around one pipeline run
+#                         (battlebox_pipeline.get_live_battlebox,
+#                         mtf_confluence_scanner.run_mtf_confluence_scan). It
+#                         becomes the current trace for everything run inside
+#                         it, including tasks started by asyncio.gather and
+#                         asyncio.to_thread (both copy the context).
+# span(stage, **sizes) -- context manager timing one stage of the current
+#                         trace. Yields a dict: set payload sizes on it
+#                         (candles=..., levels=...) and they are recorded with
+#                         the duration. A no-op outside a trace.
+# annotate(**attrs)   -- attributes on the current trace (e.g. packet=cache).
+# timed(stage, aw, count=) -- span around one awaitable; `count` names the
+#                         size field filled with len() of the result. Used for
+#                         the concurrent fetches.
+#
+# Finished traces go into an in-memory ring buffer (REQUEST_SPANS_BUFFER,
+# default 500) read by recent() and summarized by get_stats() for
+# /api/v1/system/spans and /api/v1/system/state. With SLOW_REQUEST_MS set,
+# any trace slower than that is printed with its stage breakdown.
+# Concurrent stages overlap, so stage times need not add up to the total.
+# ==============================================================================
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, List, Optional
+
+import replay_clock
+
+BUFFER_SIZE = max(1, int(os.getenv("REQUEST_SPANS_BUFFER", "500")))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0") or 0)  # 0 = slow log off
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("request_trace", default=None)
+_lock = threading.Lock()
+_buffer: "deque[Dict[str, Any]]" = deque(maxlen=BUFFER_SIZE)
+_stats = {"traces": 0, "slow": 0}
+
+
+class Trace:
+    """One pipeline run: attrs (symbol, status ...) plus its finished spans."""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.spans: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "at": replay_clock.now_utc().isoformat(),
+            "total_ms": round((time.perf_counter() - self._t0) * 1000.0, 3),
+            **self.attrs,
+            "spans": list(self.spans),
+        }
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def annotate(**attrs: Any) -> None:
+    """Add attributes to the current trace (no-op outside one)."""
+    tr = _current.get()
+    if tr is not None:
+        tr.attrs.update(attrs)
+
+
+@contextmanager
+def trace(name: str, **attrs: Any):
+    """Time one pipeline run and file it in the ring buffer on exit. Set
+    further attributes on the yielded Trace's .attrs as they become known."""
+    tr = Trace(name, dict(attrs))
+    token = _current.set(tr)
+    try:
+        yield tr
+    except BaseException as e:
+        tr.attrs.setdefault("status", "EXCEPTION")
+        tr.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        _finish(tr)
+
+
+@contextmanager
+def span(stage: str, **sizes: Any):
+    tr = _current.get()
+    if tr is None:
+        yield {}
+        return
+    entry: Dict[str, Any] = {"stage": stage, **sizes}
+    t0 = time.perf_counter()
+    try:
+        yield entry
+    except BaseException as e:
+        entry["error"] = type(e).__name__
+        raise
+    finally:
+        entry["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+        tr.spans.append(entry)
+
+
+async def timed(stage: str, aw: Awaitable[Any], count: Optional[str] = None) -> Any:
+    with span(stage) as entry:
+        out = await aw
+        if count:
+            try:
+                entry[count] = len(out)
+            except TypeError:
+                pass
+        return out
+
+
+def _finish(tr: Trace) -> None:
+    rec = tr.record()
+    slow = SLOW_REQUEST_MS > 0 and rec["total_ms"] >= SLOW_REQUEST_MS
+    with _lock:
+        _buffer.append(rec)
+        _stats["traces"] += 1
+        _stats["slow"] += int(slow)
+    if slow:
+        attrs = " ".join(f"{k}={v}" for k, v in tr.attrs.items())
+        stages = " ".join(f"{s['stage']}={s['ms']:.1f}" for s in sorted(rec["spans"], key=lambda s: -s["ms"]))
+        print(f"[SLOW REQUEST] {tr.name} {attrs} total={rec['total_ms']:.1f}ms | {stages}")
+
+
+def recent(limit: int = 50, name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Newest-first finished traces, optionally only those called `name`."""
+    with _lock:
+        rows = list(_buffer)
+    rows = [r for r in reversed(rows) if name is None or r["name"] == name]
+    return rows[:max(0, limit)]
+
+
+def _summary(values: List[float]) -> Dict[str, Any]:
+    v = sorted(values)
+    return {
+        "count": len(v),
+        "p50_ms": v[(len(v) - 1) // 2],
+        "p95_ms": v[min(len(v) - 1, int(0.95 * len(v)))],
+        "max_ms": v[-1],
+    }
+
+
+def get_stats() -> Dict[str, Any]:
+    """Per trace name over the buffer: total and per-stage p50/p95/max, and the
+    payload sizes of the latest run of each stage."""
+    with _lock:
+        rows = list(_buffer)
+        counters = dict(_stats)
+    pipelines: Dict[str, Any] = {}
+    for name in dict.fromkeys(r["name"] for r in rows):
+        runs = [r for r in rows if r["name"] == name]
+        stages: Dict[str, List[float]] = {}
+        sizes: Dict[str, Dict[str, Any]] = {}
+        for r in runs:
+            for s in r["spans"]:
+                stages.setdefault(s["stage"], []).append(s["ms"])
+                sizes[s["stage"]] = {k: v for k, v in s.items() if k not in ("stage", "ms")}
+        pipelines[name] = {
+            "total": _summary([r["total_ms"] for r in runs]),
+            "stages": {st: {**_summary(ms), **sizes[st]} for st, ms in stages.items()},
+        }
+    return {
+        **counters,
+        "buffered": len(rows),
+        "buffer_size": BUFFER_SIZE,
+        "slow_request_ms": SLOW_REQUEST_MS or None,
+        "pipelines": pipelines,
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _buffer.clear()
+        _stats.update(traces=0, slow=0)
@@ -4,6 +4,7 @@
 # JOB: Reconstruct the exact "Phase 1" data packet from history.
 # CHAIN OF COMMAND: main.py -> run_research_lab -> battlebox_pipeline -> sse_engine
 # ==============================================================================
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 import traceback
@@ -13,25 +14,6 @@ import session_manager
 import sse_engine 
 import battlebox_pipeline  # Respects the chain of command for fetching data
 
-def _slice_by_ts(candles, start_ts, end_ts):
-    """Helper to cut candle arrays by timestamp"""
-    return [c for c in candles if start_ts <= c["time"] < end_ts]
-
-def _calculate_weekly_bias(df, current_time_ts):
-    try:
-        week_ago_ts = current_time_ts - (7 * 86400)
-        week_ago_idx = df.index.get_indexer([pd.to_datetime(week_ago_ts, unit='s', utc=True)], method='nearest')[0]
-        price_week_ago = df.iloc[week_ago_idx]['close']
-        
-        curr_idx = df.index.get_indexer([pd.to_datetime(current_time_ts, unit='s', utc=True)], method='nearest')[0]
-        price_now = df.iloc[curr_idx]['open']
-
-        if price_now > price_week_ago * 1.01: return "BULLISH"
-        if price_now < price_week_ago * 0.99: return "BEARISH"
-        return "NEUTRAL"
-    except:
-        return "NEUTRAL"
-
 def _precalculate_daily_emas(df_5m):
     try:
         df_daily = df_5m.resample('1D').agg({
@@ -84,6 +66,133 @@ async def run_research_lab(payload: dict):
         traceback.print_exc()
         return {"ok": False, "error": f"Research Lab Error: {str(e)}"}
 
+# ── Columnar session engine ───────────────────────────────────────────────
+# The raw 5m list is scanned once into a sorted time column. Every session's
+# calibration / 24h-context / execution window is then an index range found
+# with searchsorted, instead of three full-list timestamp scans per
+# session. Weekly bias and daily EMAs are resolved for all sessions at once,
+# and levels are computed in one batch pass: 15m/1h/4h bars are resampled
+# once for the whole history and each window reuses them (see _window_bars).
+
+def _columnar(raw_5m):
+    """(candles sorted by time, time column as int64)."""
+    candles = raw_5m
+    times = np.fromiter((c["time"] for c in candles), dtype=np.int64, count=len(candles))
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        candles = [candles[i] for i in order]
+        times = times[order]
+    return candles, times
+
+def _session_plan(start_dt, end_dt, active_cfgs):
+    """[(cfg, anchor_ts)] in the lab's day-major, config-minor output order."""
+    plan = []
+    curr_day = start_dt
+    while curr_day <= end_dt:
+        query_time = curr_day + timedelta(hours=12) # Mid-day check
+        for cfg in active_cfgs:
+            plan.append((cfg, session_manager.anchor_ts_for_utc_date(cfg, query_time)))
+        curr_day += timedelta(days=1)
+    return plan
+
+def _weekly_bias_batch(times, opens, closes, anchor_ts):
+    """Weekly force for every anchor: session-open price vs the close a week
+    earlier, +/-1% bands. Bars are matched with the same nearest rule as
+    DatetimeIndex.get_indexer(method='nearest') -- ties go to the later bar."""
+    def _nearest(targets):
+        right = np.searchsorted(times, targets, side="left")
+        left = np.searchsorted(times, targets, side="right") - 1
+        r = np.minimum(right, len(times) - 1)
+        l = np.maximum(left, 0)
+        take_left = (right >= len(times)) | ((left >= 0) & ((targets - times[l]) < (times[r] - targets)))
+        return np.where(take_left, l, r)
+
+    price_week_ago = closes[_nearest(anchor_ts - 7 * 86400)]
+    price_now = opens[_nearest(anchor_ts)]
+    return np.where(price_now > price_week_ago * 1.01, "BULLISH",
+                    np.where(price_now < price_week_ago * 0.99, "BEARISH", "NEUTRAL")).tolist()
+
+def _daily_ema_lookup(df_daily_emas):
+    """{"YYYY-MM-DD": (ema30, ema50)} for every resampled day."""
+    if df_daily_emas.empty:
+        return {}
+    keys = df_daily_emas.index.strftime("%Y-%m-%d")
+    return dict(zip(keys, zip(df_daily_emas["ema30"].tolist(), df_daily_emas["ema50"].tolist())))
+
+_BAR_MINUTES = (15, 60, 240)
+
+def _resample_history(candles, times):
+    """{minutes: (bars, bar start times)} over the whole history, resampled once."""
+    pre = {}
+    for minutes in _BAR_MINUTES:
+        bars = sse_engine._resample(candles, minutes)
+        pre[minutes] = (bars, np.fromiter((b["time"] for b in bars), dtype=np.int64, count=len(bars)))
+    return pre
+
+def _window_bars(pre, minutes, candles, times, lo, hi):
+    """Exactly sse_engine._resample(candles[lo:hi], minutes), assembled from the
+    pre-resampled history: interior buckets are reused as-is, only the partial
+    buckets at either edge of the window are rebuilt from its own 5m bars."""
+    if lo >= hi:
+        return []
+    block = minutes * 60
+    lo_ts, hi_ts = int(times[lo]), int(times[hi - 1]) + 1
+    first_full = -(-lo_ts // block) * block
+    last_full_end = (hi_ts // block) * block
+    if first_full >= last_full_end:
+        return sse_engine._resample(candles[lo:hi], minutes)
+    bars, bar_times = pre[minutes]
+    head_end = int(np.searchsorted(times, first_full, side="left"))
+    tail_start = int(np.searchsorted(times, last_full_end, side="left"))
+    b0 = int(np.searchsorted(bar_times, first_full, side="left"))
+    b1 = int(np.searchsorted(bar_times, last_full_end, side="left"))
+    return (
+        sse_engine._resample(candles[lo:head_end], minutes)
+        + bars[b0:b1]
+        + sse_engine._resample(candles[tail_start:hi], minutes)
+    )
+
+def _compute_levels_batch(windows, candles, times, tuning):
+    """compute_sse_levels for every (ctx_lo, cal_lo, cal_hi) window. 15m/1h/4h
+    bars come from one resample of the whole history; windows shared by several
+    sessions are computed once."""
+    pre = _resample_history(candles, times)
+    computed = {}
+    out = []
+    for key in windows:
+        if key not in computed:
+            ctx_lo, cal_lo, cal_hi = key
+            context_24h = candles[ctx_lo:cal_hi]
+            calibration = candles[cal_lo:cal_hi]
+            bars_15m = _window_bars(pre, 15, candles, times, ctx_lo, cal_hi)
+            computed[key] = sse_engine.compute_sse_levels({
+                "locked_history_5m": context_24h,
+                "slice_24h_5m": context_24h,
+                "locked_15m": bars_15m,
+                "locked_1h": _window_bars(pre, 60, candles, times, ctx_lo, cal_hi),
+                "locked_4h": _window_bars(pre, 240, candles, times, ctx_lo, cal_hi),
+                "context_24h_15m": bars_15m,
+                "session_open_price": calibration[0]["open"],
+                "r30_high": max(c["high"] for c in calibration),
+                "r30_low": min(c["low"] for c in calibration),
+                "last_price": context_24h[-1]["close"] if context_24h else 0.0,
+                "tuning": tuning or {} 
+            })
+        out.append(computed[key])
+    return out
+
+_HHMM = [f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)]
+
+def _format_session_candles(candles):
+    return [
+        {
+            "t": _HHMM[(int(c["time"]) % 86400) // 60],
+            "ts": c["time"], 
+            "o": c["open"], "h": c["high"], "l": c["low"], "c": c["close"]
+        }
+        for c in candles
+    ]
+
 async def _run_hybrid_analysis(symbol, raw_5m, start_date, end_date, session_ids, tuning, include_candles):
     try:
         # Master Index
@@ -93,104 +202,80 @@ async def _run_hybrid_analysis(symbol, raw_5m, start_date, end_date, session_ids
         df.sort_index(inplace=True)
 
         # Pre-calculate Sniper Data
-        df_daily_emas = _precalculate_daily_emas(df)
+        ema_by_day = _daily_ema_lookup(_precalculate_daily_emas(df))
 
         start_dt = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
         end_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
         active_cfgs = [s for s in session_manager.SESSION_CONFIGS if s["id"] in session_ids]
-        
+
+        candles, times = _columnar(raw_5m)
+        plan = _session_plan(start_dt, end_dt, active_cfgs)
+        if not plan:
+            return {"ok": True, "total_sessions": 0, "results": []}
+
+        anchors = np.array([a for _, a in plan], dtype=np.int64)
+        lock_end = anchors + 1800
+        cal_lo = np.searchsorted(times, anchors, side="left")
+        cal_hi = np.searchsorted(times, lock_end, side="left")
+        ctx_lo = np.searchsorted(times, lock_end - 86400, side="left")
+        exec_hi = np.searchsorted(times, lock_end + (12 * 3600), side="left")
+
+        # Calibration needs at least six 5m bars.
+        keep = np.flatnonzero((cal_hi - cal_lo) >= 6)
+        opens = np.array([c["open"] for c in candles], dtype=float)
+        closes = np.array([c["close"] for c in candles], dtype=float)
+        biases = _weekly_bias_batch(times, opens, closes, anchors[keep])
+        levels_out = _compute_levels_batch(
+            [(int(ctx_lo[k]), int(cal_lo[k]), int(cal_hi[k])) for k in keep], candles, times, tuning
+        )
+
         results = []
-        curr_day = start_dt
-        
-        while curr_day <= end_dt:
-            query_time = curr_day + timedelta(hours=12) # Mid-day check
-            
-            for cfg in active_cfgs:
-                anchor_ts = session_manager.anchor_ts_for_utc_date(cfg, query_time)
-                actual_session_date = datetime.fromtimestamp(anchor_ts, tz=timezone.utc).strftime("%Y-%m-%d")
-                
-                lock_end_ts = anchor_ts + 1800  
-                exec_end_ts = lock_end_ts + (12 * 3600) 
-
-                calibration = _slice_by_ts(raw_5m, anchor_ts, lock_end_ts)
-                if len(calibration) < 6: continue 
-                
-                context_24h = _slice_by_ts(raw_5m, lock_end_ts - 86400, lock_end_ts)
-
-                d_ema30 = 0.0
-                d_ema50 = 0.0
-                try:
-                    day_key = pd.to_datetime(actual_session_date).date()
-                    if str(day_key) in df_daily_emas.index:
-                        daily_row = df_daily_emas.loc[str(day_key)]
-                        d_ema30 = daily_row['ema30']
-                        d_ema50 = daily_row['ema50']
-                except:
-                    pass
-
-                # RUN THE ENGINE
-                sse_input = {
-                    "locked_history_5m": context_24h,
-                    "slice_24h_5m": context_24h,
-                    "session_open_price": calibration[0]["open"],
-                    "r30_high": max(c["high"] for c in calibration),
-                    "r30_low": min(c["low"] for c in calibration),
-                    "last_price": context_24h[-1]["close"] if context_24h else 0.0,
-                    "tuning": tuning or {} 
-                }
-                
-                computed = sse_engine.compute_sse_levels(sse_input)
-                if "error" in computed: continue
-                
-                levels = computed["levels"]
-                levels['daily_ema30'] = d_ema30
-                levels['daily_ema50'] = d_ema50
-                
-                bias = _calculate_weekly_bias(df, anchor_ts)
-
-                # --- NEW SAFELY ADDED FUEL GAUGE MATH ---
-                bo = levels.get("breakout_trigger", 0)
-                bd = levels.get("breakdown_trigger", 0)
-                trigger_spread = ((bo - bd) / bd * 100) if bd and bd > 0 else 0
-
-                result_packet = {
-                    "date": f"{actual_session_date} [{cfg['id']}]",
-                    "price": calibration[0]["open"], 
-                    "battlebox": {
-                        "levels": {
-                            "anchor_price": levels.get("anchor_price"),
-                            "breakout_trigger": bo,       
-                            "breakdown_trigger": bd,      
-                            "daily_resistance": levels.get("daily_resistance"),       
-                            "daily_support": levels.get("daily_support"),          
-                            "range30m_high": levels.get("range30m_high"),    
-                            "range30m_low": levels.get("range30m_low"),      
-                            "structure_score": levels.get("structure_score", 0),
-                            "slope": levels.get("slope", 0),
-                            "daily_ema30": levels.get("daily_ema30", 0),
-                            "daily_ema50": levels.get("daily_ema50", 0),
-                            "trigger_spread": round(trigger_spread, 2) # <-- ADDED HERE
-                        },
-                        "context": {
-                            "weekly_force": bias
-                        }
+        for j, k in enumerate(keep):
+            computed = levels_out[j]
+            if "error" in computed: continue
+
+            cfg, anchor_ts = plan[k]
+            actual_session_date = datetime.fromtimestamp(anchor_ts, tz=timezone.utc).strftime("%Y-%m-%d")
+            d_ema30, d_ema50 = ema_by_day.get(actual_session_date, (0.0, 0.0))
+            calibration_open = candles[cal_lo[k]]["open"]
+
+            levels = dict(computed["levels"])
+            levels['daily_ema30'] = d_ema30
+            levels['daily_ema50'] = d_ema50
+
+            # --- NEW SAFELY ADDED FUEL GAUGE MATH ---
+            bo = levels.get("breakout_trigger", 0)
+            bd = levels.get("breakdown_trigger", 0)
+            trigger_spread = ((bo - bd) / bd * 100) if bd and bd > 0 else 0
+
+            result_packet = {
+                "date": f"{actual_session_date} [{cfg['id']}]",
+                "price": calibration_open, 
+                "battlebox": {
+                    "levels": {
+                        "anchor_price": levels.get("anchor_price"),
+                        "breakout_trigger": bo,       
+                        "breakdown_trigger": bd,      
+                        "daily_resistance": levels.get("daily_resistance"),       
+                        "daily_support": levels.get("daily_support"),          
+                        "range30m_high": levels.get("range30m_high"),    
+                        "range30m_low": levels.get("range30m_low"),      
+                        "structure_score": levels.get("structure_score", 0),
+                        "slope": levels.get("slope", 0),
+                        "daily_ema30": levels.get("daily_ema30", 0),
+                        "daily_ema50": levels.get("daily_ema50", 0),
+                        "trigger_spread": round(trigger_spread, 2) # <-- ADDED HERE
+                    },
+                    "context": {
+                        "weekly_force": biases[j]
                     }
                 }
+            }
 
-                if include_candles:
-                    full_session = _slice_by_ts(raw_5m, anchor_ts, exec_end_ts)
-                    result_packet["session_candles"] = [
-                        {
-                            "t": datetime.fromtimestamp(c["time"], tz=timezone.utc).strftime("%H:%M"),
-                            "ts": c["time"], 
-                            "o": c["open"], "h": c["high"], "l": c["low"], "c": c["close"]
-                        }
-                        for c in full_session
-                    ]
-
-                results.append(result_packet)
+            if include_candles:
+                result_packet["session_candles"] = _format_session_candles(candles[cal_lo[k]:exec_hi[k]])
 
-            curr_day += timedelta(days=1)
+            results.append(result_packet)
 
         return {
             "ok": True,
@@ -200,4 +285,4 @@ async def _run_hybrid_analysis(symbol, raw_5m, start_date, end_date, session_ids
 
     except Exception as e:
         traceback.print_exc()
-        return {"ok": False, "error": str(e)}
\ No newline at end of file
+        return {"ok": False, "error": str(e)}
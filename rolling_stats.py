@@ -0,0 +1,201 @@
+# rolling_stats.py
+# ==============================================================================
+# KABRODA ROLLING STATISTICS PRIMITIVES
+# Purpose: Shared sliding-window order statistics for the percentile gauges
+# (BBWP, PMARP) in battlebox_pipeline and mtf_confluence_scanner. The
+# installable bold-hubble package carries its own copy of
+# percentile_rank_last (monitoring/_rank.py) so it never imports app modules.
+#
+# Every gauge used to answer "what fraction of the last N values sit at or
+# below the current one?" with a linear `sum(1 for v in history ...)` scan,
+# which is O(lookback) per bar and O(n * lookback) for a full historical
+# sweep. Two entry points replace that scan:
+#   - rolling_percentile_rank(): whole-series sweep. Coordinate-compresses the
+#     series once, then slides a Fenwick tree over it, so every insert, evict
+#     and rank query is O(log n) and a sweep over years of 5m bars is
+#     O(n log n). Ranks are exact -- no value quantization.
+#   - percentile_rank_last(): the latest bar only, for the single-value gauges.
+#     One O(lookback) pass over that bar's window; same result as
+#     rolling_percentile_rank(...)[-1] without building the series.
+#
+# Rolling extrema (stochastic %K high/low, swing pivots in sse_engine,
+# gravity_engine and mtf_confluence_scanner) used to rebuild max()/min() or
+# nested all() comparisons over each bar's window: O(n * k). sliding_max/min
+# keep a monotonic deque of candidate indices, so every index is pushed and
+# popped at most once and a full sweep is O(n). pivot_highs/lows are built on
+# them and reproduce the callers' comparisons exactly (see their docstrings).
+# Pure stdlib, no DB / exchange imports, safe to import from anywhere.
+# ==============================================================================
+
+from collections import deque
+from typing import Deque, List, Optional, Sequence
+
+
+class _Fenwick:
+    """Binary indexed tree of counts over compressed value ranks."""
+
+    __slots__ = ("_tree",)
+
+    def __init__(self, size: int):
+        self._tree = [0] * (size + 1)
+
+    def add(self, idx: int, delta: int) -> None:
+        i = idx + 1
+        tree = self._tree
+        n = len(tree)
+        while i < n:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, idx: int) -> int:
+        """Total count over ranks [0, idx)."""
+        total = 0
+        tree = self._tree
+        i = idx
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+def rolling_percentile_rank(
+    values: Sequence[Optional[float]],
+    lookback: int,
+    inclusive: bool = True,
+    include_current: bool = False,
+    ndigits: Optional[int] = None,
+) -> List[Optional[float]]:
+    """Percentile rank of every value against its trailing window.
+
+    For bar i the window is values[i-lookback : i] (include_current=False) or
+    values[i-lookback+1 : i+1] (include_current=True); None entries are skipped
+    and do not count toward the denominator. Bar i's rank is the percent of
+    window values <= values[i] (< when inclusive=False). Output is aligned
+    1:1 with `values`; None where the bar itself is None or its window is
+    empty. This mirrors the per-gauge linear scans exactly, so callers that
+    only need the latest bar can take [-1].
+    """
+    n = len(values)
+    out: List[Optional[float]] = [None] * n
+    if n == 0 or lookback < 1:
+        return out
+
+    ranked = sorted({v for v in values if v is not None})
+    index = {v: i for i, v in enumerate(ranked)}
+    tree = _Fenwick(len(ranked))
+    in_window = 0
+
+    for i in range(n):
+        if include_current:
+            enter, leave = i, i - lookback
+        else:
+            enter, leave = i - 1, i - 1 - lookback
+        if enter >= 0 and values[enter] is not None:
+            tree.add(index[values[enter]], 1)
+            in_window += 1
+        if leave >= 0 and values[leave] is not None:
+            tree.add(index[values[leave]], -1)
+            in_window -= 1
+
+        cur = values[i]
+        if cur is None or in_window == 0:
+            continue
+        pos = index[cur]
+        count = tree.prefix(pos + 1) if inclusive else tree.prefix(pos)
+        pct = count / in_window * 100.0
+        out[i] = round(pct, ndigits) if ndigits is not None else pct
+
+    return out
+
+
+def percentile_rank_last(
+    values: Sequence[Optional[float]],
+    lookback: int,
+    inclusive: bool = True,
+    include_current: bool = False,
+    ndigits: Optional[int] = None,
+) -> Optional[float]:
+    """rolling_percentile_rank(values, ...)[-1], same window and None rules,
+    computed from the last bar's window alone."""
+    if not values or lookback < 1 or values[-1] is None:
+        return None
+    cur = values[-1]
+    end = len(values) if include_current else len(values) - 1
+    window = [v for v in values[max(0, end - lookback) : end] if v is not None]
+    if not window:
+        return None
+    if inclusive:
+        count = sum(1 for v in window if v <= cur)
+    else:
+        count = sum(1 for v in window if v < cur)
+    pct = count / len(window) * 100.0
+    return round(pct, ndigits) if ndigits is not None else pct
+
+
+def _sliding_extreme(values: Sequence[float], window: int, want_max: bool) -> List[Optional[float]]:
+    n = len(values)
+    out: List[Optional[float]] = [None] * n
+    if window < 1:
+        return out
+    dq: Deque[int] = deque()  # indices; their values are monotonic from the front
+    for i in range(n):
+        v = values[i]
+        if want_max:
+            while dq and values[dq[-1]] <= v:
+                dq.pop()
+        else:
+            while dq and values[dq[-1]] >= v:
+                dq.pop()
+        dq.append(i)
+        if dq[0] <= i - window:
+            dq.popleft()
+        if i >= window - 1:
+            out[i] = values[dq[0]]
+    return out
+
+
+def sliding_max(values: Sequence[float], window: int) -> List[Optional[float]]:
+    """max(values[i-window+1 : i+1]) for every i; None until the window fills."""
+    return _sliding_extreme(values, window, True)
+
+
+def sliding_min(values: Sequence[float], window: int) -> List[Optional[float]]:
+    """min(values[i-window+1 : i+1]) for every i; None until the window fills."""
+    return _sliding_extreme(values, window, False)
+
+
+def _pivots(values: Sequence[float], left: int, right: int, strict_left: bool, want_max: bool) -> List[int]:
+    n = len(values)
+    if n < left + right + 1:
+        return []
+    edge = _sliding_extreme(values, left, want_max) if left > 0 else None
+    ahead = _sliding_extreme(values, right, want_max) if right > 0 else None
+    out: List[int] = []
+    for i in range(left, n - right):
+        v = values[i]
+        if edge is not None:
+            e = edge[i - 1]  # extreme of values[i-left : i]
+            if want_max:
+                if e > v or (strict_left and e == v):
+                    continue
+            elif e < v or (strict_left and e == v):
+                continue
+        if ahead is not None:
+            a = ahead[i + right]  # extreme of values[i+1 : i+right+1]
+            if (a >= v) if want_max else (a <= v):
+                continue
+        out.append(i)
+    return out
+
+
+def pivot_highs(values: Sequence[float], left: int = 3, right: int = 3, strict_left: bool = False) -> List[int]:
+    """Indices i with every one of the `right` bars after strictly below
+    values[i] and every one of the `left` bars before at or below it (strictly
+    below with strict_left=True). Bars without full windows are never pivots."""
+    return _pivots(values, left, right, strict_left, True)
+
+
+def pivot_lows(values: Sequence[float], left: int = 3, right: int = 3, strict_left: bool = False) -> List[int]:
+    """Mirror of pivot_highs: `right` bars after strictly above, `left` bars
+    before at or above (strictly above with strict_left=True)."""
+    return _pivots(values, left, right, strict_left, False)
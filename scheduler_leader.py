@@ -0,0 +1,211 @@
+# scheduler_leader.py
+# ==============================================================================
+# KABRODA SCHEDULER LEADER LEASE
+# Purpose: Make sure exactly one process runs the background schedulers
+# (gravity, ledger, senior analyst, JEWEL, weekly, outcome tracker, analysis
+# loop, session monitor), however many web workers or worker.py instances
+# are up.
+#
+# Leadership is a row in scheduler_leases: the holder keeps pushing
+# expires_at forward every ttl/3. A standby takes the row over only once it
+# has expired, so a crashed or partitioned leader is replaced within one TTL.
+# Every expiry is computed and compared on the DB clock (CURRENT_TIMESTAMP),
+# never the local one, so clock skew between hosts cannot hand out two
+# unexpired leases. Locally the holder trusts a grant only for ttl seconds of
+# monotonic time counted from *before* it asked, which always ends before the
+# DB-side expiry. Works the same on Postgres and SQLite (plain UPDATE ...
+# WHERE, no dialect-specific locking).
+#
+# run_as_leader(start_tasks) is the supervisor both main.lifespan (inline
+# mode) and worker.py await: it starts the scheduler tasks on acquiring the
+# lease, cancels them (and waits for them to finish) if the lease is lost,
+# and releases it on shutdown. Renewal runs on its own thread, so a busy
+# event loop or a saturated default executor cannot starve it into letting
+# the lease lapse under running schedulers.
+# ==============================================================================
+
+import asyncio
+import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import database
+
+LEASE_NAME = "kabroda_schedulers"
+LEASE_TTL_SEC = float(os.getenv("LEADER_LEASE_TTL", "60"))
+
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _db_now(conn) -> datetime.datetime:
+    """The database's current UTC time, as a naive datetime like the columns."""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(text("SELECT CAST(CURRENT_TIMESTAMP AT TIME ZONE 'UTC' AS timestamp)")).scalar()
+    if conn.dialect.name == "sqlite":
+        # CURRENT_TIMESTAMP is whole seconds on SQLite; same clock, ms precision.
+        raw = conn.execute(text("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now')")).scalar()
+        return datetime.datetime.fromisoformat(raw)
+    return conn.execute(text("SELECT CURRENT_TIMESTAMP")).scalar()
+
+
+class LeaderLease:
+    def __init__(self, name: str = LEASE_NAME, ttl: float = LEASE_TTL_SEC, holder: str = HOLDER_ID):
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder
+        self.expires_at: Optional[datetime.datetime] = None  # DB clock
+        self._valid_until = 0.0  # local monotonic deadline of the last grant
+
+    def _granted(self, expires: datetime.datetime, asked_at: float) -> bool:
+        self.expires_at = expires
+        self._valid_until = asked_at + self.ttl
+        return True
+
+    def _refused(self) -> bool:
+        self.expires_at = None
+        self._valid_until = 0.0
+        return False
+
+    def try_acquire(self) -> bool:
+        """Take or renew the lease. True while this process holds it."""
+        asked_at = time.monotonic()
+        with database.engine.begin() as conn:
+            now = _db_now(conn)
+            expires = now + datetime.timedelta(seconds=self.ttl)
+            params = {"n": self.name, "me": self.holder, "now": now, "exp": expires}
+            res = conn.execute(text(
+                "UPDATE scheduler_leases "
+                "SET acquired_at = CASE WHEN holder = :me THEN acquired_at ELSE :now END, "
+                "holder = :me, expires_at = :exp "
+                "WHERE name = :n AND (holder = :me OR expires_at < :now)"
+            ), params)
+            if res.rowcount == 1:
+                return self._granted(expires, asked_at)
+            exists = conn.execute(
+                text("SELECT 1 FROM scheduler_leases WHERE name = :n"), {"n": self.name}
+            ).first()
+        if exists:
+            return self._refused()
+        try:
+            with database.engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO scheduler_leases (name, holder, acquired_at, expires_at) "
+                    "VALUES (:n, :me, :now, :exp)"
+                ), params)
+        except IntegrityError:
+            return self._refused()  # another process inserted first
+        return self._granted(expires, asked_at)
+
+    def release(self) -> None:
+        with database.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE scheduler_leases SET expires_at = :now WHERE name = :n AND holder = :me"
+            ), {"n": self.name, "me": self.holder, "now": _db_now(conn)})
+        self._refused()
+
+    def still_valid(self) -> bool:
+        return self.expires_at is not None and time.monotonic() < self._valid_until
+
+
+_status: Dict[str, Any] = {
+    "holder": HOLDER_ID,
+    "is_leader": False,
+    "since": None,
+    "last_renewed": None,
+    "handovers": 0,
+}
+
+
+class _Renewer(threading.Thread):
+    """Renews the lease on a dedicated thread and wakes the supervisor when
+    leadership changes hands."""
+
+    def __init__(self, lease: LeaderLease, loop: asyncio.AbstractEventLoop, changed: asyncio.Event):
+        super().__init__(name=f"leader-renew-{lease.name}", daemon=True)
+        self.lease = lease
+        self.held = False
+        self._loop = loop
+        self._changed = changed
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            try:
+                held = self.lease.try_acquire()
+            except Exception as e:
+                print(f"[LEADER] Lease renew failed: {e}")
+                held = self.lease.still_valid()  # keep running until our last grant runs out
+            if held:
+                _status["last_renewed"] = datetime.datetime.utcnow().isoformat()
+            if held != self.held:
+                self.held = held
+                try:
+                    self._loop.call_soon_threadsafe(self._changed.set)
+                except RuntimeError:
+                    return  # loop closed under us
+            # While held, also wake in time to notice a grant that ran out
+            # because renewals kept failing.
+            wait = self.lease.ttl / 3.0 if held else self.lease.ttl / 2.0
+            self._halt.wait(wait)
+
+    def stop(self) -> None:
+        self._halt.set()
+
+
+async def run_as_leader(
+    start_tasks: Callable[[], List[asyncio.Task]],
+    lease: Optional[LeaderLease] = None,
+) -> None:
+    """Supervise the scheduler tasks under the leader lease until cancelled."""
+    lease = lease or LeaderLease()
+    tasks: List[asyncio.Task] = []
+
+    async def _stop(reason: str) -> None:
+        nonlocal tasks
+        stopping, tasks = tasks, []
+        for t in stopping:
+            t.cancel()
+        # Leader status (and, on shutdown, the lease) is only given up once
+        # every scheduler has actually finished unwinding.
+        await asyncio.gather(*stopping, return_exceptions=True)
+        _status["is_leader"] = False
+        _status["since"] = None
+        print(f"[LEADER] {HOLDER_ID} stopped schedulers: {reason}")
+
+    changed = asyncio.Event()
+    renewer = _Renewer(lease, asyncio.get_running_loop(), changed)
+    print(f"[LEADER] {HOLDER_ID} contending for '{lease.name}' (ttl {lease.ttl:.0f}s)")
+    renewer.start()
+    try:
+        while True:
+            await changed.wait()
+            changed.clear()
+            if renewer.held and not tasks:
+                tasks = start_tasks()
+                _status["is_leader"] = True
+                _status["since"] = _status["last_renewed"]
+                _status["handovers"] += 1
+                print(f"[LEADER] {HOLDER_ID} acquired '{lease.name}' -- started {len(tasks)} schedulers")
+            elif not renewer.held and tasks:
+                await _stop("lease lost")
+    finally:
+        if tasks:
+            await _stop("shutdown")
+        renewer.stop()
+        await asyncio.to_thread(renewer.join, lease.ttl)
+        if lease.expires_at is not None:
+            try:
+                await asyncio.to_thread(lease.release)
+            except Exception as e:
+                print(f"[LEADER] Lease release failed (expires in <= {lease.ttl:.0f}s): {e}")
+
+
+def get_status() -> Dict[str, Any]:
+    return dict(_status)
@@ -31,6 +31,9 @@ from typing import Any, Dict, List, Optional
 
 import pytz
 
+import fetch_scheduler
+import packet_codec
+import replay_clock
 from battlebox_pipeline import (
     fetch_live_15m,
     fetch_live_1h,
@@ -483,10 +486,11 @@ async def run_session_monitor_loop() -> None:
     _notification_sent_today: bool = False
 
     print("[MONITOR] Session monitor loop started (v1 — observe-and-log only).")
+    fetch_scheduler.set_priority(fetch_scheduler.PRIORITY_BACKGROUND)
 
     while True:
         try:
-            now_utc = datetime.datetime.now(timezone.utc)
+            now_utc = replay_clock.now_utc()
             today_key = now_utc.strftime("%Y-%m-%d")
 
             # New day — reset all per-session state
@@ -528,7 +532,7 @@ async def run_session_monitor_loop() -> None:
                 else:
                     _mas_verdict = "PENDING"
                     try:
-                        pkt = json.loads(session_lock.packet_data)
+                        pkt = packet_codec.load_lock_packet(session_lock)
                         lvls = pkt.get("levels", {})
                         _session_bo = lvls.get("breakout_trigger")
                         _session_bd = lvls.get("breakdown_trigger")
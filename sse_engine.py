@@ -15,6 +15,8 @@ from dataclasses import dataclass
 from typing import Any, Dict, List, Tuple
 import math
 
+import rolling_stats
+
 # ---------------------------------------------------------
 # 1) HELPERS & MATH
 # ---------------------------------------------------------
@@ -167,21 +169,13 @@ def _find_pivots(candles: List[Dict[str, Any]], left: int = 3, right: int = 3) -
     if len(candles) < (left + right + 1):
         return 0.0, 0.0
 
-    last_sup = 0.0
-    last_dem = 0.0
-
-    for i in range(left, len(candles) - right):
-        curr = candles[i]
-        ch = float(curr["high"])
-        cl = float(curr["low"])
-
-        if all(float(candles[i - j]["high"]) <= ch for j in range(1, left + 1)) and \
-           all(float(candles[i + j]["high"]) < ch for j in range(1, right + 1)):
-            last_sup = ch
+    highs = [float(c["high"]) for c in candles]
+    lows = [float(c["low"]) for c in candles]
+    sup_idx = rolling_stats.pivot_highs(highs, left, right)
+    dem_idx = rolling_stats.pivot_lows(lows, left, right)
 
-        if all(float(candles[i - j]["low"]) >= cl for j in range(1, left + 1)) and \
-           all(float(candles[i + j]["low"]) > cl for j in range(1, right + 1)):
-            last_dem = cl
+    last_sup = highs[sup_idx[-1]] if sup_idx else 0.0
+    last_dem = lows[dem_idx[-1]] if dem_idx else 0.0
 
     return float(last_sup), float(last_dem)
 
@@ -377,13 +371,14 @@ def compute_sse_levels(inputs: Dict[str, Any]) -> Dict[str, Any]:
     if is_5m_native:
         # Slices
         slice_24h_5m = inputs.get("slice_24h_5m") or raw_5m[-288:]
-        # Derive 15m/1h/4h from locked history
-        locked_15m = _resample(raw_5m, 15)
-        locked_1h = _resample(raw_5m, 60)
-        locked_4h = _resample(raw_5m, 240)
+        # Derive 15m/1h/4h from locked history. Batch callers (research_lab)
+        # pass bars they already resampled from these same 5m candles.
+        locked_15m = inputs.get("locked_15m") or _resample(raw_5m, 15)
+        locked_1h = inputs.get("locked_1h") or _resample(raw_5m, 60)
+        locked_4h = inputs.get("locked_4h") or _resample(raw_5m, 240)
 
         # VRVP context: use 15m derived from 24h 5m slice
-        context_24h_15m = _resample(slice_24h_5m, 15)
+        context_24h_15m = inputs.get("context_24h_15m") or _resample(slice_24h_5m, 15)
 
         meta.update({
             "slice_24h_5m_count": len(slice_24h_5m),
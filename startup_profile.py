@@ -0,0 +1,202 @@
+# startup_profile.py
+# ==============================================================================
+# KABRODA STARTUP PROFILE + LAZY MODULES
+# Purpose: Measure what the web process spends its cold start on, and keep
+# rarely used subsystems off the import path entirely.
+#
+# install()      -- called first thing in main.py. Adds a meta-path finder that
+#                   times every top-level import (project modules and the
+#                   third-party packages they pull in: anthropic, yfinance,
+#                   ccxt, pandas ...). Inclusive and self time are recorded,
+#                   the same split `python -X importtime` reports.
+# finish_imports() -- called once main.py has built the app. Removes the
+#                   finder and prints the slowest imports.
+# phase(name)    -- context manager for timed boot phases (init_db, ledger
+#                   seed) inside lifespan().
+# lazy_module()  -- returns a stand-in module that imports the real one on
+#                   first attribute access. Used for the research lab,
+#                   simulator, LTI, publisher and interpreters. That first
+#                   access often happens in a worker thread (asyncio.to_thread),
+#                   so the load runs under a lock -- importlib's LazyLoader is
+#                   not thread-safe on 3.11 (gh-114763).
+#
+# report() feeds /api/v1/system/state. Set STARTUP_PROFILE=0 to skip the
+# import finder (lazy_module() keeps working either way).
+# ==============================================================================
+
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from typing import Any, Dict, List, Optional
+
+_ENABLED = os.getenv("STARTUP_PROFILE", "1").strip().lower() not in ("0", "false", "no", "off")
+_REPORT_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "15"))
+
+_T0 = time.perf_counter()
+_lock = threading.Lock()
+_imports: Dict[str, Dict[str, float]] = {}
+_phases: List[Dict[str, Any]] = []
+_tls = threading.local()         # .stack: [start, child_total] per in-flight import
+_finder: Optional["_TimingFinder"] = None
+_imports_done_ms: Optional[float] = None
+
+
+class _TimedLoader:
+    """Wraps a spec's loader for one exec_module call, then hands the module
+    its real loader back so nothing downstream ever sees the wrapper."""
+
+    def __init__(self, name: str, loader):
+        self._name = name
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec) if hasattr(self._loader, "create_module") else None
+
+    def exec_module(self, module):
+        module.__loader__ = self._loader
+        if getattr(module, "__spec__", None) is not None:
+            module.__spec__.loader = self._loader
+        stack = _tls.__dict__.setdefault("stack", [])
+        frame = [time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            stack.pop()
+            inclusive = time.perf_counter() - frame[0]
+            if stack:
+                stack[-1][1] += inclusive
+            with _lock:
+                _imports[self._name] = {
+                    "inclusive_ms": round(inclusive * 1000.0, 1),
+                    "self_ms": round((inclusive - frame[1]) * 1000.0, 1),
+                }
+
+    def __getattr__(self, item):
+        return getattr(self._loader, item)
+
+
+class _TimingFinder(MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        if "." in fullname or threading.current_thread() is not threading.main_thread():
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimedLoader(fullname, spec.loader)
+        return spec
+
+
+def install() -> None:
+    global _finder
+    if not _ENABLED or _finder is not None:
+        return
+    _finder = _TimingFinder()
+    sys.meta_path.insert(0, _finder)
+
+
+def finish_imports() -> None:
+    """Stop timing imports and print the slowest ones."""
+    global _finder, _imports_done_ms
+    if _finder is not None:
+        try:
+            sys.meta_path.remove(_finder)
+        except ValueError:
+            pass
+        _finder = None
+    if _imports_done_ms is not None:
+        return
+    _imports_done_ms = round((time.perf_counter() - _T0) * 1000.0, 1)
+    if not _imports:
+        return
+    print(f">>> [STARTUP] Imports finished in {_imports_done_ms:.0f}ms. Slowest top-level imports:")
+    for name, t in _top_imports(_REPORT_TOP):
+        print(f">>> [STARTUP]   {name:<28} {t['inclusive_ms']:>8.1f}ms (self {t['self_ms']:.1f}ms)")
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = round((time.perf_counter() - started) * 1000.0, 1)
+        with _lock:
+            _phases.append({"phase": name, "ms": ms})
+        print(f">>> [STARTUP] {name}: {ms:.0f}ms")
+
+
+def _top_imports(n: int):
+    with _lock:
+        items = list(_imports.items())
+    return sorted(items, key=lambda kv: kv[1]["inclusive_ms"], reverse=True)[:n]
+
+
+class _LazyModule(types.ModuleType):
+    """Forwards every attribute get/set/delete to the real module, importing
+    it (once, under a lock) on first use."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+        object.__setattr__(self, "_lazy_target", None)
+
+    def _lazy_load(self) -> types.ModuleType:
+        target = object.__getattribute__(self, "_lazy_target")
+        if target is None:
+            with object.__getattribute__(self, "_lazy_lock"):
+                target = object.__getattribute__(self, "_lazy_target")
+                if target is None:
+                    target = importlib.import_module(self.__name__)
+                    object.__setattr__(self, "_lazy_target", target)
+        return target
+
+    def __getattr__(self, attr: str):
+        return getattr(self._lazy_load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._lazy_load(), attr, value)
+
+    def __delattr__(self, attr: str) -> None:
+        delattr(self._lazy_load(), attr)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+
+_lazy: Dict[str, _LazyModule] = {}
+_lazy_registry_lock = threading.Lock()
+
+
+def lazy_module(name: str):
+    """Module `name`, imported on first attribute access instead of now."""
+    with _lazy_registry_lock:
+        if name in _lazy:
+            return _lazy[name]
+        if name in sys.modules:
+            return sys.modules[name]
+        if importlib.util.find_spec(name) is None:
+            raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+        module = _lazy[name] = _LazyModule(name)
+        return module
+
+
+def report() -> Dict[str, Any]:
+    return {
+        "imports_done_ms": _imports_done_ms,
+        "slowest_imports": [{"module": name, **t} for name, t in _top_imports(_REPORT_TOP)],
+        "phases": list(_phases),
+    }
@@ -0,0 +1,197 @@
+# telemetry_queue.py
+# ==============================================================================
+# KABRODA TELEMETRY WRITE-BEHIND QUEUE
+# Purpose: Take append-only telemetry rows (AgentRunLog, InterpreterLog) off
+# the agent-call hot path.
+#
+# Each writer used to open its own SessionLocal() and commit a single row
+# synchronously -- usually from inside the worker thread running the agent
+# call, so every call paid a DB round trip plus a commit (an fsync on SQLite).
+# Writers now call enqueue(Model, **fields), which is a non-blocking put that
+# is safe from any thread or coroutine. One daemon flusher thread drains the
+# queue and writes each batch with a single session and a single commit.
+#
+# created_at is stamped in enqueue(), not by the column default at flush time,
+# so rows keep the time of the event rather than of the batch write.
+# MacroNarrativeLog is NOT queued: it is the Senior Analyst dedup key, and a
+# row that sits in the queue is a window in which the analyst can fire twice.
+#
+# Flush triggers:
+#   - TELEMETRY_BATCH_SIZE rows queued (default 50), or
+#   - every TELEMETRY_FLUSH_INTERVAL seconds (default 2.0)
+#   - flush() on demand, shutdown() from main.lifespan, and an atexit hook
+#     so rows queued just before the process exits are never dropped.
+#
+# Fail-safe: a failing batch is retried row-by-row so one bad row can't take
+# the rest of the batch down with it; rows that still fail are logged and
+# dropped, same as the old per-row try/except writers.
+# ==============================================================================
+
+import atexit
+import datetime
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Tuple, Type
+
+from database import SessionLocal
+
+BATCH_SIZE = max(1, int(os.getenv("TELEMETRY_BATCH_SIZE", "50")))
+FLUSH_INTERVAL = max(0.05, float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "2.0")))
+
+_Record = Tuple[Type[Any], Dict[str, Any], str]
+
+_queue: "queue.SimpleQueue[_Record]" = queue.SimpleQueue()
+_write_lock = threading.Lock()      # one batch write at a time (flusher vs flush())
+_start_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stop = threading.Event()
+_wake = threading.Event()
+_thread: "threading.Thread | None" = None
+
+_stats = {
+    "enqueued": 0,
+    "written": 0,
+    "dropped": 0,
+    "batches": 0,
+    "last_batch_rows": 0,
+    "last_batch_ms": 0.0,
+}
+
+
+def enqueue(model: Type[Any], /, on_written: str = "", **fields: Any) -> None:
+    """Queue one ORM row for a background batched insert.
+
+    `model` is positional-only so a column named "model" (AgentRunLog.model)
+    can be passed as a field.
+
+    `on_written` is an optional message printed once the row is committed
+    (keeps the old "|| NARRATIVE LOG || Written ..." breadcrumbs accurate).
+    """
+    if hasattr(model, "created_at"):
+        fields.setdefault("created_at", datetime.datetime.utcnow())
+    _ensure_started()
+    _queue.put((model, fields, on_written))
+    with _stats_lock:
+        _stats["enqueued"] += 1
+    if _queue.qsize() >= BATCH_SIZE:
+        _wake.set()
+
+
+def _drain(limit: int) -> List[_Record]:
+    batch: List[_Record] = []
+    while len(batch) < limit:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_batch(batch: List[_Record]) -> None:
+    if not batch:
+        return
+    started = time.perf_counter()
+    written = 0
+    db = SessionLocal()
+    try:
+        db.add_all([model(**fields) for model, fields, _ in batch])
+        db.commit()
+        written = len(batch)
+        done = batch
+    except Exception as e:
+        db.rollback()
+        print(f"[TELEMETRY] Batch write failed ({len(batch)} rows), retrying row-by-row: {e}")
+        done = []
+        for record in batch:
+            model, fields, _ = record
+            try:
+                db.add(model(**fields))
+                db.commit()
+                written += 1
+                done.append(record)
+            except Exception as row_err:
+                db.rollback()
+                with _stats_lock:
+                    _stats["dropped"] += 1
+                print(f"[TELEMETRY] {model.__name__} write failed: {row_err}")
+    finally:
+        db.close()
+
+    for _, _, msg in done:
+        if msg:
+            print(msg)
+    with _stats_lock:
+        _stats["written"] += written
+        _stats["batches"] += 1
+        _stats["last_batch_rows"] = written
+        _stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000.0, 2)
+
+
+def flush() -> int:
+    """Synchronously write everything queued so far. Returns rows attempted."""
+    total = 0
+    with _write_lock:
+        while True:
+            batch = _drain(BATCH_SIZE)
+            if not batch:
+                break
+            total += len(batch)
+            _write_batch(batch)
+    return total
+
+
+def _run() -> None:
+    while not _stop.is_set():
+        # Sleep until the interval elapses or enqueue() signals a full batch.
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"[TELEMETRY] Flusher error: {e}")
+
+
+def _ensure_started() -> None:
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _start_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="telemetry-flusher", daemon=True)
+        _thread.start()
+
+
+def shutdown(timeout: float = 5.0) -> None:
+    """Stop the flusher and write whatever is still queued. Idempotent."""
+    global _thread
+    _stop.set()
+    _wake.set()
+    t = _thread
+    if t is not None and t.is_alive() and t is not threading.current_thread():
+        t.join(timeout)
+    _thread = None
+    try:
+        flushed = flush()
+        if flushed:
+            print(f"[TELEMETRY] Shutdown flush wrote {flushed} queued rows")
+    except Exception as e:
+        print(f"[TELEMETRY] Shutdown flush failed: {e}")
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        snapshot = dict(_stats)
+    return {
+        **snapshot,
+        "pending": _queue.qsize(),
+        "batch_size": BATCH_SIZE,
+        "flush_interval_s": FLUSH_INTERVAL,
+        "flusher_alive": bool(_thread is not None and _thread.is_alive()),
+    }
+
+
+atexit.register(shutdown)
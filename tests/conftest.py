@@ -0,0 +1,15 @@
+import os
+import shutil
+import tempfile
+
+# App modules bind DATABASE_URL (database.engine) and CACHE_PATH when first
+# imported, and collection imports them from whichever test file comes first.
+# Point both at a scratch directory before any of that happens, so a plain
+# `pytest tests/` never writes to the developer's kabroda.db / kabroda_cache.db.
+_SCRATCH = tempfile.mkdtemp(prefix="kabroda_pytest_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_SCRATCH, 'kabroda_test.db')}"
+os.environ["CACHE_PATH"] = os.path.join(_SCRATCH, "kabroda_cache.db")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
@@ -0,0 +1,31 @@
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import orjson
+
+from api_responses import FastJSONResponse
+
+
+def test_fast_json_response_handles_numpy_and_datetimes():
+    resp = FastJSONResponse({
+        "curve": np.linspace(0.0, 1.0, 3),
+        "score": np.int64(7),
+        "flag": np.bool_(True),
+        "at": datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+        1: "non-str key",
+        "nan": float("nan"),
+    }, status_code=201)
+    assert resp.status_code == 201
+    assert resp.media_type == "application/json"
+    assert orjson.loads(resp.body) == {
+        "curve": [0.0, 0.5, 1.0],
+        "score": 7,
+        "flag": True,
+        "at": "2026-01-02T03:04:05+00:00",
+        "1": "non-str key",
+        "nan": None,
+    }
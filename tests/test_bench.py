@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import fetch_scheduler
+import gravity_math
+from harness import bench
+
+CASES = ["sse.*", "gravity.*", "kde[[]100]", "mtf.run_mtf_confluence_scan", "battlebox.*"]
+
+
+def test_cases_run_offline_with_stable_digests_and_restore_state(tmp_path):
+    before = gravity_math.SessionLocal
+    kw = dict(only=CASES, repeat=2, min_time=0.0, max_time=1.0)
+    first = bench.run_benchmarks(**kw)
+    second = bench.run_benchmarks(**kw)
+    assert set(first["results"]) == {
+        "sse.compute_sse_levels", "gravity._scan_for_pivots[1H]", "gravity._update_zone_touches",
+        "kde[100]", "mtf.run_mtf_confluence_scan", "battlebox._build_synthetic_jewel",
+    }
+    assert all(r["calls"] >= 2 and r["min_ms"] > 0 for r in first["results"].values())
+    assert {k: r["digest"] for k, r in first["results"].items()} == \
+           {k: r["digest"] for k, r in second["results"].items()}
+    assert gravity_math.SessionLocal is before and fetch_scheduler.get_source() is None
+
+    path = bench.save_results(first, str(tmp_path / "base.json"))
+    assert bench.load_results(path)["results"] == first["results"]
+
+
+def test_compare_flags_regressions_and_changed_output():
+    def doc(**cases):
+        return {"results": {k: {"min_ms": ms, "digest": d} for k, (ms, d) in cases.items()}}
+
+    base = doc(a=(10.0, "x"), b=(10.0, "x"), c=(10.0, "x"), d=(0.001, "x"), gone=(1.0, "x"))
+    cur = doc(a=(12.0, "x"), b=(5.0, "x"), c=(10.5, "y"), d=(0.004, "x"), new=(1.0, "x"))
+    out = bench.compare(base, cur, threshold=0.15)
+    status = {r["case"]: r["status"] for r in out["rows"]}
+    assert out["regressions"] == ["a"] and out["output_changed"] == ["c"]
+    assert status == {"a": "REGRESSION", "b": "FASTER", "c": "OK", "d": "OK", "gone": "NOT RUN", "new": "NEW"}
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+from datetime import datetime
+from multiprocessing import get_context
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import cache_backend
+
+
+def test_lru_evicts_least_recent_and_expires_entries():
+    cache = cache_backend.LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # b is now least recent
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.set("short", "x", ttl=0.05)
+    assert cache.get("short") == "x"
+    time.sleep(0.06)
+    assert cache.get("short", "gone") == "gone"
+    stats = cache.stats()
+    assert stats["evictions"] >= 1 and stats["expired"] == 1
+
+
+def test_sqlite_cache_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    pkt = {"levels": {"breakout_trigger": 101.5}, "lock_time": 1700000000, "nan": float("nan")}
+    cache_backend.SQLiteCache("locked_packets", path=path).set("BTCUSDT::us_ny::2026-01-05", pkt)
+
+    restarted = cache_backend.SQLiteCache("locked_packets", path=path)
+    got = restarted.get("BTCUSDT::us_ny::2026-01-05")
+    assert got["levels"] == pkt["levels"] and got["lock_time"] == pkt["lock_time"]
+    assert got["nan"] != got["nan"]
+    # Namespaces don't collide.
+    assert cache_backend.SQLiteCache("exhaustion_5m", path=path).get("BTCUSDT::us_ny::2026-01-05") is None
+
+
+def test_sqlite_cache_ttl_and_size_bound(tmp_path):
+    cache = cache_backend.SQLiteCache("ns", path=str(tmp_path / "cache.db"), max_entries=3)
+    cache.set("old", 1, ttl=0.05)
+    time.sleep(0.06)
+    assert cache.get("old") is None
+    for i in range(10):
+        cache.set(f"k{i}", i)
+        time.sleep(0.001)
+    cache.prune()
+    assert cache.get("k9") == 9
+    assert cache.get("k0") is None
+    assert cache.stats()["evictions"] >= 7
+
+
+def _child_write(path):
+    cache_backend.SQLiteCache("shared", path=path).set("from_child", [1, 2, 3])
+
+
+def test_sqlite_cache_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    proc = get_context("spawn").Process(target=_child_write, args=(path,))
+    proc.start()
+    proc.join(30)
+    assert proc.exitcode == 0
+    assert cache_backend.SQLiteCache("shared", path=path).get("from_child") == [1, 2, 3]
+
+
+def test_tiered_cache_fills_local_from_shared(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = cache_backend.TieredCache(cache_backend.LRUCache(4), cache_backend.SQLiteCache("t", path=path))
+    writer.set("k", {"v": 1}, ttl=60)
+
+    reader = cache_backend.TieredCache(cache_backend.LRUCache(4), cache_backend.SQLiteCache("t", path=path))
+    assert reader.get("k") == {"v": 1}  # shared hit
+    assert reader.get("k") == {"v": 1}  # local hit
+    assert reader.local.stats()["hits"] == 1
+    assert reader.shared.stats()["hits"] == 1
+
+
+def test_tiered_cache_returns_the_same_types_from_either_tier(tmp_path):
+    path = str(tmp_path / "cache.db")
+    value = {"levels": (1.5, 2.5), "by_bar": {300: "x"}, "at": datetime(2026, 1, 5, 14, 30)}
+    writer = cache_backend.TieredCache(cache_backend.LRUCache(4), cache_backend.SQLiteCache("t", path=path))
+    writer.set("k", value)
+    reader = cache_backend.TieredCache(cache_backend.LRUCache(4), cache_backend.SQLiteCache("t", path=path))
+
+    hot, filled = writer.get("k"), reader.get("k")
+    assert hot == filled == {"levels": [1.5, 2.5], "by_bar": {"300": "x"}, "at": "2026-01-05 14:30:00"}
+
+
+def test_cache_interface_is_abstract():
+    with pytest.raises(TypeError):
+        cache_backend.Cache()
+
+    class _NoStats(cache_backend.Cache):
+        def get(self, key, default=None):
+            return default
+
+        def set(self, key, value, ttl=None):
+            pass
+
+        def delete(self, key):
+            pass
+
+        def clear(self):
+            pass
+
+    with pytest.raises(TypeError):
+        _NoStats()
+
+
+def test_shared_backend_errors_are_misses(tmp_path):
+    cache = cache_backend.SQLiteCache("ns", path=str(tmp_path / "missing_dir" / "cache.db"))
+    cache.set("k", 1)
+    assert cache.get("k", "default") == "default"
+    assert cache.stats()["errors"] == 2
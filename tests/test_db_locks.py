@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+
+import database
+import db_locks
+
+
+def _engine(tmp_path, monkeypatch):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'locks.db'}", connect_args={"check_same_thread": False}
+    )
+    database.AdvisoryLock.__table__.create(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    return engine
+
+
+def test_lock_excludes_second_holder_until_released(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    a = db_locks.DbLock("session_lock:BTCUSDT::us_ny::2026-01-05")
+    b = db_locks.DbLock("session_lock:BTCUSDT::us_ny::2026-01-05")
+    other = db_locks.DbLock("session_lock:ETHUSDT::us_ny::2026-01-05")
+
+    assert a.acquire(blocking=False)
+    assert not b.acquire(blocking=False)
+    assert other.acquire(blocking=False)
+    a.release()
+    assert b.acquire(blocking=False)
+    b.release()
+    other.release()
+
+
+def test_expired_row_is_taken_over(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    crashed = db_locks.DbLock("gravity_ingestion", ttl=0.1)
+    assert crashed.acquire(blocking=False)  # never released
+    time.sleep(0.15)
+    fresh = db_locks.DbLock("gravity_ingestion")
+    assert fresh.acquire(blocking=False)
+    crashed.release()  # stale token: must not delete the new holder's row
+    assert not db_locks.DbLock("gravity_ingestion").acquire(blocking=False)
+    fresh.release()
+
+
+def test_blocking_acquire_waits_for_release_and_times_out(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    holder = db_locks.DbLock("ledger_lifecycle")
+    assert holder.acquire()
+    assert not db_locks.DbLock("ledger_lifecycle").acquire(timeout=0.2)
+
+    threading.Timer(0.2, holder.release).start()
+    waiter = db_locks.DbLock("ledger_lifecycle")
+    assert waiter.acquire(timeout=5)
+    waiter.release()
+
+
+def test_async_context_manager_serializes_critical_section(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    inside = []
+
+    async def worker(i):
+        async with db_locks.async_db_lock("session_lock:X", timeout=5) as acquired:
+            assert acquired
+            inside.append(("in", i))
+            await asyncio.sleep(0.05)
+            inside.append(("out", i))
+
+    async def main():
+        await asyncio.gather(*(worker(i) for i in range(3)))
+
+    asyncio.run(main())
+    for k in range(0, len(inside), 2):
+        assert inside[k][0] == "in" and inside[k + 1] == ("out", inside[k][1])
+
+
+def test_backend_error_fails_open(tmp_path, monkeypatch):
+    # No advisory_locks table: the backend errors and the caller proceeds.
+    monkeypatch.setattr(database, "engine", create_engine(f"sqlite:///{tmp_path / 'empty.db'}"))
+    lock = db_locks.DbLock("gravity_ingestion")
+    assert lock.acquire(blocking=False)
+    assert lock.degraded
+    lock.release()
+    assert not lock.held
+
+
+
+def test_failed_advisory_unlock_discards_the_connection():
+    calls = []
+
+    class _PgConn:
+        def execute(self, *a, **kw):
+            raise RuntimeError("server closed the connection")
+
+        def invalidate(self):
+            calls.append("invalidate")
+
+        def close(self):
+            calls.append("close")
+
+    lock = db_locks.DbLock("session_lock:BTCUSDT::us_ny::2026-01-05")
+    lock.held, lock._conn = True, _PgConn()
+    lock.release()
+    # Never pooled with the advisory lock possibly still held on it.
+    assert calls[:2] == ["invalidate", "close"]
+    assert lock._conn is None and not lock.held
+
+
+def test_lock_key_is_stable_signed_64bit():
+    k = db_locks.lock_key("session_lock:BTCUSDT::us_ny::2026-01-05")
+    assert k == db_locks.lock_key("session_lock:BTCUSDT::us_ny::2026-01-05")
+    assert -(2 ** 63) <= k < 2 ** 63
+    assert k != db_locks.lock_key("gravity_ingestion")
@@ -179,6 +179,65 @@ class KabrodaE2ETestSuite(unittest.TestCase):
         for metric in ["win_rate", "net_r", "approval_rate"]:
             self.assertIn(metric, metrics)
 
+    def test_f2_audit_export_streams_ndjson_and_csv(self):
+        """F2: format=ndjson/csv stream every trade across keyset pages in the JSON export's order."""
+        import csv
+        import io
+        import json
+        from datetime import timedelta
+        from unittest import mock
+
+        date_keys = [f"2026-07-0{i + 1}" for i in range(5)]
+
+        def own_rows(db):
+            return db.query(CampaignLog).filter(CampaignLog.session_id == "export_test",
+                                                CampaignLog.date_key.in_(date_keys))
+
+        db = SessionLocal()
+        own_rows(db).delete(synchronize_session=False)
+        base = datetime(2026, 7, 6, 12, 0)
+        for i in range(5):
+            db.add(CampaignLog(
+                symbol="BTC/USDT", date_key=date_keys[i], session_id="export_test",
+                bias="LONG", grade="A", entry_price=60000.0, stop_loss=59000.0, t1=61000.0,
+                total_contracts=1.0, status="CLOSED_WIN", realized_pnl=float(i),
+                diagnostic_data=json.dumps({"i": i}) if i != 2 else "not-json",
+                # Newest row inserted first, and two rows share a timestamp.
+                created_at=base - timedelta(hours=min(i, 3)),
+            ))
+        db.commit()
+        ids = [r.id for r in own_rows(db).order_by(CampaignLog.created_at.desc(), CampaignLog.id.desc())]
+        db.close()
+
+        try:
+            res = self.admin_client.get("/admin/export-audit-ledger")
+            self.assertEqual([r["trade_id"] for r in res.json()["ledger"] if r["trade_id"] in ids], ids)
+
+            with mock.patch.object(main, "_AUDIT_EXPORT_PAGE_SIZE", 2):
+                res = self.admin_client.get("/admin/export-audit-ledger?format=ndjson")
+                self.assertEqual(res.status_code, 200)
+                self.assertTrue(res.headers["content-type"].startswith("application/x-ndjson"))
+                lines = [json.loads(l) for l in res.text.splitlines()]
+                self.assertEqual([l["trade_id"] for l in lines if l["trade_id"] in ids], ids)
+                self.assertEqual(len({l["trade_id"] for l in lines}), len(lines))  # no row twice across pages
+                self.assertTrue(all(l["record"] == "trade" for l in lines))
+                self.assertEqual(next(l for l in lines if l["trade_id"] == ids[2])["diagnostics"], {})
+
+                res = self.admin_client.get("/admin/export-audit-ledger?format=csv")
+                self.assertEqual(res.status_code, 200)
+                rows = list(csv.DictReader(io.StringIO(res.text)))
+                self.assertEqual([int(r["trade_id"]) for r in rows if int(r["trade_id"]) in ids], ids)
+        finally:
+            db = SessionLocal()
+            own_rows(db).delete(synchronize_session=False)
+            db.commit()
+            db.close()
+
+        res = self.admin_client.get("/admin/export-audit-ledger?format=xml")
+        self.assertEqual(res.status_code, 400)
+        res = self.basic_client.get("/admin/export-audit-ledger?format=ndjson")
+        self.assertEqual(res.status_code, 403)
+
 
     # --- F3: Parameter Registry API (/api/v1/system/parameters) ---
 
@@ -0,0 +1,105 @@
+import os
+import random
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import execution_kernel as ek
+import ledger_closing_engine
+
+
+def _walk(n, seed=5, price=100.0):
+    rng = random.Random(seed)
+    high, low, close = [], [], []
+    for _ in range(n):
+        o = price
+        price *= 1 + rng.gauss(0, 0.004)
+        high.append(max(o, price) * (1 + abs(rng.gauss(0, 0.002))))
+        low.append(min(o, price) * (1 - abs(rng.gauss(0, 0.002))))
+        close.append(price)
+    return high, low, close
+
+
+def _reference(high, low, start, end, is_long, stop, targets):
+    """The simulator's old per-candle loop: stop first, then targets, stop at T3."""
+    hit = [False] * len(targets)
+    stopped = False
+    for j in range(start, end):
+        if (is_long and low[j] <= stop) or (not is_long and high[j] >= stop):
+            stopped = True
+            break
+        for i, t in enumerate(targets):
+            if (is_long and high[j] >= t) or (not is_long and low[j] <= t):
+                hit[i] = True
+        if hit[-1]:
+            break
+    return stopped, hit
+
+
+def test_batch_matches_per_candle_loop():
+    high, low, close = _walk(5000)
+    rng = random.Random(11)
+    trades = []
+    for _ in range(400):
+        s = rng.randrange(0, 4900)
+        e = s + rng.randrange(0, 150)
+        long_ = rng.random() < 0.5
+        px = close[s]
+        d = 1 if long_ else -1
+        risk = px * rng.uniform(0.002, 0.02)
+        trades.append((s, e, long_, px, px - d * risk, [px + d * risk * m for m in (0.618, 1.0, 1.618)]))
+
+    res = ek.resolve_trades(high, low, close, *zip(*[(t[0], t[1], t[2], t[3], t[4]) for t in trades]),
+                            [t[5] for t in trades])
+    for i, (s, e, long_, _, stop, tg) in enumerate(trades):
+        stopped, hit = _reference(high, low, s, e, long_, stop, tg)
+        assert (res["exit_reason"][i] == ek.EXIT_STOP) == stopped
+        assert list(res["reached"][i]) == hit
+    assert set(res["exit_reason"]) == {ek.EXIT_OPEN, ek.EXIT_STOP, ek.EXIT_TARGET}
+
+
+def test_same_bar_tie_break_and_r():
+    # Bar 1 spans both the stop (95) and T1 (110).
+    high, low, close = [101, 111, 120], [99, 94, 100], [100, 100, 118]
+    args = (high, low, close, [1], [3], [True], [100.0], [95.0], [[110.0, 200.0]])
+    conservative = ek.resolve_trades(*args, exit_target=0)
+    assert conservative["exit_reason"][0] == ek.EXIT_STOP
+    assert conservative["exit_idx"][0] == 1 and conservative["realized_r"][0] == -1.0
+    assert not conservative["reached"][0].any()
+
+    optimistic = ek.resolve_trades(*args, exit_target=0, tie_break=ek.TARGET_FIRST)
+    assert optimistic["exit_reason"][0] == ek.EXIT_TARGET
+    assert optimistic["realized_r"][0] == 2.0  # (110 - 100) / 5
+
+
+def test_time_cap_and_open_trades():
+    high, low, close = [101, 102, 103, 130], [99, 100, 101, 102], [100, 101, 102, 125]
+    capped = ek.resolve_trades(high, low, close, [0], [4], [True], [100.0], [90.0], [[120.0]], max_bars=3)
+    assert capped["exit_reason"][0] == ek.EXIT_OPEN and capped["exit_idx"][0] == -1
+    assert capped["realized_r"][0] == 0.2  # marked at the last scanned close (102)
+
+    short = ek.resolve_candles([{"high": 10, "low": 9, "close": 9.5}], False, 10.0, 11.0, [None])
+    assert short["exit_reason"] == "OPEN" and short["target_idx"] == [-1]
+    empty = ek.resolve_trades([], [], [], [], [], [], [], [], [])
+    assert len(empty["exit_reason"]) == 0
+
+
+def test_lifecycle_uses_kernel_rules():
+    ts = int(datetime(2026, 6, 1, 14, tzinfo=timezone.utc).timestamp() * 1000)
+    candles = [{"ts": ts + i * 60_000, "o": 100, "h": h, "l": l, "c": 100} for i, (h, l) in
+               enumerate([(101, 99), (103, 98), (106, 94)])]
+    c = SimpleNamespace(bias="LONG", entry_price=100.0, stop_loss=95.0, t1=105.0)
+    outcome, when, r, same = ledger_closing_engine._resolve_stop_t1(c, candles)
+    assert (outcome, r, same) == ("STOP", -1.0, True)
+    assert when == datetime.fromtimestamp(candles[2]["ts"] / 1000, tz=timezone.utc)
+
+    c.t1 = 102.0
+    outcome, when, r, same = ledger_closing_engine._resolve_stop_t1(c, candles)
+    assert (outcome, r) == ("T1", 0.4) and when.minute == 1
+    assert ledger_closing_engine._frac_r(100.0, 95.0, 102.0, True) == float(ek.frac_r(100.0, 95.0, 102.0, True))
+
+    c.t1 = None
+    c.stop_loss = 90.0
+    assert ledger_closing_engine._resolve_stop_t1(c, candles)[0] is None
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import fetch_scheduler
+
+
+def test_live_priority_and_round_robin_by_symbol():
+    async def scenario():
+        budget = fetch_scheduler._ExchangeBudget("test", rate=50.0, burst=1)
+        granted = []
+
+        async def request(symbol, level):
+            await budget.acquire(symbol, level)
+            granted.append(symbol)
+
+        await budget.acquire("warmup", fetch_scheduler.PRIORITY_BACKGROUND)  # drain the burst
+        tasks = [
+            asyncio.create_task(request(sym, fetch_scheduler.PRIORITY_BACKGROUND))
+            for sym in ["ETH", "ETH", "ETH", "SOL", "XRP"]
+        ]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("BTC", fetch_scheduler.PRIORITY_LIVE)))
+        await asyncio.gather(*tasks)
+        return granted, budget.snapshot()
+
+    granted, stats = asyncio.run(scenario())
+    assert granted == ["BTC", "ETH", "SOL", "XRP", "ETH", "ETH"]
+    assert stats["granted"] == 7
+    assert stats["queued"] == 6
+
+
+def test_penalize_blocks_until_refilled():
+    budget = fetch_scheduler._ExchangeBudget("test", rate=10.0, burst=5)
+    budget.penalize(seconds=2.0)
+    assert budget.tokens <= -19.9
+    assert budget.rate_limit_hits == 1
+
+
+def test_pool_from_a_finished_loop_is_closed_when_replaced():
+    async def get_session():
+        return fetch_scheduler._shared_session()
+
+    old = asyncio.run(get_session())
+    connector = old.connector
+
+    async def replace():
+        session = fetch_scheduler._shared_session()
+        await asyncio.sleep(0.01)  # let the release task run
+        await fetch_scheduler.close_all()
+        return session
+
+    new = asyncio.run(replace())
+    assert new is not old and old.closed and connector.closed
@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import gravity_engine
+from database import CampaignLog, GravityMemory, SessionLocal, init_db
+
+NOW = datetime(2026, 7, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _candles(n, span_sec, drift, accel=0.0, seed=5):
+    """Up-trending bars ending at NOW; `accel` bends the last 30 bars parabolic."""
+    rng = random.Random(seed)
+    t0 = int(NOW.timestamp()) - (n - 1) * span_sec
+    price, out = 50000.0, []
+    for i in range(n):
+        o = price
+        step = drift + (accel if i >= n - 30 else 0.0)
+        price *= 1 + step + rng.gauss(0, 0.001)
+        out.append({"time": t0 + i * span_sec, "open": o, "close": price, "volume": rng.uniform(10, 50),
+                    "high": max(o, price) * 1.001, "low": min(o, price) * 0.999})
+    return out
+
+
+def test_pmarp_caps_the_energy_grade_of_an_overextended_long():
+    candles = _candles(300, 3600, 0.0005, accel=0.006)
+    # Below 252 bars the cap does not apply: aligned trend, strong MACD.
+    assert gravity_engine._compute_energy_grade(candles[-251:], "LONG") == "STRONG"
+    # With the history it does: PMARP >= 95 on a parabolic leg caps it at WEAK.
+    assert gravity_engine._compute_energy_grade(candles, "LONG") == "WEAK"
+
+
+def test_kinematic_grade_reads_pmarp_from_candles():
+    assert gravity_engine._compute_kinematic_grade(_candles(200, 3600, 0.0005, accel=0.006)) == "OVEREXTENDED"
+
+
+def test_1h_bos_writes_a_candidate_with_its_grades():
+    init_db()
+    symbol = db_sym = "GRADETESTUSDT"
+    candles_1h = _candles(200, 3600, 0.0005, accel=0.006)
+    db = SessionLocal()
+    try:
+        db.add(GravityMemory(symbol=db_sym, source="1H_PIVOT", level_type="SUPPLY", active=True,
+                             price=candles_1h[-20]["close"], permanence_class=2,
+                             timestamp=(NOW - timedelta(days=1)).replace(tzinfo=None)))
+        db.commit()
+        gravity_engine._detect_1h_bos(symbol, db_sym, candles_1h, _candles(120, 14400, 0.001),
+                                      _candles(60, 86400, 0.004), db, now=NOW)
+        row = db.query(CampaignLog).filter(CampaignLog.symbol == symbol).one()
+        assert (row.session_id, row.bias, row.macro_bias) == ("1h_system", "LONG", "BULLISH")
+        # 200 bars: the kinematic grade reads PMARP; the energy cap needs 252.
+        assert (row.energy_grade, row.kinematic_grade) == ("STRONG", "OVEREXTENDED")
+        assert row.stop_loss < row.entry_price < row.t1 < row.t2 < row.t3
+    finally:
+        db.rollback()
+        db.query(CampaignLog).filter(CampaignLog.symbol == symbol).delete()
+        db.query(GravityMemory).filter(GravityMemory.symbol == db_sym).delete()
+        db.commit()
+        db.close()
@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from harness import loadtest
+
+
+def test_ladder_serves_every_endpoint_against_the_stub_exchange():
+    report = loadtest.run_load_test(list(loadtest.ENDPOINTS), [1, 2], duration=0.5, latency_ms=2.0,
+                                    jitter_ms=1.0, macro_latency_ms=2.0, levels=50, slo_ms=60000, warmup=2)
+    assert [(r["endpoint"], r["requests"], r["errors"]) for r in report["warmup"]] == \
+           [(e, 2, 0) for e in loadtest.ENDPOINTS]
+    assert [(r["endpoint"], r["concurrency"]) for r in report["steps"]] == \
+           [(e, n) for e in loadtest.ENDPOINTS for n in (1, 2)]
+    for row in report["steps"]:
+        assert row["errors"] == 0 and row["requests"] >= 1 and row["rps"] > 0, row
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"] <= row["max_ms"]
+    assert all(c["max_concurrency_within_slo"] == 2 for c in report["capacity"].values())
+
+
+def test_percentiles_and_capacity():
+    s = loadtest.summarize([float(i) for i in range(1, 101)], errors=0, elapsed=2.0)
+    assert (s["p50_ms"], s["p95_ms"], s["p99_ms"], s["max_ms"], s["rps"]) == (50.0, 95.0, 99.0, 100.0, 50.0)
+    rows = [
+        {"endpoint": "a", "concurrency": 1, "p95_ms": 100.0, "error_rate": 0.0, "rps": 10.0},
+        {"endpoint": "a", "concurrency": 8, "p95_ms": 400.0, "error_rate": 0.0, "rps": 20.0},
+        {"endpoint": "a", "concurrency": 32, "p95_ms": 2500.0, "error_rate": 0.0, "rps": 18.0},
+        {"endpoint": "b", "concurrency": 1, "p95_ms": 90.0, "error_rate": 0.5, "rps": 5.0},
+    ]
+    assert loadtest.capacity(rows, slo_ms=500) == {
+        "a": {"max_concurrency_within_slo": 8, "peak_rps": 20.0},
+        "b": {"max_concurrency_within_slo": None, "peak_rps": 5.0},
+    }
@@ -0,0 +1,193 @@
+import asyncio
+import copy
+import os
+import sys
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import battlebox_pipeline
+import cache_backend
+import db_locks
+import gravity_engine
+import gravity_math
+import kabroda_mas_flow
+import market_context_oracle
+import market_data
+import packet_codec
+import replay_clock
+import database
+from database import Base, SessionLock
+from harness import bench
+
+
+class _NoLock:
+    def __init__(self, name):
+        self.name = name
+
+    async def acquire_async(self, timeout=None):
+        return True
+
+    async def release_async(self):
+        pass
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """get_live_battlebox over the bench fixture, a scratch DB and no network.
+    Yields the session factory; every symbol is served the same candles."""
+    fixture = bench.synthetic_fixture()
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    for mod in (battlebox_pipeline, gravity_math, gravity_engine):
+        monkeypatch.setattr(mod, "SessionLocal", factory)
+
+    async def _no_macro():
+        return {"vix": 1}
+
+    monkeypatch.setattr(db_locks, "DbLock", _NoLock)
+    monkeypatch.setattr(market_context_oracle, "get_global_macro_context", _no_macro)
+    monkeypatch.setattr(kabroda_mas_flow, "run_mas_analysis", lambda **kwargs: None)
+    monkeypatch.setattr(battlebox_pipeline, "_LOCKED_PACKETS", cache_backend.LRUCache(8, 3600.0))
+    monkeypatch.setattr(battlebox_pipeline, "_packet_stats", {"hits": 0, "misses": 0, "db_loads": 0, "computed": 0})
+    monkeypatch.setattr(packet_codec, "_cache", OrderedDict())  # decoded rows are keyed by id, per DB
+    monkeypatch.setattr(database, "engine", engine)
+    database._m004_session_locks_unique_key()
+    market_data.set_candle_source(bench._FixtureSource(fixture["windows"]))
+    replay_clock.install(replay_clock.ReplayClock(datetime.fromtimestamp(fixture["now"], tz=timezone.utc)))
+    try:
+        yield factory
+    finally:
+        market_data.set_candle_source(None)
+        replay_clock.uninstall()
+
+
+def test_locked_packets_cache_is_size_and_age_bounded():
+    stats = battlebox_pipeline.get_locked_packet_stats()
+    cache = stats["cache"]
+    local = cache["local"] if cache["backend"] == "tiered" else cache
+    assert local["max"] == battlebox_pipeline.LOCKED_PACKETS_MAX
+    assert battlebox_pipeline._LOCKED_PACKETS is cache_backend.get_cache("locked_packets")
+
+
+def test_evicted_sessions_reload_from_the_session_lock_row(pipeline, monkeypatch):
+    monkeypatch.setattr(battlebox_pipeline, "LOCKED_PACKETS_MAX", 2)
+    monkeypatch.setattr(battlebox_pipeline, "_LOCKED_PACKETS", cache_backend.LRUCache(2, 3600.0))
+    fired = []
+    monkeypatch.setattr(kabroda_mas_flow, "run_mas_analysis", lambda **kwargs: fired.append(kwargs["session_id"]))
+    sessions = ["us_ny_futures", "eu_london", "asia_tokyo"]  # one more than the cache holds
+
+    async def run():
+        first = {s: await battlebox_pipeline.get_live_battlebox("BTC/USDT", "MANUAL", s) for s in sessions}
+        again = await battlebox_pipeline.get_live_battlebox("BTC/USDT", "MANUAL", "us_ny_futures")
+        hot = await battlebox_pipeline.get_live_battlebox("BTC/USDT", "MANUAL", "us_ny_futures")
+        await asyncio.sleep(0.1)  # let the MAS to_thread tasks run
+        return first, again, hot
+
+    first, again, hot = asyncio.run(run())
+    assert all(r["status"] == "OK" for r in [*first.values(), again, hot])
+    assert again["battlebox"]["levels"] == first["us_ny_futures"]["battlebox"]["levels"]
+
+    stats = battlebox_pipeline.get_locked_packet_stats()
+    # NY was evicted, came back from its session_locks row and was not recomputed.
+    assert (stats["computed"], stats["db_loads"], stats["hits"], stats["misses"]) == (3, 1, 1, 4)
+    assert stats["cache"]["evictions"] == 2 and stats["cache"]["size"] == 2 and stats["hit_rate"] == 0.2
+    assert sorted(fired) == sorted(sessions)  # MAS fired once per session, not again on reload
+    db = pipeline()
+    try:
+        assert db.query(SessionLock).count() == 3
+    finally:
+        db.close()
+
+
+def test_waiting_on_one_sessions_vault_lock_does_not_block_other_sessions(pipeline, monkeypatch):
+    # Another worker holds the NY futures vault lock until London has been served.
+    london_done = asyncio.Event()
+    waits = []
+
+    class _HeldElsewhere(_NoLock):
+        async def acquire_async(self, timeout=None):
+            if "us_ny_futures" in self.name:
+                try:
+                    await asyncio.wait_for(london_done.wait(), 5.0)
+                    waits.append("released")
+                except asyncio.TimeoutError:
+                    waits.append("timed out")
+            return True
+
+    monkeypatch.setattr(db_locks, "DbLock", _HeldElsewhere)
+
+    async def run():
+        ny = asyncio.create_task(battlebox_pipeline.get_live_battlebox("BTC/USDT", "MANUAL", "us_ny_futures"))
+        await asyncio.sleep(0.05)
+        london = await battlebox_pipeline.get_live_battlebox("BTC/USDT", "MANUAL", "eu_london")
+        london_done.set()
+        return await ny, london
+
+    ny, london = asyncio.run(run())
+    assert ny["status"] == london["status"] == "OK"
+    assert waits == ["released"]
+
+
+def test_one_cache_lookup_per_request(pipeline):
+    async def run():
+        first = await battlebox_pipeline.get_live_battlebox("BTC/USDT")
+        after_first = battlebox_pipeline._LOCKED_PACKETS.stats()
+        second = await battlebox_pipeline.get_live_battlebox("BTC/USDT")
+        return first, after_first, second
+
+    first, after_first, second = asyncio.run(run())
+    assert first["status"] == second["status"] == "OK"
+    assert first["battlebox"]["levels"] == second["battlebox"]["levels"]
+    assert (after_first["misses"], after_first["hits"]) == (1, 0)  # computed: one miss, no re-read
+    stats = battlebox_pipeline._LOCKED_PACKETS.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+    assert battlebox_pipeline.get_locked_packet_stats()["computed"] == 1
+
+
+def test_a_worker_that_timed_out_adopts_the_lock_committed_before_its_insert(pipeline, monkeypatch):
+    fired = []
+    monkeypatch.setattr(kabroda_mas_flow, "run_mas_analysis", lambda **kwargs: fired.append(kwargs))
+
+    class _TimedOut(_NoLock):
+        async def acquire_async(self, timeout=None):
+            return False  # the other worker still holds the vault lock
+
+    monkeypatch.setattr(db_locks, "DbLock", _TimedOut)
+    compute = battlebox_pipeline._compute_sse_packet
+
+    def compute_while_the_other_worker_commits(*args, **kwargs):
+        pkt = compute(*args, **kwargs)
+        theirs = copy.deepcopy(pkt)
+        theirs["meta"] = {"locked_by": "other worker"}
+        db = pipeline()
+        db.add(SessionLock(symbol="BTC/USDT", session_id="us_ny_futures", date_key="2026-06-01",
+                           lock_time=int(theirs["lock_time"]), **packet_codec.lock_fields(theirs)))
+        db.commit()
+        db.close()
+        return pkt
+
+    monkeypatch.setattr(battlebox_pipeline, "_compute_sse_packet", compute_while_the_other_worker_commits)
+
+    async def run():
+        out = await battlebox_pipeline.get_live_battlebox("BTC/USDT")
+        await asyncio.sleep(0.1)
+        return out
+
+    out = asyncio.run(run())
+    assert out["status"] == "OK" and out["battlebox"]["meta"] == {"locked_by": "other worker"}
+    db = pipeline()
+    try:
+        assert db.query(SessionLock).count() == 1
+    finally:
+        db.close()
+    stats = battlebox_pipeline.get_locked_packet_stats()
+    assert (stats["computed"], stats["db_loads"]) == (0, 1)
+    assert fired == []  # MAS runs once per session, in the worker that owns the lock
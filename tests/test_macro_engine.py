@@ -0,0 +1,98 @@
+import asyncio
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+import kabroda_macro_engine as kme
+
+DAY = 86400
+
+
+def _series(n, seed=9, start=1_500_000_000):
+    rng = random.Random(seed)
+    price = 8000.0
+    out = []
+    for i in range(n):
+        price *= 1 + rng.gauss(0.0008, 0.035)
+        out.append({
+            "time": start + i * DAY,
+            "high": price * (1 + abs(rng.gauss(0, 0.02))),
+            "low": price * (1 - abs(rng.gauss(0, 0.02))),
+            "close": price,
+        })
+    return out
+
+
+def _session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'macro.db'}")
+    database.MacroDailyCandle.__table__.create(engine)
+    database.MacroEngineState.__table__.create(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_zigzag_resumes_to_the_same_pivots():
+    candles = _series(1200)
+    full = kme._calculate_zigzag_pivots(candles)
+    assert len(full) >= 4
+
+    state = kme._new_zigzag(candles[0])
+    for lo in range(0, len(candles), 37):
+        kme._advance_zigzag(state, candles[lo : lo + 37])
+    kme._advance_zigzag(state, candles[:500])  # already-seen bars are ignored
+    assert state["pivots"] == full
+
+
+def test_find_macro_anchors_does_not_mutate_input():
+    candles = _series(900)
+    before = [dict(c) for c in candles]
+    kme._find_macro_anchors(candles)
+    assert candles == before
+
+
+def test_incremental_scan_matches_full_recompute(tmp_path, monkeypatch):
+    db = _session(tmp_path)
+    candles = _series(800)
+    calls = []
+    real = kme._find_macro_anchors
+    monkeypatch.setattr(kme, "_find_macro_anchors", lambda *a, **k: calls.append(1) or real(*a, **k))
+
+    anchors, _, changed = kme._scan_symbol(db, "BTCUSDT", candles[:600], candles[600])
+    assert changed and anchors == real(candles[:601])
+
+    for i in range(601, 800):
+        anchors, window, changed = kme._scan_symbol(db, "BTCUSDT", candles[:i], candles[i])
+        assert window == candles[: i + 1]
+        assert anchors == real(candles[: i + 1])
+    # The validator only ran on the bars where a pivot confirmed or an extreme moved.
+    assert 1 < len(calls) < 200
+
+
+def test_sync_fetches_only_new_bars(tmp_path, monkeypatch):
+    db = _session(tmp_path)
+    now = 1_700_000_000 - (1_700_000_000 % DAY)
+    series = _series(40, start=now - 39 * DAY)
+    clock = {"t": now - DAY + 3600}  # series[-2] is the forming bar
+    monkeypatch.setattr(kme.time, "time", lambda: clock["t"])
+    seen = []
+
+    async def fake_fetch(symbol, target_days=1500, since_ms=None):
+        seen.append(since_ms)
+        visible = [c for c in series if c["time"] <= clock["t"]]
+        return visible if since_ms is None else [c for c in visible if c["time"] * 1000 >= since_ms]
+
+    monkeypatch.setattr(kme, "fetch_historical_daily_macro", fake_fetch)
+    history, forming = asyncio.run(kme._sync_daily_history(db, "BTC/USDT", "BTCUSDT"))
+    assert seen == [None]
+    assert len(history) == 38 and forming["time"] == series[-2]["time"]
+
+    clock["t"] = now + 3600  # a day later: series[-2] closed, series[-1] forming
+    history, forming = asyncio.run(kme._sync_daily_history(db, "BTC/USDT", "BTCUSDT"))
+    assert seen[-1] == series[-2]["time"] * 1000
+    assert len(history) == 39 and history[-1] == series[-2]
+    assert forming["time"] == series[-1]["time"]
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import battlebox_pipeline
+import market_simulator
+
+
+def _history(days, seed=23, start="2024-03-01"):
+    rng = random.Random(seed)
+    t0 = int(datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()) - 10 * 86400
+    price = 64000.0
+    out = []
+    for i in range((days + 12) * 288):
+        o = price
+        price *= 1 + rng.gauss(0, 0.0018)
+        out.append({"time": t0 + i * 300, "open": o, "close": price, "volume": rng.uniform(5, 80),
+                    "high": max(o, price) * (1 + abs(rng.gauss(0, 0.0008))),
+                    "low": min(o, price) * (1 - abs(rng.gauss(0, 0.0008)))})
+    return out
+
+
+BASE = {"symbol": "BTCUSDT", "start_date_utc": "2024-03-01", "end_date_utc": "2024-03-20",
+        "session_ids": ["us_ny_futures", "eu_london"]}
+
+
+def _fake_history(monkeypatch):
+    raw = _history(21)
+    calls = []
+
+    async def fetch(symbol, start_ts, end_ts):
+        calls.append(symbol)
+        return raw
+
+    monkeypatch.setattr(battlebox_pipeline, "fetch_historical_pagination", fetch, raising=False)
+    return calls
+
+
+def test_grid_sweep_matches_individual_runs(monkeypatch):
+    calls = _fake_history(monkeypatch)
+    grid = {"min_gap": [0.1, 0.5], "exhaust_max": [1.0, 3.0], "entry_style": ["instant", "pullback"]}
+    out = asyncio.run(market_simulator.run_parameter_sweep({**BASE, "grid": grid, "workers": 1}))
+    assert out["ok"] and out["combos"] == 8 and out["sessions"] > 20
+    assert calls == ["BTCUSDT"]  # one history load for every combination
+
+    for row in out["results"]:
+        single = asyncio.run(market_simulator.run_simulation({**BASE, **row["params"], "use_custom_gaps": True}))
+        assert single["stats"] == row["stats"]
+    assert sum(r["stats"]["total_trades"] for r in out["results"]) > 0
+
+    rates = [r["win_rate"] for r in out["results"]]
+    assert rates == sorted(rates, reverse=True)
+    assert [r["rank"] for r in out["results"]] == list(range(1, 9))
+
+
+def test_process_pool_matches_inline(monkeypatch):
+    _fake_history(monkeypatch)
+    monkeypatch.setattr(market_simulator, "SIM_SWEEP_WORKERS", 2)
+    payload = {**BASE, "random": {"samples": 6, "seed": 4,
+                                  "space": {"min_gap": [0.1, 1.0], "allow_jb": [True, False],
+                                            "stop_style": ["radar_default", "15m_candle"]}}}
+    inline = asyncio.run(market_simulator.run_parameter_sweep({**payload, "workers": 1}))
+    pooled = asyncio.run(market_simulator.run_parameter_sweep({**payload, "workers": 2}))
+    assert inline["ok"] and pooled["ok"]
+    assert pooled["results"] == inline["results"]
+    assert all(0.1 <= r["params"]["min_gap"] <= 1.0 for r in inline["results"])
+
+
+def test_concurrent_inline_sweeps_keep_their_own_inputs(monkeypatch):
+    _fake_history(monkeypatch)
+    grid = {"min_gap": [0.1, 0.5], "entry_style": ["instant", "pullback"]}
+    ny = {**BASE, "session_ids": ["us_ny_futures"], "grid": grid, "workers": 1}
+    london = {**BASE, "session_ids": ["eu_london"], "grid": grid, "exhaust_max": 1.0, "workers": 1}
+    alone = [asyncio.run(market_simulator.run_parameter_sweep(p)) for p in (ny, london)]
+    simulate = market_simulator._simulate
+
+    def slow_simulate(*args):
+        time.sleep(0.2)  # long enough for the other sweep to start mid-way
+        return simulate(*args)
+
+    monkeypatch.setattr(market_simulator, "_simulate", slow_simulate)
+
+    async def both():
+        return await asyncio.gather(market_simulator.run_parameter_sweep(ny),
+                                    market_simulator.run_parameter_sweep(london))
+
+    assert list(asyncio.run(both())) == alone
+
+
+def test_requested_workers_are_capped(monkeypatch):
+    _fake_history(monkeypatch)
+    monkeypatch.setattr(market_simulator, "SIM_SWEEP_WORKERS", 2)
+    seen = []
+    monkeypatch.setattr(market_simulator, "_run_sweep",
+                        lambda symbol, sessions, combos, base, include_log, workers: seen.append(workers) or [])
+    for asked in (64, 1, -3):
+        assert asyncio.run(market_simulator.run_parameter_sweep({**BASE, "grid": {"min_gap": [0.5]}, "workers": asked}))["ok"]
+    assert seen == [2, 1, 1]
+
+
+def test_sweep_pool_defaults_to_two_workers_and_honours_the_env_override():
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    probe = "import market_simulator; print(market_simulator.SIM_SWEEP_WORKERS)"
+    env = {k: v for k, v in os.environ.items() if k != "SIM_SWEEP_WORKERS"}
+    run = lambda e: subprocess.run([sys.executable, "-c", probe], cwd=root, env=e,
+                                   capture_output=True, text=True, check=True).stdout.split()[-1]
+    assert run(env) == "2"
+    assert run({**env, "SIM_SWEEP_WORKERS": "6"}) == "6"
+    assert run({**env, "SIM_SWEEP_WORKERS": "0"}) == "1"
+
+
+def test_sweep_rejects_bad_requests(monkeypatch):
+    _fake_history(monkeypatch)
+    run = lambda p: asyncio.run(market_simulator.run_parameter_sweep({**BASE, **p}))
+    assert "grid" in run({})["error"]
+    assert "Unknown" in run({"grid": {"leverage": [1, 2]}})["error"]
+    assert "rank_by" in run({"grid": {"min_gap": [0.5]}, "rank_by": "pnl"})["error"]
+    monkeypatch.setattr(market_simulator, "SIM_SWEEP_MAX_COMBOS", 3)
+    assert "max 3" in run({"grid": {"min_gap": [0.1, 0.2], "primal_max": [1, 2]}})["error"]
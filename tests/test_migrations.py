@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, inspect, text
+
+import database
+
+
+def test_migrations_run_once_and_are_recorded(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    calls = []
+    original = database._MIGRATIONS
+    monkeypatch.setattr(
+        database,
+        "_MIGRATIONS",
+        [(v, n, (lambda fn=fn, v=v: (calls.append(v), fn()))) for v, n, fn in original],
+    )
+
+    database.init_db()
+    # Fresh install: legacy ALTERs are stamped, not replayed.
+    assert 1 not in calls and 2 in calls
+    database.init_db()
+    assert calls.count(2) == 1
+
+    with engine.connect() as conn:
+        versions = [r[0] for r in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+    assert versions == [v for v, _, _ in original]
+
+    index_names = {ix["name"] for ix in inspect(engine).get_indexes("campaign_logs")}
+    assert {"ix_campaign_logs_open_lifecycle", "ix_campaign_logs_open_canonical"} <= index_names
+
+
+def test_session_locks_unique_key_drops_duplicates_and_rejects_new_ones(tmp_path, monkeypatch):
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'locks.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    database.SessionLock.__table__.create(engine)
+    row = "INSERT INTO session_locks (symbol, session_id, date_key, lock_time, packet_data) VALUES ('BTCUSDT', 'us_ny_futures', '2026-01-05', :t, '')"
+    with engine.begin() as conn:
+        for t in (1, 2, 3):
+            conn.execute(text(row), {"t": t})
+
+    database._m004_session_locks_unique_key()
+    with engine.connect() as conn:
+        assert [r[0] for r in conn.execute(text("SELECT lock_time FROM session_locks"))] == [1]  # earliest kept
+    with pytest.raises(IntegrityError):
+        with engine.begin() as conn:
+            conn.execute(text(row), {"t": 4})
@@ -0,0 +1,45 @@
+import json
+import math
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import packet_codec
+
+
+def _packet():
+    return {
+        "lock_time": 1760000000,
+        "levels": {"breakout_trigger": 64123.5, "breakdown_trigger": 63010.25},
+        "htf_shelves": {"resistance": [{"price": 65000.0 + i, "strength": i} for i in range(200)]},
+        "context": {"note": "ü ✓", "gap": float("nan")},
+    }
+
+
+def test_roundtrip_matches_legacy_json_and_is_smaller():
+    pkt = _packet()
+    legacy = json.dumps(pkt, default=str)
+    blob = packet_codec.encode_packet(pkt)
+    assert blob[0] == packet_codec.FORMAT_JSON_ZLIB
+    assert len(blob) < len(legacy.encode("utf-8")) / 3
+
+    decoded = packet_codec.decode_packet(blob)
+    assert math.isnan(decoded["context"].pop("gap"))
+    expected = json.loads(legacy)
+    expected["context"].pop("gap")
+    assert decoded == expected
+
+
+def test_load_lock_packet_caches_by_id_and_reads_legacy_rows():
+    new_row = SimpleNamespace(id=9001, **packet_codec.lock_fields({"levels": {"a": 1}}))
+    legacy_row = SimpleNamespace(id=9002, packet_blob=None, packet_data='{"test": true}')
+
+    before = packet_codec.get_stats()
+    first = packet_codec.load_lock_packet(new_row)
+    assert packet_codec.load_lock_packet(new_row) is first
+    assert packet_codec.load_lock_packet(legacy_row) == {"test": True}
+    after = packet_codec.get_stats()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 2
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import replay_clock
+from database import Base, CampaignLog, CandleHistory, MonitorEventLog, SessionLock
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+START = datetime(2025, 3, 3, 12, 0)  # NY futures opens 13:30 UTC, locks 14:00
+
+
+def _source_db(tmp_path, seed=3):
+    """candle_history with 5M bars from START - 30d to START + 2d."""
+    url = f"sqlite:///{tmp_path / 'source.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine, tables=[CandleHistory.__table__])
+    rng = random.Random(seed)
+    t0 = START - timedelta(days=30)
+    rows, price, closes = [], 60000.0, {}
+    for i in range(32 * 288):
+        o = price
+        price *= 1 + rng.gauss(0, 0.0015)
+        ts = t0 + timedelta(minutes=5 * i)
+        closes[ts] = price
+        rows.append(CandleHistory(symbol="BTC/USDT", timeframe="5M", timestamp=ts, open=o, close=price,
+                                  high=max(o, price) * (1 + abs(rng.gauss(0, 0.0007))),
+                                  low=min(o, price) * (1 - abs(rng.gauss(0, 0.0007))), volume=rng.uniform(5, 80)))
+    db = sessionmaker(bind=engine)()
+    db.add_all(rows)
+    db.commit()
+    db.close()
+    engine.dispose()
+    return url, closes
+
+
+def _app_db(tmp_path, name, entry):
+    """Migrated scratch app DB holding one APPROVED LONG campaign at `entry`."""
+    url = f"sqlite:///{tmp_path / name}"
+    env = {**os.environ, "DATABASE_URL": url}
+    subprocess.run([sys.executable, "-c", "import database; database.init_db()"], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+    engine = create_engine(url)
+    db = sessionmaker(bind=engine)()
+    db.add(CampaignLog(symbol="BTC/USDT", date_key="2025-03-03", session_id="us_ny_futures", bias="LONG",
+                       grade="A", entry_price=entry, stop_loss=entry * 0.98, t1=entry * 1.003,
+                       total_contracts=1.0, status="OPEN", mas_approval_status="APPROVED",
+                       session_expires_at=START + timedelta(hours=8), is_canonical=True))
+    db.commit()
+    db.close()
+    engine.dispose()
+    return url
+
+
+def _replay(app_url, source_url):
+    out = subprocess.run(
+        [sys.executable, "harness/replay.py", "--db", app_url, "--source", source_url,
+         "--start", START.isoformat(), "--hours", "8", "--battlebox-every", "300"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    line = [l for l in out.stdout.splitlines() if l.startswith("[REPLAY] ")][-1]
+    return json.loads(line[len("[REPLAY] "):])
+
+
+def _rows(url):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        locks = conn.execute(select(SessionLock.session_id, SessionLock.date_key, SessionLock.lock_time,
+                                    SessionLock.packet_data).order_by(SessionLock.id)).all()
+        polls = conn.execute(select(MonitorEventLog.poll_sequence, MonitorEventLog.poll_timestamp,
+                                    MonitorEventLog.btc_price, MonitorEventLog.state_snapshot_json)
+                             .order_by(MonitorEventLog.id)).all()
+        trade = conn.execute(select(CampaignLog.entry_filled_at, CampaignLog.closed_at, CampaignLog.status,
+                                    CampaignLog.realized_pnl)).one()
+    engine.dispose()
+    return locks, polls, tuple(trade)
+
+
+def test_replayed_day_drives_every_loop_offline_and_repeats_exactly(tmp_path):
+    source, closes = _source_db(tmp_path)
+    entry = closes[START - timedelta(minutes=5)] * 0.999  # fills on the first lifecycle tick
+    first = _replay(_app_db(tmp_path, "a.db", entry), source)
+    second = _replay(_app_db(tmp_path, "b.db", entry), source)
+
+    assert first["simulated_seconds"] == 8 * 3600 and first["speedup"] >= 100
+    assert first["fetches"]["fetch_ticker"] >= 1 and first["fetches"]["fetch_ohlcv:1m"] >= 1
+    assert first["battlebox"]["OK"] > 0
+    assert {"symbol": "BTC/USDT", "session_id": "us_ny_futures", "date_key": "2025-03-03"} in first["mas_calls"]
+
+    locks, polls, trade = _rows(f"sqlite:///{tmp_path / 'a.db'}")
+    lock_ts = int(datetime(2025, 3, 3, 14, tzinfo=timezone.utc).timestamp())
+    assert ("us_ny_futures", "2025-03-03", lock_ts) in [l[:3] for l in locks]
+    assert polls and polls[0][1] >= datetime(2025, 3, 3, 14)  # monitor polls only after the lock
+    filled, closed, status, _ = trade
+    assert filled == START and START < closed <= START + timedelta(hours=8)
+    assert status in ("CLOSED_WIN", "CLOSED_LOSS")
+
+    assert _rows(f"sqlite:///{tmp_path / 'b.db'}") == (locks, polls, trade)
+    assert (first["fetches"], first["battlebox"]) == (second["fetches"], second["battlebox"])
+
+
+def test_replay_clock_jumps_timers_in_order_and_holds_for_threads():
+    clock = replay_clock.ReplayClock(datetime(2025, 1, 1, tzinfo=timezone.utc))
+    loop = asyncio.new_event_loop()
+    clock.bind(loop)
+    woke = []
+
+    async def sleeper(name, delay):
+        await asyncio.sleep(delay)
+        woke.append((name, clock.elapsed()))
+
+    async def worker():
+        await asyncio.to_thread(time.sleep, 0.2)  # real time passes, simulated time must not
+        woke.append(("thread", clock.elapsed()))
+
+    async def run():
+        replay_clock.install(clock)
+        try:
+            await asyncio.gather(sleeper("day", 86400), sleeper("hour", 3600), worker())
+            return replay_clock.now_utc()
+        finally:
+            replay_clock.uninstall()
+
+    started = time.perf_counter()
+    try:
+        now = loop.run_until_complete(run())
+    finally:
+        loop.close()
+    assert woke == [("thread", 0.0), ("hour", 3600.0), ("day", 86400.0)]
+    assert now == datetime(2025, 1, 2, tzinfo=timezone.utc)
+    assert time.perf_counter() - started < 5
+    assert abs(replay_clock.time() - time.time()) < 1  # wall clock again once uninstalled
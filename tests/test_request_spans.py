@@ -0,0 +1,125 @@
+import asyncio
+import os
+import sys
+from collections import deque
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import battlebox_pipeline
+import cache_backend
+import db_locks
+import gravity_engine
+import gravity_math
+import kabroda_mas_flow
+import market_context_oracle
+import market_data
+import mtf_confluence_scanner
+import replay_clock
+import request_spans
+from database import Base
+from harness import bench
+
+
+@pytest.fixture(autouse=True)
+def _fresh_buffer(monkeypatch):
+    monkeypatch.setattr(request_spans, "_buffer", deque(maxlen=request_spans.BUFFER_SIZE))
+    monkeypatch.setattr(request_spans, "_stats", {"traces": 0, "slow": 0})
+
+
+def test_spans_record_stages_sizes_and_errors_into_a_bounded_buffer(monkeypatch, capsys):
+    with request_spans.span("outside") as sp:  # no trace: no-op
+        sp["candles"] = 1
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return [1, 2, 3]
+
+    async def run():
+        with request_spans.trace("pipe", symbol="BTC/USDT") as tr:
+            await asyncio.gather(request_spans.timed("fetch_a", fetch(), count="candles"),
+                                 request_spans.timed("fetch_b", fetch(), count="candles"))
+            with request_spans.span("compute", levels=7):
+                request_spans.annotate(packet="cache")
+            tr.attrs["status"] = "OK"
+
+    monkeypatch.setattr(request_spans, "SLOW_REQUEST_MS", 5.0)
+    asyncio.run(run())
+    rec = request_spans.recent()[0]
+    assert rec["name"] == "pipe" and rec["status"] == "OK" and rec["packet"] == "cache"
+    assert {s["stage"]: s.get("candles", s.get("levels")) for s in rec["spans"]} == \
+           {"fetch_a": 3, "fetch_b": 3, "compute": 7}
+    assert rec["total_ms"] >= 10 and "[SLOW REQUEST] pipe symbol=BTC/USDT" in capsys.readouterr().out
+
+    monkeypatch.setattr(request_spans, "_buffer", deque(maxlen=2))
+    with pytest.raises(ValueError):
+        with request_spans.trace("pipe"):
+            with request_spans.span("boom"):
+                raise ValueError
+    failed = request_spans.recent(name="pipe")[0]
+    assert failed["status"] == "EXCEPTION" and failed["spans"][0]["error"] == "ValueError"
+    stats = request_spans.get_stats()
+    assert stats["traces"] == 2 and stats["slow"] == 1 and stats["pipelines"]["pipe"]["stages"]["boom"]["count"] == 1
+    for _ in range(2):
+        with request_spans.trace("noop"):
+            pass
+    assert [r["name"] for r in request_spans.recent()] == ["noop", "noop"]  # oldest dropped
+
+
+def test_battlebox_and_confluence_report_every_stage(monkeypatch):
+    fixture = bench.synthetic_fixture()
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    for mod in (battlebox_pipeline, gravity_math, gravity_engine):
+        monkeypatch.setattr(mod, "SessionLocal", factory)
+
+    class _NoLock:
+        def __init__(self, name):
+            pass
+
+        async def acquire_async(self, timeout=None):
+            return True
+
+        async def release_async(self):
+            pass
+
+    async def _no_macro():
+        return {"vix": 1}
+
+    monkeypatch.setattr(db_locks, "DbLock", _NoLock)
+    monkeypatch.setattr(market_context_oracle, "get_global_macro_context", _no_macro)
+    monkeypatch.setattr(kabroda_mas_flow, "run_mas_analysis", lambda **kwargs: None)
+    monkeypatch.setattr(battlebox_pipeline, "_LOCKED_PACKETS", cache_backend.LRUCache(8, 3600.0))
+    market_data.set_candle_source(bench._FixtureSource(fixture["windows"]))
+    replay_clock.install(replay_clock.ReplayClock(datetime.fromtimestamp(fixture["now"], tz=timezone.utc)))
+
+    async def run():
+        first = await battlebox_pipeline.get_live_battlebox("BTC/USDT")
+        second = await battlebox_pipeline.get_live_battlebox("BTC/USDT")
+        scan = await mtf_confluence_scanner.run_mtf_confluence_scan("BTC/USDT")
+        return first, second, scan
+
+    try:
+        first, second, scan = asyncio.run(run())
+    finally:
+        market_data.set_candle_source(None)
+        replay_clock.uninstall()
+    assert first["status"] == second["status"] == "OK" and scan["symbol"] == "BTC/USDT"
+
+    mtf, cached, computed = request_spans.recent()
+    stages = {s["stage"]: s for s in computed["spans"]}
+    assert computed["packet"] == "computed" and cached["packet"] == "cache"
+    assert {"fetch", "fetch_5m", "fetch_15m", "fetch_1h", "fetch_4h", "fetch_1d", "macro_context", "indicators",
+            "macro_structure", "gravity_kde", "macro_fibs", "vault_wait", "lock_lookup", "sse_packet",
+            "mtf_snapshot", "lock_write", "bedrock_log", "structure_state"} <= set(stages)
+    assert stages["fetch_5m"]["candles"] == len(fixture["windows"]["5M"]) and stages["macro_context"]["keys"] == 1
+    assert stages["sse_packet"]["levels"] > 0 and "sse_packet" not in {s["stage"] for s in cached["spans"]}
+    assert {s["stage"] for s in mtf["spans"]} >= {"fetch", "fetch_15m", "analyze_15M", "analyze_1W",
+                                                  "gravity_kde", "key_levels"}
+    assert request_spans.get_stats()["pipelines"]["battlebox"]["total"]["count"] == 2
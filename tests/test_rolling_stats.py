@@ -0,0 +1,218 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from rolling_stats import (
+    pivot_highs,
+    percentile_rank_last,
+    pivot_lows,
+    rolling_percentile_rank,
+    sliding_max,
+    sliding_min,
+)
+
+
+def _brute_rank(values, lookback, inclusive, include_current):
+    out = []
+    for i, cur in enumerate(values):
+        if include_current:
+            window = values[max(0, i - lookback + 1) : i + 1]
+        else:
+            window = values[max(0, i - lookback) : i]
+        window = [v for v in window if v is not None]
+        if cur is None or not window:
+            out.append(None)
+            continue
+        if inclusive:
+            count = sum(1 for v in window if v <= cur)
+        else:
+            count = sum(1 for v in window if v < cur)
+        out.append(count / len(window) * 100.0)
+    return out
+
+
+@pytest.mark.parametrize("inclusive", [True, False])
+@pytest.mark.parametrize("include_current", [True, False])
+def test_rolling_percentile_rank_matches_linear_scan(inclusive, include_current):
+    rng = random.Random(26)
+    # Coarse rounding forces plenty of ties; sprinkle in None gaps.
+    values = [round(rng.gauss(0, 1), 1) for _ in range(600)]
+    for i in range(0, 600, 37):
+        values[i] = None
+    for lookback in (1, 5, 50, 252, 1000):
+        got = rolling_percentile_rank(values, lookback, inclusive, include_current)
+        assert got == _brute_rank(values, lookback, inclusive, include_current)
+
+
+@pytest.mark.parametrize("inclusive", [True, False])
+@pytest.mark.parametrize("include_current", [True, False])
+def test_percentile_rank_last_matches_series_tail(inclusive, include_current):
+    rng = random.Random(41)
+    values = [round(rng.gauss(0, 1), 1) for _ in range(400)]
+    for i in range(0, 400, 29):
+        values[i] = None
+    for end in (0, 1, 2, 28, 29, 30, 300, 400):
+        for lookback in (1, 5, 252, 1000):
+            sub = values[:end]
+            want = rolling_percentile_rank(sub, lookback, inclusive, include_current)
+            assert percentile_rank_last(sub, lookback, inclusive, include_current) == (want[-1] if want else None)
+
+
+def test_battlebox_gauges_match_previous_scan():
+    import battlebox_pipeline
+
+    rng = random.Random(7)
+    price = 60000.0
+    candles = []
+    for _ in range(400):
+        price *= 1 + rng.gauss(0, 0.004)
+        candles.append({"close": price, "volume": rng.uniform(1, 50)})
+    closes = [c["close"] for c in candles]
+
+    bbwp_series = battlebox_pipeline._calc_bbwp_series(closes)
+    assert len(bbwp_series) == len(closes)
+    for end in (10, 14, 30, 252, 400):
+        sub = closes[:end]
+        series = battlebox_pipeline._calc_bbwp_series(sub)
+        assert battlebox_pipeline._calc_bbwp(sub) == (50.0 if series[-1] is None else series[-1])
+        series = battlebox_pipeline._calc_pmarp_series(candles[:end])
+        assert battlebox_pipeline._calc_pmarp(candles[:end]) == (50.0 if series[-1] is None else series[-1])
+
+    # Recompute the last PMARP value with the original O(lookback) scan.
+    ma_period, lookback = 20, 350
+    pmar = []
+    for i in range(len(closes)):
+        if i < ma_period - 1:
+            pmar.append(None)
+            continue
+        pw = closes[i - ma_period + 1 : i + 1]
+        vw = [c["volume"] for c in candles[i - ma_period + 1 : i + 1]]
+        vwma = sum(p * v for p, v in zip(pw, vw)) / sum(vw)
+        pmar.append(closes[i] / vwma)
+    hist = [v for v in pmar[len(closes) - lookback :] if v is not None]
+    expected = round(sum(1 for v in hist if v < pmar[-1]) / len(hist) * 100.0, 2)
+    assert battlebox_pipeline._calc_pmarp(candles) == expected
+
+
+def _candles(seed, n, step=0.004, tick=None):
+    rng = random.Random(seed)
+    price = 60000.0
+    out = []
+    for i in range(n):
+        price *= 1 + rng.gauss(0, step)
+        hi = price * (1 + abs(rng.gauss(0, step / 2)))
+        lo = price * (1 - abs(rng.gauss(0, step / 2)))
+        if tick:  # coarse prices -> plenty of equal highs/lows
+            hi, lo, price = round(hi / tick) * tick, round(lo / tick) * tick, round(price / tick) * tick
+        out.append({"time": 1700000000 + i * 3600, "open": price, "high": hi, "low": lo,
+                    "close": price, "volume": rng.uniform(1, 50)})
+    return out
+
+
+def _brute_pivots(values, left, right, strict_left, want_max):
+    out = []
+    for i in range(left, len(values) - right):
+        v = values[i]
+        if want_max:
+            ok_l = all((values[i - j] < v) if strict_left else (values[i - j] <= v) for j in range(1, left + 1))
+            ok_r = all(values[i + j] < v for j in range(1, right + 1))
+        else:
+            ok_l = all((values[i - j] > v) if strict_left else (values[i - j] >= v) for j in range(1, left + 1))
+            ok_r = all(values[i + j] > v for j in range(1, right + 1))
+        if ok_l and ok_r:
+            out.append(i)
+    return out
+
+
+def test_sliding_extrema_match_window_scan():
+    rng = random.Random(3)
+    values = [rng.randint(0, 20) for _ in range(500)]
+    for window in (1, 2, 14, 50, 600):
+        hi, lo = sliding_max(values, window), sliding_min(values, window)
+        for i in range(len(values)):
+            if i < window - 1:
+                assert hi[i] is None and lo[i] is None
+            else:
+                assert hi[i] == max(values[i - window + 1 : i + 1])
+                assert lo[i] == min(values[i - window + 1 : i + 1])
+
+
+@pytest.mark.parametrize("strict_left", [False, True])
+@pytest.mark.parametrize("left,right", [(3, 3), (1, 1), (5, 2), (0, 3), (3, 0), (10, 10)])
+def test_pivots_match_nested_scan(left, right, strict_left):
+    rng = random.Random(left * 31 + right)
+    for values in ([rng.randint(0, 12) for _ in range(400)], [rng.gauss(0, 1) for _ in range(400)]):
+        assert pivot_highs(values, left, right, strict_left) == _brute_pivots(values, left, right, strict_left, True)
+        assert pivot_lows(values, left, right, strict_left) == _brute_pivots(values, left, right, strict_left, False)
+    short = [1.0] * (left + right)
+    assert pivot_highs(short, left, right, strict_left) == pivot_lows(short, left, right, strict_left) == []
+
+
+@pytest.mark.parametrize("tick", [None, 50.0])
+def test_engine_pivot_scans_match_previous_scan(tick):
+    import gravity_engine
+    import mtf_confluence_scanner
+    import sse_engine
+
+    candles = _candles(11, 3000, tick=tick)
+    highs = [c["high"] for c in candles]
+    lows = [c["low"] for c in candles]
+
+    # gravity_engine: scans the closed candles (all but the last).
+    for tf in ("4h", "1h", "1d"):
+        got = gravity_engine._scan_for_pivots(candles, tf)
+        closed = len(candles) - 1
+        want_sup = _brute_pivots(highs[:closed], 3, 3, False, True)
+        want_dem = _brute_pivots(lows[:closed], 3, 3, False, False)
+        assert [p["ts"] for p in got if p["type"] == "SUPPLY"] == [candles[i]["time"] for i in want_sup]
+        assert [p["ts"] for p in got if p["type"] == "DEMAND"] == [candles[i]["time"] for i in want_dem]
+
+    sup = _brute_pivots(highs, 3, 3, False, True)
+    dem = _brute_pivots(lows, 3, 3, False, False)
+    assert sse_engine._find_pivots(candles) == (highs[sup[-1]], lows[dem[-1]])
+
+    closes = [c["close"] for c in candles]
+    assert mtf_confluence_scanner._find_pivot_highs(closes) == [(i, closes[i]) for i in _brute_pivots(closes, 3, 3, True, True)]
+    assert mtf_confluence_scanner._find_pivot_lows(closes) == [(i, closes[i]) for i in _brute_pivots(closes, 3, 3, True, False)]
+
+
+def test_stochastic_matches_window_scan():
+    import battlebox_pipeline
+
+    candles = _candles(5, 300, tick=25.0)
+    k_vals = []
+    for i in range(13, len(candles)):
+        window = candles[i - 13 : i + 1]
+        hh = max(c["high"] for c in window)
+        ll = min(c["low"] for c in window)
+        cl = candles[i]["close"]
+        k_vals.append(100 * (cl - ll) / (hh - ll) if hh != ll else 50.0)
+    d = sum(k_vals[-3:]) / 3
+    assert battlebox_pipeline._calc_stochastic(candles) == {"k": round(k_vals[-1], 2), "d": round(d, 2)}
+
+
+def test_exhaustion_monitor_imports_without_the_app_and_keeps_its_bbwp():
+    import subprocess
+
+    pkg = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bold-hubble")
+    # The package alone on the path (no app root): it must not reach for rolling_stats.
+    proc = subprocess.run([sys.executable, "-c", "import monitoring"], cwd=pkg,
+                          env={**os.environ, "PYTHONPATH": pkg}, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+    from monitoring import exhaustion_monitor
+
+    candles = _candles(11, 400, tick=30.0)
+    closes = [c["close"] for c in candles]
+    widths = []
+    for i in range(19, len(closes)):
+        w = closes[i - 19 : i + 1]
+        mean = sum(w) / 20
+        widths.append(4.0 * (sum((x - mean) ** 2 for x in w) / 20) ** 0.5 / mean)
+    want = sum(1 for w in widths[:-1] if w <= widths[-1]) / (len(widths) - 1) * 100.0  # the old linear scan
+    assert exhaustion_monitor._calc_bbwp(candles) == want
+    assert percentile_rank_last(widths, len(widths) - 1) == want
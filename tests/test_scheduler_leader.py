@@ -0,0 +1,95 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+
+import database
+import scheduler_leader
+
+
+def _engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'leader.db'}")
+    database.SchedulerLease.__table__.create(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    return engine
+
+
+def test_only_one_holder_until_the_lease_expires(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    a = scheduler_leader.LeaderLease(ttl=0.3, holder="a")
+    b = scheduler_leader.LeaderLease(ttl=0.3, holder="b")
+
+    assert a.try_acquire()
+    assert not b.try_acquire()
+    assert a.try_acquire()  # renew
+    time.sleep(0.35)
+    assert b.try_acquire()  # a stopped renewing
+    assert not a.try_acquire()
+    b.release()
+    assert a.try_acquire()
+
+
+def test_supervisor_starts_once_and_releases_on_cancel(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    lease = scheduler_leader.LeaderLease(ttl=0.15, holder="sup")
+    started = []
+
+    async def scenario():
+        async def forever():
+            await asyncio.sleep(3600)
+
+        def start_tasks():
+            task = asyncio.create_task(forever())
+            started.append(task)
+            return [task]
+
+        sup = asyncio.create_task(scheduler_leader.run_as_leader(start_tasks, lease=lease))
+        await asyncio.sleep(0.25)  # several renewals
+        sup.cancel()
+        try:
+            await sup
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert len(started) == 1 and started[0].cancelled()
+    assert scheduler_leader.LeaderLease(ttl=0.15, holder="other").try_acquire()
+
+
+def test_lease_survives_a_blocked_loop_and_outlives_scheduler_shutdown(tmp_path, monkeypatch):
+    _engine(tmp_path, monkeypatch)
+    lease = scheduler_leader.LeaderLease(ttl=0.15, holder="sup")
+    other = scheduler_leader.LeaderLease(ttl=0.15, holder="other")
+    seen = {}
+
+    async def scenario():
+        async def scheduler():
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.2)  # slow unwind, longer than the TTL
+                seen["leader_during_unwind"] = scheduler_leader.get_status()["is_leader"]
+                seen["taken_during_unwind"] = other.try_acquire()
+                raise
+
+        sup = asyncio.create_task(
+            scheduler_leader.run_as_leader(lambda: [asyncio.create_task(scheduler())], lease=lease)
+        )
+        await asyncio.sleep(0.1)
+        time.sleep(0.4)  # a sync call hogging the loop for several TTLs
+        seen["taken_while_blocked"] = other.try_acquire()
+        sup.cancel()
+        try:
+            await sup
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert seen == {"taken_while_blocked": False, "leader_during_unwind": True, "taken_during_unwind": False}
+    assert not scheduler_leader.get_status()["is_leader"]
+    assert other.try_acquire()
@@ -0,0 +1,64 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import startup_profile
+
+
+def test_lazy_module_executes_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "kb_lazy_probe.py").write_text(
+        "import builtins\n"
+        "builtins.KB_LAZY_PROBE_RUNS = getattr(builtins, 'KB_LAZY_PROBE_RUNS', 0) + 1\n"
+        "VALUE = 42\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "kb_lazy_probe", raising=False)
+    import builtins
+
+    mod = startup_profile.lazy_module("kb_lazy_probe")
+    assert getattr(builtins, "KB_LAZY_PROBE_RUNS", 0) == 0
+    assert mod.VALUE == 42
+    assert builtins.KB_LAZY_PROBE_RUNS == 1
+    assert startup_profile.lazy_module("kb_lazy_probe") is mod
+    del builtins.KB_LAZY_PROBE_RUNS
+
+
+def test_phase_is_reported():
+    with startup_profile.phase("unit_test_phase"):
+        pass
+    phases = [p["phase"] for p in startup_profile.report()["phases"]]
+    assert "unit_test_phase" in phases
+
+
+def test_lazy_module_first_access_from_many_threads_imports_once(tmp_path, monkeypatch):
+    import builtins
+    import threading
+
+    (tmp_path / "kb_lazy_slow.py").write_text(
+        "import builtins, time\n"
+        "builtins.KB_LAZY_SLOW_RUNS = getattr(builtins, 'KB_LAZY_SLOW_RUNS', 0) + 1\n"
+        "time.sleep(0.2)\n"
+        "VALUE = 7\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "kb_lazy_slow", raising=False)
+    mod = startup_profile.lazy_module("kb_lazy_slow")
+    seen, errors = [], []
+
+    def read():
+        try:
+            seen.append(mod.VALUE)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and seen == [7] * 8
+    assert builtins.KB_LAZY_SLOW_RUNS == 1
+    monkeypatch.setattr(mod, "VALUE", 8)  # writes reach the real module
+    assert sys.modules["kb_lazy_slow"].VALUE == 8
+    del builtins.KB_LAZY_SLOW_RUNS
@@ -0,0 +1,103 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import telemetry_queue
+
+
+class _Row:
+    def __init__(self, **fields):
+        if fields.get("bad"):
+            raise ValueError("bad row")
+        self.fields = fields
+
+
+class _FakeSession:
+    commits = []
+
+    def __init__(self):
+        self._pending = []
+
+    def add(self, row):
+        self._pending.append(row)
+
+    def add_all(self, rows):
+        self._pending.extend(rows)
+
+    def commit(self):
+        _FakeSession.commits.append([r.fields["n"] for r in self._pending])
+        self._pending = []
+
+    def rollback(self):
+        self._pending = []
+
+    def close(self):
+        pass
+
+
+def test_rows_batch_into_one_commit_and_flush_on_shutdown(monkeypatch):
+    monkeypatch.setattr(telemetry_queue, "SessionLocal", _FakeSession)
+    monkeypatch.setattr(telemetry_queue, "FLUSH_INTERVAL", 60.0)
+    telemetry_queue.shutdown()
+    _FakeSession.commits = []
+
+    for n in range(5):
+        telemetry_queue.enqueue(_Row, n=n)
+    assert _FakeSession.commits == []  # nothing written on the caller's path
+
+    telemetry_queue.shutdown()
+    assert _FakeSession.commits == [[0, 1, 2, 3, 4]]
+    assert telemetry_queue.get_stats()["pending"] == 0
+
+
+def test_bad_row_does_not_drop_the_batch(monkeypatch):
+    monkeypatch.setattr(telemetry_queue, "SessionLocal", _FakeSession)
+    monkeypatch.setattr(telemetry_queue, "FLUSH_INTERVAL", 60.0)
+    telemetry_queue.shutdown()
+    _FakeSession.commits = []
+    dropped_before = telemetry_queue.get_stats()["dropped"]
+
+    telemetry_queue.enqueue(_Row, n=1)
+    telemetry_queue.enqueue(_Row, n=2, bad=True)
+    telemetry_queue.enqueue(_Row, n=3)
+    telemetry_queue.flush()
+    telemetry_queue.shutdown()
+
+    assert _FakeSession.commits == [[1], [3]]
+    assert telemetry_queue.get_stats()["dropped"] == dropped_before + 1
+
+
+def test_created_at_is_stamped_at_enqueue_time(monkeypatch):
+    import datetime
+
+    class _Stamped(_Row):
+        created_at = None  # stands in for the ORM column
+
+    monkeypatch.setattr(telemetry_queue, "SessionLocal", _FakeSession)
+    monkeypatch.setattr(telemetry_queue, "FLUSH_INTERVAL", 60.0)
+    telemetry_queue.shutdown()
+    written = []
+    monkeypatch.setattr(_FakeSession, "commit", lambda self: written.extend(self._pending))
+
+    before = datetime.datetime.utcnow()
+    telemetry_queue.enqueue(_Stamped, n=1)
+    telemetry_queue.enqueue(_Row, n=2)
+    after = datetime.datetime.utcnow()
+    telemetry_queue.shutdown()
+
+    assert before <= written[0].fields["created_at"] <= after
+    assert "created_at" not in written[1].fields  # models without the column are left alone
+
+
+def test_a_model_column_is_passed_through_as_a_field(monkeypatch):
+    monkeypatch.setattr(telemetry_queue, "SessionLocal", _FakeSession)
+    monkeypatch.setattr(telemetry_queue, "FLUSH_INTERVAL", 60.0)
+    telemetry_queue.shutdown()
+    written = []
+    monkeypatch.setattr(_FakeSession, "commit", lambda self: written.extend(self._pending))
+
+    telemetry_queue.enqueue(_Row, n=1, model="claude")  # AgentRunLog has a `model` column
+    telemetry_queue.shutdown()
+
+    assert written[0].fields == {"n": 1, "model": "claude"}
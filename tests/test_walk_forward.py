@@ -0,0 +1,115 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import gravity_engine
+from database import Base, CandleHistory, DecisionGaugeReading, DecisionLog
+from harness import walk_forward as wf
+
+START = datetime(2025, 3, 1)
+
+
+def _source_db(tmp_path, days=50, seed=9):
+    """candle_history with 5M bars from START - 40d and stored 1D bars before that."""
+    url = f"sqlite:///{tmp_path / 'source.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine, tables=[CandleHistory.__table__])
+    rng = random.Random(seed)
+    t0 = START - timedelta(days=40)
+    rows, price, drift = [], 60000.0, 0.0
+    for i in range((days + 40) * 288):
+        if i % 576 == 0:
+            drift = rng.choice([-1, 1]) * rng.uniform(0.0001, 0.0004)  # two-day legs make BOS breaks
+        o = price
+        price *= 1 + drift + rng.gauss(0, 0.0015)
+        rows.append(CandleHistory(symbol="BTC/USDT", timeframe="5M", timestamp=t0 + timedelta(minutes=5 * i),
+                                  open=o, close=price, volume=rng.uniform(5, 80),
+                                  high=max(o, price) * (1 + abs(rng.gauss(0, 0.0007))),
+                                  low=min(o, price) * (1 - abs(rng.gauss(0, 0.0007)))))
+    for d in range(1, 60):
+        px = 60000.0 * (1 + 0.002 * ((d % 9) - 4))
+        rows.append(CandleHistory(symbol="BTC/USDT", timeframe="1D", timestamp=t0 - timedelta(days=d),
+                                  open=px, high=px * 1.01, low=px * 0.99, close=px, volume=1000.0))
+    db = sessionmaker(bind=engine)()
+    db.add_all(rows)
+    db.commit()
+    db.close()
+    engine.dispose()
+    return url
+
+
+def _decisions(url):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        rows = conn.execute(select(DecisionLog).order_by(DecisionLog.decided_at, DecisionLog.decision_timeframe)).all()
+        gauges = conn.execute(select(DecisionGaugeReading)).all()
+    engine.dispose()
+    out = [tuple(getattr(r, f) for f in wf._DECISION_FIELDS) for r in rows]
+    return out, len(gauges)
+
+
+def test_chunked_replay_matches_sequential_and_resumes(tmp_path):
+    source = _source_db(tmp_path, days=12)
+    seq = f"sqlite:///{tmp_path / 'seq.db'}"
+    out = wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-05", ["us_ny_futures", "eu_london"],
+                              results_url=seq, source_url=source, chunk_days=4, tick_minutes=60, workers=1)
+    assert out["chunks"] == 1 and out["decisions"] > 0
+    want, n_gauges = _decisions(seq)
+    assert n_gauges > 0
+    kinds = {(r[1], r[2]) for r in want}  # (timeframe, decision_type)
+    assert {"15M", "4H", "1H"} <= {k[0] for k in kinds} and ("4H", "TRADE") in kinds
+    traded = [r for r in want if r[2] == "TRADE"]
+    assert all(r[wf._DECISION_FIELDS.index("outcome_status")] for r in traded)
+
+    # The same range as two 2-day chunks, the first run stopping after one chunk.
+    chunked = f"sqlite:///{tmp_path / 'chunked.db'}"
+    first = wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-03", ["eu_london", "us_ny_futures"],
+                                results_url=chunked, source_url=source, chunk_days=2, tick_minutes=60, workers=1)
+    rest = wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-05", ["eu_london", "us_ny_futures"],
+                               results_url=chunked, source_url=source, chunk_days=2, tick_minutes=60, workers=1)
+    assert first["run_key"] == rest["run_key"]
+    assert (first["chunks"], rest["chunks"], rest["skipped"]) == (1, 2, 1)
+    assert _decisions(chunked) == (want, n_gauges)
+
+    again = wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-05", ["eu_london", "us_ny_futures"],
+                                results_url=chunked, source_url=source, chunk_days=2, tick_minutes=60, workers=1)
+    assert again["skipped"] == 2 and again["decisions"] == 0
+
+    with pytest.raises(ValueError):
+        wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-05", ["eu_london"],
+                            results_url=chunked, source_url=source, chunk_days=2, tick_minutes=60, workers=1)
+
+
+def test_pool_matches_inline_and_live_state_is_restored(tmp_path):
+    source = _source_db(tmp_path, days=6)
+    inline, pooled = f"sqlite:///{tmp_path / 'a.db'}", f"sqlite:///{tmp_path / 'b.db'}"
+    before = (wf.battlebox_pipeline.SessionLocal, wf.unified_audit_writer.SessionLocal, wf.notify.send_admin_email)
+    kw = dict(results_url=inline, source_url=source, chunk_days=1, tick_minutes=60)
+    wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-03", workers=1, **kw)
+    wf.run_walk_forward("BTC/USDT", "2025-03-01", "2025-03-03", workers=2, **{**kw, "results_url": pooled})
+    assert _decisions(pooled) == _decisions(inline)
+    assert (wf.battlebox_pipeline.SessionLocal, wf.unified_audit_writer.SessionLocal, wf.notify.send_admin_email) == before
+
+
+def test_candle_windows_match_what_a_fetch_returns_mid_bar(tmp_path):
+    hist = wf.load_history("BTC/USDT", START.replace(tzinfo=timezone.utc),
+                           (START + timedelta(days=2)).replace(tzinfo=timezone.utc), _source_db(tmp_path, days=2))
+    now = int(START.replace(tzinfo=timezone.utc).timestamp()) + 3 * 3600 + 35 * 60  # 03:35 UTC
+    w = hist.window("1H", now, 200)
+    assert len(w) == 200 and w[-1]["time"] == now - 35 * 60  # forming 03:00 bar
+    m5 = [c for c in hist.window("5M", now, 1500) if c["time"] >= w[-1]["time"]]
+    assert len(m5) == 7 and m5[-1]["time"] == now - 300
+    assert (w[-1]["open"], w[-1]["close"]) == (m5[0]["open"], m5[-1]["close"])
+    assert w[-1]["high"] == max(c["high"] for c in m5)
+    assert w[-2]["time"] == w[-1]["time"] - 3600
+    daily = hist.window("1D", now, 300)
+    # 59 stored days before the 5M history, 40 resampled, today's forming bar.
+    assert len(daily) == 100 and daily[0]["time"] == daily[-1]["time"] - 99 * 86400
+    assert gravity_engine._scan_for_pivots(hist.window("4H", now, 50), "4h")
@@ -0,0 +1,63 @@
+# worker.py
+# ==============================================================================
+# KABRODA SCHEDULER WORKER
+# Purpose: Run the background schedulers in their own process, away from the
+# event loop that serves HTTP.
+#
+# Gravity pivot scans, zone touches, indicator passes and the blocking DB
+# calls in the ledger / session-monitor loops used to share main.py's event
+# loop with every API request. Deploy layout with this split:
+#   web:    SCHEDULER_MODE=off uvicorn main:app --workers N   (stateless)
+#   worker: python worker.py                                  (1+ instances)
+# Every worker contends for the same scheduler_leader lease, so running a
+# second one is a hot standby, never a duplicate scheduler set.
+#
+# main.py is imported for its scheduler coroutines only; its lifespan (and
+# therefore the HTTP app) never starts here.
+# ==============================================================================
+
+import asyncio
+import signal
+
+import startup_profile
+startup_profile.install()
+
+import agent_core
+import fetch_scheduler
+import scheduler_leader
+import telemetry_queue
+from database import init_db
+from main import start_scheduler_tasks
+
+
+async def run_worker() -> None:
+    print(">>> BOOTING KABRODA WORKER: Initializing Database Schema...")
+    with startup_profile.phase("init_db"):
+        init_db()
+    try:
+        with startup_profile.phase("seed_spend_ledger"):
+            agent_core.seed_spend_ledger()
+    except Exception as e:
+        print(f">>> Agent spend ledger seed failed (will seed on first budget check): {e}")
+
+    supervisor = asyncio.create_task(scheduler_leader.run_as_leader(start_scheduler_tasks))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, supervisor.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows dev boxes: Ctrl+C still raises KeyboardInterrupt
+
+    try:
+        await supervisor
+    except asyncio.CancelledError:
+        pass
+    finally:
+        print(">>> SHUTTING DOWN KABRODA WORKER...")
+        await fetch_scheduler.close_all()
+        await asyncio.to_thread(telemetry_queue.shutdown)
+
+
+if __name__ == "__main__":
+    startup_profile.finish_imports()
+    asyncio.run(run_worker())